@@ -0,0 +1,6 @@
+#!/bin/bash
+source venv/bin/activate
+# Compile once before the shards start, reusing stored artifacts for unchanged sources
+python scripts/artifact_store.py compile
+python scripts/run_tests.py "$@" tests/adapters tests/internal tests/test_authentication.py tests/stateful
+brownie test tests/mainnet-fork --network mainnet-fork
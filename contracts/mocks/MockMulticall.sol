@@ -0,0 +1,31 @@
+// SPDX-License-Identifier: GPL-3.0-only
+pragma solidity =0.7.6;
+pragma abicoder v2;
+
+/// @notice Batches view calls for test invariant checks. The calls are made in the constructor and
+/// the results are returned in place of the runtime code, so the batch is executed with a single
+/// eth_call of the creation code and nothing is deployed.
+contract MockMulticall {
+    struct Call {
+        address target;
+        bytes callData;
+    }
+
+    struct Result {
+        bool success;
+        bytes returnData;
+    }
+
+    constructor(Call[] memory calls) {
+        Result[] memory results = new Result[](calls.length);
+        for (uint256 i; i < calls.length; i++) {
+            (bool success, bytes memory returnData) = calls[i].target.staticcall(calls[i].callData);
+            results[i] = Result(success, returnData);
+        }
+
+        bytes memory data = abi.encode(results);
+        assembly {
+            return(add(data, 32), mload(data))
+        }
+    }
+}
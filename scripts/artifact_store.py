@@ -0,0 +1,183 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+from glob import glob
+
+import yaml
+
+# Content addressed store of brownie build artifacts, shared between branches and worktrees.
+# Artifacts are keyed by the hash of every source file in their compilation, the solc version
+# and the compiler section of brownie-config.yaml (optimizer settings and remappings). Brownie
+# only recompiles contracts without an up to date artifact, so restoring matching artifacts
+# before compiling means only contracts with changed transitive sources are recompiled:
+#   python scripts/artifact_store.py compile
+STORE_DIR = os.environ.get(
+    "NOTIONAL_ARTIFACT_STORE", os.path.join(os.path.expanduser("~"), ".cache", "notional-artifacts")
+)
+STORE_VERSION = 2
+BUILD_DIRS = ["build/contracts", "build/interfaces"]
+CONFIG_PATH = "brownie-config.yaml"
+# Sources from brownie-config.yaml dependencies are relative to the brownie packages folder
+PACKAGES_DIR = os.path.join(os.path.expanduser("~"), ".brownie", "packages")
+
+
+def getCompilerConfig():
+    with open(CONFIG_PATH, "r") as f:
+        config = yaml.safe_load(f)
+    return config.get("compiler", {})
+
+
+def _hashFile(path, fileHashes):
+    if path not in fileHashes:
+        fileHashes[path] = None
+        for fullPath in [path, os.path.join(PACKAGES_DIR, path)]:
+            if os.path.isfile(fullPath):
+                with open(fullPath, "rb") as f:
+                    fileHashes[path] = hashlib.sha256(f.read()).hexdigest()
+                break
+    return fileHashes[path]
+
+
+def getSourcePaths(artifact):
+    """Returns every source file in the compilation of the artifact"""
+    paths = set(artifact.get("allSourcePaths", {}).values())
+    if artifact.get("sourcePath"):
+        paths.add(artifact["sourcePath"])
+    return sorted(paths)
+
+
+def getArtifactKey(relPath, sourcePaths, compiler, compilerConfig, fileHashes):
+    """
+    Returns the store key of an artifact at relPath in its build directory compiled from the
+    given sources, or None if any of the sources no longer exist
+    """
+    hashes = [(path, _hashFile(path, fileHashes)) for path in sourcePaths]
+    if any(h is None for (_, h) in hashes):
+        return None
+
+    key = json.dumps(
+        [STORE_VERSION, relPath, hashes, compiler, compilerConfig], sort_keys=True, default=str
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _entryPaths(buildDir, relPath, key):
+    # Entries keep the path of the artifact in its build directory, dependency artifacts are
+    # built into subdirectories
+    directory = os.path.join(STORE_DIR, os.path.basename(buildDir), relPath)
+    return (os.path.join(directory, key + ".json"), os.path.join(directory, key + ".sources.json"))
+
+
+def _writeAtomic(path, data):
+    # Worktrees may share a store, partially written entries must never be visible
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmpPath = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmpPath, "wb") as f:
+        f.write(data)
+    os.replace(tmpPath, path)
+
+
+def saveArtifacts():
+    """Adds every artifact in the build directories to the store, returns the number added"""
+    compilerConfig = getCompilerConfig()
+    fileHashes = {}
+    saved = 0
+
+    for buildDir in BUILD_DIRS:
+        for path in glob(os.path.join(buildDir, "**", "*.json"), recursive=True):
+            with open(path, "rb") as f:
+                data = f.read()
+            artifact = json.loads(data)
+
+            relPath = os.path.relpath(path, buildDir)[:-5]
+            sourcePaths = getSourcePaths(artifact)
+            key = getArtifactKey(
+                relPath, sourcePaths, artifact.get("compiler"), compilerConfig, fileHashes
+            )
+            if key is None:
+                continue
+
+            (artifactPath, manifestPath) = _entryPaths(buildDir, relPath, key)
+            if os.path.exists(manifestPath):
+                continue
+
+            # The manifest is written last, it marks the entry as complete
+            _writeAtomic(artifactPath, data)
+            manifest = {"sourcePaths": sourcePaths, "compiler": artifact.get("compiler")}
+            _writeAtomic(manifestPath, json.dumps(manifest).encode())
+            saved += 1
+
+    return saved
+
+
+def restoreArtifacts():
+    """
+    Copies stored artifacts whose sources and compiler settings match the working tree into the
+    build directories, returns the number restored
+    """
+    compilerConfig = getCompilerConfig()
+    fileHashes = {}
+    restored = 0
+
+    for buildDir in BUILD_DIRS:
+        storeDir = os.path.join(STORE_DIR, os.path.basename(buildDir))
+        # Entries of each artifact by its path in the build directory
+        entries = {}
+        for manifestPath in glob(os.path.join(storeDir, "**", "*.sources.json"), recursive=True):
+            relPath = os.path.relpath(os.path.dirname(manifestPath), storeDir)
+            entries.setdefault(relPath, []).append(manifestPath)
+
+        for (relPath, manifestPaths) in sorted(entries.items()):
+            buildPath = os.path.join(buildDir, relPath + ".json")
+            for manifestPath in sorted(manifestPaths):
+                with open(manifestPath, "r") as f:
+                    manifest = json.load(f)
+
+                key = getArtifactKey(
+                    relPath,
+                    manifest["sourcePaths"],
+                    manifest["compiler"],
+                    compilerConfig,
+                    fileHashes,
+                )
+                if key is None or manifestPath != _entryPaths(buildDir, relPath, key)[1]:
+                    continue
+
+                (artifactPath, _) = _entryPaths(buildDir, relPath, key)
+                if not _isSame(artifactPath, buildPath):
+                    os.makedirs(os.path.dirname(buildPath), exist_ok=True)
+                    shutil.copyfile(artifactPath, buildPath)
+                    restored += 1
+                break
+
+    return restored
+
+
+def _isSame(storePath, buildPath):
+    if not os.path.exists(buildPath):
+        return False
+    with open(storePath, "rb") as a, open(buildPath, "rb") as b:
+        return a.read() == b.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shares compiled artifacts between worktrees")
+    parser.add_argument("command", choices=["restore", "save", "compile"])
+    args = parser.parse_args()
+
+    if args.command in ("restore", "compile"):
+        print("Restored {} artifacts from {}".format(restoreArtifacts(), STORE_DIR))
+
+    if args.command == "compile":
+        subprocess.run(["brownie", "compile"], check=True)
+
+    if args.command in ("save", "compile"):
+        print("Saved {} artifacts to {}".format(saveArtifacts(), STORE_DIR))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+from glob import glob
+
+import rlp
+from brownie import accounts
+from brownie.network import web3
+from brownie.network.account import Account
+from brownie.network.contract import Contract, ProjectContract
+from brownie.network.state import Chain
+from brownie.project import ContractsV2Project
+from eth_utils import keccak, to_checksum_address
+
+chain = Chain()
+
+CACHE_DIR = "build/state_cache"
+CACHE_VERSION = 2
+# Build outputs and configuration that change the deployed environment
+CACHE_SOURCES = [
+    "build/contracts/**/*.json",
+    "build/interfaces/**/*.json",
+    "scripts/artifacts/*.json",
+    "scripts/config.py",
+]
+STORAGE_PAGE_SIZE = 1024
+
+
+def isCacheEnabled():
+    """Chain state caching is enabled by setting CHAIN_STATE_CACHE to a non zero value"""
+    return os.environ.get("CHAIN_STATE_CACHE", "0") not in ("", "0", "false")
+
+
+def _rpc(method, params=None):
+    response = web3.provider.make_request(method, params or [])
+    if "error" in response:
+        raise ValueError("{} failed: {}".format(method, response["error"]))
+    return response["result"]
+
+
+def getCacheKey(*args):
+    """
+    Returns a hash of the compiled contracts, deployment artifacts and scripts/config.py along
+    with the chain id. Any additional args, e.g. constructor arguments, are hashed
+    as well. The chain head is not part of the key, restored state is only valid on a node
+    launched from the fixed mnemonic in brownie-config.yaml so that the accounts match.
+    """
+    digest = hashlib.sha256()
+    digest.update(str(CACHE_VERSION).encode())
+    for pattern in CACHE_SOURCES:
+        for path in sorted(glob(pattern, recursive=True)):
+            digest.update(path.encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+
+    digest.update(json.dumps([web3.eth.chain_id] + [str(a) for a in args]).encode())
+
+    return digest.hexdigest()
+
+
+def _getCreatedAddress(sender, nonce):
+    return to_checksum_address(keccak(rlp.encode([bytes.fromhex(sender[2:]), nonce]))[12:])
+
+
+def getTouchedAddresses(fromBlock, extraAddresses=()):
+    """
+    Returns every address touched by transactions since fromBlock, including contracts created
+    by other contracts which are found by the nonces of their creators.
+    """
+    touched = set(to_checksum_address(a) for a in extraAddresses)
+    for blockNumber in range(fromBlock, web3.eth.block_number + 1):
+        block = web3.eth.get_block(blockNumber, full_transactions=True)
+        for txn in block["transactions"]:
+            receipt = web3.eth.get_transaction_receipt(txn["hash"])
+            touched.add(txn["from"])
+            for address in [txn["to"], receipt["contractAddress"]]:
+                if address is not None:
+                    touched.add(to_checksum_address(address))
+            for log in receipt["logs"]:
+                touched.add(to_checksum_address(log["address"]))
+
+    pending = list(touched)
+    while pending:
+        address = pending.pop()
+        if len(web3.eth.get_code(address)) == 0:
+            continue
+
+        # Contract nonces start at one and are only incremented by CREATE
+        for nonce in range(1, web3.eth.get_transaction_count(address)):
+            created = _getCreatedAddress(address, nonce)
+            if created not in touched:
+                touched.add(created)
+                pending.append(created)
+
+    return sorted(touched)
+
+
+def _getStorage(blockHash, txIndex, address):
+    storage = {}
+    nextKey = "0x" + "00" * 32
+    while nextKey is not None:
+        result = _rpc(
+            "debug_storageRangeAt", [blockHash, txIndex, address, nextKey, STORAGE_PAGE_SIZE]
+        )
+        for entry in result["storage"].values():
+            if entry["key"] is None:
+                raise ValueError("Storage slot preimage unavailable for {}".format(address))
+            storage[entry["key"]] = entry["value"]
+        nextKey = result["nextKey"]
+
+    return storage
+
+
+def dumpChainState(addresses):
+    """
+    Returns the code, balance, nonce and storage of each address along with the block number
+    and time of the chain so that it can be restored with loadChainState.
+    """
+    state = {"blockNumber": None, "time": None, "accounts": {}}
+    # Ganache replays the block up to and including the transaction index, reading at the last
+    # transaction of the latest block gives the current state without sending another
+    latest = web3.eth.get_block("latest")
+    (blockHash, txIndex) = (latest["hash"].hex(), max(len(latest["transactions"]) - 1, 0))
+    for address in addresses:
+        code = web3.eth.get_code(address).hex()
+        state["accounts"][address] = {
+            "code": code,
+            "balance": hex(web3.eth.get_balance(address)),
+            "nonce": hex(web3.eth.get_transaction_count(address)),
+            "storage": _getStorage(blockHash, txIndex, address) if code != "0x" else {},
+        }
+
+    state["blockNumber"] = web3.eth.block_number
+    state["time"] = chain.time()
+    return state
+
+
+def loadChainState(state):
+    """Restores a state returned by dumpChainState onto the local node"""
+    for (address, account) in state["accounts"].items():
+        _rpc("evm_setAccountCode", [address, account["code"]])
+        _rpc("evm_setAccountBalance", [address, account["balance"]])
+        _rpc("evm_setAccountNonce", [address, account["nonce"]])
+        for (slot, value) in account["storage"].items():
+            _rpc("evm_setAccountStorageAt", [address, slot, value])
+
+    # Compound accrues interest by block number and governance votes by block
+    if web3.eth.block_number < state["blockNumber"]:
+        chain.mine(state["blockNumber"] - web3.eth.block_number)
+    if chain.time() < state["time"]:
+        chain.sleep(state["time"] - chain.time())
+        chain.mine(1)
+
+
+def _encodeValue(value):
+    if isinstance(value, Account):
+        return {"account": value.address}
+    elif isinstance(value, (Contract, ProjectContract)):
+        return {"contract": value._name, "address": value.address, "abi": value.abi}
+    elif isinstance(value, dict):
+        return {"dict": [[_encodeValue(k), _encodeValue(v)] for (k, v) in value.items()]}
+    elif isinstance(value, (list, tuple)):
+        return {"list": [_encodeValue(v) for v in value]}
+    else:
+        return {"value": value}
+
+
+def _decodeValue(encoded, owner):
+    if "account" in encoded:
+        return accounts.at(encoded["account"], force=True)
+    elif "contract" in encoded:
+        name = encoded["contract"]
+        container = getattr(ContractsV2Project, name, None)
+        if container is not None and container.abi == encoded["abi"]:
+            # Project contracts are added to their containers as they are on deployment
+            return container.at(encoded["address"], owner=owner)
+        return Contract.from_abi(name, encoded["address"], abi=encoded["abi"], owner=owner)
+    elif "dict" in encoded:
+        return {_decodeValue(k, owner): _decodeValue(v, owner) for (k, v) in encoded["dict"]}
+    elif "list" in encoded:
+        return [_decodeValue(v, owner) for v in encoded["list"]]
+    else:
+        return encoded["value"]
+
+
+def saveCachedEnvironment(key, attributes, fromBlock):
+    """
+    Dumps the chain state touched since fromBlock and the environment attributes, contracts
+    are referenced by their address and abi
+    """
+    cache = {
+        "manifest": {name: _encodeValue(value) for (name, value) in attributes.items()},
+        "state": dumpChainState(getTouchedAddresses(fromBlock, [a.address for a in accounts])),
+    }
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, "{}.json".format(key))
+    # Write to a temporary file first so that concurrent runs never read a partial cache
+    with open(path + ".tmp", "w") as f:
+        json.dump(cache, f)
+    os.replace(path + ".tmp", path)
+
+
+def loadCachedEnvironment(key, owner):
+    """Restores a cached environment, returning its attributes or None on a cache miss"""
+    path = os.path.join(CACHE_DIR, "{}.json".format(key))
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r") as f:
+        cache = json.load(f)
+
+    loadChainState(cache["state"])
+    return {name: _decodeValue(value, owner) for (name, value) in cache["manifest"].items()}
@@ -42,6 +42,13 @@ from brownie.network import web3
 from brownie.network.contract import Contract
 from brownie.network.state import Chain
 from brownie.project import ContractsV2Project
+from scripts.chain_state import (
+    getCacheKey,
+    isCacheEnabled,
+    loadCachedEnvironment,
+    saveCachedEnvironment,
+)
+from scripts.common import getDependencies
 from scripts.config import CompoundConfig, CurrencyDefaults, GovernanceConfig, TokenConfig
 
 chain = Chain()
@@ -89,42 +96,85 @@ def deployGovernance(deployer, noteERC20, guardian, governorConfig):
     )
 
 
-def deployNotionalContracts(deployer, **kwargs):
+def deployPipelined(deployer, deployments):
+    """
+    Deploys contracts in levels of their library dependency graph. Each level is broadcast with
+    explicit nonces before waiting for any receipts. deployments is an ordered dict of name to
+    (ContractContainer, constructorArgs), libraries not in deployments must already be deployed.
+    """
+    dependencies = {
+        name: [d for d in getDependencies(container.bytecode) if d in deployments]
+        for (name, (container, _)) in deployments.items()
+    }
     contracts = {}
-    if network.show_active() in ["kovan", "mainnet"]:
-        raise Exception("update governance deployment!")
-
-    # Deploy Libraries
-    contracts["SettleAssetsExternal"] = SettleAssetsExternal.deploy({"from": deployer})
-    contracts["FreeCollateralExternal"] = FreeCollateralExternal.deploy({"from": deployer})
-    contracts["TradingAction"] = TradingAction.deploy({"from": deployer})
-    contracts["nTokenMintAction"] = nTokenMintAction.deploy({"from": deployer})
-    contracts["nTokenRedeemAction"] = nTokenRedeemAction.deploy({"from": deployer})
-    contracts["MigrateIncentives"] = MigrateIncentives.deploy({"from": deployer})
-
-    # Deploy logic contracts
-    contracts["Governance"] = GovernanceAction.deploy({"from": deployer})
 
+    while len(contracts) < len(deployments):
+        level = [
+            name
+            for name in deployments.keys()
+            if name not in contracts and all(d in contracts for d in dependencies[name])
+        ]
+        if len(level) == 0:
+            raise Exception("Circular library dependency in {}".format(dependencies))
+
+        nonce = deployer.nonce
+        pending = []
+        for name in level:
+            (container, args) = deployments[name]
+            # Libraries are linked to the most recently deployed instance in their container
+            txn = container.deploy(*args, {"from": deployer, "nonce": nonce, "required_confs": 0})
+            pending.append((name, container, txn))
+            nonce += 1
+
+        for (name, container, txn) in pending:
+            txn.wait(1)
+            if txn.status != 1:
+                raise Exception("Deployment of {} failed".format(name))
+            contracts[name] = container.at(txn.contract_address)
+
+    return contracts
+
+
+def deployNotionalContracts(deployer, pipelined=False, **kwargs):
+    contracts = {}
     if network.show_active() in ["kovan", "mainnet"]:
         raise Exception("update governance deployment!")
+
     # Brownie and Hardhat do not compile to the same bytecode for this contract, during mainnet
     # deployment. Therefore, when we deploy to mainnet we actually deploy the artifact generated
     # by the hardhat deployment here. NOTE: this artifact must be generated, the artifact here will
     # not be correct for future upgrades.
     # contracts["Governance"] = deployArtifact("./scripts/mainnet/GovernanceAction.json", [],
     #   deployer, "Governance")
-    contracts["Views"] = Views.deploy({"from": deployer})
-    contracts["InitializeMarketsAction"] = InitializeMarketsAction.deploy({"from": deployer})
-    contracts["nTokenAction"] = nTokenAction.deploy({"from": deployer})
-    contracts["BatchAction"] = BatchAction.deploy({"from": deployer})
-    contracts["AccountAction"] = AccountAction.deploy({"from": deployer})
-    contracts["ERC1155Action"] = ERC1155Action.deploy({"from": deployer})
-    contracts["LiquidateCurrencyAction"] = LiquidateCurrencyAction.deploy({"from": deployer})
-    contracts["CalculationViews"] = CalculationViews.deploy({"from": deployer})
-    contracts["LiquidatefCashAction"] = LiquidatefCashAction.deploy({"from": deployer})
-    contracts["TreasuryAction"] = TreasuryAction.deploy(kwargs["Comptroller"], {"from": deployer})
-    contracts["VaultAction"] = VaultAction.deploy({"from": deployer})
-    contracts["VaultAccountAction"] = VaultAccountAction.deploy({"from": deployer})
+    deployments = {
+        # Libraries
+        "SettleAssetsExternal": (SettleAssetsExternal, []),
+        "FreeCollateralExternal": (FreeCollateralExternal, []),
+        "TradingAction": (TradingAction, []),
+        "nTokenMintAction": (nTokenMintAction, []),
+        "nTokenRedeemAction": (nTokenRedeemAction, []),
+        "MigrateIncentives": (MigrateIncentives, []),
+        # Logic contracts
+        "Governance": (GovernanceAction, []),
+        "Views": (Views, []),
+        "InitializeMarketsAction": (InitializeMarketsAction, []),
+        "nTokenAction": (nTokenAction, []),
+        "BatchAction": (BatchAction, []),
+        "AccountAction": (AccountAction, []),
+        "ERC1155Action": (ERC1155Action, []),
+        "LiquidateCurrencyAction": (LiquidateCurrencyAction, []),
+        "CalculationViews": (CalculationViews, []),
+        "LiquidatefCashAction": (LiquidatefCashAction, []),
+        "TreasuryAction": (TreasuryAction, [kwargs["Comptroller"]]),
+        "VaultAction": (VaultAction, []),
+        "VaultAccountAction": (VaultAccountAction, []),
+    }
+
+    if pipelined:
+        contracts = deployPipelined(deployer, deployments)
+    else:
+        for (name, (container, args)) in deployments.items():
+            contracts[name] = container.deploy(*args, {"from": deployer})
 
     # Deploy Pause Router
     pauseRouter = PauseRouter.deploy(
@@ -159,9 +209,16 @@ def deployNotionalContracts(deployer, **kwargs):
     return (router, pauseRouter, contracts)
 
 
-def deployNotional(deployer, cETHAddress, guardianAddress, comptroller, COMP, WETH):
+def deployNotional(
+    deployer, cETHAddress, guardianAddress, comptroller, COMP, WETH, pipelined=False
+):
     (router, pauseRouter, contracts) = deployNotionalContracts(
-        deployer, cETH=cETHAddress, COMP=COMP, WETH=WETH, Comptroller=comptroller
+        deployer,
+        pipelined=pipelined,
+        cETH=cETHAddress,
+        COMP=COMP,
+        WETH=WETH,
+        Comptroller=comptroller,
     )
 
     initializeData = web3.eth.contract(abi=Router.abi).encodeABI(
@@ -195,8 +252,26 @@ def deployArtifact(path, constructorArgs, deployer, name):
 
 
 class TestEnvironment:
-    def __init__(self, deployer, withGovernance=False, multisig=None):
+    def __init__(self, deployer, withGovernance=False, multisig=None, useCache=None):
         self.deployer = deployer
+        # When enabled the deployed chain state is reloaded from build/state_cache, keyed by the
+        # build artifacts and config, instead of redeploying every contract. Only the local
+        # ganache network is launched with the fixed accounts that the cached state expects.
+        if useCache is None:
+            useCache = isCacheEnabled() and network.show_active() == "development"
+        cacheKey = None
+        fromBlock = chain.height + 1
+        if useCache:
+            cacheKey = getCacheKey(
+                deployer.address, withGovernance, multisig.address if multisig else None
+            )
+            cached = loadCachedEnvironment(cacheKey, deployer)
+            if cached is not None:
+                self.__dict__.update(cached)
+                # The restored chain may be later than when the cache was written
+                self.startTime = chain.time()
+                return
+
         # Proxy Admin is just used for testing V1 contracts
         self.proxyAdmin = nProxyAdmin.deploy({"from": self.deployer})
 
@@ -258,6 +333,8 @@ class TestEnvironment:
             )
 
         self.startTime = chain.time()
+        if cacheKey is not None:
+            saveCachedEnvironment(cacheKey, self.__dict__, fromBlock)
 
     def _deployNoteERC20(self):
         (self.noteERC20Proxy, self.noteERC20) = deployNoteERC20(self.deployer)
@@ -367,6 +444,7 @@ class TestEnvironment:
             self.comptroller,
             self.COMP,
             self.WETH,
+            pipelined=True,
         )
         self.enableCurrency("ETH", CurrencyDefaults)
 
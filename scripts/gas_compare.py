@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from fnmatch import fnmatch
+
+# Gas regression gate for the results of scripts/gas_stats.py. Results are stored as baselines
+# keyed by commit, a new run is compared against the nearest ancestor commit with a baseline:
+#   brownie run scripts/gas_stats.py
+#   python scripts/gas_compare.py save                 (on the base branch)
+#   python scripts/gas_compare.py compare -o gas.md    (exits 1 on a regression)
+# Baselines are committed to gas_baselines/ by default. CI jobs that keep baselines as build
+# artifacts instead download them to a directory set in NOTIONAL_GAS_BASELINES.
+BASELINE_DIR = os.environ.get("NOTIONAL_GAS_BASELINES", "gas_baselines")
+RESULTS_PATH = "gas_stats.json"
+# Number of ancestor commits searched for a baseline
+MAX_ANCESTORS = 200
+
+# (key pattern, relative threshold, absolute threshold in gas), the first matching pattern
+# applies. A change is only reported when it exceeds both thresholds.
+THRESHOLDS = [
+    ("nToken.initializeMarkets.*", 0.005, 1000),
+    ("settleAssets.*", 0.01, 500),
+    ("*", 0.01, 200),
+]
+
+
+def getCommit(rev="HEAD"):
+    return subprocess.check_output(["git", "rev-parse", rev]).decode().strip()
+
+
+def _baselinePath(commit):
+    return os.path.join(BASELINE_DIR, commit + ".json")
+
+
+def loadResults(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def saveBaseline(results, commit):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = _baselinePath(commit)
+    tmpPath = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmpPath, "w") as f:
+        json.dump(results, f, sort_keys=True, indent=4)
+    os.replace(tmpPath, path)
+    return path
+
+
+def findBaseline(rev="HEAD"):
+    """Returns the nearest commit at or before rev with a stored baseline, or None"""
+    commits = subprocess.check_output(
+        ["git", "rev-list", "--max-count={}".format(MAX_ANCESTORS), rev]
+    )
+    for commit in commits.decode().split():
+        if os.path.exists(_baselinePath(commit)):
+            return commit
+    return None
+
+
+def getThreshold(key, thresholds):
+    for (pattern, relative, absolute) in thresholds:
+        if fnmatch(key, pattern):
+            return (relative, absolute)
+    return (0, 0)
+
+
+def compareResults(baseline, results, thresholds):
+    """
+    Returns (regressions, improvements, added, removed, failed). Regressions and improvements
+    are lists of (key, baseline gas, current gas) for every cold and warm measurement whose
+    change exceeds both of its thresholds. Failed lists the benchmarks that gas_stats.py
+    recorded with an error.
+    """
+    regressions = []
+    improvements = []
+    failed = sorted(k for (k, v) in results.items() if "error" in v)
+    for key in sorted(set(baseline.keys()) & set(results.keys())):
+        if "error" in baseline[key] or "error" in results[key]:
+            continue
+
+        (relative, absolute) = getThreshold(key, thresholds)
+        for temperature in ["cold", "warm"]:
+            before = baseline[key][temperature]
+            after = results[key][temperature]
+            change = after - before
+            if abs(change) <= absolute or abs(change) <= relative * before:
+                continue
+
+            entry = ("{}.{}".format(key, temperature), before, after)
+            if change > 0:
+                regressions.append(entry)
+            else:
+                improvements.append(entry)
+
+    added = sorted(set(results.keys()) - set(baseline.keys()))
+    removed = sorted(set(baseline.keys()) - set(results.keys()))
+    return (regressions, improvements, added, removed, failed)
+
+
+def isFailure(comparison):
+    """Regressions, removed benchmarks and benchmarks that failed to run all fail the gate"""
+    (regressions, _, _, removed, failed) = comparison
+    return len(regressions) > 0 or len(removed) > 0 or len(failed) > 0
+
+
+def _formatTable(entries):
+    lines = ["| Benchmark | Baseline | Current | Change | % |", "|---|---:|---:|---:|---:|"]
+    for (key, before, after) in entries:
+        lines.append(
+            "| {} | {:,} | {:,} | {:+,} | {:+.2f}% |".format(
+                key, before, after, after - before, 100 * (after - before) / before
+            )
+        )
+    return lines
+
+
+def formatReport(commit, comparison):
+    (regressions, improvements, added, removed, failed) = comparison
+    lines = ["## Gas report", "", "Compared against baseline `{}`.".format(commit[0:10]), ""]
+    lines += ["### Regressions", ""]
+    lines += _formatTable(regressions) if len(regressions) > 0 else ["None"]
+    lines += ["", "### Improvements", ""]
+    lines += _formatTable(improvements) if len(improvements) > 0 else ["None"]
+    if len(failed) > 0:
+        lines += ["", "### Failed benchmarks", ""] + ["- {}".format(k) for k in failed]
+    if len(added) > 0:
+        lines += ["", "### New benchmarks", ""] + ["- {}".format(k) for k in added]
+    if len(removed) > 0:
+        lines += ["", "### Removed benchmarks", ""] + ["- {}".format(k) for k in removed]
+
+    return "\n".join(lines) + "\n"
+
+
+def loadThresholds(path):
+    """Reads {pattern: {"relative": float, "absolute": int}}, checked before the defaults"""
+    if path is None:
+        return THRESHOLDS
+
+    with open(path, "r") as f:
+        overrides = json.load(f)
+    return [(p, t["relative"], t["absolute"]) for (p, t) in overrides.items()] + THRESHOLDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares gas_stats.json against a baseline")
+    parser.add_argument("command", choices=["save", "compare"])
+    parser.add_argument("-r", "--results", default=RESULTS_PATH, help="gas_stats.py output")
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        help="commit to save or compare against, defaults to the nearest baseline before HEAD",
+    )
+    parser.add_argument("-t", "--thresholds", help="json file of per key pattern thresholds")
+    parser.add_argument("-o", "--output", help="also write the markdown report to this file")
+    parser.add_argument(
+        "--allow-missing-baseline",
+        action="store_true",
+        help="exit successfully when there is no baseline to compare against",
+    )
+    args = parser.parse_args()
+    results = loadResults(args.results)
+
+    if args.command == "save":
+        commit = getCommit(args.baseline or "HEAD")
+        print("Saved baseline {}".format(saveBaseline(results, commit)))
+        return 0
+
+    commit = getCommit(args.baseline) if args.baseline else findBaseline()
+    if commit is None or not os.path.exists(_baselinePath(commit)):
+        print("No gas baseline found in {}, nothing to compare".format(BASELINE_DIR))
+        return 0 if args.allow_missing_baseline else 1
+
+    comparison = compareResults(
+        loadResults(_baselinePath(commit)), results, loadThresholds(args.thresholds)
+    )
+    report = formatReport(commit, comparison)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+
+    return 1 if isFailure(comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
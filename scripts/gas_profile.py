@@ -0,0 +1,85 @@
+from collections import Counter
+
+# Aggregates execution gas per Solidity function over many transactions. Each transaction is
+# walked through the brownie trace, gas of every opcode is attributed to the stack of functions
+# it ran in so that the stacks can be written as folded stacks for flamegraph.pl, speedscope or
+# inferno. Intrinsic gas and refunds are not part of the trace and are not counted.
+CALL_OPS = {"CALL", "STATICCALL", "DELEGATECALL", "CALLCODE", "CREATE", "CREATE2"}
+
+
+def _frameName(step):
+    return (step.get("fn") or "<unknown>").replace(";", ":").replace(" ", "_")
+
+
+class CallTreeProfile:
+    """Inclusive and exclusive gas per function, and gas per call stack"""
+
+    def __init__(self):
+        self.stacks = Counter()
+        self.inclusive = Counter()
+        self.exclusive = Counter()
+        self.calls = Counter()
+        self.transactions = 0
+
+    def _addGas(self, stack, gas):
+        self.stacks[stack] += gas
+        self.exclusive[stack[-1]] += gas
+        # Recursive functions are only counted once per stack
+        for fn in set(stack):
+            self.inclusive[fn] += gas
+
+    def addTrace(self, trace):
+        """Adds the steps of a brownie transaction trace"""
+        # (depth, jumpDepth, function) of each frame on the current stack
+        frames = []
+        # (caller stack, gas before the call, gas at the start of the callee) per pending call
+        pendingCalls = []
+
+        for (i, step) in enumerate(trace):
+            key = (step["depth"], step["jumpDepth"])
+            while len(frames) > 0 and frames[-1][0:2] > key:
+                frames.pop()
+            if len(frames) > 0 and frames[-1][0:2] == key:
+                frames[-1] = (key[0], key[1], _frameName(step))
+            else:
+                frames.append((key[0], key[1], _frameName(step)))
+                self.calls[frames[-1][2]] += 1
+            stack = tuple(f[2] for f in frames)
+
+            if i > 0 and step["depth"] < trace[i - 1]["depth"] and len(pendingCalls) > 0:
+                # The call costs the gas spent by the caller minus the gas used by the callee
+                (callerStack, gasBefore, calleeStart) = pendingCalls.pop()
+                previous = trace[i - 1]
+                calleeUsed = calleeStart - (previous["gas"] - previous["gasCost"])
+                self._addGas(callerStack, gasBefore - step["gas"] - calleeUsed)
+
+            nextStep = trace[i + 1] if i + 1 < len(trace) else None
+            if nextStep is None or nextStep["depth"] < step["depth"]:
+                self._addGas(stack, step["gasCost"])
+            elif nextStep["depth"] > step["depth"] and step["op"] in CALL_OPS:
+                pendingCalls.append((stack, step["gas"], nextStep["gas"]))
+            else:
+                self._addGas(stack, step["gas"] - nextStep["gas"])
+
+        self.transactions += 1
+
+    def addTransaction(self, txn):
+        self.addTrace(txn.trace)
+
+    def writeFolded(self, path):
+        """Writes one line of semicolon separated functions and gas per call stack"""
+        with open(path, "w") as f:
+            for (stack, gas) in sorted(self.stacks.items()):
+                if gas > 0:
+                    f.write("{} {}\n".format(";".join(stack), gas))
+
+    def summaryLines(self, top=20):
+        lines = [
+            "Gas by function over {} transactions:".format(self.transactions),
+            "{:>14} {:>14} {:>8}  {}".format("inclusive", "exclusive", "calls", "function"),
+        ]
+        for (fn, gas) in self.inclusive.most_common(top):
+            lines.append(
+                "{:>14} {:>14} {:>8}  {}".format(gas, self.exclusive[fn], self.calls[fn], fn)
+            )
+        return lines
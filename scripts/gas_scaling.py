@@ -0,0 +1,204 @@
+import json
+import os
+
+from brownie import accounts
+from scripts.gas_stats import (
+    SnapshotStack,
+    errorLog,
+    gasLog,
+    getBenchmarkEnvironment,
+    getLendTrades,
+    liquidatefCashCrossCurrency,
+    liquidatefCashLocal,
+    prepareCrossCurrencyfCashLiquidation,
+    prepareLocalfCashLiquidation,
+    prepareSettlement,
+    runScenarios,
+    settleAssets,
+)
+from tests.helpers import get_balance_trade_action
+
+# Measures how gas grows with the number of assets or actions in a transaction. Each sweep runs a
+# gas_stats scenario for every N, fits a linear or two segment piecewise linear model to the
+# results and extrapolates the largest N that fits under the block gas limit:
+#   brownie run scripts/gas_scaling.py
+GAS_SCALING_PATH = "gas_scaling.json"
+BLOCK_GAS_LIMIT = int(os.environ.get("BLOCK_GAS_LIMIT", 30_000_000))
+# Fraction of the block gas limit a transaction is sized to, leaves room for estimation error
+SAFE_GAS_FRACTION = 0.9
+# A piecewise model is only used if it removes this fraction of the linear model's squared error
+PIECEWISE_IMPROVEMENT = 0.5
+
+
+def batchTradeActions(env, tradeActions, **_):
+    return env.notional.batchBalanceAndTradeAction(
+        accounts[1],
+        [
+            get_balance_trade_action(
+                env.currencyId["DAI"],
+                "DepositAsset",
+                getLendTrades(range(1, tradeActions + 1)),
+                depositActionAmount=10000e8 * tradeActions,
+            )
+        ],
+        {"from": accounts[1]},
+    )
+
+
+# Scenarios as in gas_stats.SCENARIOS, sweep names the parameter that is N. Array portfolios hold
+# at most seven assets so liquidations sweep up to six fCash assets plus the debt, and a single
+# currency has at most seven markets to trade in.
+SWEEPS = [
+    {
+        "key": "liquidatefCashLocal.{fCashAssets}",
+        "sweep": "fCashAssets",
+        "setup": ["markets"],
+        "params": {"maxMarkets": [7], "fCashAssets": list(range(1, 7))},
+        "prepare": prepareLocalfCashLiquidation,
+        "action": liquidatefCashLocal,
+        "repeat": False,
+    },
+    {
+        "key": "liquidatefCashCrossCurrency.{fCashAssets}",
+        "sweep": "fCashAssets",
+        "setup": ["markets"],
+        "params": {"maxMarkets": [7], "fCashAssets": list(range(1, 7))},
+        "prepare": prepareCrossCurrencyfCashLiquidation,
+        "action": liquidatefCashCrossCurrency,
+        "repeat": False,
+    },
+    {
+        "key": "batchBalanceAndTradeAction.{tradeActions}",
+        "sweep": "tradeActions",
+        "setup": ["markets"],
+        "params": {"maxMarkets": [7], "tradeActions": list(range(1, 8))},
+        "action": batchTradeActions,
+        "repeat": False,
+    },
+    {
+        "key": "settleAssets.bitmap.{assetsBitmapSize}",
+        "sweep": "assetsBitmapSize",
+        "setup": ["markets", "bitmapPortfolio"],
+        "params": {
+            "maxMarkets": [7],
+            "assetsBitmapSize": list(range(1, 21)),
+            "activeCurrencies": [1],
+        },
+        "prepare": prepareSettlement,
+        "action": settleAssets,
+        "repeat": False,
+    },
+]
+
+
+def fitLinear(points):
+    """Returns (intercept, slope, squared error) of the least squares line through the points"""
+    n = len(points)
+    meanX = sum(x for (x, _) in points) / n
+    meanY = sum(y for (_, y) in points) / n
+    varX = sum((x - meanX) ** 2 for (x, _) in points)
+    slope = 0 if varX == 0 else sum((x - meanX) * (y - meanY) for (x, y) in points) / varX
+    intercept = meanY - slope * meanX
+    error = sum((y - intercept - slope * x) ** 2 for (x, y) in points)
+    return (intercept, slope, error)
+
+
+def fitModel(points):
+    """
+    Fits a line, or two lines split at the breakpoint with the least squared error when that
+    removes at least PIECEWISE_IMPROVEMENT of the error. Returns a list of segments
+    {"from": N, "intercept": gas, "slope": gas per N}.
+    """
+    points = sorted(points)
+    (intercept, slope, error) = fitLinear(points)
+    segments = [{"from": points[0][0], "intercept": intercept, "slope": slope}]
+
+    # Each segment needs at least two points
+    best = None
+    for i in range(2, len(points) - 1):
+        (left, right) = (fitLinear(points[0:i]), fitLinear(points[i:]))
+        if best is None or left[2] + right[2] < best[0]:
+            best = (left[2] + right[2], i, left, right)
+
+    if best is not None and best[0] < error * (1 - PIECEWISE_IMPROVEMENT):
+        (_, i, left, right) = best
+        segments = [
+            {"from": points[0][0], "intercept": left[0], "slope": left[1]},
+            {"from": points[i][0], "intercept": right[0], "slope": right[1]},
+        ]
+
+    return segments
+
+
+def getMaxSafeN(segments, gasLimit):
+    """Extrapolates the last segment to the largest N whose gas is within the limit"""
+    last = segments[-1]
+    if last["slope"] <= 0:
+        return None
+    return int((gasLimit - last["intercept"]) // last["slope"])
+
+
+def getScalingReport(sweeps):
+    report = {}
+    safeGas = BLOCK_GAS_LIMIT * SAFE_GAS_FRACTION
+    for sweep in sweeps:
+        operation = sweep["key"].split(".{")[0]
+        points = []
+        for n in sweep["params"][sweep["sweep"]]:
+            params = {k: v[0] for (k, v) in sweep["params"].items()}
+            params[sweep["sweep"]] = n
+            key = sweep["key"].format(**params)
+            if key in gasLog:
+                points.append((n, gasLog[key]["cold"]))
+
+        if len(points) < 2:
+            report[operation] = {"points": points, "error": "fewer than two measurements"}
+            continue
+
+        segments = fitModel(points)
+        report[operation] = {
+            "points": points,
+            "model": "linear" if len(segments) == 1 else "piecewise",
+            "segments": segments,
+            "marginalGas": segments[-1]["slope"],
+            "maxSafeN": getMaxSafeN(segments, safeGas),
+            "maxMeasuredN": max(n for (n, _) in points),
+        }
+
+    return report
+
+
+def formatScalingReport(report):
+    lines = [
+        "Block gas limit {:,}, sized to {:.0%}".format(BLOCK_GAS_LIMIT, SAFE_GAS_FRACTION),
+        "{:<36}{:>10}{:>16}{:>14}{:>12}".format(
+            "Operation", "Model", "Gas per N", "Max safe N", "Measured"
+        ),
+    ]
+    for (operation, result) in sorted(report.items()):
+        if "error" in result:
+            lines.append("{:<36}{}".format(operation, result["error"]))
+            continue
+
+        lines.append(
+            "{:<36}{:>10}{:>16,.0f}{:>14}{:>12}".format(
+                operation,
+                result["model"],
+                result["marginalGas"],
+                "unbounded" if result["maxSafeN"] is None else result["maxSafeN"],
+                "1-{}".format(result["maxMeasuredN"]),
+            )
+        )
+    return "\n".join(lines)
+
+
+def main():
+    env = getBenchmarkEnvironment()
+    runScenarios(env, SWEEPS, SnapshotStack())
+    if len(errorLog) > 0:
+        print("{} measurements failed and are left out of the fits".format(len(errorLog)))
+
+    report = getScalingReport(SWEEPS)
+    print(formatScalingReport(report))
+    with open(GAS_SCALING_PATH, "w") as f:
+        json.dump(report, f, sort_keys=True, indent=4)
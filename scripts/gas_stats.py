@@ -1,124 +1,46 @@
 import json
+import os
+from itertools import product
 
 from brownie import accounts
+from brownie.network.rpc import Rpc
 from brownie.network.state import Chain
-from scripts.config import CurrencyDefaults, nTokenDefaults
+from scripts.config import CompoundConfig, CurrencyDefaults, TokenConfig, nTokenDefaults
 from scripts.deployment import TestEnvironment
+from scripts.gas_profile import CallTreeProfile
+from scripts.storage_profile import StorageProfiler, getContractNames
 from tests.constants import SECONDS_IN_QUARTER
 from tests.helpers import get_balance_action, get_balance_trade_action, get_tref
 
 chain = Chain()
-
-gasLog = {
-    "deposit.underlying": None,
-    "deposit.underlying.hasTransferFee": None,
-    "deposit.asset": None,
-    "withdraw.asset.partialBalance": None,
-    "withdraw.underlying.partialBalance": None,
-    "withdraw.asset.entireBalance": None,
-    "withdraw.underlying.entireBalance": None,
-    "batch.deposit.underlying": None,
-    "batch.deposit.underlying.hasTransferFee": None,
-    "batch.deposit.asset": None,
-    "batch.deposit.asset.hasTransferFee": None,
-    "batch.withdraw.asset.partialBalance": None,
-    "batch.withdraw.underlying.partialBalance": None,
-    "batch.withdraw.asset.entireBalance": None,
-    "batch.withdraw.underlying.entireBalance": None,
-    "nToken.initializeMarkets.2": None,
-    "nToken.initializeMarkets.3": None,
-    "nToken.initializeMarkets.4": None,
-    "nToken.initializeMarkets.5": None,
-    "nToken.initializeMarkets.6": None,
-    "nToken.initializeMarkets.7": None,
-    "nToken.DepositAssetAndMintNToken.0": None,
-    "nToken.DepositAssetAndMintNToken.2": None,
-    "nToken.DepositAssetAndMintNToken.3": None,
-    "nToken.DepositAssetAndMintNToken.4": None,
-    "nToken.DepositAssetAndMintNToken.5": None,
-    "nToken.DepositAssetAndMintNToken.6": None,
-    "nToken.DepositAssetAndMintNToken.7": None,
-    "nToken.DepositUnderlyingAndMintNToken.0": None,
-    "nToken.DepositUnderlyingAndMintNToken.2": None,
-    "nToken.DepositUnderlyingAndMintNToken.3": None,
-    "nToken.DepositUnderlyingAndMintNToken.4": None,
-    "nToken.DepositUnderlyingAndMintNToken.5": None,
-    "nToken.DepositUnderlyingAndMintNToken.6": None,
-    "nToken.DepositUnderlyingAndMintNToken.7": None,
-    "nToken.ConvertCashToNToken.0": None,
-    "nToken.ConvertCashToNToken.2": None,
-    "nToken.ConvertCashToNToken.3": None,
-    "nToken.ConvertCashToNToken.4": None,
-    "nToken.ConvertCashToNToken.5": None,
-    "nToken.ConvertCashToNToken.6": None,
-    "nToken.ConvertCashToNToken.7": None,
-    "nToken.RedeemNToken.0": None,
-    "nToken.RedeemNToken.2": None,
-    "nToken.RedeemNToken.3": None,
-    "nToken.RedeemNToken.4": None,
-    "nToken.RedeemNToken.5": None,
-    "nToken.RedeemNToken.6": None,
-    "nToken.RedeemNToken.7": None,
-    "batchAction.lend.DepositAsset": None,
-    "batchAction.lend.DepositUnderlying": None,
-    "batchAction.lend.NoDeposit": None,
-    "batchAction.lend.WithdrawToAsset": None,
-    "batchAction.lend.WithdrawToUnderlying": None,
-    "batchAction.lend.RollToMaturity": None,
-    "batchAction.liquidity.DepositAsset": None,
-    "batchAction.liquidity.DepositUnderlying": None,
-    "batchAction.liquidity.NoDeposit": None,
-    "batchAction.liquidity.WithdrawToAsset": None,
-    "batchAction.liquidity.WithdrawToUnderlying": None,
-    "batchAction.liquidity.RollToMaturity": None,
-    "batchAction.borrowNoWithdraw.NoDeposit": None,
-    "batchAction.borrowNoWithdraw.DepositAssetCollateral": None,
-    "batchAction.borrowNoWithdraw.DepositUnderlyingCollateral": None,
-    "batchAction.borrowNoWithdraw.DepositETHCollateral": None,
-    "batchAction.borrowNoWithdraw.DepositNTokenCollateral": None,
-    "batchAction.borrowWithdrawAsset.NoDeposit": None,
-    "batchAction.borrowWithdrawAsset.DepositAssetCollateral": None,
-    "batchAction.borrowWithdrawAsset.DepositUnderlyingCollateral": None,
-    "batchAction.borrowWithdrawAsset.DepositETHCollateral": None,
-    "batchAction.borrowWithdrawAsset.DepositNTokenCollateral": None,
-    "batchAction.borrowWithdrawUnderlying.NoDeposit": None,
-    "batchAction.borrowWithdrawUnderlying.DepositAssetCollateral": None,
-    "batchAction.borrowWithdrawUnderlying.DepositUnderlyingCollateral": None,
-    "batchAction.borrowWithdrawUnderlying.DepositETHCollateral": None,
-    "batchAction.borrowWithdrawUnderlying.DepositNTokenCollateral": None,
-    "batchAction.borrow.RollToMaturity": None,
-    #     "Other": {
-    #         "PurchaseNTokenResidualPartial": None,
-    #         "PurchaseNTokenResidualAll": None,
-    #         "SettleCashDebtPartial": None,
-    #         "SettleCashDebtAll": None,
-    #     },
-    # },
-    # "nTokenTransfer": None,
-    # "nTokenClaimIncentives": {"nTokenBalances": range(1, 10)},
-    # "liquidateLocalCurrency": {
-    #     "transferCash": None,
-    #     "withdrawTokens": None,
-    #     "transferNTokens": None,
-    # },
-    # "liquidateCollateralCurrency": {
-    #     "transferCash": None,
-    #     "withdrawTokens": None,
-    #     "transferNTokens": None,
-    # },
-    # "liquidatefCashLocal": {"fCashAssets": range(1, 5),},
-    # "liquidatefCashCrossCurrency": {"fCashAssets": range(1, 5)},
-    # "freeCollateral": {
-    #     "assetArrayLength": range(1, 7),
-    #     "assetsBitmapSize": range(1, 20),
-    #     "activeCurrencies": range(1, 9),
-    # },
-    # "settleAssets": {
-    #     "assetArrayLength": range(1, 7),
-    #     "assetsBitmapSize": range(1, 20),
-    #     "activeCurrencies": range(1, 9),
-    # },
-}
+rpc = Rpc()
+
+# Gas benchmarks are declared in SCENARIOS and run over the cartesian product of their parameter
+# values. Combinations that share setup stages run from the same chain snapshot, so each stage is
+# only built once. Results are written to gas_stats.json:
+#   brownie run scripts/gas_stats.py
+# Set GAS_STORAGE_PROFILE=1 to also write the storage area breakdown of every measured
+# transaction to gas_storage.json, and GAS_CALL_PROFILE=1 to write the gas of every measured
+# transaction per Solidity call stack to gas_calls.folded. Both trace every transaction and are
+# much slower.
+GAS_STATS_PATH = "gas_stats.json"
+GAS_STORAGE_PATH = "gas_storage.json"
+GAS_CALLS_PATH = "gas_calls.folded"
+
+# Currencies in the order they are made active on portfolio accounts, the first one holds the
+# portfolio. Only six currencies are listed by the test environment, the rest are benchmark
+# copies of DAI.
+BENCHMARK_CURRENCIES = ["DAI", "USDC", "USDT", "WBTC", "ETH", "BENCH1", "BENCH2", "BENCH3"]
+DEPOSIT_CURRENCIES = ["DAI", "USDC", "USDT", "ETH"]
+MARKET_CURRENCIES = ["DAI", "USDC"]
+# Precision of the free collateral limit found for liquidated accounts, in fCash notional
+BORROW_PRECISION = 1e8
+
+gasLog = {}
+storageLog = {}
+errorLog = {}
+storageProfiler = None
+callProfile = None
 
 
 def environment(accounts):
@@ -127,343 +49,329 @@ def environment(accounts):
 
 def log_gas(key, txnCold, txnWarm):
     gasLog[key] = {"cold": txnCold.gas_used, "warm": txnWarm.gas_used}
+    if storageProfiler is not None:
+        cold = storageProfiler.profile(txnCold.txid)
+        warm = cold if txnWarm is txnCold else storageProfiler.profile(txnWarm.txid)
+        storageLog[key] = {"cold": cold, "warm": warm}
 
+    if callProfile is not None:
+        callProfile.addTransaction(txnCold)
+        if txnWarm is not txnCold:
+            callProfile.addTransaction(txnWarm)
 
-def deposits(env):
-    txnCold = env.notional.depositAssetToken(accounts[0].address, 2, 5000e8, {"from": accounts[0]})
-    txnWarm = env.notional.depositAssetToken(accounts[0].address, 2, 5000e8, {"from": accounts[0]})
-    log_gas("deposit.asset", txnCold, txnWarm)
 
-    chain.undo(2)
-    txnCold = env.notional.depositUnderlyingToken(
-        accounts[0].address, 2, 5000e8, {"from": accounts[0]}
-    )
-    txnWarm = env.notional.depositUnderlyingToken(
-        accounts[0].address, 2, 5000e8, {"from": accounts[0]}
-    )
-    log_gas("deposit.underlying", txnCold, txnWarm)
+def getUnderlying(symbol, amount):
+    decimals = 18 if symbol == "ETH" else TokenConfig[symbol]["decimals"]
+    return int(amount * 10 ** decimals)
 
-    chain.undo(2)
-    txnCold = env.notional.depositUnderlyingToken(
-        accounts[0].address, 3, 5000e8, {"from": accounts[0]}
-    )
-    txnWarm = env.notional.depositUnderlyingToken(
-        accounts[0].address, 3, 5000e8, {"from": accounts[0]}
-    )
-    log_gas("deposit.underlying.hasTransferFee", txnCold, txnWarm)
 
-    chain.undo(2)
-    txnCold = env.notional.batchBalanceAction(
-        accounts[0], [get_balance_action(2, "DepositAsset", depositActionAmount=5000e8)]
-    )
-    txnWarm = env.notional.batchBalanceAction(
-        accounts[0], [get_balance_action(2, "DepositAsset", depositActionAmount=5000e8)]
-    )
-    log_gas("batch.deposit.asset", txnCold, txnWarm)
+def getTxnParams(account, symbol=None, value=0):
+    return {"from": account, "value": value if symbol == "ETH" else 0}
 
-    chain.undo(2)
-    txnCold = env.notional.batchBalanceAction(
-        accounts[0], [get_balance_action(3, "DepositAsset", depositActionAmount=5000e8)]
-    )
-    txnWarm = env.notional.batchBalanceAction(
-        accounts[0], [get_balance_action(3, "DepositAsset", depositActionAmount=5000e8)]
-    )
-    log_gas("batch.deposit.asset.hasTransferFee", txnCold, txnWarm)
 
-    chain.undo(2)
-    txnCold = env.notional.batchBalanceAction(
-        accounts[0], [get_balance_action(2, "DepositUnderlying", depositActionAmount=5000e8)]
-    )
-    txnWarm = env.notional.batchBalanceAction(
-        accounts[0], [get_balance_action(2, "DepositUnderlying", depositActionAmount=5000e8)]
-    )
-    log_gas("batch.deposit.underlying", txnCold, txnWarm)
+class SnapshotStack:
+    """
+    Stack of chain snapshots, reverting to a depth discards every layer above it. Brownie's
+    chain.snapshot only holds a single snapshot so layers are taken directly from the node.
+    """
 
-    chain.undo(2)
-    txnCold = env.notional.batchBalanceAction(
-        accounts[0], [get_balance_action(3, "DepositUnderlying", depositActionAmount=5000e8)]
-    )
-    txnWarm = env.notional.batchBalanceAction(
-        accounts[0], [get_balance_action(3, "DepositUnderlying", depositActionAmount=5000e8)]
-    )
-    log_gas("batch.deposit.underlying.hasTransferFee", txnCold, txnWarm)
+    def __init__(self):
+        self.layers = []
 
+    def push(self):
+        self.layers.append(rpc.snapshot())
+        return len(self.layers)
 
-def withdraws(env):
-    # TODO: warm / cold should incorporate second currency to ensure account context is not blank
-    env.notional.depositAssetToken(accounts[0].address, 2, 5000e8, {"from": accounts[0]})
+    def revert(self, depth):
+        # Reverting invalidates the snapshot, chain._revert returns a new one at the same state
+        self.layers = self.layers[:depth]
+        self.layers[-1] = chain._revert(self.layers[-1])
 
-    txn = env.notional.withdraw(2, 1000e8, False)
-    log_gas("withdraw.asset.partialBalance", txn, txn)
 
-    txn = env.notional.withdraw(2, 4000e8, False)
-    log_gas("withdraw.asset.entireBalance", txn, txn)
+def listBenchmarkCurrencies(env):
+    for symbol in BENCHMARK_CURRENCIES:
+        if symbol in env.currencyId:
+            continue
 
-    chain.undo(2)
+        if symbol not in TokenConfig:
+            TokenConfig[symbol] = dict(TokenConfig["DAI"], name="Benchmark " + symbol)
+            CompoundConfig[symbol] = CompoundConfig["DAI"]
+            env._deployMockCurrency(symbol)
+        env.enableCurrency(symbol, CurrencyDefaults)
 
-    txn = env.notional.withdraw(2, 1000e8, True)
-    log_gas("withdraw.underlying.partialBalance", txn, txn)
 
-    txn = env.notional.withdraw(2, 4000e8, True)
-    log_gas("withdraw.underlying.entireBalance", txn, txn)
+def fundAccounts(env, recipients):
+    deployer = accounts[0]
+    for symbol in BENCHMARK_CURRENCIES:
+        cToken = env.cToken[symbol]
+        if symbol == "ETH":
+            cToken.mint({"from": deployer, "value": 20e18})
+        else:
+            token = env.token[symbol]
+            token.approve(cToken.address, 2 ** 255, {"from": deployer})
+            token.approve(env.notional.address, 2 ** 255, {"from": deployer})
+            cToken.mint(getUnderlying(symbol, 1_000_000), {"from": deployer})
+        cToken.approve(env.notional.address, 2 ** 255, {"from": deployer})
 
-    chain.undo(2)
-    txn = env.notional.batchBalanceAction(
-        accounts[0], [get_balance_action(2, "None", withdrawAmountInternalPrecision=1000e8)]
-    )
-    log_gas("batch.withdraw.asset.partialBalance", txn, txn)
-    txn = env.notional.batchBalanceAction(
-        accounts[0], [get_balance_action(2, "None", withdrawEntireCashBalance=True)]
-    )
-    log_gas("batch.withdraw.asset.entireBalance", txn, txn)
+        for account in recipients:
+            cToken.transfer(account, 100e8 if symbol == "ETH" else 1_000_000e8, {"from": deployer})
+            cToken.approve(env.notional.address, 2 ** 255, {"from": account})
+            if symbol != "ETH":
+                token.transfer(account, getUnderlying(symbol, 100_000), {"from": deployer})
+                token.approve(env.notional.address, 2 ** 255, {"from": account})
 
-    chain.undo(2)
-    txn = env.notional.batchBalanceAction(
-        accounts[0],
-        [
-            get_balance_action(
-                2, "None", withdrawAmountInternalPrecision=1000e8, redeemToUnderlying=True
-            )
-        ],
-    )
-    log_gas("batch.withdraw.underlying.partialBalance", txn, txn)
-    txn = env.notional.batchBalanceAction(
-        accounts[0],
-        [get_balance_action(2, "None", withdrawEntireCashBalance=True, redeemToUnderlying=True)],
-    )
-    log_gas("batch.withdraw.underlying.entireBalance", txn, txn)
 
+def addActiveCurrencies(env, account, activeCurrencies):
+    # The portfolio currency is already active, the others hold a small cash balance
+    for symbol in BENCHMARK_CURRENCIES[1:activeCurrencies]:
+        env.notional.depositAssetToken(account, env.currencyId[symbol], 10e8, {"from": account})
 
-def ntoken(env, maxMarkets):
-    currencyId = 2
 
-    txnCold = env.notional.batchBalanceAction(
-        accounts[0],
-        [
-            get_balance_action(
-                currencyId, "DepositAssetAndMintNToken", depositActionAmount=1000000e8
-            )
-        ],
-        {"from": accounts[0]},
-    )
-    txnWarm = env.notional.batchBalanceAction(
+# Setup stages, each is called as setup(env, **params) with the parameters named in its entry
+def setupCashGroup(env, maxMarkets):
+    for symbol in MARKET_CURRENCIES:
+        currencyId = env.currencyId[symbol]
+        cashGroup = list(env.notional.getCashGroup(currencyId))
+        cashGroup[0] = maxMarkets
+        cashGroup[9] = CurrencyDefaults["tokenHaircut"][0:maxMarkets]
+        cashGroup[10] = CurrencyDefaults["rateScalar"][0:maxMarkets]
+        env.notional.updateCashGroup(currencyId, cashGroup)
+        env.notional.updateDepositParameters(currencyId, *(DEPOSIT_PARAMETERS[maxMarkets]))
+        env.notional.updateInitializationParameters(currencyId, *(INIT_PARAMETERS[maxMarkets]))
+
+
+def setupMarkets(env, maxMarkets):
+    # Zero markets leaves the currencies listed without initialized markets
+    if maxMarkets == 0:
+        return
+
+    setupCashGroup(env, maxMarkets)
+    env.notional.batchBalanceAction(
         accounts[0],
         [
             get_balance_action(
-                currencyId, "DepositAssetAndMintNToken", depositActionAmount=10000000e8
+                env.currencyId[symbol], "DepositAssetAndMintNToken", depositActionAmount=5000000e8
             )
+            for symbol in MARKET_CURRENCIES
         ],
         {"from": accounts[0]},
     )
-    log_gas("nToken.DepositAssetAndMintNToken.{}".format(maxMarkets), txnCold, txnWarm)
+    for symbol in MARKET_CURRENCIES:
+        env.notional.initializeMarkets(env.currencyId[symbol], True)
 
-    chain.undo(2)
-    txnCold = env.notional.batchBalanceAction(
-        accounts[0],
+
+def getLendTrades(marketIndexes):
+    return [
+        {"tradeActionType": "Lend", "marketIndex": i, "notional": 100e8, "minSlippage": 0}
+        for i in marketIndexes
+    ]
+
+
+def setupArrayPortfolio(env, assetArrayLength):
+    # Assets are lent into consecutive markets of the portfolio currency
+    currencyId = env.currencyId[BENCHMARK_CURRENCIES[0]]
+    env.notional.batchBalanceAndTradeAction(
+        accounts[2],
         [
-            get_balance_action(
-                currencyId, "DepositUnderlyingAndMintNToken", depositActionAmount=1000000e18
+            get_balance_trade_action(
+                currencyId,
+                "DepositAsset",
+                getLendTrades(range(1, assetArrayLength + 1)),
+                depositActionAmount=10000e8 * assetArrayLength,
             )
         ],
-        {"from": accounts[0]},
+        {"from": accounts[2]},
     )
-    txnWarm = env.notional.batchBalanceAction(
-        accounts[0],
-        [
-            get_balance_action(
-                currencyId, "DepositUnderlyingAndMintNToken", depositActionAmount=1000000e18
+
+
+def setupBitmapPortfolio(env, assetsBitmapSize):
+    # Only seven markets are active at a time, larger bitmaps hold assets lent in earlier
+    # quarters. Each quarter the markets are initialized and new maturities are lent into.
+    account = accounts[2]
+    currencyId = env.currencyId[BENCHMARK_CURRENCIES[0]]
+    env.notional.enableBitmapCurrency(currencyId, {"from": account})
+
+    while True:
+        held = set(asset[1] for asset in env.notional.getAccountPortfolio(account))
+        markets = env.notional.getActiveMarkets(currencyId)
+        marketIndexes = [i + 1 for (i, m) in enumerate(markets) if m[1] not in held]
+        marketIndexes = marketIndexes[0 : assetsBitmapSize - len(held)]
+        if len(marketIndexes) > 0:
+            env.notional.batchBalanceAndTradeAction(
+                account,
+                [
+                    get_balance_trade_action(
+                        currencyId,
+                        "DepositAsset",
+                        getLendTrades(marketIndexes),
+                        depositActionAmount=10000e8 * len(marketIndexes),
+                    )
+                ],
+                {"from": account},
             )
-        ],
-        {"from": accounts[0]},
-    )
-    log_gas("nToken.DepositUnderlyingAndMintNToken.{}".format(maxMarkets), txnCold, txnWarm)
 
-    chain.undo(2)
-    env.notional.batchBalanceAction(
-        accounts[0], [get_balance_action(2, "DepositAsset", depositActionAmount=1000000e8)]
-    )
-    txn = env.notional.batchBalanceAction(
-        accounts[0],
-        [get_balance_action(currencyId, "ConvertCashToNToken", depositActionAmount=1000000e8)],
-        {"from": accounts[0]},
-    )
-    log_gas("nToken.ConvertCashToNToken.{}".format(maxMarkets), txn, txn)
+        if len(held) + len(marketIndexes) >= assetsBitmapSize:
+            break
+
+        chain.mine(1, timestamp=chain.time() + SECONDS_IN_QUARTER)
+        env.notional.initializeMarkets(currencyId, False)
+        env.notional.settleAccount(account, {"from": account})
+
 
-    if maxMarkets > 0:
-        txnCold = env.notional.batchBalanceAction(
-            accounts[0],
-            [get_balance_action(currencyId, "RedeemNToken", depositActionAmount=10000e8)],
-            {"from": accounts[0]},
+# Setup name => (setup function, names of the scenario parameters it is called with)
+SETUPS = {
+    "cashGroup": (setupCashGroup, ["maxMarkets"]),
+    "markets": (setupMarkets, ["maxMarkets"]),
+    "arrayPortfolio": (setupArrayPortfolio, ["assetArrayLength"]),
+    "bitmapPortfolio": (setupBitmapPortfolio, ["assetsBitmapSize"]),
+}
+
+
+# Scenario actions are called as action(env, **params) and return the measured transaction,
+# prepare functions run before the first action and are not measured
+def deposit(env, method, depositType, currency, **_):
+    account = accounts[1]
+    currencyId = env.currencyId[currency]
+    amount = 10e8 if depositType == "DepositAsset" else getUnderlying(currency, 1)
+    value = amount if depositType == "DepositUnderlying" else 0
+
+    if method == "direct" and depositType == "DepositAsset":
+        return env.notional.depositAssetToken(account, currencyId, amount, {"from": account})
+    elif method == "direct":
+        return env.notional.depositUnderlyingToken(
+            account, currencyId, amount, getTxnParams(account, currency, value)
         )
+    else:
+        return env.notional.batchBalanceAction(
+            account,
+            [get_balance_action(currencyId, depositType, depositActionAmount=amount)],
+            getTxnParams(account, currency, value),
+        )
+
+
+def prepareWithdraw(env, currency, **_):
+    account = accounts[1]
+    env.notional.depositAssetToken(account, env.currencyId[currency], 100e8, {"from": account})
+
+
+def withdraw(env, method, withdrawTo, balance, currency, **_):
+    account = accounts[1]
+    currencyId = env.currencyId[currency]
+    redeem = withdrawTo == "underlying"
+    amount = 10e8 if balance == "partialBalance" else 100e8
 
-        chain.undo(1)
-        txnWarm = env.notional.batchBalanceAction(
-            accounts[0],
+    if method == "direct":
+        return env.notional.withdraw(currencyId, amount, redeem, {"from": account})
+    else:
+        return env.notional.batchBalanceAction(
+            account,
             [
                 get_balance_action(
                     currencyId,
-                    "RedeemNToken",
-                    depositActionAmount=10000e8,
-                    withdrawEntireCashBalance=True,
+                    "None",
+                    withdrawAmountInternalPrecision=amount if balance == "partialBalance" else 0,
+                    withdrawEntireCashBalance=balance == "entireBalance",
+                    redeemToUnderlying=redeem,
                 )
             ],
-            {"from": accounts[0]},
+            {"from": account},
         )
-        log_gas("nToken.RedeemNToken.{}".format(maxMarkets), txnCold, txnWarm)
 
 
-def lend(env):
-    currencyId = 2
-    lendAction = [
-        {"tradeActionType": "Lend", "marketIndex": 1, "notional": 100e8, "minSlippage": 0}
-    ]
-    txnCold = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId,
-                "DepositAsset",
-                lendAction,
-                depositActionAmount=5000e8,
-                withdrawEntireCashBalance=True,
-            )
-        ],
-        {"from": accounts[1]},
-    )
-    txnWarm = env.notional.batchBalanceAndTradeAction(
+def prepareInitializeMarkets(env, **_):
+    env.notional.batchBalanceAction(
         accounts[1],
         [
-            get_balance_trade_action(
-                currencyId,
-                "DepositAsset",
-                lendAction,
-                depositActionAmount=5000e8,
-                withdrawEntireCashBalance=True,
+            get_balance_action(
+                env.currencyId["DAI"], "DepositAssetAndMintNToken", depositActionAmount=100e8
             )
         ],
         {"from": accounts[1]},
     )
-    log_gas("batchAction.lend.DepositAsset", txnCold, txnWarm)
 
-    chain.undo(2)
-    txnCold = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId,
-                "DepositUnderlying",
-                lendAction,
-                depositActionAmount=100e18,
-                withdrawEntireCashBalance=True,
-            )
-        ],
-        {"from": accounts[1]},
-    )
-    txnWarm = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId,
-                "DepositUnderlying",
-                lendAction,
-                depositActionAmount=100e18,
-                withdrawEntireCashBalance=True,
-            )
-        ],
-        {"from": accounts[1]},
-    )
-    log_gas("batchAction.lend.DepositUnderlying", txnCold, txnWarm)
 
-    chain.undo(2)
-    env.notional.depositAssetToken(accounts[1].address, currencyId, 10000e8, {"from": accounts[1]})
-    txnCold = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [get_balance_trade_action(currencyId, "None", lendAction)],
-        {"from": accounts[1]},
-    )
-    txnWarm = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [get_balance_trade_action(currencyId, "None", lendAction)],
-        {"from": accounts[1]},
+def initializeMarkets(env, **_):
+    return env.notional.initializeMarkets(env.currencyId["DAI"], True, {"from": accounts[0]})
+
+
+def prepareNTokenAction(env, action, **_):
+    if action == "ConvertCashToNToken":
+        env.notional.depositAssetToken(
+            accounts[0], env.currencyId["DAI"], 2000000e8, {"from": accounts[0]}
+        )
+
+
+def nTokenAction(env, action, **_):
+    amounts = {
+        "DepositAssetAndMintNToken": 1000000e8,
+        "DepositUnderlyingAndMintNToken": getUnderlying("DAI", 1000000),
+        "ConvertCashToNToken": 1000000e8,
+        "RedeemNToken": 10000e8,
+    }
+    return env.notional.batchBalanceAction(
+        accounts[0],
+        [get_balance_action(env.currencyId["DAI"], action, depositActionAmount=amounts[action])],
+        {"from": accounts[0]},
     )
-    log_gas("batchAction.lend.NoDeposit", txnCold, txnWarm)
 
-    chain.undo(2)
-    withdrawAction = [
-        {"tradeActionType": "Borrow", "marketIndex": 1, "notional": 100e8, "maxSlippage": 0}
+
+def prepareTrade(env, tradeAction, depositType, currency, **_):
+    account = accounts[1]
+    currencyId = env.currencyId[currency]
+    if depositType == "None":
+        env.notional.depositAssetToken(account, currencyId, 20000e8, {"from": account})
+
+    # nToken collateral is minted in the same transaction as the borrow
+    if tradeAction == "Borrow" and depositType != "DepositNTokenCollateral":
+        env.notional.depositUnderlyingToken(
+            account, env.currencyId["ETH"], 10e18, {"from": account, "value": 10e18}
+        )
+
+
+def trade(env, tradeAction, depositType, withdraw, currency, marketIndex, **_):
+    trades = {
+        "Lend": {"notional": 100e8, "minSlippage": 0},
+        "Borrow": {"notional": 100e8, "maxSlippage": 0},
+        "AddLiquidity": {"notional": 5000e8, "minSlippage": 0, "maxSlippage": 0},
+    }
+    tradeParams = dict(trades[tradeAction], tradeActionType=tradeAction, marketIndex=marketIndex)
+    depositAmounts = {
+        "None": 0,
+        "DepositAsset": 10000e8,
+        "DepositUnderlying": getUnderlying(currency, 200),
+        "DepositNTokenCollateral": 0,
+    }
+    actions = [
+        get_balance_trade_action(
+            env.currencyId[currency],
+            "None" if depositType == "DepositNTokenCollateral" else depositType,
+            [tradeParams],
+            depositActionAmount=depositAmounts[depositType],
+            withdrawEntireCashBalance=withdraw != "none",
+            redeemToUnderlying=withdraw == "underlying",
+        )
     ]
-    env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId,
-                "DepositUnderlying",
-                lendAction,
-                depositActionAmount=100e18,
-                withdrawEntireCashBalance=True,
-            )
-        ],
-        {"from": accounts[1]},
-    )
-    txn = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId, "None", withdrawAction, withdrawEntireCashBalance=True
-            )
-        ],
-        {"from": accounts[1]},
-    )
-    log_gas("batchAction.lend.WithdrawToAsset", txn, txn)
 
-    chain.undo(1)
-    txn = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
+    if depositType == "DepositNTokenCollateral":
+        # Collateral is minted as nTokens of the other market currency, actions are sorted by
+        # currency id
+        collateral = [c for c in MARKET_CURRENCIES if c != currency][0]
+        actions.append(
             get_balance_trade_action(
-                currencyId,
-                "None",
-                withdrawAction,
-                withdrawEntireCashBalance=True,
-                redeemToUnderlying=True,
+                env.currencyId[collateral],
+                "DepositAssetAndMintNToken",
+                [],
+                depositActionAmount=20000e8,
             )
-        ],
-        {"from": accounts[1]},
-    )
-    log_gas("batchAction.lend.WithdrawToUnderlying", txn, txn)
+        )
+        actions.sort(key=lambda a: a[1])
 
-    chain.undo(1)
-    txn = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId,
-                "None",
-                [
-                    {
-                        "tradeActionType": "Borrow",
-                        "marketIndex": 1,
-                        "notional": 100e8,
-                        "maxSlippage": 0,
-                    },
-                    {
-                        "tradeActionType": "Lend",
-                        "marketIndex": 2,
-                        "notional": 80e8,
-                        "minSlippage": 0,
-                    },
-                ],
-                withdrawEntireCashBalance=True,
-            )
-        ],
-        {"from": accounts[1]},
-    )
-    log_gas("batchAction.lend.RollToMaturity", txn, txn)
+    return env.notional.batchBalanceAndTradeAction(accounts[1], actions, {"from": accounts[1]})
 
 
-def liquidity(env):
-    currencyId = 2
-    addLiquidityAction = [
+ROLL_TRADES = {
+    "lend": [{"tradeActionType": "Lend", "marketIndex": 1, "notional": 100e8, "minSlippage": 0}],
+    "liquidity": [
         {
             "tradeActionType": "AddLiquidity",
             "marketIndex": 1,
@@ -471,278 +379,465 @@ def liquidity(env):
             "minSlippage": 0,
             "maxSlippage": 0,
         }
-    ]
-    removeLiquidityAction = [
-        {
-            "tradeActionType": "RemoveLiquidity",
-            "marketIndex": 1,
-            "notional": 5000e8,
-            "minSlippage": 0,
-            "maxSlippage": 0,
-        }
-    ]
+    ],
+    "borrow": [
+        {"tradeActionType": "Borrow", "marketIndex": 1, "notional": 100e8, "maxSlippage": 0}
+    ],
+}
 
-    txnCold = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId,
-                "DepositAsset",
-                addLiquidityAction,
-                depositActionAmount=5000e8,
-                withdrawEntireCashBalance=True,
-            )
-        ],
-        {"from": accounts[1]},
-    )
-    txnWarm = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
+
+def prepareRoll(env, position, currency, **_):
+    account = accounts[1]
+    if position == "borrow":
+        env.notional.depositUnderlyingToken(
+            account, env.currencyId["ETH"], 10e18, {"from": account, "value": 10e18}
+        )
+
+    env.notional.batchBalanceAndTradeAction(
+        account,
         [
             get_balance_trade_action(
-                currencyId,
-                "DepositAsset",
-                addLiquidityAction,
-                depositActionAmount=5000e8,
-                withdrawEntireCashBalance=True,
+                env.currencyId[currency],
+                "None" if position == "borrow" else "DepositAsset",
+                ROLL_TRADES[position],
+                depositActionAmount=0 if position == "borrow" else 10000e8,
             )
         ],
-        {"from": accounts[1]},
+        {"from": account},
     )
-    log_gas("batchAction.liquidity.DepositAsset", txnCold, txnWarm)
 
-    chain.undo(2)
-    txnCold = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId, "DepositUnderlying", addLiquidityAction, depositActionAmount=100e18
-            )
+
+def roll(env, position, currency, **_):
+    trades = {
+        "lend": [
+            {"tradeActionType": "Borrow", "marketIndex": 1, "notional": 100e8, "maxSlippage": 0},
+            {"tradeActionType": "Lend", "marketIndex": 2, "notional": 80e8, "minSlippage": 0},
         ],
-        {"from": accounts[1]},
-    )
-    txnWarm = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId, "DepositUnderlying", addLiquidityAction, depositActionAmount=100e18
-            )
+        "liquidity": [
+            {
+                "tradeActionType": "RemoveLiquidity",
+                "marketIndex": 1,
+                "notional": 5000e8,
+                "minSlippage": 0,
+                "maxSlippage": 0,
+            },
+            {
+                "tradeActionType": "AddLiquidity",
+                "marketIndex": 2,
+                "notional": 0,
+                "minSlippage": 0,
+                "maxSlippage": 0,
+            },
         ],
-        {"from": accounts[1]},
-    )
-    log_gas("batchAction.liquidity.DepositUnderlying", txnCold, txnWarm)
-
-    chain.undo(2)
-    txnCold = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId, "DepositUnderlying", addLiquidityAction, depositActionAmount=100e18
-            )
+        "borrow": [
+            {"tradeActionType": "Lend", "marketIndex": 1, "notional": 100e8, "minSlippage": 0},
+            {"tradeActionType": "Borrow", "marketIndex": 2, "notional": 100e8, "maxSlippage": 0},
         ],
-        {"from": accounts[1]},
-    )
-    txnWarm = env.notional.batchBalanceAndTradeAction(
+    }
+    return env.notional.batchBalanceAndTradeAction(
         accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId, "DepositUnderlying", addLiquidityAction, depositActionAmount=100e18
-            )
-        ],
+        [get_balance_trade_action(env.currencyId[currency], "None", trades[position])],
         {"from": accounts[1]},
     )
-    log_gas("batchAction.liquidity.DepositUnderlying", txnCold, txnWarm)
 
-    chain.undo(2)
-    env.notional.depositAssetToken(accounts[1].address, currencyId, 10000e8, {"from": accounts[1]})
-    txn = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [get_balance_trade_action(currencyId, "None", addLiquidityAction)],
-        {"from": accounts[1]},
-    )
-    log_gas("batchAction.liquidity.NoDeposit", txn, txn)
 
-    chain.undo(2)
-    # Setup withdraw liquidity, add liquidity
-    env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId, "DepositUnderlying", addLiquidityAction, depositActionAmount=100e18
+def preparePortfolio(env, activeCurrencies, **_):
+    addActiveCurrencies(env, accounts[2], activeCurrencies)
+
+
+def prepareSettlement(env, activeCurrencies, **_):
+    addActiveCurrencies(env, accounts[2], activeCurrencies)
+    chain.mine(1, timestamp=chain.time() + SECONDS_IN_QUARTER)
+
+
+def freeCollateral(env, **_):
+    # Free collateral is a view, it is measured as a transaction that is discarded on revert
+    return env.notional.getFreeCollateral.transact(accounts[2], {"from": accounts[0]})
+
+
+def settleAssets(env, **_):
+    return env.notional.settleAccount(accounts[2], {"from": accounts[0]})
+
+
+def getMaxBorrow(env, account, currencyId, marketIndex, upper):
+    """Returns the largest borrow that passes the free collateral check, found with eth_call"""
+
+    def borrowAction(notional):
+        return get_balance_trade_action(
+            currencyId,
+            "None",
+            [
+                {
+                    "tradeActionType": "Borrow",
+                    "marketIndex": marketIndex,
+                    "notional": notional,
+                    "maxSlippage": 0,
+                }
+            ],
+            withdrawEntireCashBalance=True,
+            redeemToUnderlying=True,
+        )
+
+    (low, high) = (0, int(upper))
+    while high - low > BORROW_PRECISION:
+        mid = (low + high) // 2
+        try:
+            env.notional.batchBalanceAndTradeAction.call(
+                account, [borrowAction(mid)], {"from": account}
             )
-        ],
-        {"from": accounts[1]},
+            low = mid
+        except Exception:
+            high = mid
+
+    return borrowAction(low)
+
+
+def borrowToLimit(env, account, symbol, marketIndex, upper):
+    borrow = getMaxBorrow(env, account, env.currencyId[symbol], marketIndex, upper)
+    env.notional.batchBalanceAndTradeAction(account, [borrow], {"from": account})
+
+
+def prepareLocalCurrencyLiquidation(env, **_):
+    # DAI nToken holder borrows DAI up to its limit, a lower nToken haircut then leaves it
+    # undercollateralized
+    account = accounts[1]
+    currencyId = env.currencyId["DAI"]
+    env.notional.batchBalanceAction(
+        account,
+        [get_balance_action(currencyId, "DepositAssetAndMintNToken", depositActionAmount=5000e8)],
+        {"from": account},
     )
-    # Create some fCash residual
-    env.notional.batchBalanceAndTradeAction(
-        accounts[0],
-        [
-            get_balance_trade_action(
-                currencyId,
-                "DepositUnderlying",
-                [
-                    {
-                        "tradeActionType": "Borrow",
-                        "marketIndex": 1,
-                        "notional": 100e8,
-                        "maxSlippage": 0,
-                    }
-                ],
-                depositActionAmount=100e18,
-            )
-        ],
-        {"from": accounts[0]},
+    borrowToLimit(env, account, "DAI", 1, 200e8)
+
+    collateral = list(nTokenDefaults["Collateral"])
+    collateral[1] = collateral[1] - 15
+    env.notional.updateTokenCollateralParameters(currencyId, *collateral)
+
+
+def liquidateLocalCurrency(env, **_):
+    return env.notional.liquidateLocalCurrency(
+        accounts[1], env.currencyId["DAI"], 0, {"from": accounts[0]}
     )
 
-    txn = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId, "None", removeLiquidityAction, withdrawEntireCashBalance=True
-            )
-        ],
-        {"from": accounts[1]},
+
+def prepareCollateralCurrencyLiquidation(env, collateral, **_):
+    # USDC cash or nToken holder borrows DAI up to its limit, a lower USDC exchange rate then
+    # leaves it undercollateralized
+    account = accounts[1]
+    depositType = "DepositAsset" if collateral == "cash" else "DepositAssetAndMintNToken"
+    env.notional.batchBalanceAction(
+        account,
+        [get_balance_action(env.currencyId["USDC"], depositType, depositActionAmount=5000e8)],
+        {"from": account},
     )
-    log_gas("batchAction.liquidity.WithdrawToAsset", txn, txn)
+    borrowToLimit(env, account, "DAI", 1, 200e8)
+    env.ethOracle["USDC"].setAnswer(int(TokenConfig["USDC"]["rate"] * 0.8))
+
 
-    chain.undo(1)
-    txn = env.notional.batchBalanceAndTradeAction(
+def liquidateCollateralCurrency(env, withdraw, **_):
+    return env.notional.liquidateCollateralCurrency(
         accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId,
-                "None",
-                removeLiquidityAction,
-                withdrawEntireCashBalance=True,
-                redeemToUnderlying=True,
-            )
-        ],
-        {"from": accounts[1]},
+        env.currencyId["DAI"],
+        env.currencyId["USDC"],
+        0,
+        0,
+        withdraw != "none",
+        withdraw == "underlying",
+        {"from": accounts[0]},
     )
-    log_gas("batchAction.liquidity.WithdrawToUnderlying", txn, txn)
 
-    chain.undo(1)
-    txn = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
+
+def lendIntoMarkets(env, account, symbol, fCashAssets):
+    env.notional.batchBalanceAndTradeAction(
+        account,
         [
             get_balance_trade_action(
-                currencyId,
-                "None",
-                removeLiquidityAction,
+                env.currencyId[symbol],
+                "DepositAsset",
+                getLendTrades(range(1, fCashAssets + 1)),
+                depositActionAmount=10000e8 * fCashAssets,
                 withdrawEntireCashBalance=True,
-                redeemToUnderlying=True,
             )
         ],
-        {"from": accounts[1]},
+        {"from": account},
     )
-    log_gas("batchAction.liquidity.WithdrawToUnderlying", txn, txn)
 
-    chain.undo(1)
-    txn = env.notional.batchBalanceAndTradeAction(
-        accounts[1],
-        [
-            get_balance_trade_action(
-                currencyId,
-                "None",
-                [
-                    {
-                        "tradeActionType": "RemoveLiquidity",
-                        "marketIndex": 1,
-                        "notional": 5000e8,
-                        "minSlippage": 0,
-                        "maxSlippage": 0,
-                    },
-                    {
-                        "tradeActionType": "AddLiquidity",
-                        "marketIndex": 2,
-                        "notional": 0,
-                        "minSlippage": 0,
-                        "maxSlippage": 0,
-                    },
-                ],
-            )
-        ],
-        {"from": accounts[1]},
-    )
-    log_gas("batchAction.liquidity.RollToMaturity", txn, txn)
 
+def getPositiveMaturities(env, account, currencyId):
+    portfolio = env.notional.getAccountPortfolio(account)
+    return list(reversed([a[1] for a in portfolio if a[0] == currencyId and a[3] > 0]))
 
-def borrow(env):
-    chain.revert()
-    borrowActions(env, False, False)
-    chain.revert()
-    borrowActions(env, True, False)
-    chain.revert()
-    borrowActions(env, True, True)
 
+def prepareLocalfCashLiquidation(env, fCashAssets, **_):
+    # DAI lender in the first N markets borrows up to its limit in the last market, a higher
+    # fCash haircut then leaves it undercollateralized
+    account = accounts[1]
+    currencyId = env.currencyId["DAI"]
+    lendIntoMarkets(env, account, "DAI", fCashAssets)
+    borrowToLimit(env, account, "DAI", 7, 1000e8 * fCashAssets)
 
-def borrowActions(env, withdrawCash, redeem):
-    borrowAction = get_balance_trade_action(
-        2,
-        "None",
-        [{"tradeActionType": "Borrow", "marketIndex": 1, "notional": 100e8, "maxSlippage": 0}],
-        withdrawEntireCashBalance=withdrawCash,
-        redeemToUnderlying=redeem,
-    )
-    collateralAction = get_balance_trade_action(4, "DepositAsset", [], depositActionAmount=10000e8)
-    key = None
-    if withdrawCash and redeem:
-        key = "borrowWithdrawUnderlying"
-    elif withdrawCash:
-        key = "borrowWithdrawAsset"
-    else:
-        key = "borrowNoWithdraw"
+    cashGroup = list(env.notional.getCashGroup(currencyId))
+    cashGroup[5] = 250
+    env.notional.updateCashGroup(currencyId, cashGroup)
 
-    txnCold = env.notional.batchBalanceAndTradeAction(
-        accounts[1], [borrowAction, collateralAction], {"from": accounts[1]}
-    )
-    txnWarm = env.notional.batchBalanceAndTradeAction(
-        accounts[1], [borrowAction, collateralAction], {"from": accounts[1]}
-    )
-    log_gas("batchAction.{}.DepositAssetCollateral".format(key), txnCold, txnWarm)
 
-    chain.undo(2)
-    collateralAction = get_balance_trade_action(
-        4, "DepositUnderlying", [], depositActionAmount=200e6
-    )
-    txnCold = env.notional.batchBalanceAndTradeAction(
-        accounts[1], [borrowAction, collateralAction], {"from": accounts[1]}
-    )
-    txnWarm = env.notional.batchBalanceAndTradeAction(
-        accounts[1], [borrowAction, collateralAction], {"from": accounts[1]}
+def liquidatefCashLocal(env, **_):
+    currencyId = env.currencyId["DAI"]
+    maturities = getPositiveMaturities(env, accounts[1], currencyId)
+    return env.notional.liquidatefCashLocal(
+        accounts[1], currencyId, maturities, [0] * len(maturities), {"from": accounts[0]}
     )
-    log_gas("batchAction.{}.DepositUnderlyingCollateral".format(key), txnCold, txnWarm)
 
-    chain.undo(2)
-    collateralAction = get_balance_trade_action(
-        4, "DepositAssetAndMintNToken", [], depositActionAmount=20000e8
-    )
-    txnCold = env.notional.batchBalanceAndTradeAction(
-        accounts[1], [borrowAction, collateralAction], {"from": accounts[1]}
-    )
-    txnWarm = env.notional.batchBalanceAndTradeAction(
-        accounts[1], [borrowAction, collateralAction], {"from": accounts[1]}
-    )
-    log_gas("batchAction.{}.DepositNTokenCollateral".format(key), txnCold, txnWarm)
 
-    chain.undo(2)
-    env.notional.depositAssetToken(accounts[1].address, 4, 20000e8, {"from": accounts[1]})
-    txnCold = env.notional.batchBalanceAndTradeAction(
-        accounts[1], [borrowAction], {"from": accounts[1]}
-    )
-    txnWarm = env.notional.batchBalanceAndTradeAction(
-        accounts[1], [borrowAction], {"from": accounts[1]}
-    )
-    log_gas("batchAction.{}.NoDeposit".format(key), txnCold, txnWarm)
+def prepareCrossCurrencyfCashLiquidation(env, fCashAssets, **_):
+    # USDC lender in the first N markets borrows DAI up to its limit, a lower USDC exchange
+    # rate then leaves it undercollateralized
+    account = accounts[1]
+    lendIntoMarkets(env, account, "USDC", fCashAssets)
+    borrowToLimit(env, account, "DAI", 1, 200e8 * fCashAssets)
+    env.ethOracle["USDC"].setAnswer(int(TokenConfig["USDC"]["rate"] * 0.8))
 
-    chain.undo(2)
-    ethCollateral = get_balance_trade_action(1, "DepositUnderlying", [], depositActionAmount=10e18)
-    txnCold = env.notional.batchBalanceAndTradeAction(
-        accounts[1], [ethCollateral, borrowAction], {"from": accounts[1], "value": 10e18}
-    )
-    txnWarm = env.notional.batchBalanceAndTradeAction(
-        accounts[1], [ethCollateral, borrowAction], {"from": accounts[1], "value": 10e18}
+
+def liquidatefCashCrossCurrency(env, **_):
+    (localCurrencyId, fCashCurrencyId) = (env.currencyId["DAI"], env.currencyId["USDC"])
+    maturities = getPositiveMaturities(env, accounts[1], fCashCurrencyId)
+    return env.notional.liquidatefCashCrossCurrency(
+        accounts[1],
+        localCurrencyId,
+        fCashCurrencyId,
+        maturities,
+        [0] * len(maturities),
+        {"from": accounts[0]},
     )
-    log_gas("batchAction.{}.DepositETHCollateral".format(key), txnCold, txnWarm)
+
+
+# Each scenario is logged under key.format(**params) for every combination of its params. A
+# scenario runs its setup stages, then prepare(env, **params), then measures action(env, **params)
+# twice for cold and warm storage unless repeat is False, in which case the single transaction is
+# logged as both. Combinations where valid(params) is false are skipped.
+SCENARIOS = [
+    {
+        "key": "deposit.{method}.{depositType}.{currency}",
+        "params": {
+            "method": ["direct", "batch"],
+            "depositType": ["DepositAsset", "DepositUnderlying"],
+            "currency": DEPOSIT_CURRENCIES,
+        },
+        "action": deposit,
+    },
+    {
+        "key": "withdraw.{method}.{withdrawTo}.{balance}.{currency}",
+        "params": {
+            "method": ["direct", "batch"],
+            "withdrawTo": ["asset", "underlying"],
+            "balance": ["partialBalance", "entireBalance"],
+            "currency": DEPOSIT_CURRENCIES,
+        },
+        "prepare": prepareWithdraw,
+        "action": withdraw,
+        "repeat": False,
+    },
+    {
+        "key": "nToken.initializeMarkets.{maxMarkets}",
+        "setup": ["cashGroup"],
+        "params": {"maxMarkets": [2, 3, 4, 5, 6, 7]},
+        "prepare": prepareInitializeMarkets,
+        "action": initializeMarkets,
+        "repeat": False,
+    },
+    {
+        "key": "nToken.{action}.{maxMarkets}",
+        "setup": ["markets"],
+        "params": {
+            "action": [
+                "DepositAssetAndMintNToken",
+                "DepositUnderlyingAndMintNToken",
+                "ConvertCashToNToken",
+                "RedeemNToken",
+            ],
+            "maxMarkets": [0, 2, 3, 4, 5, 6, 7],
+        },
+        "valid": lambda p: p["maxMarkets"] > 0 or p["action"] != "RedeemNToken",
+        "prepare": prepareNTokenAction,
+        "action": nTokenAction,
+    },
+    {
+        "key": "batchAction.{tradeAction}.{depositType}.{withdraw}.{currency}.{marketIndex}",
+        "setup": ["markets"],
+        "params": {
+            "maxMarkets": [3],
+            "tradeAction": ["Lend", "Borrow", "AddLiquidity"],
+            "depositType": ["None", "DepositAsset", "DepositUnderlying", "DepositNTokenCollateral"],
+            "withdraw": ["none", "asset", "underlying"],
+            "currency": MARKET_CURRENCIES,
+            "marketIndex": [1, 2, 3],
+        },
+        # nToken collateral is only needed to borrow
+        "valid": lambda p: p["tradeAction"] == "Borrow" or "NToken" not in p["depositType"],
+        "prepare": prepareTrade,
+        "action": trade,
+    },
+    {
+        "key": "batchAction.roll.{position}.{currency}",
+        "setup": ["markets"],
+        "params": {
+            "maxMarkets": [3],
+            "position": ["lend", "liquidity", "borrow"],
+            "currency": MARKET_CURRENCIES,
+        },
+        "prepare": prepareRoll,
+        "action": roll,
+        "repeat": False,
+    },
+    {
+        "key": "freeCollateral.array.{assetArrayLength}.{activeCurrencies}",
+        "setup": ["markets", "arrayPortfolio"],
+        "params": {
+            "maxMarkets": [7],
+            "assetArrayLength": list(range(1, 8)),
+            "activeCurrencies": list(range(1, 9)),
+        },
+        "prepare": preparePortfolio,
+        "action": freeCollateral,
+        "repeat": False,
+    },
+    {
+        "key": "settleAssets.array.{assetArrayLength}.{activeCurrencies}",
+        "setup": ["markets", "arrayPortfolio"],
+        "params": {
+            "maxMarkets": [7],
+            "assetArrayLength": list(range(1, 8)),
+            "activeCurrencies": list(range(1, 9)),
+        },
+        "prepare": prepareSettlement,
+        "action": settleAssets,
+        "repeat": False,
+    },
+    {
+        "key": "freeCollateral.bitmap.{assetsBitmapSize}.{activeCurrencies}",
+        "setup": ["markets", "bitmapPortfolio"],
+        "params": {
+            "maxMarkets": [7],
+            "assetsBitmapSize": list(range(1, 21)),
+            "activeCurrencies": list(range(1, 9)),
+        },
+        "prepare": preparePortfolio,
+        "action": freeCollateral,
+        "repeat": False,
+    },
+    {
+        "key": "settleAssets.bitmap.{assetsBitmapSize}.{activeCurrencies}",
+        "setup": ["markets", "bitmapPortfolio"],
+        "params": {
+            "maxMarkets": [7],
+            "assetsBitmapSize": list(range(1, 21)),
+            "activeCurrencies": list(range(1, 9)),
+        },
+        "prepare": prepareSettlement,
+        "action": settleAssets,
+        "repeat": False,
+    },
+    {
+        "key": "liquidateLocalCurrency.nToken.{maxMarkets}",
+        "setup": ["markets"],
+        "params": {"maxMarkets": [2, 3, 4, 5, 6, 7]},
+        "prepare": prepareLocalCurrencyLiquidation,
+        "action": liquidateLocalCurrency,
+        "repeat": False,
+    },
+    {
+        "key": "liquidateCollateralCurrency.{collateral}.{withdraw}",
+        "setup": ["markets"],
+        "params": {
+            "maxMarkets": [3],
+            "collateral": ["cash", "nToken"],
+            "withdraw": ["none", "asset", "underlying"],
+        },
+        "prepare": prepareCollateralCurrencyLiquidation,
+        "action": liquidateCollateralCurrency,
+        "repeat": False,
+    },
+    # Array portfolios hold at most seven assets, six fCash assets plus the debt
+    {
+        "key": "liquidatefCashLocal.{fCashAssets}",
+        "setup": ["markets"],
+        "params": {"maxMarkets": [7], "fCashAssets": list(range(1, 7))},
+        "prepare": prepareLocalfCashLiquidation,
+        "action": liquidatefCashLocal,
+        "repeat": False,
+    },
+    {
+        "key": "liquidatefCashCrossCurrency.{fCashAssets}",
+        "setup": ["markets"],
+        "params": {"maxMarkets": [7], "fCashAssets": list(range(1, 7))},
+        "prepare": prepareCrossCurrencyfCashLiquidation,
+        "action": liquidatefCashCrossCurrency,
+        "repeat": False,
+    },
+]
+
+
+def expandScenario(scenario):
+    """Returns the parameters of every valid combination in the scenario"""
+    names = sorted(scenario["params"].keys())
+    combinations = []
+    for values in product(*[scenario["params"][n] for n in names]):
+        params = dict(zip(names, values))
+        if scenario.get("valid", lambda _: True)(params):
+            combinations.append(params)
+
+    return combinations
+
+
+def getSetupPath(scenario, params):
+    return tuple(
+        (name, tuple((p, params[p]) for p in SETUPS[name][1])) for name in scenario.get("setup", [])
+    )
+
+
+def runScenario(env, scenario, params):
+    key = scenario["key"].format(**params)
+    if "prepare" in scenario:
+        scenario["prepare"](env, **params)
+
+    txnCold = scenario["action"](env, **params)
+    txnWarm = scenario["action"](env, **params) if scenario.get("repeat", True) else txnCold
+    log_gas(key, txnCold, txnWarm)
+
+
+def runScenarios(env, scenarios, stack):
+    """
+    Runs every combination of the scenarios from the current chain state. Runs are ordered by
+    their setup stages so that each stage is built once and shared by every run below it.
+    """
+    runs = []
+    for scenario in scenarios:
+        for params in expandScenario(scenario):
+            runs.append((getSetupPath(scenario, params), scenario, params))
+    runs.sort(key=lambda r: r[0])
+
+    baseDepth = stack.push()
+    currentPath = ()
+    for (path, scenario, params) in runs:
+        shared = 0
+        while shared < min(len(path), len(currentPath)) and path[shared] == currentPath[shared]:
+            shared += 1
+
+        stack.revert(baseDepth + shared)
+        for (name, setupParams) in path[shared:]:
+            SETUPS[name][0](env, **dict(setupParams))
+            stack.push()
+        currentPath = path
+
+        key = scenario["key"].format(**params)
+        try:
+            runScenario(env, scenario, params)
+        except Exception as e:
+            # A failing combination is reported without stopping the rest of the matrix
+            errorLog[key] = str(e)
+            print("Failed {}: {}".format(key, e))
+
+    stack.revert(baseDepth)
 
 
 DEPOSIT_PARAMETERS = {
@@ -767,7 +862,8 @@ INIT_PARAMETERS = {
 }
 
 
-def main():
+def getBenchmarkEnvironment():
+    """Deploys the environment that every scenario starts from"""
     env = environment(accounts)
 
     # Set time
@@ -775,107 +871,42 @@ def main():
     newTime = get_tref(blockTime) + SECONDS_IN_QUARTER + 1
     chain.mine(1, timestamp=newTime)
 
-    cToken = env.cToken["DAI"]
-    env.token["DAI"].approve(env.notional.address, 2 ** 255, {"from": accounts[0]})
-    env.token["DAI"].approve(cToken.address, 2 ** 255, {"from": accounts[0]})
-    cToken.mint(100000000e18, {"from": accounts[0]})
-    cToken.approve(env.notional.address, 2 ** 255, {"from": accounts[0]})
-
-    cToken.approve(env.notional.address, 2 ** 255, {"from": accounts[1]})
-    env.token["DAI"].approve(env.notional.address, 2 ** 255, {"from": accounts[1]})
-    env.token["DAI"].transfer(accounts[1], 1000e18, {"from": accounts[0]})
-    cToken.transfer(accounts[1], 500000e8, {"from": accounts[0]})
-
-    env.enableCurrency("DAI", CurrencyDefaults)
-    currencyId = 2
-    env.notional.updateDepositParameters(currencyId, *(nTokenDefaults["Deposit"]))
-    env.notional.updateInitializationParameters(currencyId, *(nTokenDefaults["Initialization"]))
-    env.notional.updateTokenCollateralParameters(currencyId, *(nTokenDefaults["Collateral"]))
-    env.notional.updateIncentiveEmissionRate(currencyId, CurrencyDefaults["incentiveEmissionRate"])
-
-    cToken = env.cToken["USDT"]
-    env.token["USDT"].approve(env.notional.address, 2 ** 255, {"from": accounts[0]})
-    env.token["USDT"].approve(cToken.address, 2 ** 255, {"from": accounts[0]})
-    cToken.mint(100000000e18, {"from": accounts[0]})
-    cToken.approve(env.notional.address, 2 ** 255, {"from": accounts[0]})
-    env.enableCurrency("USDT", CurrencyDefaults)
-
-    cToken = env.cToken["USDC"]
-    env.token["USDC"].approve(env.notional.address, 2 ** 255, {"from": accounts[0]})
-    env.token["USDC"].approve(cToken.address, 2 ** 255, {"from": accounts[0]})
-    cToken.mint(100000000e6, {"from": accounts[0]})
-    cToken.approve(env.notional.address, 2 ** 255, {"from": accounts[0]})
-
-    cToken.approve(env.notional.address, 2 ** 255, {"from": accounts[1]})
-    env.token["USDC"].approve(env.notional.address, 2 ** 255, {"from": accounts[1]})
-    env.token["USDC"].transfer(accounts[1], 10000e6, {"from": accounts[0]})
-    cToken.transfer(accounts[1], 500000e8, {"from": accounts[0]})
-    env.enableCurrency("USDC", CurrencyDefaults)
-
-    currencyId = 4
-    # TODO: what if this isnt initialized?
-    env.notional.updateDepositParameters(currencyId, *(nTokenDefaults["Deposit"]))
-    env.notional.updateInitializationParameters(currencyId, *(nTokenDefaults["Initialization"]))
-    env.notional.updateTokenCollateralParameters(currencyId, *(nTokenDefaults["Collateral"]))
-    env.notional.updateIncentiveEmissionRate(currencyId, CurrencyDefaults["incentiveEmissionRate"])
-
-    chain.snapshot()
-
-    deposits(env)
-    chain.revert()
-
-    withdraws(env)
-    chain.revert()
-
-    ntoken(env, 0)
-    currencyId = 2
-    for maxMarkets in range(2, 8):
-        chain.revert()
-
-        cashGroup = list(env.notional.getCashGroup(currencyId))
-        cashGroup[0] = maxMarkets
-        cashGroup[9] = CurrencyDefaults["tokenHaircut"][0:maxMarkets]
-        cashGroup[10] = CurrencyDefaults["rateScalar"][0:maxMarkets]
-        env.notional.updateCashGroup(currencyId, cashGroup)
-        env.notional.updateDepositParameters(currencyId, *(DEPOSIT_PARAMETERS[maxMarkets]))
-        env.notional.updateInitializationParameters(currencyId, *(INIT_PARAMETERS[maxMarkets]))
-
-        # initialize markets
-        env.notional.batchBalanceAction(
-            accounts[1],
-            [
-                get_balance_action(
-                    currencyId, "DepositAssetAndMintNToken", depositActionAmount=100e8
-                )
-            ],
-            {"from": accounts[1]},
+    listBenchmarkCurrencies(env)
+    fundAccounts(env, [accounts[1], accounts[2]])
+    for symbol in MARKET_CURRENCIES:
+        currencyId = env.currencyId[symbol]
+        env.notional.updateDepositParameters(currencyId, *(nTokenDefaults["Deposit"]))
+        env.notional.updateInitializationParameters(currencyId, *(nTokenDefaults["Initialization"]))
+        env.notional.updateTokenCollateralParameters(currencyId, *(nTokenDefaults["Collateral"]))
+        env.notional.updateIncentiveEmissionRate(
+            currencyId, CurrencyDefaults["incentiveEmissionRate"]
         )
-        txn = env.notional.initializeMarkets(currencyId, True)
-        log_gas("nToken.initializeMarkets.{}".format(maxMarkets), txn, txn)
 
-        ntoken(env, maxMarkets)
+    return env
 
-    chain.revert()
-    env.notional.batchBalanceAction(
-        accounts[0],
-        [
-            get_balance_action(2, "DepositAssetAndMintNToken", depositActionAmount=5000000e8),
-            get_balance_action(4, "DepositAssetAndMintNToken", depositActionAmount=5000000e8),
-        ],
-        {"from": accounts[0]},
-    )
-    env.notional.initializeMarkets(2, True)
-    env.notional.initializeMarkets(4, True)
-    chain.snapshot()
-
-    lend(env)
-    chain.revert()
-
-    liquidity(env)
-    chain.revert()
 
-    borrow(env)
-    chain.revert()
-
-    with open("gas_stats.json", "w") as f:
-        json.dump(gasLog, f, sort_keys=True, indent=4)
+def main():
+    global storageProfiler, callProfile
+    env = getBenchmarkEnvironment()
+    if os.environ.get("GAS_STORAGE_PROFILE"):
+        storageProfiler = StorageProfiler(env.notional.address, getContractNames(env))
+    if os.environ.get("GAS_CALL_PROFILE"):
+        callProfile = CallTreeProfile()
+
+    runScenarios(env, SCENARIOS, SnapshotStack())
+    if len(errorLog) > 0:
+        print("{} of {} benchmarks failed".format(len(errorLog), len(errorLog) + len(gasLog)))
+
+    # Failed benchmarks are written with their error so that comparisons report them
+    results = dict(gasLog)
+    results.update({key: {"error": error} for (key, error) in errorLog.items()})
+    with open(GAS_STATS_PATH, "w") as f:
+        json.dump(results, f, sort_keys=True, indent=4)
+
+    if storageProfiler is not None:
+        with open(GAS_STORAGE_PATH, "w") as f:
+            json.dump(storageLog, f, sort_keys=True, indent=4)
+
+    if callProfile is not None:
+        callProfile.writeFolded(GAS_CALLS_PATH)
+        print("\n".join(callProfile.summaryLines()))
@@ -0,0 +1,193 @@
+# Mirrors contracts/internal/valuation/AssetHandler.sol. Portfolio assets are the PortfolioAsset
+# tuples returned by the contracts: (currencyId, maturity, assetType, notional, ...). Markets and
+# oracle rates are read from a ValuationSnapshot in place of contract storage.
+from functools import lru_cache
+
+import scripts.offchain.abdk_math as abdk
+from scripts.offchain.asset_rate import convertFromUnderlying
+from scripts.offchain.cash_group import getDebtBuffer, getfCashHaircut, getLiquidityHaircut
+from scripts.offchain.constants import (
+    FCASH_ASSET_TYPE,
+    IMPLIED_RATE_TIME,
+    MAX_LIQUIDITY_TOKEN_INDEX,
+    MIN_LIQUIDITY_TOKEN_INDEX,
+    PERCENTAGE_DECIMALS,
+    QUARTER,
+    RATE_PRECISION,
+    RATE_PRECISION_64x64,
+)
+from scripts.offchain.date_time import getMarketIndex, getTradedMarket
+from scripts.offchain.market import ORACLE_RATE, TOTAL_ASSET_CASH, TOTAL_FCASH, TOTAL_LIQUIDITY
+from scripts.offchain.safe_int import checked, div, mulInRatePrecision, require
+
+CURRENCY_ID = 0
+MATURITY = 1
+ASSET_TYPE = 2
+NOTIONAL = 3
+
+
+def isLiquidityToken(assetType):
+    return MIN_LIQUIDITY_TOKEN_INDEX <= assetType <= MAX_LIQUIDITY_TOKEN_INDEX
+
+
+def getSettlementDate(asset):
+    assetType = int(asset[ASSET_TYPE])
+    require(0 < assetType <= MAX_LIQUIDITY_TOKEN_INDEX, "dev: settlement date invalid asset type")
+    # 3 month tokens and fCash tokens settle at maturity
+    if assetType <= MIN_LIQUIDITY_TOKEN_INDEX:
+        return int(asset[MATURITY])
+
+    # Liquidity tokens settle at tRef + 90 days
+    return int(asset[MATURITY]) - getTradedMarket(assetType - 1) + QUARTER
+
+
+@lru_cache(maxsize=16384)
+def getDiscountFactor(timeToMaturity, oracleRate):
+    # Accounts holding the same maturities share discount factors, so these are cached
+    expValue = abdk.fromUInt((oracleRate * timeToMaturity) // IMPLIED_RATE_TIME)
+    expValue = abdk.div64x64(expValue, RATE_PRECISION_64x64)
+    expValue = abdk.exp(abdk.neg(expValue))
+    expValue = abdk.mul(expValue, RATE_PRECISION_64x64)
+
+    return abdk.toInt(expValue)
+
+
+def getPresentfCashValue(notional, maturity, blockTime, oracleRate):
+    if notional == 0:
+        return 0
+
+    require(maturity >= blockTime, "dev: uint256 sub underflow")
+    discountFactor = getDiscountFactor(maturity - blockTime, oracleRate)
+    require(discountFactor <= RATE_PRECISION, "dev: get present value invalid discount factor")
+
+    return mulInRatePrecision(notional, discountFactor)
+
+
+def getRiskAdjustedPresentfCashValue(cashGroup, notional, maturity, blockTime, oracleRate):
+    if notional == 0:
+        return 0
+
+    require(maturity >= blockTime, "dev: uint256 sub underflow")
+    timeToMaturity = maturity - blockTime
+    if notional > 0:
+        # Lending is discounted at a higher rate
+        discountFactor = getDiscountFactor(timeToMaturity, oracleRate + getfCashHaircut(cashGroup))
+    else:
+        # Borrowing is discounted at a lower rate, floored at a zero rate
+        debtBuffer = getDebtBuffer(cashGroup)
+        if debtBuffer >= oracleRate:
+            return notional
+
+        discountFactor = getDiscountFactor(timeToMaturity, oracleRate - debtBuffer)
+
+    require(discountFactor <= RATE_PRECISION, "dev: get risk adjusted pv, invalid discount factor")
+    return mulInRatePrecision(notional, discountFactor)
+
+
+def getCashClaims(token, market):
+    require(isLiquidityToken(token[ASSET_TYPE]) and token[NOTIONAL] >= 0)
+
+    assetCash = div(checked(market[TOTAL_ASSET_CASH] * token[NOTIONAL]), market[TOTAL_LIQUIDITY])
+    fCash = div(checked(market[TOTAL_FCASH] * token[NOTIONAL]), market[TOTAL_LIQUIDITY])
+
+    return (assetCash, fCash)
+
+
+def _calcToken(numerator, tokens, haircut, liquidity):
+    return div(div(checked(numerator * tokens * haircut), PERCENTAGE_DECIMALS), liquidity)
+
+
+def getHaircutCashClaims(token, market, cashGroup):
+    require(isLiquidityToken(token[ASSET_TYPE]) and token[NOTIONAL] >= 0)
+    require(token[CURRENCY_ID] == cashGroup[0], "dev: haircut cash claims, currency id mismatch")
+    haircut = getLiquidityHaircut(cashGroup, token[ASSET_TYPE])
+
+    assetCash = _calcToken(
+        market[TOTAL_ASSET_CASH], token[NOTIONAL], haircut, market[TOTAL_LIQUIDITY]
+    )
+    fCash = _calcToken(market[TOTAL_FCASH], token[NOTIONAL], haircut, market[TOTAL_LIQUIDITY])
+
+    return (assetCash, fCash)
+
+
+def getLiquidityTokenValue(index, cashGroup, snapshot, assets, blockTime, riskAdjusted):
+    """
+    Returns the asset cash claim and the present value of the fCash claim of the liquidity token
+    at assets[index]. As in the contract, a matching fCash asset directly preceding the token
+    has the fCash claim netted into its notional, so assets must be a list of mutable assets.
+    """
+    liquidityToken = assets[index]
+    (marketIndex, idiosyncratic) = getMarketIndex(cashGroup[1], liquidityToken[MATURITY], blockTime)
+    require(not idiosyncratic, "dev: idiosyncratic liquidity token")
+    market = snapshot.loadMarket(cashGroup, marketIndex, blockTime)
+
+    if riskAdjusted:
+        (assetCashClaim, fCashClaim) = getHaircutCashClaims(liquidityToken, market, cashGroup)
+    else:
+        (assetCashClaim, fCashClaim) = getCashClaims(liquidityToken, market)
+
+    if index > 0:
+        maybefCash = assets[index - 1]
+        if (
+            maybefCash[ASSET_TYPE] == FCASH_ASSET_TYPE
+            and maybefCash[CURRENCY_ID] == liquidityToken[CURRENCY_ID]
+            and maybefCash[MATURITY] == liquidityToken[MATURITY]
+        ):
+            maybefCash[NOTIONAL] = checked(maybefCash[NOTIONAL] + fCashClaim)
+            return (assetCashClaim, 0)
+
+    if riskAdjusted:
+        pv = getRiskAdjustedPresentfCashValue(
+            cashGroup, fCashClaim, liquidityToken[MATURITY], blockTime, market[ORACLE_RATE]
+        )
+    else:
+        pv = getPresentfCashValue(
+            fCashClaim, liquidityToken[MATURITY], blockTime, market[ORACLE_RATE]
+        )
+
+    return (assetCashClaim, pv)
+
+
+def getNetCashGroupValue(assets, cashGroup, snapshot, blockTime, portfolioIndex):
+    """
+    Returns the risk adjusted asset value of the assets in the cash group starting at
+    portfolioIndex and the index of the first asset outside of the cash group. assets must
+    be sorted and mutable, see getLiquidityTokenValue.
+    """
+    presentValueAsset = 0
+    presentValueUnderlying = 0
+
+    # Liquidity tokens first so that their fCash claims are netted into the fCash assets
+    for i in range(portfolioIndex, len(assets)):
+        if not isLiquidityToken(assets[i][ASSET_TYPE]):
+            continue
+        if assets[i][CURRENCY_ID] != cashGroup[0]:
+            break
+
+        (assetCashClaim, pv) = getLiquidityTokenValue(
+            i, cashGroup, snapshot, assets, blockTime, True
+        )
+        presentValueAsset = checked(presentValueAsset + assetCashClaim)
+        presentValueUnderlying = checked(presentValueUnderlying + pv)
+
+    j = portfolioIndex
+    while j < len(assets):
+        a = assets[j]
+        if a[ASSET_TYPE] != FCASH_ASSET_TYPE:
+            j += 1
+            continue
+        if a[CURRENCY_ID] != cashGroup[0]:
+            break
+
+        oracleRate = snapshot.calculateOracleRate(cashGroup, a[MATURITY], blockTime)
+        pv = getRiskAdjustedPresentfCashValue(
+            cashGroup, a[NOTIONAL], a[MATURITY], blockTime, oracleRate
+        )
+        presentValueUnderlying = checked(presentValueUnderlying + pv)
+        j += 1
+
+    presentValueAsset = checked(
+        presentValueAsset + convertFromUnderlying(cashGroup[2], presentValueUnderlying)
+    )
+
+    return (presentValueAsset, j)
@@ -0,0 +1,18 @@
+# Mirrors contracts/internal/markets/AssetRate.sol. Asset rates are the tuples returned by the
+# contracts: (rateOracle, rate, underlyingDecimals)
+from scripts.offchain.constants import ASSET_RATE_DECIMAL_DIFFERENCE
+from scripts.offchain.safe_int import checked, div
+
+
+def convertToUnderlying(assetRate, assetBalance):
+    return div(
+        div(checked(int(assetRate[1]) * assetBalance), ASSET_RATE_DECIMAL_DIFFERENCE),
+        int(assetRate[2]),
+    )
+
+
+def convertFromUnderlying(assetRate, underlyingBalance):
+    return div(
+        checked(underlyingBalance * ASSET_RATE_DECIMAL_DIFFERENCE * int(assetRate[2])),
+        int(assetRate[1]),
+    )
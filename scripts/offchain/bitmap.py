@@ -0,0 +1,65 @@
+# Mirrors contracts/math/Bitmap.sol. Bitmaps are python ints holding a bytes32 value, bit
+# numbers are 1-indexed from the most significant bit.
+from scripts.offchain.safe_int import require
+
+MSB = 1 << 255
+MAX_BITMAP = (1 << 256) - 1
+
+
+def toBitmap(value):
+    """Converts a bytes32 value as returned by brownie (or a hex string) to an int bitmap"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        return int(value, 16) if value not in ("", "0x") else 0
+    return int.from_bytes(bytes(value), "big")
+
+
+def toBytes32(bitmap):
+    """Converts an int bitmap to the 0x prefixed hex string accepted as a bytes32 argument"""
+    return "0x{:064x}".format(bitmap)
+
+
+def setBit(bitmap, index, setOn):
+    require(index >= 1 and index <= 256)
+    if setOn:
+        return bitmap | (MSB >> (index - 1))
+    else:
+        return bitmap & ~(MSB >> (index - 1)) & MAX_BITMAP
+
+
+def isBitSet(bitmap, index):
+    require(index >= 1 and index <= 256)
+    return (bitmap >> (256 - index)) & 1 == 1
+
+
+def totalBitsSet(bitmap):
+    return bin(bitmap).count("1")
+
+
+def getMSB(x):
+    require(x > 0)
+    return x.bit_length() - 1
+
+
+def getNextBitNum(x):
+    if x == 0:
+        return 0
+    return 257 - x.bit_length()
+
+
+def getBitNums(bitmap):
+    """Returns the set bit numbers in ascending order, the same order the contracts iterate in"""
+    bitNums = []
+    while bitmap != 0:
+        bitNum = getNextBitNum(bitmap)
+        bitNums.append(bitNum)
+        bitmap ^= MSB >> (bitNum - 1)
+    return bitNums
+
+
+def getBitmapFromBitNums(bitNums):
+    bitmap = 0
+    for bitNum in bitNums:
+        bitmap = setBit(bitmap, bitNum, True)
+    return bitmap
@@ -0,0 +1,120 @@
+# Mirrors the getters in contracts/internal/markets/CashGroup.sol. Cash groups are the tuples
+# returned by buildCashGroupView: (currencyId, maxMarketIndex, assetRate, data)
+from scripts.offchain.constants import (
+    BASIS_POINT,
+    FIVE_BASIS_POINTS,
+    FIVE_MINUTES,
+    IMPLIED_RATE_TIME,
+    MIN_LIQUIDITY_TOKEN_INDEX,
+    RATE_PRECISION,
+)
+from scripts.offchain.safe_int import div, require
+
+RATE_ORACLE_TIME_WINDOW = 8
+TOTAL_FEE = 16
+RESERVE_FEE_SHARE = 24
+DEBT_BUFFER = 32
+FCASH_HAIRCUT = 40
+SETTLEMENT_PENALTY = 48
+LIQUIDATION_FCASH_HAIRCUT = 56
+LIQUIDATION_DEBT_BUFFER = 64
+LIQUIDITY_TOKEN_HAIRCUT = 72
+RATE_SCALAR = 128
+
+
+def toWord(data):
+    if isinstance(data, int):
+        return data
+    if isinstance(data, (bytes, bytearray)):
+        return int.from_bytes(data, "big")
+    return int(data, 16)
+
+
+def _getByte(cashGroup, offset):
+    return (toWord(cashGroup[3]) >> offset) & 0xFF
+
+
+def encodeCashGroupSettings(settings):
+    # Packs a CashGroupSettings tuple (i.e. CASH_GROUP_PARAMETERS) the same way as
+    # CashGroup.setCashGroupStorage
+    data = (
+        settings[0]
+        | (settings[1] << RATE_ORACLE_TIME_WINDOW)
+        | (settings[2] << TOTAL_FEE)
+        | (settings[3] << RESERVE_FEE_SHARE)
+        | (settings[4] << DEBT_BUFFER)
+        | (settings[5] << FCASH_HAIRCUT)
+        | (settings[6] << SETTLEMENT_PENALTY)
+        | (settings[7] << LIQUIDATION_FCASH_HAIRCUT)
+        | (settings[8] << LIQUIDATION_DEBT_BUFFER)
+    )
+    for i, haircut in enumerate(settings[9]):
+        data |= haircut << (LIQUIDITY_TOKEN_HAIRCUT + i * 8)
+    for i, scalar in enumerate(settings[10]):
+        data |= scalar << (RATE_SCALAR + i * 8)
+
+    return data
+
+
+def buildCashGroup(currencyId, settings, assetRate):
+    return (currencyId, settings[0], assetRate, encodeCashGroupSettings(settings))
+
+
+def getRateScalar(cashGroup, marketIndex, timeToMaturity):
+    require(1 <= marketIndex <= cashGroup[1], "dev: invalid market index")
+    scalar = _getByte(cashGroup, RATE_SCALAR + 8 * (marketIndex - 1)) * RATE_PRECISION
+    rateScalar = div(scalar * IMPLIED_RATE_TIME, timeToMaturity)
+    require(rateScalar > 0, "dev: rate scalar underflow")
+    return rateScalar
+
+
+def getLiquidityHaircut(cashGroup, assetType):
+    offset = LIQUIDITY_TOKEN_HAIRCUT + 8 * (assetType - MIN_LIQUIDITY_TOKEN_INDEX)
+    return _getByte(cashGroup, offset)
+
+
+def getTotalFee(cashGroup):
+    return _getByte(cashGroup, TOTAL_FEE) * BASIS_POINT
+
+
+def getReserveFeeShare(cashGroup):
+    return _getByte(cashGroup, RESERVE_FEE_SHARE)
+
+
+def getfCashHaircut(cashGroup):
+    return _getByte(cashGroup, FCASH_HAIRCUT) * FIVE_BASIS_POINTS
+
+
+def getDebtBuffer(cashGroup):
+    return _getByte(cashGroup, DEBT_BUFFER) * FIVE_BASIS_POINTS
+
+
+def getRateOracleTimeWindow(cashGroup):
+    return _getByte(cashGroup, RATE_ORACLE_TIME_WINDOW) * FIVE_MINUTES
+
+
+def getSettlementPenalty(cashGroup):
+    return _getByte(cashGroup, SETTLEMENT_PENALTY) * FIVE_BASIS_POINTS
+
+
+def getLiquidationfCashHaircut(cashGroup):
+    return _getByte(cashGroup, LIQUIDATION_FCASH_HAIRCUT) * FIVE_BASIS_POINTS
+
+
+def getLiquidationDebtBuffer(cashGroup):
+    return _getByte(cashGroup, LIQUIDATION_DEBT_BUFFER) * FIVE_BASIS_POINTS
+
+
+def interpolateOracleRate(shortMaturity, longMaturity, shortRate, longRate, assetMaturity):
+    require(shortMaturity < assetMaturity, "dev: cash group interpolation error, short maturity")
+    require(assetMaturity < longMaturity, "dev: cash group interpolation error, long maturity")
+
+    # Rates may be inverted where the short market rate is above the long market rate
+    if longRate >= shortRate:
+        return (longRate - shortRate) * (assetMaturity - shortMaturity) // (
+            longMaturity - shortMaturity
+        ) + shortRate
+    else:
+        return shortRate - (shortRate - longRate) * (assetMaturity - shortMaturity) // (
+            longMaturity - shortMaturity
+        )
@@ -0,0 +1,67 @@
+# Mirrors contracts/global/Constants.sol, all values are integers so that the off chain
+# models round exactly the same way the contracts do.
+INTERNAL_TOKEN_PRECISION = 10 ** 8
+INCENTIVE_ACCUMULATION_PRECISION = 10 ** 18
+ETH_CURRENCY_ID = 1
+ETH_DECIMALS = 10 ** 18
+PERCENTAGE_DECIMALS = 100
+MAX_TRADED_MARKET_INDEX = 7
+MAX_BITMAP_ASSETS = 20
+FIVE_MINUTES = 300
+
+DAY = 86400
+WEEK = DAY * 6
+MONTH = WEEK * 5
+QUARTER = MONTH * 3
+YEAR = QUARTER * 4
+
+DAYS_IN_WEEK = 6
+DAYS_IN_MONTH = 30
+DAYS_IN_QUARTER = 90
+
+MAX_DAY_OFFSET = 90
+MAX_WEEK_OFFSET = 360
+MAX_MONTH_OFFSET = 2160
+MAX_QUARTER_OFFSET = 7650
+
+WEEK_BIT_OFFSET = 90
+MONTH_BIT_OFFSET = 135
+QUARTER_BIT_OFFSET = 195
+
+IMPLIED_RATE_TIME = 360 * DAY
+RATE_PRECISION = 10 ** 9
+BASIS_POINT = RATE_PRECISION // 10000
+DELEVERAGE_BUFFER = 300 * BASIS_POINT
+FIVE_BASIS_POINTS = 5 * BASIS_POINT
+TEN_BASIS_POINTS = 10 * BASIS_POINT
+
+RATE_PRECISION_64x64 = 0x3B9ACA000000000000000000
+LOG_RATE_PRECISION_64x64 = 382276781265598821176
+MAX_MARKET_PROPORTION = RATE_PRECISION * 99 // 100
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+HAS_ASSET_DEBT = 0x01
+HAS_CASH_DEBT = 0x02
+ACTIVE_IN_PORTFOLIO = 0x8000
+ACTIVE_IN_BALANCES = 0x4000
+UNMASK_FLAGS = 0x3FFF
+
+# Byte offsets into the nToken parameters
+LIQUIDATION_HAIRCUT_PERCENTAGE = 0
+CASH_WITHHOLDING_BUFFER = 1
+RESIDUAL_PURCHASE_TIME_BUFFER = 2
+PV_HAIRCUT_PERCENTAGE = 3
+RESIDUAL_PURCHASE_INCENTIVE = 4
+
+FCASH_ASSET_TYPE = 1
+MIN_LIQUIDITY_TOKEN_INDEX = 2
+MAX_LIQUIDITY_TOKEN_INDEX = 8
+
+DEPOSIT_PERCENT_BASIS = 10 ** 8
+DEFAULT_LIQUIDATION_PORTION = 40
+TOKEN_REPO_INCENTIVE_PERCENT = 30
+VAULT_ACCOUNT_MIN_BLOCKS = 5
+
+# Asset rates are stored with 10 extra decimal places relative to the underlying
+ASSET_RATE_DECIMAL_DIFFERENCE = 10 ** 10
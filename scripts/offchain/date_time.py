@@ -0,0 +1,169 @@
+# Mirrors contracts/internal/markets/DateTime.sol
+from functools import lru_cache
+
+from scripts.offchain.bitmap import getBitNums, setBit
+from scripts.offchain.constants import (
+    DAY,
+    DAYS_IN_MONTH,
+    DAYS_IN_QUARTER,
+    DAYS_IN_WEEK,
+    MAX_DAY_OFFSET,
+    MAX_MONTH_OFFSET,
+    MAX_QUARTER_OFFSET,
+    MAX_TRADED_MARKET_INDEX,
+    MAX_WEEK_OFFSET,
+    MONTH,
+    MONTH_BIT_OFFSET,
+    QUARTER,
+    QUARTER_BIT_OFFSET,
+    WEEK,
+    WEEK_BIT_OFFSET,
+    YEAR,
+)
+from scripts.offchain.safe_int import Revert, require
+
+TRADED_MARKETS = (QUARTER, 2 * QUARTER, YEAR, 2 * YEAR, 5 * YEAR, 10 * YEAR, 20 * YEAR)
+
+
+def getReferenceTime(blockTime):
+    require(blockTime >= QUARTER)
+    return blockTime - (blockTime % QUARTER)
+
+
+def getTimeUTC0(time):
+    require(time >= DAY)
+    return time - (time % DAY)
+
+
+def getTradedMarket(index):
+    if 1 <= index <= MAX_TRADED_MARKET_INDEX:
+        return TRADED_MARKETS[index - 1]
+
+    raise Revert("Invalid index")
+
+
+def getMarketIndex(maxMarketIndex, maturity, blockTime):
+    require(maxMarketIndex > 0, "CG: no markets listed")
+    require(maxMarketIndex <= MAX_TRADED_MARKET_INDEX, "CG: market index bound")
+    tRef = getReferenceTime(blockTime)
+
+    for i in range(1, maxMarketIndex + 1):
+        marketMaturity = tRef + getTradedMarket(i)
+        if marketMaturity == maturity:
+            return (i, False)
+        # Returns the market that is immediately greater than the maturity
+        if marketMaturity > maturity:
+            return (i, True)
+
+    raise Revert("CG: no market found")
+
+
+def isValidMaturity(maxMarketIndex, maturity, blockTime):
+    tRef = getReferenceTime(blockTime)
+    maxMaturity = tRef + getTradedMarket(maxMarketIndex)
+    # Cannot trade past max maturity
+    if maturity > maxMaturity:
+        return False
+
+    # Check that the maturity is on a valid bit
+    (_, isValid) = getBitNumFromMaturity(blockTime, maturity)
+    return isValid
+
+
+def getBitNumFromMaturity(blockTime, maturity):
+    """Returns (bitNum, isExact) for the maturity relative to the block time"""
+    blockTimeUTC0 = getTimeUTC0(blockTime)
+
+    # Maturities must always divide days evenly
+    if maturity % DAY != 0:
+        return (0, False)
+    # Maturity cannot be in the past
+    if blockTimeUTC0 >= maturity:
+        return (0, False)
+
+    # Overflow check done above
+    daysOffset = (maturity - blockTimeUTC0) // DAY
+
+    # These if statements need to fall through to the next one
+    if daysOffset <= MAX_DAY_OFFSET:
+        return (daysOffset, True)
+    elif daysOffset <= MAX_WEEK_OFFSET:
+        offsetInDays = daysOffset - MAX_DAY_OFFSET + (blockTimeUTC0 % WEEK) // DAY
+        return (
+            WEEK_BIT_OFFSET + offsetInDays // DAYS_IN_WEEK,
+            offsetInDays % DAYS_IN_WEEK == 0,
+        )
+    elif daysOffset <= MAX_MONTH_OFFSET:
+        offsetInDays = daysOffset - MAX_WEEK_OFFSET + (blockTimeUTC0 % MONTH) // DAY
+        return (
+            MONTH_BIT_OFFSET + offsetInDays // DAYS_IN_MONTH,
+            offsetInDays % DAYS_IN_MONTH == 0,
+        )
+    elif daysOffset <= MAX_QUARTER_OFFSET:
+        offsetInDays = daysOffset - MAX_MONTH_OFFSET + (blockTimeUTC0 % QUARTER) // DAY
+        return (
+            QUARTER_BIT_OFFSET + offsetInDays // DAYS_IN_QUARTER,
+            offsetInDays % DAYS_IN_QUARTER == 0,
+        )
+
+    # This is the maximum 1-indexed bit num, it is never valid because it is beyond the 20
+    # year max maturity
+    return (256, False)
+
+
+@lru_cache(maxsize=1024)
+def getMaturityTable(blockTimeUTC0):
+    """
+    Returns the maturity of every bit number for a UTC0 block time, index 0 is unused so the
+    table can be indexed directly by the 1-indexed bit number.
+    """
+    weekStart = blockTimeUTC0 + MAX_DAY_OFFSET * DAY - (blockTimeUTC0 % WEEK)
+    monthStart = blockTimeUTC0 + MAX_WEEK_OFFSET * DAY - (blockTimeUTC0 % MONTH)
+    quarterStart = blockTimeUTC0 + MAX_MONTH_OFFSET * DAY - (blockTimeUTC0 % QUARTER)
+
+    return (
+        (0,)
+        + tuple(blockTimeUTC0 + b * DAY for b in range(1, WEEK_BIT_OFFSET + 1))
+        + tuple(
+            weekStart + (b - WEEK_BIT_OFFSET) * WEEK
+            for b in range(WEEK_BIT_OFFSET + 1, MONTH_BIT_OFFSET + 1)
+        )
+        + tuple(
+            monthStart + (b - MONTH_BIT_OFFSET) * MONTH
+            for b in range(MONTH_BIT_OFFSET + 1, QUARTER_BIT_OFFSET + 1)
+        )
+        + tuple(
+            quarterStart + (b - QUARTER_BIT_OFFSET) * QUARTER
+            for b in range(QUARTER_BIT_OFFSET + 1, 257)
+        )
+    )
+
+
+@lru_cache(maxsize=1024)
+def getBitNumTable(blockTimeUTC0):
+    """Returns a dict of exact maturity to bit number for a UTC0 block time"""
+    return {maturity: bitNum for (bitNum, maturity) in enumerate(getMaturityTable(blockTimeUTC0))}
+
+
+def getMaturityFromBitNum(blockTime, bitNum):
+    require(bitNum != 0)
+    require(bitNum <= 256)
+    return getMaturityTable(getTimeUTC0(blockTime))[bitNum]
+
+
+def getBitmapFromMaturities(blockTime, maturities):
+    """Sets the bit for each maturity, reverts if any maturity does not fall exactly on a bit"""
+    bitNumTable = getBitNumTable(getTimeUTC0(blockTime))
+    bitmap = 0
+    for maturity in maturities:
+        bitNum = bitNumTable.get(maturity, 0)
+        require(bitNum != 0, "Invalid maturity")
+        bitmap = setBit(bitmap, bitNum, True)
+
+    return bitmap
+
+
+def getMaturitiesFromBitmap(blockTime, bitmap):
+    """Returns the maturities of every set bit in ascending order"""
+    maturityTable = getMaturityTable(getTimeUTC0(blockTime))
+    return [maturityTable[bitNum] for bitNum in getBitNums(bitmap)]
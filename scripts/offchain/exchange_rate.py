@@ -0,0 +1,43 @@
+# Mirrors contracts/internal/valuation/ExchangeRate.sol. ETH rates are the ETHRate tuples used
+# by the contracts: (rateDecimals, rate, buffer, haircut, liquidationDiscount)
+from scripts.offchain.constants import ETH_CURRENCY_ID, ETH_DECIMALS, PERCENTAGE_DECIMALS
+from scripts.offchain.safe_int import checked, div, require
+
+RATE_DECIMALS = 0
+RATE = 1
+BUFFER = 2
+HAIRCUT = 3
+LIQUIDATION_DISCOUNT = 4
+
+
+def buildExchangeRate(
+    currencyId, rate, rateDecimalPlaces, mustInvert, buffer, haircut, liquidationDiscount
+):
+    # Takes the ETHRateStorage settings and the latest oracle answer
+    if currencyId == ETH_CURRENCY_ID:
+        rateDecimals = ETH_DECIMALS
+        rate = ETH_DECIMALS
+    else:
+        require(rate > 0, "Invalid rate")
+        rateDecimals = 10 ** rateDecimalPlaces
+        if mustInvert:
+            rate = div(rateDecimals * rateDecimals, rate)
+
+    return (rateDecimals, rate, buffer, haircut, liquidationDiscount)
+
+
+def convertToETH(ethRate, balance):
+    multiplier = ethRate[HAIRCUT] if balance > 0 else ethRate[BUFFER]
+
+    return div(
+        div(checked(balance * ethRate[RATE] * multiplier), PERCENTAGE_DECIMALS),
+        ethRate[RATE_DECIMALS],
+    )
+
+
+def convertETHTo(ethRate, balance):
+    return div(checked(balance * ethRate[RATE_DECIMALS]), ethRate[RATE])
+
+
+def exchangeRate(baseETHRate, quoteETHRate):
+    return div(checked(baseETHRate[RATE] * quoteETHRate[RATE_DECIMALS]), quoteETHRate[RATE])
@@ -0,0 +1,390 @@
+# Mirrors the view methods in contracts/internal/valuation/FreeCollateral.sol. Accounts are the
+# (accountContext, accountBalances, portfolio) tuples returned by MockValuationLib.getAccount,
+# all other state is read from a ValuationSnapshot.
+from scripts.offchain.asset_handler import (
+    ASSET_TYPE,
+    CURRENCY_ID,
+    MATURITY,
+    NOTIONAL,
+    getNetCashGroupValue,
+    getRiskAdjustedPresentfCashValue,
+)
+from scripts.offchain.asset_rate import convertFromUnderlying, convertToUnderlying
+from scripts.offchain.cash_group import toWord
+from scripts.offchain.constants import (
+    ACTIVE_IN_BALANCES,
+    ACTIVE_IN_PORTFOLIO,
+    PERCENTAGE_DECIMALS,
+    PV_HAIRCUT_PERCENTAGE,
+    UNMASK_FLAGS,
+    ZERO_ADDRESS,
+)
+from scripts.offchain.exchange_rate import convertToETH
+from scripts.offchain.safe_int import Revert, checked, div, require
+from scripts.offchain.snapshot import (
+    NTOKEN_ASSET_PV,
+    NTOKEN_PARAMETERS,
+    NTOKEN_TOTAL_SUPPLY,
+    getNTokenParameter,
+)
+
+# AccountContext tuple indexes
+NEXT_SETTLE_TIME = 0
+HAS_DEBT = 1
+ASSET_ARRAY_LENGTH = 2
+BITMAP_CURRENCY_ID = 3
+ACTIVE_CURRENCIES = 4
+
+# LiquidationFactors tuple indexes
+ACCOUNT = 0
+NET_ETH_VALUE = 1
+LOCAL_ASSET_AVAILABLE = 2
+COLLATERAL_ASSET_AVAILABLE = 3
+NTOKEN_HAIRCUT_ASSET_VALUE = 4
+NTOKEN_PARAMETERS_FACTOR = 5
+LOCAL_ETH_RATE = 6
+COLLATERAL_ETH_RATE = 7
+LOCAL_ASSET_RATE = 8
+COLLATERAL_CASH_GROUP = 9
+IS_CALCULATION = 10
+
+# Length of the netLocalAssetValues array returned by getFreeCollateralView
+MAX_NET_LOCAL_VALUES = 10
+ACTIVE_CURRENCIES_BITS = 144
+
+# Zero values of the structs that getLiquidationFactors may leave unset
+EMPTY_ASSET_RATE = (ZERO_ADDRESS, 0, 0)
+EMPTY_ETH_RATE = (0, 0, 0, 0, 0)
+EMPTY_CASH_GROUP = (0, 0, EMPTY_ASSET_RATE, 0)
+
+
+def getActiveCurrencies(accountContext):
+    # Unpacks the bytes18 active currencies into (currencyId, flags) pairs
+    currencies = toWord(accountContext[ACTIVE_CURRENCIES])
+    result = []
+    while currencies != 0:
+        currencyBytes = currencies >> (ACTIVE_CURRENCIES_BITS - 16)
+        result.append((currencyBytes & UNMASK_FLAGS, currencyBytes))
+        currencies = (currencies << 16) & ((1 << ACTIVE_CURRENCIES_BITS) - 1)
+
+    return result
+
+
+def getBalances(accountBalances):
+    # AccountBalance tuples keyed by currency id, returns (cashBalance, nTokenBalance)
+    return {int(b[0]): (int(b[1]), int(b[2])) for b in accountBalances if int(b[0]) != 0}
+
+
+def _getCurrencyBalances(balances, currencyBytes):
+    if currencyBytes & ACTIVE_IN_BALANCES == ACTIVE_IN_BALANCES:
+        return balances.get(currencyBytes & UNMASK_FLAGS, (0, 0))
+
+    return (0, 0)
+
+
+def getSortedPortfolio(portfolio):
+    assets = [
+        [int(a[CURRENCY_ID]), int(a[MATURITY]), int(a[ASSET_TYPE]), int(a[NOTIONAL])]
+        for a in portfolio
+    ]
+    assets.sort(key=lambda a: (a[CURRENCY_ID], a[MATURITY], a[ASSET_TYPE]))
+
+    return assets
+
+
+def getNTokenHaircutAssetPV(snapshot, cashGroup, tokenBalance):
+    """
+    Returns the haircut asset value of an nToken balance and the nToken parameters. The nToken
+    asset present value is read from the snapshot, it is the same for every account.
+    """
+    nToken = snapshot.getNToken(cashGroup[0])
+    parameters = nToken[NTOKEN_PARAMETERS]
+    nTokenHaircutAssetPV = div(
+        div(
+            checked(
+                tokenBalance
+                * nToken[NTOKEN_ASSET_PV]
+                * getNTokenParameter(parameters, PV_HAIRCUT_PERCENTAGE)
+            ),
+            PERCENTAGE_DECIMALS,
+        ),
+        nToken[NTOKEN_TOTAL_SUPPLY],
+    )
+
+    return (nTokenHaircutAssetPV, parameters)
+
+
+def _getPortfolioAndNTokenAssetValue(
+    snapshot, portfolio, portfolioIndex, cashGroup, nTokenBalance, blockTime
+):
+    """
+    Returns (netPortfolioValue, nTokenHaircutAssetValue, nTokenParameters, portfolioIndex)
+    where portfolioIndex is advanced past the assets in the cash group.
+    """
+    if portfolioIndex < len(portfolio) and portfolio[portfolioIndex][CURRENCY_ID] == cashGroup[0]:
+        (netPortfolioValue, portfolioIndex) = getNetCashGroupValue(
+            portfolio, cashGroup, snapshot, blockTime, portfolioIndex
+        )
+    else:
+        netPortfolioValue = 0
+
+    if nTokenBalance > 0:
+        (nTokenHaircutAssetValue, nTokenParameters) = getNTokenHaircutAssetPV(
+            snapshot, cashGroup, nTokenBalance
+        )
+    else:
+        (nTokenHaircutAssetValue, nTokenParameters) = (0, 0)
+
+    return (netPortfolioValue, nTokenHaircutAssetValue, nTokenParameters, portfolioIndex)
+
+
+def getBitmapPortfolioValue(snapshot, cashGroup, portfolio, blockTime):
+    """
+    Returns the risk adjusted asset value of the ifCash assets in a bitmap portfolio and whether
+    any of them are debts. Matured assets are valued at their notional.
+    """
+    netPortfolioValueUnderlying = 0
+    hasDebt = False
+    for asset in portfolio:
+        (maturity, notional) = (int(asset[MATURITY]), int(asset[NOTIONAL]))
+        if maturity <= blockTime:
+            pv = notional
+        else:
+            oracleRate = snapshot.calculateOracleRate(cashGroup, maturity, blockTime)
+            pv = getRiskAdjustedPresentfCashValue(
+                cashGroup, notional, maturity, blockTime, oracleRate
+            )
+
+        netPortfolioValueUnderlying = checked(netPortfolioValueUnderlying + pv)
+        if pv < 0:
+            hasDebt = True
+
+    return (convertFromUnderlying(cashGroup[2], netPortfolioValueUnderlying), hasDebt)
+
+
+def _convertToETH(ethRate, assetRate, netLocalAssetValue):
+    return convertToETH(ethRate, convertToUnderlying(assetRate, netLocalAssetValue))
+
+
+def _getCurrencyValues(snapshot, account, blockTime):
+    """
+    Walks the account once in the same order as FreeCollateral.sol and returns
+    (netETHValue, bitmapCurrencyId, currencyValues). Each currency value is a tuple of
+    (currencyId, netLocalAssetValue, nTokenHaircutAssetValue, nTokenParameters, cashGroup,
+    assetRate, ethRate) where cashGroup is None if the contract would not have loaded it.
+    """
+    (accountContext, accountBalances, portfolio) = account
+    balances = getBalances(accountBalances)
+    bitmapCurrencyId = int(accountContext[BITMAP_CURRENCY_ID])
+    netETHValue = 0
+    currencyValues = []
+
+    if bitmapCurrencyId != 0:
+        cashGroup = snapshot.getCashGroup(bitmapCurrencyId)
+        (cashBalance, nTokenBalance) = balances.get(bitmapCurrencyId, (0, 0))
+        if nTokenBalance > 0:
+            (nTokenHaircutAssetValue, nTokenParameters) = getNTokenHaircutAssetPV(
+                snapshot, cashGroup, nTokenBalance
+            )
+        else:
+            (nTokenHaircutAssetValue, nTokenParameters) = (0, 0)
+
+        (portfolioAssetValue, _) = getBitmapPortfolioValue(
+            snapshot, cashGroup, portfolio, blockTime
+        )
+        netLocalAssetValue = checked(cashBalance + nTokenHaircutAssetValue + portfolioAssetValue)
+        ethRate = snapshot.getETHRate(bitmapCurrencyId)
+        netETHValue = _convertToETH(ethRate, cashGroup[2], netLocalAssetValue)
+        currencyValues.append(
+            (
+                bitmapCurrencyId,
+                netLocalAssetValue,
+                nTokenHaircutAssetValue,
+                nTokenParameters,
+                cashGroup,
+                cashGroup[2],
+                ethRate,
+            )
+        )
+        portfolio = []
+    else:
+        portfolio = getSortedPortfolio(portfolio)
+
+    portfolioIndex = 0
+    for (currencyId, currencyBytes) in getActiveCurrencies(accountContext):
+        require(currencyId != bitmapCurrencyId)
+        (netLocalAssetValue, nTokenBalance) = _getCurrencyBalances(balances, currencyBytes)
+
+        if currencyBytes & ACTIVE_IN_PORTFOLIO == ACTIVE_IN_PORTFOLIO or nTokenBalance > 0:
+            cashGroup = snapshot.getCashGroup(currencyId)
+            (
+                netPortfolioValue,
+                nTokenHaircutAssetValue,
+                nTokenParameters,
+                portfolioIndex,
+            ) = _getPortfolioAndNTokenAssetValue(
+                snapshot, portfolio, portfolioIndex, cashGroup, nTokenBalance, blockTime
+            )
+            netLocalAssetValue = checked(
+                netLocalAssetValue + netPortfolioValue + nTokenHaircutAssetValue
+            )
+            assetRate = cashGroup[2]
+        else:
+            (cashGroup, nTokenHaircutAssetValue, nTokenParameters) = (None, 0, 0)
+            assetRate = snapshot.getAssetRate(currencyId)
+
+        ethRate = snapshot.getETHRate(currencyId)
+        netETHValue = checked(netETHValue + _convertToETH(ethRate, assetRate, netLocalAssetValue))
+        currencyValues.append(
+            (
+                currencyId,
+                netLocalAssetValue,
+                nTokenHaircutAssetValue,
+                nTokenParameters,
+                cashGroup,
+                assetRate,
+                ethRate,
+            )
+        )
+
+    return (netETHValue, bitmapCurrencyId, currencyValues)
+
+
+def getFreeCollateralView(snapshot, account, blockTime):
+    """
+    Mirrors FreeCollateral.getFreeCollateralView, returning (netETHValue, netLocalAssetValues).
+    account is an (accountContext, accountBalances, portfolio) tuple. Raises Revert where the
+    contract would revert.
+    """
+    (netETHValue, _, currencyValues) = _getCurrencyValues(snapshot, account, blockTime)
+    netLocalAssetValues = [v[1] for v in currencyValues]
+
+    require(len(netLocalAssetValues) <= MAX_NET_LOCAL_VALUES, "dev: index out of bounds")
+    netLocalAssetValues += [0] * (MAX_NET_LOCAL_VALUES - len(netLocalAssetValues))
+
+    return (netETHValue, netLocalAssetValues)
+
+
+def _buildLiquidationFactors(
+    netETHValue, bitmapCurrencyId, currencyValues, localCurrencyId, collateralCurrencyId, address
+):
+    localAssetAvailable = 0
+    collateralAssetAvailable = 0
+    nTokenHaircutAssetValue = 0
+    nTokenParameters = 0
+    localETHRate = EMPTY_ETH_RATE
+    collateralETHRate = EMPTY_ETH_RATE
+    localAssetRate = EMPTY_ASSET_RATE
+    collateralCashGroup = EMPTY_CASH_GROUP
+
+    for (i, values) in enumerate(currencyValues):
+        (currencyId, netLocal, nTokenValue, parameters, cashGroup, assetRate, ethRate) = values
+
+        if i == 0 and bitmapCurrencyId != 0:
+            # The bitmap currency can only ever be the local currency
+            if currencyId == localCurrencyId:
+                (localAssetAvailable, localETHRate, localAssetRate) = (netLocal, ethRate, assetRate)
+                if collateralCurrencyId == 0:
+                    collateralCashGroup = cashGroup
+                    (nTokenHaircutAssetValue, nTokenParameters) = (nTokenValue, parameters)
+            continue
+
+        setLiquidationFactors = (
+            currencyId == localCurrencyId and collateralCurrencyId == 0
+        ) or currencyId == collateralCurrencyId
+        if setLiquidationFactors and cashGroup is not None:
+            collateralCashGroup = cashGroup
+            (nTokenHaircutAssetValue, nTokenParameters) = (nTokenValue, parameters)
+
+        if currencyId == collateralCurrencyId:
+            # The asset rate is set even if the cash group was not loaded
+            collateralCashGroup = collateralCashGroup[:2] + (assetRate,) + collateralCashGroup[3:]
+            (collateralAssetAvailable, collateralETHRate) = (netLocal, ethRate)
+        elif currencyId == localCurrencyId:
+            (localAssetAvailable, localETHRate, localAssetRate) = (netLocal, ethRate, assetRate)
+
+    require(netETHValue < 0, "Sufficient collateral")
+
+    return (
+        address,
+        netETHValue,
+        localAssetAvailable,
+        collateralAssetAvailable,
+        nTokenHaircutAssetValue,
+        nTokenParameters,
+        localETHRate,
+        collateralETHRate,
+        localAssetRate,
+        collateralCashGroup,
+        False,
+    )
+
+
+def getLiquidationFactors(
+    snapshot, account, blockTime, localCurrencyId, collateralCurrencyId, address=ZERO_ADDRESS
+):
+    """
+    Mirrors FreeCollateral.getLiquidationFactors, returning a LiquidationFactors tuple. Fields
+    that the contract leaves unset are zero valued. Raises Revert("Sufficient collateral") if
+    the account cannot be liquidated.
+    """
+    (netETHValue, bitmapCurrencyId, currencyValues) = _getCurrencyValues(
+        snapshot, account, blockTime
+    )
+
+    return _buildLiquidationFactors(
+        netETHValue,
+        bitmapCurrencyId,
+        currencyValues,
+        localCurrencyId,
+        collateralCurrencyId,
+        address,
+    )
+
+
+def getAllLiquidationFactors(snapshot, account, blockTime, address=ZERO_ADDRESS):
+    """
+    Returns the liquidation factors of every (localCurrencyId, collateralCurrencyId) pair that
+    can be liquidated, keyed by the pair. A collateral currency id of zero is used for local
+    currency and local fCash liquidation. The account is only valued once, an empty dict is
+    returned if the account has sufficient collateral.
+    """
+    (netETHValue, bitmapCurrencyId, currencyValues) = _getCurrencyValues(
+        snapshot, account, blockTime
+    )
+    if netETHValue >= 0:
+        return {}
+
+    currencyIds = [v[0] for v in currencyValues]
+    factors = {}
+    for localCurrencyId in currencyIds:
+        for collateralCurrencyId in [0] + currencyIds:
+            if collateralCurrencyId == localCurrencyId:
+                continue
+
+            factors[(localCurrencyId, collateralCurrencyId)] = _buildLiquidationFactors(
+                netETHValue,
+                bitmapCurrencyId,
+                currencyValues,
+                localCurrencyId,
+                collateralCurrencyId,
+                address,
+            )
+
+    return factors
+
+
+def batchGetFreeCollateralView(snapshot, accounts, blockTime):
+    """
+    Values every account against a single snapshot. Oracle rates, loaded markets and discount
+    factors are computed once and shared across accounts. Returns a list of
+    (netETHValue, netLocalAssetValues), None for accounts where the contract would revert.
+    """
+    results = []
+    for account in accounts:
+        try:
+            results.append(getFreeCollateralView(snapshot, account, int(blockTime)))
+        except Revert:
+            results.append(None)
+
+    return results
@@ -0,0 +1,208 @@
+# Mirrors the NOTE incentive calculations in contracts/internal/balances/Incentives.sol,
+# contracts/internal/nToken/nTokenSupply.sol and contracts/external/MigrateIncentives.sol.
+# Supply factors are the (totalSupply, accumulatedNOTEPerNToken, lastAccumulatedTime) tuples
+# returned by getStoredNTokenSupplyFactors, migration values are the deprecated
+# (finalEmissionRatePerYear, finalTotalIntegralSupply, finalMigrationTime) storage values.
+from scripts.offchain.constants import (
+    INCENTIVE_ACCUMULATION_PRECISION,
+    INTERNAL_TOKEN_PRECISION,
+    YEAR,
+)
+from scripts.offchain.safe_int import require
+from scripts.offchain.vector import broadcast, toInts
+
+UINT96_MAX = 2 ** 96 - 1
+UINT128_MAX = 2 ** 128 - 1
+UINT32_MAX = 2 ** 32 - 1
+
+# Supply factor tuple indexes
+TOTAL_SUPPLY = 0
+ACCUMULATED_NOTE_PER_NTOKEN = 1
+LAST_ACCUMULATED_TIME = 2
+
+# Migration tuple indexes
+FINAL_EMISSION_RATE_PER_YEAR = 0
+FINAL_TOTAL_INTEGRAL_SUPPLY = 1
+FINAL_MIGRATION_TIME = 2
+
+
+def _calculateAdditionalNOTE(emissionRatePerYear, timeSinceLastAccumulation, totalSupply):
+    return (
+        (timeSinceLastAccumulation * INCENTIVE_ACCUMULATION_PRECISION * emissionRatePerYear)
+        // YEAR
+        // totalSupply
+    )
+
+
+def getUpdatedAccumulatedNOTEPerNToken(supplyFactors, emissionRatePerYear, blockTime):
+    """
+    Mirrors nTokenSupply.getUpdatedAccumulatedNOTEPerNToken, emissionRatePerYear is denominated
+    in whole tokens as it is stored in the nToken context.
+    """
+    (totalSupply, accumulatedNOTEPerNToken, lastAccumulatedTime) = toInts(supplyFactors)
+
+    if blockTime > lastAccumulatedTime and lastAccumulatedTime > 0 and totalSupply > 0:
+        accumulatedNOTEPerNToken += _calculateAdditionalNOTE(
+            emissionRatePerYear * INTERNAL_TOKEN_PRECISION,
+            blockTime - lastAccumulatedTime,
+            totalSupply,
+        )
+        require(accumulatedNOTEPerNToken < UINT128_MAX, "dev: accumulated NOTE overflow")
+
+    return (totalSupply, accumulatedNOTEPerNToken, lastAccumulatedTime)
+
+
+def changeNTokenSupply(supplyFactors, emissionRatePerYear, netChange, blockTime):
+    """
+    Mirrors nTokenSupply.changeNTokenSupply, returning the new supply factors. The accumulated
+    NOTE per nToken up to the block time is the ACCUMULATED_NOTE_PER_NTOKEN of the result.
+    """
+    (totalSupply, accumulatedNOTEPerNToken, _) = getUpdatedAccumulatedNOTEPerNToken(
+        supplyFactors, emissionRatePerYear, blockTime
+    )
+
+    newTotalSupply = totalSupply + netChange
+    require(0 <= newTotalSupply < UINT96_MAX, "dev: nToken supply overflow")
+    require(blockTime < UINT32_MAX, "dev: block time overflow")
+
+    return (newTotalSupply, accumulatedNOTEPerNToken, blockTime)
+
+
+def migrateAccountFromPreviousCalculation(
+    migration, nTokenBalance, lastClaimTime, lastClaimIntegralSupply
+):
+    (finalEmissionRatePerYear, finalTotalIntegralSupply, finalMigrationTime) = toInts(migration)
+
+    # This if statement should never be true but we return 0 just in case
+    if lastClaimTime == 0 or lastClaimTime >= finalMigrationTime:
+        return 0
+
+    timeSinceMigration = finalMigrationTime - lastClaimTime
+    incentiveRate = (
+        timeSinceMigration
+        * INTERNAL_TOKEN_PRECISION
+        * finalEmissionRatePerYear
+        * INTERNAL_TOKEN_PRECISION
+    ) // YEAR
+
+    require(finalTotalIntegralSupply >= lastClaimIntegralSupply, "SafeMath: subtraction overflow")
+    avgTotalSupply = (finalTotalIntegralSupply - lastClaimIntegralSupply) // timeSinceMigration
+    if avgTotalSupply == 0:
+        return 0
+
+    incentivesToClaim = (nTokenBalance * incentiveRate) // avgTotalSupply
+    # incentiveRate has a decimal basis of 1e16 so divide by token precision to reduce to 1e8
+    return incentivesToClaim // INTERNAL_TOKEN_PRECISION
+
+
+def calculateIncentivesToClaim(
+    migration,
+    storedNTokenBalance,
+    lastClaimTime,
+    accountIncentiveDebt,
+    accumulatedNOTEPerNToken,
+    finalNTokenBalance,
+):
+    """
+    Mirrors Incentives.calculateIncentivesToClaim, returning (incentivesToClaim,
+    newAccountIncentiveDebt). When lastClaimTime is set the accountIncentiveDebt is the
+    lastClaimIntegralSupply of the previous calculation and the account is migrated.
+    """
+    incentivesToClaim = 0
+    if lastClaimTime > 0:
+        incentivesToClaim = migrateAccountFromPreviousCalculation(
+            migration, storedNTokenBalance, lastClaimTime, accountIncentiveDebt
+        )
+        accountIncentiveDebt = 0
+
+    accrued = (storedNTokenBalance * accumulatedNOTEPerNToken) // INCENTIVE_ACCUMULATION_PRECISION
+    require(accrued >= accountIncentiveDebt, "SafeMath: subtraction overflow")
+    incentivesToClaim += accrued - accountIncentiveDebt
+
+    newAccountIncentiveDebt = (
+        finalNTokenBalance * accumulatedNOTEPerNToken
+    ) // INCENTIVE_ACCUMULATION_PRECISION
+
+    return (incentivesToClaim, newAccountIncentiveDebt)
+
+
+def getAccumulatedNOTEPerNTokenAtTimes(
+    supplyFactors, emissionRatePerYear, blockTimes, emissionRateChanges=()
+):
+    """
+    Returns the accumulated NOTE per nToken at each block time. emissionRateChanges is a list
+    of (blockTime, newEmissionRatePerYear), each change accumulates up to its block time first
+    the same way as nTokenSupply.setIncentiveEmissionRate.
+    """
+    changes = sorted((int(t), int(r)) for (t, r) in emissionRateChanges)
+    supplyFactors = tuple(toInts(supplyFactors))
+    emissionRatePerYear = int(emissionRatePerYear)
+    results = [0] * len(blockTimes)
+
+    c = 0
+    for (i, blockTime) in sorted(enumerate(toInts(blockTimes)), key=lambda x: x[1]):
+        # Emission rate changes at the same block time take effect before the claim
+        while c < len(changes) and changes[c][0] <= blockTime:
+            supplyFactors = changeNTokenSupply(supplyFactors, emissionRatePerYear, 0, changes[c][0])
+            emissionRatePerYear = changes[c][1]
+            c += 1
+
+        (_, results[i], _) = getUpdatedAccumulatedNOTEPerNToken(
+            supplyFactors, emissionRatePerYear, blockTime
+        )
+
+    return results
+
+
+def batchGetClaimableIncentives(
+    supplyFactors,
+    emissionRatePerYear,
+    migration,
+    nTokenBalances,
+    lastClaimTimes,
+    accountIncentiveDebts,
+    blockTimes,
+    emissionRateChanges=(),
+):
+    """
+    Mirrors CalculationViews.nTokenGetClaimableIncentives for a single nToken over arrays of
+    holders, returning a list for each block time of the incentives claimable by each holder.
+    Holder arrays are broadcast against each other. Amounts migrated from the previous
+    calculation do not depend on the block time so they are calculated once per holder.
+    """
+    (nTokenBalances, lastClaimTimes, accountIncentiveDebts) = broadcast(
+        nTokenBalances, lastClaimTimes, accountIncentiveDebts
+    )
+    holders = []
+    for (balance, lastClaimTime, debt) in zip(
+        nTokenBalances, lastClaimTimes, accountIncentiveDebts
+    ):
+        (balance, lastClaimTime, debt) = (int(balance), int(lastClaimTime), int(debt))
+        migrated = 0
+        if lastClaimTime > 0:
+            migrated = migrateAccountFromPreviousCalculation(
+                migration, balance, lastClaimTime, debt
+            )
+            debt = 0
+        holders.append((balance, migrated, debt))
+
+    accumulated = getAccumulatedNOTEPerNTokenAtTimes(
+        supplyFactors, emissionRatePerYear, blockTimes, emissionRateChanges
+    )
+
+    results = []
+    for accumulatedNOTEPerNToken in accumulated:
+        claimable = []
+        for (balance, migrated, debt) in holders:
+            if balance <= 0:
+                # Only accounts holding nTokens are included in the view
+                claimable.append(0)
+                continue
+
+            (incentivesToClaim, _) = calculateIncentivesToClaim(
+                migration, balance, 0, debt, accumulatedNOTEPerNToken, balance
+            )
+            claimable.append(migrated + incentivesToClaim)
+        results.append(claimable)
+
+    return results
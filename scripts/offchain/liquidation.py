@@ -0,0 +1,568 @@
+# Mirrors the amount calculations in contracts/internal/liquidation and uses them to rank
+# liquidation candidates. Factors are the LiquidationFactors tuples returned by
+# free_collateral.getLiquidationFactors, accounts are (accountContext, accountBalances, portfolio)
+# tuples and all other state is read from a ValuationSnapshot.
+from scripts.offchain.asset_handler import (
+    ASSET_TYPE,
+    CURRENCY_ID,
+    MATURITY,
+    NOTIONAL,
+    getDiscountFactor,
+)
+from scripts.offchain.asset_rate import convertFromUnderlying, convertToUnderlying
+from scripts.offchain.cash_group import (
+    getDebtBuffer,
+    getfCashHaircut,
+    getLiquidationDebtBuffer,
+    getLiquidationfCashHaircut,
+)
+from scripts.offchain.constants import (
+    DEFAULT_LIQUIDATION_PORTION,
+    FCASH_ASSET_TYPE,
+    LIQUIDATION_HAIRCUT_PERCENTAGE,
+    PERCENTAGE_DECIMALS,
+    PV_HAIRCUT_PERCENTAGE,
+)
+from scripts.offchain.exchange_rate import (
+    BUFFER,
+    HAIRCUT,
+    LIQUIDATION_DISCOUNT,
+    RATE,
+    RATE_DECIMALS,
+    convertETHTo,
+    exchangeRate,
+)
+from scripts.offchain.free_collateral import (
+    BITMAP_CURRENCY_ID,
+    COLLATERAL_ASSET_AVAILABLE,
+    COLLATERAL_CASH_GROUP,
+    COLLATERAL_ETH_RATE,
+    LOCAL_ASSET_AVAILABLE,
+    LOCAL_ASSET_RATE,
+    LOCAL_ETH_RATE,
+    NET_ETH_VALUE,
+    NTOKEN_HAIRCUT_ASSET_VALUE,
+    NTOKEN_PARAMETERS_FACTOR,
+    getAllLiquidationFactors,
+    getBalances,
+)
+from scripts.offchain.safe_int import (
+    Revert,
+    checked,
+    div,
+    divInRatePrecision,
+    mulInRatePrecision,
+    require,
+    subNoNeg,
+)
+from scripts.offchain.snapshot import getNTokenParameter
+
+# Liquidation methods, named after the LiquidateCurrencyAction and LiquidatefCashAction methods
+LOCAL_CURRENCY = "liquidateLocalCurrency"
+COLLATERAL_CURRENCY = "liquidateCollateralCurrency"
+FCASH_LOCAL = "liquidatefCashLocal"
+FCASH_CROSS_CURRENCY = "liquidatefCashCrossCurrency"
+
+# Candidate tuple indexes
+CANDIDATE_PROFIT = 0
+CANDIDATE_METHOD = 1
+CANDIDATE_ACCOUNT = 2
+CANDIDATE_LOCAL_CURRENCY = 3
+CANDIDATE_COLLATERAL_CURRENCY = 4
+CANDIDATE_AMOUNTS = 5
+
+
+def calculateLiquidationAmount(liquidateAmountRequired, maxTotalBalance, userSpecifiedMaximum):
+    defaultAllowedAmount = div(
+        checked(maxTotalBalance * DEFAULT_LIQUIDATION_PORTION), PERCENTAGE_DECIMALS
+    )
+
+    result = liquidateAmountRequired
+    if liquidateAmountRequired > maxTotalBalance:
+        result = maxTotalBalance
+
+    if liquidateAmountRequired < defaultAllowedAmount:
+        result = defaultAllowedAmount
+
+    if userSpecifiedMaximum > 0 and result > userSpecifiedMaximum:
+        result = userSpecifiedMaximum
+
+    return result
+
+
+def calculateLocalLiquidationUnderlyingRequired(localAssetAvailable, netETHValue, localETHRate):
+    multiple = localETHRate[HAIRCUT] if localAssetAvailable > 0 else localETHRate[BUFFER]
+    require(multiple > 0, "dev: cannot liquidate haircut asset")
+
+    return div(checked(convertETHTo(localETHRate, -netETHValue) * PERCENTAGE_DECIMALS), multiple)
+
+
+def calculateCrossCurrencyFactors(factors):
+    collateralDenominatedFC = convertFromUnderlying(
+        factors[COLLATERAL_CASH_GROUP][2],
+        convertETHTo(factors[COLLATERAL_ETH_RATE], -factors[NET_ETH_VALUE]),
+    )
+    liquidationDiscount = max(
+        factors[COLLATERAL_ETH_RATE][LIQUIDATION_DISCOUNT],
+        factors[LOCAL_ETH_RATE][LIQUIDATION_DISCOUNT],
+    )
+
+    return (collateralDenominatedFC, liquidationDiscount)
+
+
+def calculateLocalToPurchase(
+    factors, liquidationDiscount, collateralUnderlyingPresentValue, collateralBalanceToSell
+):
+    localUnderlyingFromLiquidator = div(
+        div(
+            checked(
+                collateralUnderlyingPresentValue
+                * PERCENTAGE_DECIMALS
+                * factors[LOCAL_ETH_RATE][RATE_DECIMALS]
+            ),
+            exchangeRate(factors[LOCAL_ETH_RATE], factors[COLLATERAL_ETH_RATE]),
+        ),
+        liquidationDiscount,
+    )
+
+    localAssetFromLiquidator = convertFromUnderlying(
+        factors[LOCAL_ASSET_RATE], localUnderlyingFromLiquidator
+    )
+    maxLocalAsset = -factors[LOCAL_ASSET_AVAILABLE]
+
+    if localAssetFromLiquidator > maxLocalAsset:
+        collateralBalanceToSell = div(
+            checked(collateralBalanceToSell * maxLocalAsset), localAssetFromLiquidator
+        )
+        localAssetFromLiquidator = maxLocalAsset
+
+    return (collateralBalanceToSell, localAssetFromLiquidator)
+
+
+def getETHValue(ethRate, underlying):
+    # Converts underlying to ETH at the exchange rate, without any haircut or buffer
+    return div(checked(underlying * ethRate[RATE]), ethRate[RATE_DECIMALS])
+
+
+def _getAssetETHValue(assetRate, ethRate, assetCash):
+    return getETHValue(ethRate, convertToUnderlying(assetRate, assetCash))
+
+
+def _getNTokenHaircuts(factors):
+    parameters = factors[NTOKEN_PARAMETERS_FACTOR]
+    return (
+        getNTokenParameter(parameters, LIQUIDATION_HAIRCUT_PERCENTAGE),
+        getNTokenParameter(parameters, PV_HAIRCUT_PERCENTAGE),
+    )
+
+
+def _getNTokenPresentValue(factors, nTokens, nTokenBalance):
+    # The nToken asset PV without the PV haircut applied
+    (_, pvHaircut) = _getNTokenHaircuts(factors)
+    return div(
+        div(
+            checked(nTokens * factors[NTOKEN_HAIRCUT_ASSET_VALUE] * PERCENTAGE_DECIMALS), pvHaircut
+        ),
+        nTokenBalance,
+    )
+
+
+def calculatefCashDiscounts(snapshot, cashGroup, maturity, blockTime, isNotionalPositive):
+    """
+    Returns (riskAdjustedDiscountFactor, liquidationDiscountFactor, oracleDiscountFactor). The
+    oracle discount factor is the unhaircut value of the fCash to the liquidator.
+    """
+    oracleRate = snapshot.calculateOracleRate(cashGroup, maturity, blockTime)
+    require(maturity >= blockTime, "dev: uint256 sub underflow")
+    timeToMaturity = maturity - blockTime
+
+    if isNotionalPositive:
+        riskAdjusted = getDiscountFactor(timeToMaturity, oracleRate + getfCashHaircut(cashGroup))
+        liquidation = getDiscountFactor(
+            timeToMaturity, oracleRate + getLiquidationfCashHaircut(cashGroup)
+        )
+    else:
+        buffer = getDebtBuffer(cashGroup)
+        riskAdjusted = getDiscountFactor(
+            timeToMaturity, 0 if oracleRate < buffer else oracleRate - buffer
+        )
+        buffer = getLiquidationDebtBuffer(cashGroup)
+        liquidation = getDiscountFactor(
+            timeToMaturity, 0 if oracleRate < buffer else oracleRate - buffer
+        )
+
+    return (riskAdjusted, liquidation, getDiscountFactor(timeToMaturity, oracleRate))
+
+
+def getfCashAssets(account, currencyId):
+    """
+    Returns the (maturity, notional) of the fCash assets in a currency, sorted by descending
+    maturity as the liquidation methods require.
+    """
+    (accountContext, _, portfolio) = account
+    isBitmap = int(accountContext[BITMAP_CURRENCY_ID]) == currencyId
+    fCash = [
+        (int(a[MATURITY]), int(a[NOTIONAL]))
+        for a in portfolio
+        if int(a[CURRENCY_ID]) == currencyId
+        and (isBitmap or int(a[ASSET_TYPE]) == FCASH_ASSET_TYPE)
+        and int(a[NOTIONAL]) != 0
+    ]
+    fCash.sort(reverse=True)
+
+    return fCash
+
+
+def calculateLocalCurrencyLiquidation(factors, nTokenBalance):
+    """
+    Mirrors LiquidateCurrency.liquidateLocalCurrency with no user maximum, returning
+    (profitETH, (nTokensToLiquidate, localAssetCashFromLiquidator)). Liquidity tokens are not
+    withdrawn, the benefit is raised entirely from nTokens.
+    """
+    require(factors[LOCAL_ASSET_AVAILABLE] != 0)
+    require(factors[NTOKEN_HAIRCUT_ASSET_VALUE] > 0, "dev: no nTokens to liquidate")
+    assetBenefitRequired = convertFromUnderlying(
+        factors[LOCAL_ASSET_RATE],
+        calculateLocalLiquidationUnderlyingRequired(
+            factors[LOCAL_ASSET_AVAILABLE], factors[NET_ETH_VALUE], factors[LOCAL_ETH_RATE]
+        ),
+    )
+
+    (liquidationHaircut, pvHaircut) = _getNTokenHaircuts(factors)
+    require(liquidationHaircut > pvHaircut, "dev: haircut percentage underflow")
+    nTokensToLiquidate = div(
+        checked(assetBenefitRequired * nTokenBalance * pvHaircut),
+        checked(factors[NTOKEN_HAIRCUT_ASSET_VALUE] * (liquidationHaircut - pvHaircut)),
+    )
+    nTokensToLiquidate = calculateLiquidationAmount(nTokensToLiquidate, nTokenBalance, 0)
+
+    localAssetCash = div(
+        div(
+            checked(nTokensToLiquidate * liquidationHaircut * factors[NTOKEN_HAIRCUT_ASSET_VALUE]),
+            pvHaircut,
+        ),
+        nTokenBalance,
+    )
+    profit = _getAssetETHValue(
+        factors[LOCAL_ASSET_RATE],
+        factors[LOCAL_ETH_RATE],
+        _getNTokenPresentValue(factors, nTokensToLiquidate, nTokenBalance) - localAssetCash,
+    )
+
+    return (profit, (nTokensToLiquidate, localAssetCash))
+
+
+def calculateCollateralToRaise(factors, maxCollateralLiquidation):
+    """
+    Mirrors LiquidateCurrency._calculateCollateralToRaise, returning
+    (requiredCollateralAssetCash, localAssetCashFromLiquidator, liquidationDiscount)
+    """
+    (collateralDenominatedFC, liquidationDiscount) = calculateCrossCurrencyFactors(factors)
+    denominator = (
+        div(factors[LOCAL_ETH_RATE][BUFFER] * PERCENTAGE_DECIMALS, liquidationDiscount)
+        - factors[COLLATERAL_ETH_RATE][HAIRCUT]
+    )
+    requiredCollateralAssetCash = div(
+        checked(collateralDenominatedFC * PERCENTAGE_DECIMALS), denominator
+    )
+    requiredCollateralAssetCash = calculateLiquidationAmount(
+        requiredCollateralAssetCash,
+        factors[COLLATERAL_ASSET_AVAILABLE],
+        maxCollateralLiquidation,
+    )
+
+    (requiredCollateralAssetCash, localAssetCashFromLiquidator) = calculateLocalToPurchase(
+        factors,
+        liquidationDiscount,
+        convertToUnderlying(factors[COLLATERAL_CASH_GROUP][2], requiredCollateralAssetCash),
+        requiredCollateralAssetCash,
+    )
+
+    return (requiredCollateralAssetCash, localAssetCashFromLiquidator, liquidationDiscount)
+
+
+def calculateCollateralCurrencyLiquidation(factors, cashBalance, nTokenBalance):
+    """
+    Mirrors LiquidateCurrency.liquidateCollateralCurrency with no user maximums, returning
+    (profitETH, (collateralAssetCash, nTokensToLiquidate, localAssetCashFromLiquidator)).
+    Collateral is raised from the cash balance and then nTokens, liquidity tokens are not
+    withdrawn.
+    """
+    require(factors[LOCAL_ASSET_AVAILABLE] < 0, "No local debt")
+    require(factors[COLLATERAL_ASSET_AVAILABLE] > 0, "No collateral")
+    (required, localAssetCashFromLiquidator, liquidationDiscount) = calculateCollateralToRaise(
+        factors, 0
+    )
+
+    collateralAssetCash = min(max(cashBalance, 0), required)
+    remaining = required - collateralAssetCash
+    nTokensToLiquidate = 0
+    if remaining > 0 and factors[NTOKEN_HAIRCUT_ASSET_VALUE] > 0:
+        (liquidationHaircut, pvHaircut) = _getNTokenHaircuts(factors)
+        nTokensToLiquidate = div(
+            checked(remaining * nTokenBalance * pvHaircut),
+            checked(factors[NTOKEN_HAIRCUT_ASSET_VALUE] * liquidationHaircut),
+        )
+        nTokensToLiquidate = min(nTokensToLiquidate, nTokenBalance)
+        remaining = subNoNeg(
+            remaining,
+            div(
+                div(
+                    checked(
+                        nTokensToLiquidate
+                        * factors[NTOKEN_HAIRCUT_ASSET_VALUE]
+                        * liquidationHaircut
+                    ),
+                    pvHaircut,
+                ),
+                nTokenBalance,
+            ),
+        )
+
+    if remaining > 0:
+        actualCollateralAssetSold = required - remaining
+        (_, localAssetCashFromLiquidator) = calculateLocalToPurchase(
+            factors,
+            liquidationDiscount,
+            convertToUnderlying(factors[COLLATERAL_CASH_GROUP][2], actualCollateralAssetSold),
+            actualCollateralAssetSold,
+        )
+
+    collateralReceived = collateralAssetCash
+    if nTokensToLiquidate > 0:
+        collateralReceived += _getNTokenPresentValue(factors, nTokensToLiquidate, nTokenBalance)
+
+    profit = _getAssetETHValue(
+        factors[COLLATERAL_CASH_GROUP][2], factors[COLLATERAL_ETH_RATE], collateralReceived
+    ) - _getAssetETHValue(
+        factors[LOCAL_ASSET_RATE], factors[LOCAL_ETH_RATE], localAssetCashFromLiquidator
+    )
+
+    return (profit, (collateralAssetCash, nTokensToLiquidate, localAssetCashFromLiquidator))
+
+
+def calculatefCashLocalLiquidation(snapshot, factors, fCash, cashBalance, blockTime):
+    """
+    Mirrors LiquidatefCash.liquidatefCashLocal with no user maximums over fCash, a list of
+    (maturity, notional) sorted by descending maturity. Returns
+    (profitETH, (maturities, fCashNotionalTransfers, localAssetCashFromLiquidator)).
+    """
+    require(factors[LOCAL_ASSET_AVAILABLE] != 0)
+    cashGroup = factors[COLLATERAL_CASH_GROUP]
+    underlyingBenefitRequired = calculateLocalLiquidationUnderlyingRequired(
+        factors[LOCAL_ASSET_AVAILABLE], factors[NET_ETH_VALUE], factors[LOCAL_ETH_RATE]
+    )
+    localCashBalanceUnderlying = convertToUnderlying(factors[LOCAL_ASSET_RATE], cashBalance)
+    localUnderlyingFromLiquidator = 0
+    profitUnderlying = 0
+    (maturities, transfers) = ([], [])
+
+    for (maturity, notional) in fCash:
+        if notional < 0:
+            require(localCashBalanceUnderlying >= 0, "dev: insufficient cash balance")
+
+        (riskAdjusted, liquidation, oracle) = calculatefCashDiscounts(
+            snapshot, cashGroup, maturity, blockTime, notional > 0
+        )
+        transfer = divInRatePrecision(underlyingBenefitRequired, abs(liquidation - riskAdjusted))
+        transfer = calculateLiquidationAmount(transfer, abs(notional), 0)
+        liquidationValue = mulInRatePrecision(transfer, liquidation)
+
+        if notional < 0:
+            if liquidationValue > localCashBalanceUnderlying:
+                transfer = div(checked(transfer * localCashBalanceUnderlying), liquidationValue)
+                liquidationValue = localCashBalanceUnderlying
+
+            transfer = -transfer
+            liquidationValue = -liquidationValue
+
+        localUnderlyingFromLiquidator = checked(localUnderlyingFromLiquidator + liquidationValue)
+        localCashBalanceUnderlying = checked(localCashBalanceUnderlying + liquidationValue)
+        underlyingBenefitRequired -= abs(mulInRatePrecision(transfer, liquidation - riskAdjusted))
+        # The liquidator buys fCash below its oracle value or borrows above it
+        profitUnderlying += abs(mulInRatePrecision(transfer, oracle - liquidation))
+        maturities.append(maturity)
+        transfers.append(transfer)
+
+        if underlyingBenefitRequired <= 0:
+            break
+
+    localAssetCashFromLiquidator = convertFromUnderlying(
+        factors[LOCAL_ASSET_RATE], localUnderlyingFromLiquidator
+    )
+    profit = getETHValue(factors[LOCAL_ETH_RATE], profitUnderlying)
+
+    return (profit, (maturities, transfers, localAssetCashFromLiquidator))
+
+
+def calculatefCashCrossCurrencyLiquidation(snapshot, factors, fCash, blockTime):
+    """
+    Mirrors LiquidatefCash.liquidatefCashCrossCurrency with no user maximums over fCash, a list
+    of positive (maturity, notional) sorted by descending maturity. Returns
+    (profitETH, (maturities, fCashNotionalTransfers, localAssetCashFromLiquidator)).
+    """
+    require(factors[LOCAL_ASSET_AVAILABLE] < 0, "dev: no local debt")
+    require(factors[COLLATERAL_ASSET_AVAILABLE] > 0, "dev: no collateral assets")
+    cashGroup = factors[COLLATERAL_CASH_GROUP]
+    collateralAssetRate = cashGroup[2]
+    localAssetAvailable = factors[LOCAL_ASSET_AVAILABLE]
+    collateralAssetAvailable = factors[COLLATERAL_ASSET_AVAILABLE]
+
+    (underlyingBenefitRequired, liquidationDiscount) = calculateCrossCurrencyFactors(factors)
+    underlyingBenefitRequired = convertToUnderlying(collateralAssetRate, underlyingBenefitRequired)
+    localAssetCashFromLiquidator = 0
+    collateralUnderlyingPurchased = 0
+    (maturities, transfers) = ([], [])
+
+    for (maturity, notional) in fCash:
+        require(notional > 0, "dev: invalid fcash asset")
+        (riskAdjusted, liquidation, oracle) = calculatefCashDiscounts(
+            snapshot, cashGroup, maturity, blockTime, True
+        )
+        termTwo = (
+            div(factors[LOCAL_ETH_RATE][BUFFER] * PERCENTAGE_DECIMALS, liquidationDiscount)
+            - factors[COLLATERAL_ETH_RATE][HAIRCUT]
+        )
+        benefitDivisor = (liquidation - riskAdjusted) + div(
+            checked(liquidation * termTwo), PERCENTAGE_DECIMALS
+        )
+
+        fCashToLiquidate = divInRatePrecision(underlyingBenefitRequired, benefitDivisor)
+        fCashToLiquidate = calculateLiquidationAmount(fCashToLiquidate, notional, 0)
+
+        # LiquidatefCash._limitPurchaseByAvailableAmounts
+        liquidationPV = mulInRatePrecision(fCashToLiquidate, liquidation)
+        riskAdjustedPV = mulInRatePrecision(fCashToLiquidate, riskAdjusted)
+        collateralUnderlyingAvailable = convertToUnderlying(
+            collateralAssetRate, collateralAssetAvailable
+        )
+        if riskAdjustedPV > collateralUnderlyingAvailable:
+            fCashToLiquidate = divInRatePrecision(collateralUnderlyingAvailable, riskAdjusted)
+            riskAdjustedPV = collateralUnderlyingAvailable
+            liquidationPV = mulInRatePrecision(fCashToLiquidate, liquidation)
+
+        limitFactors = list(factors)
+        limitFactors[LOCAL_ASSET_AVAILABLE] = localAssetAvailable
+        (fCashToLiquidate, localAssetCash) = calculateLocalToPurchase(
+            limitFactors, liquidationDiscount, liquidationPV, fCashToLiquidate
+        )
+        collateralAssetAvailable = subNoNeg(
+            collateralAssetAvailable, convertFromUnderlying(collateralAssetRate, riskAdjustedPV)
+        )
+        require(localAssetCash >= 0)
+        localAssetAvailable = checked(localAssetAvailable + localAssetCash)
+
+        underlyingBenefitRequired -= mulInRatePrecision(fCashToLiquidate, benefitDivisor)
+        localAssetCashFromLiquidator = checked(localAssetCashFromLiquidator + localAssetCash)
+        collateralUnderlyingPurchased += mulInRatePrecision(fCashToLiquidate, oracle)
+        maturities.append(maturity)
+        transfers.append(fCashToLiquidate)
+
+        if (
+            underlyingBenefitRequired <= 0
+            or collateralAssetAvailable == 0
+            or localAssetAvailable == 0
+        ):
+            break
+
+    profit = getETHValue(
+        factors[COLLATERAL_ETH_RATE], collateralUnderlyingPurchased
+    ) - _getAssetETHValue(
+        factors[LOCAL_ASSET_RATE], factors[LOCAL_ETH_RATE], localAssetCashFromLiquidator
+    )
+
+    return (profit, (maturities, transfers, localAssetCashFromLiquidator))
+
+
+def getLiquidationCandidates(snapshot, address, account, blockTime):
+    """
+    Evaluates every liquidation method over every (local, collateral) currency pair of a single
+    account. Returns a list of (profitETH, method, address, localCurrencyId,
+    collateralCurrencyId, amounts), methods that would revert are omitted.
+    """
+    allFactors = getAllLiquidationFactors(snapshot, account, blockTime, address)
+    if not allFactors:
+        return []
+
+    balances = getBalances(account[1])
+    candidates = []
+    for ((localCurrencyId, collateralCurrencyId), factors) in allFactors.items():
+        if collateralCurrencyId == 0:
+            (cashBalance, nTokenBalance) = balances.get(localCurrencyId, (0, 0))
+            fCash = [f for f in getfCashAssets(account, localCurrencyId) if f[0] > blockTime]
+            results = [
+                (
+                    LOCAL_CURRENCY,
+                    _tryCalculate(calculateLocalCurrencyLiquidation, factors, nTokenBalance),
+                ),
+                (
+                    FCASH_LOCAL,
+                    _tryCalculate(
+                        calculatefCashLocalLiquidation,
+                        snapshot,
+                        factors,
+                        fCash,
+                        cashBalance,
+                        blockTime,
+                    ),
+                ),
+            ]
+        else:
+            (cashBalance, nTokenBalance) = balances.get(collateralCurrencyId, (0, 0))
+            fCash = [
+                f
+                for f in getfCashAssets(account, collateralCurrencyId)
+                if f[0] > blockTime and f[1] > 0
+            ]
+            results = [
+                (
+                    COLLATERAL_CURRENCY,
+                    _tryCalculate(
+                        calculateCollateralCurrencyLiquidation, factors, cashBalance, nTokenBalance
+                    ),
+                ),
+                (
+                    FCASH_CROSS_CURRENCY,
+                    _tryCalculate(
+                        calculatefCashCrossCurrencyLiquidation, snapshot, factors, fCash, blockTime
+                    ),
+                ),
+            ]
+
+        for (method, result) in results:
+            if result is not None:
+                (profit, amounts) = result
+                candidates.append(
+                    (profit, method, address, localCurrencyId, collateralCurrencyId, amounts)
+                )
+
+    return candidates
+
+
+def _tryCalculate(calculate, *args):
+    try:
+        return calculate(*args)
+    except Revert:
+        return None
+
+
+def scanLiquidationCandidates(snapshot, accounts, blockTime, minProfit=1):
+    """
+    Scans accounts, a dict of address to account tuple, and returns every liquidation that
+    yields at least minProfit (in ETH at internal precision), sorted by descending profit.
+    Each account is valued once for all of its currency pairs, oracle rates, loaded markets
+    and discount factors are shared across accounts through the snapshot.
+    """
+    blockTime = int(blockTime)
+    candidates = []
+    for (address, account) in accounts.items():
+        try:
+            accountCandidates = getLiquidationCandidates(snapshot, address, account, blockTime)
+        except Revert:
+            # The account cannot be valued, the contract would revert as well
+            continue
+
+        candidates.extend(c for c in accountCandidates if c[CANDIDATE_PROFIT] >= minProfit)
+
+    candidates.sort(key=lambda c: c[CANDIDATE_PROFIT], reverse=True)
+    return candidates
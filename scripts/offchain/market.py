@@ -0,0 +1,488 @@
+# Port of the liquidity curve in contracts/internal/markets/Market.sol. Markets are the
+# MarketParameters tuples used by the contracts and tests.helpers.get_market_state:
+# (storageSlot, maturity, totalfCash, totalAssetCash, totalLiquidity, lastImpliedRate,
+#  oracleRate, previousTradeTime)
+from functools import lru_cache
+
+import scripts.offchain.abdk_math as abdk
+from scripts.offchain.asset_rate import convertFromUnderlying, convertToUnderlying
+from scripts.offchain.cash_group import getRateScalar, getReserveFeeShare, getTotalFee
+from scripts.offchain.constants import (
+    IMPLIED_RATE_TIME,
+    INTERNAL_TOKEN_PRECISION,
+    LOG_RATE_PRECISION_64x64,
+    MAX_MARKET_PROPORTION,
+    PERCENTAGE_DECIMALS,
+    RATE_PRECISION,
+    RATE_PRECISION_64x64,
+)
+from scripts.offchain.safe_int import (
+    Revert,
+    checked,
+    div,
+    divInRatePrecision,
+    mulInRatePrecision,
+    require,
+    subNoNeg,
+)
+from scripts.offchain.vector import broadcast, isArray
+
+UINT32_MAX = 2 ** 32 - 1
+# Iteration limit in Market.getfCashGivenCashAmount
+MAX_NEWTON_ITERATIONS = 250
+
+TOTAL_FCASH = 2
+TOTAL_ASSET_CASH = 3
+TOTAL_LIQUIDITY = 4
+LAST_IMPLIED_RATE = 5
+ORACLE_RATE = 6
+PREVIOUS_TRADE_TIME = 7
+
+
+@lru_cache(maxsize=4096)
+def getExchangeRateFromImpliedRate(impliedRate, timeToMaturity):
+    expValue = abdk.fromUInt((impliedRate * timeToMaturity) // IMPLIED_RATE_TIME)
+    expValueScaled = abdk.div64x64(expValue, RATE_PRECISION_64x64)
+    expResult = abdk.exp(expValueScaled)
+    expResultScaled = abdk.mul(expResult, RATE_PRECISION_64x64)
+
+    return abdk.toInt(expResultScaled)
+
+
+def logProportion(proportion):
+    if proportion == RATE_PRECISION:
+        return (0, False)
+
+    logitP = divInRatePrecision(proportion, RATE_PRECISION - proportion)
+    abdkProportion = abdk.fromInt(logitP)
+    if abdkProportion <= 0:
+        return (0, False)
+
+    result = abdk.toInt(
+        abdk.mul(abdk.sub(abdk.ln(abdkProportion), LOG_RATE_PRECISION_64x64), RATE_PRECISION_64x64)
+    )
+
+    return (result, True)
+
+
+def getExchangeRate(totalfCash, totalCashUnderlying, rateScalar, rateAnchor, fCashToAccount):
+    numerator = subNoNeg(totalfCash, fCashToAccount)
+    proportion = divInRatePrecision(numerator, totalfCash + totalCashUnderlying)
+    if proportion > MAX_MARKET_PROPORTION:
+        return (0, False)
+
+    (lnProportion, success) = logProportion(proportion)
+    if not success:
+        return (0, False)
+
+    rate = divInRatePrecision(lnProportion, rateScalar) + rateAnchor
+    if rate < RATE_PRECISION:
+        return (0, False)
+
+    return (rate, True)
+
+
+def getRateAnchor(totalfCash, lastImpliedRate, totalCashUnderlying, rateScalar, timeToMaturity):
+    newExchangeRate = getExchangeRateFromImpliedRate(lastImpliedRate, timeToMaturity)
+    if newExchangeRate < RATE_PRECISION:
+        return (0, False)
+
+    proportion = divInRatePrecision(totalfCash, totalfCash + totalCashUnderlying)
+    (lnProportion, success) = logProportion(proportion)
+    if not success:
+        return (0, False)
+
+    return (newExchangeRate - divInRatePrecision(lnProportion, rateScalar), True)
+
+
+def getImpliedRate(totalfCash, totalCashUnderlying, rateScalar, rateAnchor, timeToMaturity):
+    (exchangeRate, success) = getExchangeRate(
+        totalfCash, totalCashUnderlying, rateScalar, rateAnchor, 0
+    )
+    if not success:
+        return 0
+
+    rate = abdk.fromInt(exchangeRate)
+    rateScaled = abdk.div64x64(rate, RATE_PRECISION_64x64)
+    lnRateScaled = abdk.ln(rateScaled)
+    lnRate = abdk.toUInt(abdk.mul(lnRateScaled, RATE_PRECISION_64x64))
+
+    impliedRate = (lnRate * IMPLIED_RATE_TIME) // timeToMaturity
+    if impliedRate > UINT32_MAX:
+        return 0
+
+    return impliedRate
+
+
+def getExchangeRateFactors(market, cashGroup, timeToMaturity, marketIndex):
+    rateScalar = getRateScalar(cashGroup, marketIndex, timeToMaturity)
+    totalCashUnderlying = convertToUnderlying(cashGroup[2], int(market[TOTAL_ASSET_CASH]))
+    totalfCash = int(market[TOTAL_FCASH])
+
+    if totalfCash == 0 or totalCashUnderlying == 0:
+        return (0, 0, 0)
+
+    (rateAnchor, success) = getRateAnchor(
+        totalfCash, int(market[LAST_IMPLIED_RATE]), totalCashUnderlying, rateScalar, timeToMaturity
+    )
+    if not success:
+        return (0, 0, 0)
+
+    return (rateScalar, totalCashUnderlying, rateAnchor)
+
+
+def _getNetCashAmountsUnderlying(cashGroup, preFeeExchangeRate, fCashToAccount, timeToMaturity):
+    preFeeCashToAccount = -divInRatePrecision(fCashToAccount, preFeeExchangeRate)
+    fee = getExchangeRateFromImpliedRate(getTotalFee(cashGroup), timeToMaturity)
+
+    if fCashToAccount > 0:
+        # Lending
+        postFeeExchangeRate = divInRatePrecision(preFeeExchangeRate, fee)
+        if postFeeExchangeRate < RATE_PRECISION:
+            return (0, 0, 0)
+
+        fee = mulInRatePrecision(preFeeCashToAccount, RATE_PRECISION - fee)
+    else:
+        # Borrowing
+        fee = -div(preFeeCashToAccount * (RATE_PRECISION - fee), fee)
+
+    cashToReserve = div(fee * getReserveFeeShare(cashGroup), PERCENTAGE_DECIMALS)
+
+    return (
+        preFeeCashToAccount - fee,
+        -(preFeeCashToAccount - fee + cashToReserve),
+        cashToReserve,
+    )
+
+
+def _setNewMarketState(
+    market, assetRate, netCashToAccount, netCashToMarket, netCashToReserve, blockTime
+):
+    market[TOTAL_ASSET_CASH] = int(market[TOTAL_ASSET_CASH]) + convertFromUnderlying(
+        assetRate, netCashToMarket
+    )
+    if blockTime is not None:
+        market[PREVIOUS_TRADE_TIME] = blockTime
+
+    assetCashToReserve = convertFromUnderlying(assetRate, netCashToReserve)
+    netAssetCashToAccount = convertFromUnderlying(assetRate, netCashToAccount)
+    return (netAssetCashToAccount, assetCashToReserve)
+
+
+def _calculateTrade(market, cashGroup, fCashToAccount, timeToMaturity, factors, blockTime):
+    # Updates market in place, the same way the contract updates the market in memory
+    (rateScalar, totalCashUnderlying, rateAnchor) = factors
+    (preFeeExchangeRate, success) = getExchangeRate(
+        int(market[TOTAL_FCASH]), totalCashUnderlying, rateScalar, rateAnchor, fCashToAccount
+    )
+    if not success:
+        return (0, 0)
+
+    (netCashToAccount, netCashToMarket, netCashToReserve) = _getNetCashAmountsUnderlying(
+        cashGroup, preFeeExchangeRate, fCashToAccount, timeToMaturity
+    )
+    if netCashToAccount == 0:
+        return (0, 0)
+
+    market[TOTAL_FCASH] = subNoNeg(int(market[TOTAL_FCASH]), fCashToAccount)
+    market[LAST_IMPLIED_RATE] = getImpliedRate(
+        market[TOTAL_FCASH],
+        totalCashUnderlying + netCashToMarket,
+        rateScalar,
+        rateAnchor,
+        timeToMaturity,
+    )
+    if market[LAST_IMPLIED_RATE] == 0:
+        return (0, 0)
+
+    return _setNewMarketState(
+        market, cashGroup[2], netCashToAccount, netCashToMarket, netCashToReserve, blockTime
+    )
+
+
+def calculateTrade(market, cashGroup, fCashToAccount, timeToMaturity, marketIndex, blockTime=None):
+    """
+    Mirrors MockMarket.calculateTrade, returning (newMarket, netAssetCash, assetCashToReserve).
+    previousTradeTime is only updated when a blockTime is given. Raises Revert where the
+    contract would revert.
+    """
+    newMarket = list(market)
+    fCashToAccount = int(fCashToAccount)
+    timeToMaturity = int(timeToMaturity)
+    if newMarket[TOTAL_FCASH] <= fCashToAccount:
+        return (tuple(newMarket), 0, 0)
+
+    factors = getExchangeRateFactors(market, cashGroup, timeToMaturity, int(marketIndex))
+    (assetCash, fee) = _calculateTrade(
+        newMarket, cashGroup, fCashToAccount, timeToMaturity, factors, blockTime
+    )
+
+    return (tuple(newMarket), assetCash, fee)
+
+
+def removeLiquidity(market, tokensToRemove):
+    """
+    Mirrors Market.removeLiquidity, returning (newMarket, assetCash, fCash) for the liquidity
+    tokens removed from the market.
+    """
+    tokensToRemove = int(tokensToRemove)
+    if tokensToRemove == 0:
+        return (tuple(market), 0, 0)
+    require(tokensToRemove > 0, "dev: negative tokens to remove")
+
+    newMarket = [int(v) if i > 0 else v for (i, v) in enumerate(market)]
+    assetCash = div(
+        checked(newMarket[TOTAL_ASSET_CASH] * tokensToRemove), newMarket[TOTAL_LIQUIDITY]
+    )
+    fCash = div(checked(newMarket[TOTAL_FCASH] * tokensToRemove), newMarket[TOTAL_LIQUIDITY])
+
+    newMarket[TOTAL_LIQUIDITY] = subNoNeg(newMarket[TOTAL_LIQUIDITY], tokensToRemove)
+    newMarket[TOTAL_FCASH] = subNoNeg(newMarket[TOTAL_FCASH], fCash)
+    newMarket[TOTAL_ASSET_CASH] = subNoNeg(newMarket[TOTAL_ASSET_CASH], assetCash)
+
+    return (tuple(newMarket), assetCash, fCash)
+
+
+def updateRateOracle(
+    previousTradeTime, lastImpliedRate, oracleRate, rateOracleTimeWindow, blockTime
+):
+    require(rateOracleTimeWindow > 0, "dev: update rate oracle, time window zero")
+    # This can occur when using a view function get to a market state in the past
+    if previousTradeTime > blockTime:
+        return lastImpliedRate
+
+    timeDiff = blockTime - previousTradeTime
+    if timeDiff > rateOracleTimeWindow:
+        return lastImpliedRate
+
+    lastTradeWeight = (timeDiff * RATE_PRECISION) // rateOracleTimeWindow
+    oracleWeight = RATE_PRECISION - lastTradeWeight
+
+    return (lastImpliedRate * lastTradeWeight + oracleRate * oracleWeight) // RATE_PRECISION
+
+
+def getOracleRate(market, rateOracleTimeWindow, blockTime):
+    # Market.getOracleRate, market is the stored market for the current settlement date
+    require(int(market[ORACLE_RATE]) > 0, "Market not initialized")
+
+    return updateRateOracle(
+        int(market[PREVIOUS_TRADE_TIME]),
+        int(market[LAST_IMPLIED_RATE]),
+        int(market[ORACLE_RATE]),
+        rateOracleTimeWindow,
+        blockTime,
+    )
+
+
+def loadMarket(market, rateOracleTimeWindow, blockTime):
+    # Market.loadMarket with needsLiquidity set, market is the stored market
+    newMarket = [int(v) if i > 0 else v for (i, v) in enumerate(market)]
+    newMarket[ORACLE_RATE] = updateRateOracle(
+        newMarket[PREVIOUS_TRADE_TIME],
+        newMarket[LAST_IMPLIED_RATE],
+        newMarket[ORACLE_RATE],
+        rateOracleTimeWindow,
+        blockTime,
+    )
+
+    return tuple(newMarket)
+
+
+def _isMarket(value):
+    return isArray(value) and len(value) == 8 and not isArray(value[1])
+
+
+def batchCalculateTrade(
+    markets, cashGroup, fCashAmounts, timeToMaturities, marketIndexes, blockTime=None
+):
+    """
+    Evaluates calculateTrade element wise over arrays of markets, fCash amounts, times to
+    maturity and market indexes. Any argument may also be a single value which is applied
+    to every trade. Returns a list of (newMarket, netAssetCash, assetCashToReserve) tuples
+    where a trade that would revert is reported as None.
+    """
+    if _isMarket(markets):
+        markets = [markets]
+    (markets, fCashAmounts, timeToMaturities, marketIndexes) = broadcast(
+        markets, fCashAmounts, timeToMaturities, marketIndexes
+    )
+
+    # Rate factors only depend on the market, time to maturity and market index so they are
+    # shared across every trade against the same market
+    factorCache = {}
+    results = []
+    for (market, fCash, timeToMaturity, marketIndex) in zip(
+        markets, fCashAmounts, timeToMaturities, marketIndexes
+    ):
+        if int(market[TOTAL_FCASH]) <= int(fCash):
+            results.append((tuple(market), 0, 0))
+            continue
+
+        try:
+            key = (
+                int(market[TOTAL_FCASH]),
+                int(market[TOTAL_ASSET_CASH]),
+                int(market[LAST_IMPLIED_RATE]),
+                int(timeToMaturity),
+                int(marketIndex),
+            )
+            if key not in factorCache:
+                factorCache[key] = getExchangeRateFactors(
+                    market, cashGroup, int(timeToMaturity), int(marketIndex)
+                )
+
+            newMarket = list(market)
+            (assetCash, fee) = _calculateTrade(
+                newMarket, cashGroup, int(fCash), int(timeToMaturity), factorCache[key], blockTime
+            )
+            results.append((tuple(newMarket), assetCash, fee))
+        except Revert:
+            results.append(None)
+
+    return results
+
+
+def _calculateDelta(
+    cashAmount, totalfCash, totalCashUnderlying, rateScalar, fCashGuess, exchangeRate, feeRate
+):
+    # f(fCash) / f'(fCash), see Market._calculateDelta
+    denominator = mulInRatePrecision(
+        rateScalar, (totalfCash - fCashGuess) * (totalCashUnderlying + fCashGuess)
+    )
+
+    if fCashGuess > 0:
+        # Lending
+        exchangeRate = divInRatePrecision(exchangeRate, feeRate)
+        require(exchangeRate >= RATE_PRECISION, "dev: rate underflow")
+        derivative = divInRatePrecision(cashAmount * (totalfCash + totalCashUnderlying), feeRate)
+    else:
+        # Borrowing
+        exchangeRate = mulInRatePrecision(exchangeRate, feeRate)
+        require(exchangeRate >= RATE_PRECISION, "dev: rate underflow")
+        derivative = mulInRatePrecision(cashAmount, feeRate * (totalfCash + totalCashUnderlying))
+
+    derivative = INTERNAL_TOKEN_PRECISION - div(derivative, denominator)
+    numerator = mulInRatePrecision(cashAmount, exchangeRate) + fCashGuess
+
+    return div(numerator * INTERNAL_TOKEN_PRECISION, derivative)
+
+
+def _newtonStep(
+    totalfCash, netCashToAccount, totalCashUnderlying, rateScalar, rateAnchor, feeRate, guess
+):
+    (exchangeRate, success) = getExchangeRate(
+        totalfCash, totalCashUnderlying, rateScalar, rateAnchor, guess
+    )
+    require(success, "dev: invalid exchange rate")
+
+    return _calculateDelta(
+        netCashToAccount, totalfCash, totalCashUnderlying, rateScalar, guess, exchangeRate, feeRate
+    )
+
+
+def getfCashGivenCashAmount(
+    totalfCash, netCashToAccount, totalCashUnderlying, rateScalar, rateAnchor, feeRate, maxDelta
+):
+    require(maxDelta >= 0)
+    params = (totalfCash, netCashToAccount, totalCashUnderlying, rateScalar, rateAnchor, feeRate)
+    guess = -mulInRatePrecision(netCashToAccount, rateAnchor)
+    for _ in range(MAX_NEWTON_ITERATIONS):
+        delta = _newtonStep(*params, guess)
+        if abs(delta) <= maxDelta:
+            return guess
+        guess -= delta
+
+    raise Revert("No convergence")
+
+
+def batchGetfCashGivenCashAmount(
+    markets, cashGroup, netCashAmounts, marketIndexes, timeToMaturities, maxDelta=0
+):
+    """
+    Runs the Newton iteration in Market.getfCashGivenCashAmount for every element of the
+    given arrays at once, mirroring MockMarket.getfCashAmountGivenCashAmount. Returns a list of
+    (fCash, converged) tuples. Elements where the contract would revert are reported with
+    fCash set to None and converged set to False.
+    """
+    require(maxDelta >= 0)
+    if _isMarket(markets):
+        markets = [markets]
+    (markets, netCashAmounts, marketIndexes, timeToMaturities) = broadcast(
+        markets, netCashAmounts, marketIndexes, timeToMaturities
+    )
+
+    results = [(None, False)] * len(markets)
+    active = []
+    for i, (market, netCash, marketIndex, timeToMaturity) in enumerate(
+        zip(markets, netCashAmounts, marketIndexes, timeToMaturities)
+    ):
+        try:
+            (rateScalar, totalCashUnderlying, rateAnchor) = getExchangeRateFactors(
+                market, cashGroup, int(timeToMaturity), int(marketIndex)
+            )
+            # Rate scalar can never be zero so this signifies a failure
+            require(rateScalar != 0)
+            fee = getExchangeRateFromImpliedRate(getTotalFee(cashGroup), int(timeToMaturity))
+        except Revert:
+            continue
+
+        params = (
+            int(market[TOTAL_FCASH]),
+            int(netCash),
+            totalCashUnderlying,
+            rateScalar,
+            rateAnchor,
+            fee,
+        )
+        active.append((i, params, -mulInRatePrecision(int(netCash), rateAnchor)))
+
+    # Each pass advances every unconverged element by one Newton step, elements drop out of the
+    # active set as soon as they converge or fail
+    for _ in range(MAX_NEWTON_ITERATIONS):
+        if not active:
+            break
+
+        stillActive = []
+        for (i, params, guess) in active:
+            try:
+                delta = _newtonStep(*params, guess)
+            except Revert:
+                continue
+
+            if abs(delta) <= maxDelta:
+                results[i] = (guess, True)
+            else:
+                stillActive.append((i, params, guess - delta))
+        active = stillActive
+
+    return results
+
+
+def batchGetfCashLendFromDeposit(
+    markets, cashGroup, depositAmountsUnderlying, marketIndexes, timeToMaturities
+):
+    # Underlying deposits are in internal precision, mirrors the solver portion of
+    # CalculationViews.getfCashLendFromDeposit
+    results = batchGetfCashGivenCashAmount(
+        markets,
+        cashGroup,
+        [-int(d) for d in broadcast(depositAmountsUnderlying)[0]],
+        marketIndexes,
+        timeToMaturities,
+    )
+    return [(f, True) if c and f > 0 else (None, False) for (f, c) in results]
+
+
+def batchGetfCashBorrowFromPrincipal(
+    markets, cashGroup, borrowAmountsUnderlying, marketIndexes, timeToMaturities
+):
+    # Underlying borrows are in internal precision, mirrors the solver portion of
+    # CalculationViews.getfCashBorrowFromPrincipal
+    results = batchGetfCashGivenCashAmount(
+        markets,
+        cashGroup,
+        [int(b) for b in broadcast(borrowAmountsUnderlying)[0]],
+        marketIndexes,
+        timeToMaturities,
+    )
+    return [(f, True) if c and f < 0 else (None, False) for (f, c) in results]
@@ -0,0 +1,120 @@
+# Mirrors the present value calculations in contracts/internal/nToken/nTokenCalculations.sol.
+# nToken portfolios are (cashBalance, lastInitializedTime, liquidityTokens, ifCashAssets) tuples
+# where liquidityTokens and ifCashAssets are the PortfolioAsset arrays returned by
+# Views.getNTokenPortfolio. Markets and oracle rates are read from a ValuationSnapshot.
+from scripts.offchain.asset_handler import MATURITY, NOTIONAL, getCashClaims, getPresentfCashValue
+from scripts.offchain.asset_rate import convertFromUnderlying
+from scripts.offchain.constants import MAX_TRADED_MARKET_INDEX, QUARTER
+from scripts.offchain.date_time import getReferenceTime, getTradedMarket
+from scripts.offchain.market import ORACLE_RATE
+from scripts.offchain.safe_int import checked
+
+# nToken portfolio tuple indexes
+CASH_BALANCE = 0
+LAST_INITIALIZED_TIME = 1
+LIQUIDITY_TOKENS = 2
+IFCASH_ASSETS = 3
+
+
+def getNextSettleTime(lastInitializedTime):
+    if lastInitializedTime == 0:
+        return 0
+    return getReferenceTime(lastInitializedTime) + QUARTER
+
+
+def _getifCashNotionals(nToken):
+    return {int(a[MATURITY]): int(a[NOTIONAL]) for a in nToken[IFCASH_ASSETS]}
+
+
+def getNTokenMarketValue(snapshot, cashGroup, nToken, blockTime):
+    """
+    Returns (totalAssetValue, netfCash), the value of the liquidity tokens and the fCash held at
+    the same maturities. Values are not haircut.
+    """
+    ifCash = _getifCashNotionals(nToken)
+    totalAssetValue = 0
+    netfCash = []
+
+    for (i, token) in enumerate(nToken[LIQUIDITY_TOKENS]):
+        market = snapshot.loadMarket(cashGroup, i + 1, blockTime)
+        token = [int(v) for v in token[0:4]]
+        maturity = token[MATURITY]
+        (assetCashClaim, fCashClaim) = getCashClaims(token, market)
+
+        netfCash.append(checked(fCashClaim + ifCash.get(maturity, 0)))
+        netAssetValueInMarket = assetCashClaim + convertFromUnderlying(
+            cashGroup[2],
+            getPresentfCashValue(netfCash[i], maturity, blockTime, market[ORACLE_RATE]),
+        )
+        totalAssetValue = checked(totalAssetValue + netAssetValueInMarket)
+
+    return (totalAssetValue, netfCash)
+
+
+def getNTokenifCashResiduals(cashGroup, nToken, blockTime):
+    """
+    Mirrors nTokenCalculations.getNTokenifCashBits, returning the (maturity, notional) of the
+    ifCash assets that do not sit on an active market maturity.
+    """
+    # If max market index is less than or equal to 2, there are never ifCash assets by construction
+    if cashGroup[1] <= 2 or len(nToken[IFCASH_ASSETS]) == 0:
+        return []
+
+    tRef = getReferenceTime(blockTime)
+    if tRef == int(nToken[LAST_INITIALIZED_TIME]):
+        # ACTIVE_MARKETS_MASK covers every traded market maturity
+        numMarkets = MAX_TRADED_MARKET_INDEX
+    else:
+        numMarkets = cashGroup[1]
+    activeMaturities = {tRef + getTradedMarket(i) for i in range(1, numMarkets + 1)}
+
+    return [
+        (maturity, notional)
+        for (maturity, notional) in sorted(_getifCashNotionals(nToken).items())
+        if maturity not in activeMaturities
+    ]
+
+
+def getNTokenAssetPV(snapshot, cashGroup, nToken, blockTime):
+    """
+    Mirrors nTokenCalculations.getNTokenAssetPV, the value used for nToken mints, redemptions
+    and free collateral (as the assetPV of a ValuationSnapshot nToken).
+    """
+    nextSettleTime = getNextSettleTime(int(nToken[LAST_INITIALIZED_TIME]))
+    if nextSettleTime <= blockTime:
+        # Liquidity tokens are valued one second before maturity until markets are initialized
+        blockTime = nextSettleTime - 1
+
+    (totalAssetValueInMarkets, _) = getNTokenMarketValue(snapshot, cashGroup, nToken, blockTime)
+
+    ifCashResidualUnderlyingPV = 0
+    for (maturity, notional) in getNTokenifCashResiduals(cashGroup, nToken, blockTime):
+        if maturity <= blockTime:
+            pv = notional
+        else:
+            oracleRate = snapshot.calculateOracleRate(cashGroup, maturity, blockTime)
+            pv = getPresentfCashValue(notional, maturity, blockTime, oracleRate)
+        ifCashResidualUnderlyingPV = checked(ifCashResidualUnderlyingPV + pv)
+
+    return checked(
+        totalAssetValueInMarkets
+        + convertFromUnderlying(cashGroup[2], ifCashResidualUnderlyingPV)
+        + int(nToken[CASH_BALANCE])
+    )
+
+
+def batchGetNTokenAssetPV(snapshot, currencyId, nToken, blockTimes):
+    """
+    Values a single nToken portfolio at every block time, returning a list of asset PVs. The
+    portfolio is parsed once, loaded markets, oracle rates and discount factors are cached by
+    the snapshot so block times in the same quarter share market state.
+    """
+    cashGroup = snapshot.getCashGroup(currencyId)
+    nToken = (
+        int(nToken[CASH_BALANCE]),
+        int(nToken[LAST_INITIALIZED_TIME]),
+        [tuple(int(v) for v in t[0:4]) for t in nToken[LIQUIDITY_TOKENS]],
+        [tuple(int(v) for v in a[0:4]) for a in nToken[IFCASH_ASSETS]],
+    )
+
+    return [getNTokenAssetPV(snapshot, cashGroup, nToken, int(t)) for t in blockTimes]
@@ -0,0 +1,121 @@
+# Replays trade streams against the rate oracle in contracts/internal/markets/Market.sol. Markets
+# are the stored MarketParameters tuples of a single cash group for one quarter, indexed by
+# market index - 1 (the layout returned by getActiveMarkets). Streams are consumed lazily so
+# memory use does not grow with the number of events.
+from scripts.offchain.cash_group import getRateOracleTimeWindow
+from scripts.offchain.market import (
+    LAST_IMPLIED_RATE,
+    ORACLE_RATE,
+    PREVIOUS_TRADE_TIME,
+    calculateTrade,
+    loadMarket,
+    updateRateOracle,
+)
+from scripts.offchain.safe_int import require
+
+# Replayed event tuple indexes
+EVENT_BLOCK_TIME = 0
+EVENT_MARKET_INDEX = 1
+EVENT_MARKET = 2
+
+
+def executeTrade(market, cashGroup, fCashToAccount, marketIndex, blockTime):
+    """
+    Mirrors loading a stored market at blockTime and Market.executeTrade, returning the new
+    stored market or None where the trade fails. The stored oracle rate is the oracle rate
+    calculated when the market is loaded.
+    """
+    loaded = loadMarket(market, getRateOracleTimeWindow(cashGroup), blockTime)
+    timeToMaturity = int(loaded[1]) - blockTime
+    require(timeToMaturity > 0, "dev: market matured")
+
+    (newMarket, netAssetCash, _) = calculateTrade(
+        loaded, cashGroup, fCashToAccount, timeToMaturity, marketIndex, blockTime
+    )
+    if netAssetCash == 0:
+        # TradingAction reverts when a trade fails
+        return None
+
+    return newMarket
+
+
+def setImpliedRate(market, rateOracleTimeWindow, lastImpliedRate, blockTime):
+    """
+    Returns the stored market after a trade at blockTime that leaves the market at
+    lastImpliedRate, for replaying implied rate paths without the liquidity curve.
+    """
+    newMarket = list(market)
+    newMarket[ORACLE_RATE] = updateRateOracle(
+        int(market[PREVIOUS_TRADE_TIME]),
+        int(market[LAST_IMPLIED_RATE]),
+        int(market[ORACLE_RATE]),
+        rateOracleTimeWindow,
+        blockTime,
+    )
+    newMarket[LAST_IMPLIED_RATE] = int(lastImpliedRate)
+    newMarket[PREVIOUS_TRADE_TIME] = blockTime
+
+    return tuple(newMarket)
+
+
+def replayTrades(markets, cashGroup, events, impliedRates=False):
+    """
+    Applies events, an iterable of (blockTime, marketIndex, fCashToAccount) in block time order,
+    to the stored markets. When impliedRates is set the last value of each event is the
+    lastImpliedRate the market trades to instead. Yields (blockTime, marketIndex, newMarket)
+    for every event, newMarket is None for failed trades which leave the market unchanged.
+    """
+    markets = [tuple(m) for m in markets]
+    rateOracleTimeWindow = getRateOracleTimeWindow(cashGroup)
+    lastBlockTime = 0
+
+    for (blockTime, marketIndex, value) in events:
+        (blockTime, marketIndex) = (int(blockTime), int(marketIndex))
+        require(blockTime >= lastBlockTime, "dev: events out of order")
+        require(1 <= marketIndex <= len(markets), "Invalid market")
+        lastBlockTime = blockTime
+
+        if impliedRates:
+            newMarket = setImpliedRate(
+                markets[marketIndex - 1], rateOracleTimeWindow, value, blockTime
+            )
+        else:
+            newMarket = executeTrade(
+                markets[marketIndex - 1], cashGroup, int(value), marketIndex, blockTime
+            )
+
+        if newMarket is not None:
+            markets[marketIndex - 1] = newMarket
+        yield (blockTime, marketIndex, newMarket)
+
+
+def replayOracleRates(markets, cashGroup, events, observationTimes, impliedRates=False):
+    """
+    Replays events and yields (blockTime, activeMarkets) at each of the ascending
+    observationTimes, where activeMarkets are the markets loaded at that block time after every
+    event up to and including it, comparable to getActiveMarketsAtBlockTime. The oracle rate of
+    each market is activeMarkets[i][ORACLE_RATE].
+    """
+    stored = [tuple(m) for m in markets]
+    rateOracleTimeWindow = getRateOracleTimeWindow(cashGroup)
+    replay = replayTrades(stored, cashGroup, events, impliedRates)
+    pending = next(replay, None)
+
+    for blockTime in observationTimes:
+        blockTime = int(blockTime)
+        while pending is not None and pending[EVENT_BLOCK_TIME] <= blockTime:
+            if pending[EVENT_MARKET] is not None:
+                stored[pending[EVENT_MARKET_INDEX] - 1] = pending[EVENT_MARKET]
+            pending = next(replay, None)
+
+        yield (blockTime, [loadMarket(m, rateOracleTimeWindow, blockTime) for m in stored])
+
+
+def getOracleRatePath(markets, cashGroup, events, observationTimes, impliedRates=False):
+    """Returns a list of (blockTime, [oracleRate per market]) at each observation time"""
+    return [
+        (blockTime, [m[ORACLE_RATE] for m in activeMarkets])
+        for (blockTime, activeMarkets) in replayOracleRates(
+            markets, cashGroup, events, observationTimes, impliedRates
+        )
+    ]
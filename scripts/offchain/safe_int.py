@@ -0,0 +1,43 @@
+from scripts.offchain.constants import RATE_PRECISION
+
+INT256_MIN = -(2 ** 255)
+INT256_MAX = 2 ** 255 - 1
+UINT256_MAX = 2 ** 256 - 1
+
+
+class Revert(Exception):
+    """Raised wherever the mirrored Solidity code would revert."""
+
+    pass
+
+
+def require(condition, message="dev: revert"):
+    if not condition:
+        raise Revert(message)
+
+
+def checked(x):
+    # Solidity int256 bounds, Python integers never overflow on their own
+    require(INT256_MIN <= x <= INT256_MAX, "dev: int256 overflow")
+    return x
+
+
+def div(x, y):
+    # Solidity integer division truncates towards zero, Python floors
+    require(y != 0, "dev: division by zero")
+    q = abs(x) // abs(y)
+    return q if (x >= 0) == (y >= 0) else -q
+
+
+def subNoNeg(x, y):
+    z = x - y
+    require(z >= 0, "dev: int256 sub to negative")
+    return z
+
+
+def mulInRatePrecision(x, y):
+    return div(checked(x * y), RATE_PRECISION)
+
+
+def divInRatePrecision(x, y):
+    return div(checked(x * RATE_PRECISION), y)
@@ -0,0 +1,202 @@
+# Mirrors contracts/internal/settlement/SettlePortfolioAssets.sol, SettleBitmapAssets.sol and
+# contracts/external/SettleAssetsExternal.sol. Settlement rates and settlement markets are read
+# from a ValuationSnapshot and updated in place, the same way settlement writes to storage, so
+# accounts settled against the same snapshot see each other's settlement.
+from scripts.offchain.asset_handler import (
+    ASSET_TYPE,
+    CURRENCY_ID,
+    MATURITY,
+    NOTIONAL,
+    getSettlementDate,
+    isLiquidityToken,
+)
+from scripts.offchain.asset_rate import convertFromUnderlying
+from scripts.offchain.bitmap import getNextBitNum, setBit
+from scripts.offchain.constants import FCASH_ASSET_TYPE
+from scripts.offchain.date_time import (
+    getBitNumFromMaturity,
+    getBitmapFromMaturities,
+    getMaturityFromBitNum,
+    getTimeUTC0,
+)
+from scripts.offchain.free_collateral import (
+    BITMAP_CURRENCY_ID,
+    NEXT_SETTLE_TIME,
+    getSortedPortfolio,
+)
+from scripts.offchain.market import removeLiquidity
+from scripts.offchain.safe_int import checked, require
+
+# Settled account tuple indexes
+SETTLE_AMOUNTS = 0
+NEW_PORTFOLIO = 1
+NEW_NEXT_SETTLE_TIME = 2
+NEW_BITMAP = 3
+
+
+def _settleLiquidityToken(snapshot, asset):
+    # Market.loadSettlementMarket and Market.removeLiquidity, the market is written back
+    currencyId = asset[CURRENCY_ID]
+    settlementDate = getSettlementDate(asset)
+    market = snapshot.getSettlementMarket(currencyId, asset[MATURITY], settlementDate)
+    (market, assetCash, fCash) = removeLiquidity(market, asset[NOTIONAL])
+    snapshot.settlementMarkets[(currencyId, asset[MATURITY], settlementDate)] = market
+
+    return (assetCash, fCash)
+
+
+def settlePortfolio(snapshot, portfolio, blockTime):
+    """
+    Mirrors SettlePortfolioAssets.settlePortfolio on a portfolio sorted by currency id, maturity
+    and asset type. Returns (settleAmounts, newPortfolio) where settleAmounts is a list of
+    (currencyId, netCashChange) and newPortfolio holds the remaining assets, with liquidity
+    tokens that settle before maturity converted to fCash.
+    """
+    portfolio = getSortedPortfolio(portfolio)
+    deleted = set()
+    settleAmounts = []
+
+    for (i, asset) in enumerate(portfolio):
+        if getSettlementDate(asset) > blockTime:
+            continue
+
+        currencyId = asset[CURRENCY_ID]
+        if len(settleAmounts) == 0 or settleAmounts[-1][0] != currencyId:
+            settleAmounts.append([currencyId, 0])
+
+        assetCash = 0
+        if asset[ASSET_TYPE] == FCASH_ASSET_TYPE:
+            settlementRate = snapshot.buildSettlementRate(currencyId, asset[MATURITY], blockTime)
+            assetCash = convertFromUnderlying(settlementRate, asset[NOTIONAL])
+            deleted.add(i)
+        elif isLiquidityToken(asset[ASSET_TYPE]):
+            (assetCash, fCash) = _settleLiquidityToken(snapshot, asset)
+
+            if asset[MATURITY] > blockTime:
+                # If fCash has not yet matured then add it to the portfolio
+                _settleLiquidityTokenTofCash(portfolio, deleted, i, fCash)
+            else:
+                settlementRate = snapshot.buildSettlementRate(
+                    currencyId, asset[MATURITY], blockTime
+                )
+                assetCash = checked(assetCash + convertFromUnderlying(settlementRate, fCash))
+                deleted.add(i)
+
+        settleAmounts[-1][1] = checked(settleAmounts[-1][1] + assetCash)
+
+    # Zero notional assets are deleted when the portfolio is stored
+    newPortfolio = [a for (i, a) in enumerate(portfolio) if i not in deleted and a[NOTIONAL] != 0]
+    return ([tuple(s) for s in settleAmounts], getSortedPortfolio(newPortfolio))
+
+
+def _settleLiquidityTokenTofCash(portfolio, deleted, index, fCash):
+    liquidityToken = portfolio[index]
+    if index != 0:
+        # Check to see if the previous index is the matching fCash asset, this will be the case
+        # when the portfolio is sorted
+        fCashAsset = portfolio[index - 1]
+        if (
+            fCashAsset[CURRENCY_ID] == liquidityToken[CURRENCY_ID]
+            and fCashAsset[MATURITY] == liquidityToken[MATURITY]
+            and fCashAsset[ASSET_TYPE] == FCASH_ASSET_TYPE
+        ):
+            fCashAsset[NOTIONAL] = checked(fCashAsset[NOTIONAL] + fCash)
+            deleted.add(index)
+
+    liquidityToken[ASSET_TYPE] = FCASH_ASSET_TYPE
+    liquidityToken[NOTIONAL] = fCash
+
+
+def settleBitmappedCashGroup(snapshot, currencyId, bitmap, ifCash, oldSettleTime, blockTime):
+    """
+    Mirrors SettleBitmapAssets.settleBitmappedCashGroup. bitmap is relative to oldSettleTime and
+    ifCash is a dict of maturity to notional. Returns (totalAssetCash, newSettleTime, newBitmap,
+    newifCash) where newBitmap is remapped relative to newSettleTime.
+    """
+    totalAssetCash = 0
+    newSettleTime = getTimeUTC0(blockTime)
+    require(newSettleTime >= oldSettleTime, "dev: new settle time before previous")
+
+    (lastSettleBit, _) = getBitNumFromMaturity(oldSettleTime, newSettleTime)
+    if lastSettleBit == 0:
+        return (totalAssetCash, newSettleTime, bitmap, dict(ifCash))
+
+    newifCash = dict(ifCash)
+    nextBitNum = getNextBitNum(bitmap)
+    while nextBitNum != 0 and nextBitNum <= lastSettleBit:
+        maturity = getMaturityFromBitNum(oldSettleTime, nextBitNum)
+        settlementRate = snapshot.buildSettlementRate(currencyId, maturity, blockTime)
+        totalAssetCash = checked(
+            totalAssetCash + convertFromUnderlying(settlementRate, newifCash.pop(maturity, 0))
+        )
+
+        # Turn the bit off now that it is settled
+        bitmap = setBit(bitmap, nextBitNum, False)
+        nextBitNum = getNextBitNum(bitmap)
+
+    newBitmap = 0
+    while nextBitNum != 0:
+        maturity = getMaturityFromBitNum(oldSettleTime, nextBitNum)
+        (newBitNum, isValid) = getBitNumFromMaturity(newSettleTime, maturity)
+        require(isValid, "dev: invalid new bit num")
+
+        newBitmap = setBit(newBitmap, newBitNum, True)
+
+        # Turn the bit off now that it is remapped
+        bitmap = setBit(bitmap, nextBitNum, False)
+        nextBitNum = getNextBitNum(bitmap)
+
+    return (totalAssetCash, newSettleTime, newBitmap, newifCash)
+
+
+def settleAccount(snapshot, account, blockTime):
+    """
+    Mirrors SettleAssetsExternal.settleAccount for an account returned by Views.getAccount.
+    Returns (settleAmounts, newPortfolio, newNextSettleTime, newBitmap), accounts that do not
+    need to settle return an empty list of settle amounts.
+    """
+    (accountContext, _, portfolio) = account[0:3]
+    nextSettleTime = int(accountContext[NEXT_SETTLE_TIME])
+    bitmapCurrencyId = int(accountContext[BITMAP_CURRENCY_ID])
+
+    if bitmapCurrencyId != 0:
+        # Bitmap portfolios are returned with absolute maturities, bits are relative to the
+        # account's next settle time
+        ifCash = {int(a[MATURITY]): int(a[NOTIONAL]) for a in portfolio}
+        bitmap = getBitmapFromMaturities(nextSettleTime, ifCash.keys()) if ifCash else 0
+        if nextSettleTime == 0 or nextSettleTime > blockTime:
+            return ([], getSortedPortfolio(portfolio), nextSettleTime, bitmap)
+
+        (settledCash, newSettleTime, newBitmap, newifCash) = settleBitmappedCashGroup(
+            snapshot, bitmapCurrencyId, bitmap, ifCash, nextSettleTime, blockTime
+        )
+        newPortfolio = [
+            [bitmapCurrencyId, maturity, FCASH_ASSET_TYPE, notional]
+            for (maturity, notional) in sorted(newifCash.items())
+        ]
+        return ([(bitmapCurrencyId, settledCash)], newPortfolio, newSettleTime, newBitmap)
+
+    if nextSettleTime == 0 or nextSettleTime > blockTime:
+        return ([], getSortedPortfolio(portfolio), nextSettleTime, 0)
+
+    (settleAmounts, newPortfolio) = settlePortfolio(snapshot, portfolio, blockTime)
+    # AccountContextHandler.storeAssetsAndUpdateContext sets the next settle time to the
+    # earliest settlement date in the remaining portfolio
+    newNextSettleTime = min([getSettlementDate(a) for a in newPortfolio], default=0)
+    return (settleAmounts, newPortfolio, newNextSettleTime, 0)
+
+
+def batchSettleAccounts(snapshot, accounts, blockTime):
+    """
+    Settles every account against a single snapshot, accounts is a dict of address to the
+    value returned by Views.getAccount. Returns a dict of address to the settleAccount result
+    and the total net cash change per currency across all accounts.
+    """
+    results = {}
+    totalSettledCash = {}
+    for (address, account) in accounts.items():
+        results[address] = settleAccount(snapshot, account, blockTime)
+        for (currencyId, netCashChange) in results[address][SETTLE_AMOUNTS]:
+            totalSettledCash[currencyId] = totalSettledCash.get(currencyId, 0) + netCashChange
+
+    return (results, totalSettledCash)
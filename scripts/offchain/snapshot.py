@@ -0,0 +1,207 @@
+# Pre-loaded protocol state used by the off chain valuation models in place of contract
+# storage. A snapshot is account independent so a single snapshot is shared when valuing
+# many accounts, derived values (oracle rates, loaded markets) are cached per block time.
+from scripts.offchain.cash_group import (
+    buildCashGroup,
+    getRateOracleTimeWindow,
+    interpolateOracleRate,
+)
+from scripts.offchain.constants import ZERO_ADDRESS
+from scripts.offchain.date_time import getMarketIndex, getReferenceTime, getTradedMarket
+from scripts.offchain.market import getOracleRate, loadMarket
+from scripts.offchain.safe_int import Revert, require
+
+EMPTY_MARKET = ("0x0", 0, 0, 0, 0, 0, 0, 0)
+
+# nToken tuples: (totalSupply, parameters, assetPV)
+NTOKEN_TOTAL_SUPPLY = 0
+NTOKEN_PARAMETERS = 1
+NTOKEN_ASSET_PV = 2
+
+
+def encodeNTokenParameters(
+    residualPurchaseIncentive10BPS,
+    pvHaircutPercentage,
+    residualPurchaseTimeBufferHours,
+    cashWithholdingBuffer10BPS,
+    liquidationHaircutPercentage,
+):
+    # Packs the parameters the same way as nTokenHandler.setNTokenCollateralParameters, the
+    # bytes5 value is left aligned when it is read back as bytes6
+    parameters = (
+        residualPurchaseIncentive10BPS
+        | (pvHaircutPercentage << 8)
+        | (residualPurchaseTimeBufferHours << 16)
+        | (cashWithholdingBuffer10BPS << 24)
+        | (liquidationHaircutPercentage << 32)
+    )
+
+    return parameters << 8
+
+
+def getNTokenParameter(parameters, index):
+    # nToken parameters are a bytes6 value, indexes are counted from the left
+    if isinstance(parameters, (bytes, bytearray)):
+        parameters = int.from_bytes(parameters, "big")
+    elif isinstance(parameters, str):
+        parameters = int(parameters, 16)
+
+    return (parameters >> (8 * (5 - index))) & 0xFF
+
+
+class ValuationSnapshot:
+    def __init__(self):
+        self.assetRates = {}
+        self.ethRates = {}
+        self.cashGroups = {}
+        self.supplyRates = {}
+        self.nTokens = {}
+        # Stored markets keyed by currency id and then maturity. Markets are expected to be
+        # those of the current settlement date for the block times being valued.
+        self.markets = {}
+        # Settlement rates keyed by (currencyId, maturity) and settlement markets keyed by
+        # (currencyId, maturity, settlementDate). These are updated as assets are settled.
+        self.settlementRates = {}
+        self.settlementMarkets = {}
+        self._oracleRates = {}
+        self._loadedMarkets = {}
+
+    def setCurrency(
+        self,
+        currencyId,
+        assetRate,
+        ethRate,
+        cashGroupSettings=None,
+        markets=(),
+        supplyRate=0,
+        nToken=None,
+    ):
+        """
+        Sets the state for a currency. assetRate is (rateOracle, rate, underlyingDecimals) and
+        ethRate is (rateDecimals, rate, buffer, haircut, liquidationDiscount) as built by the
+        contracts. cashGroupSettings is a CashGroupSettings tuple, markets are MarketParameters
+        tuples as stored and nToken is (totalSupply, parameters, assetPV).
+        """
+        assetRate = tuple(int(v) if i > 0 else v for (i, v) in enumerate(assetRate))
+        self.assetRates[currencyId] = assetRate
+        self.ethRates[currencyId] = tuple(int(v) for v in ethRate)
+        self.supplyRates[currencyId] = int(supplyRate)
+
+        if cashGroupSettings is not None:
+            self.cashGroups[currencyId] = buildCashGroup(currencyId, cashGroupSettings, assetRate)
+        self.markets[currencyId] = {int(m[1]): m for m in markets}
+
+        if nToken is not None:
+            self.setNToken(currencyId, *nToken)
+
+        self._oracleRates.clear()
+        self._loadedMarkets.clear()
+
+    def setNToken(self, currencyId, totalSupply, parameters, assetPV):
+        self.nTokens[currencyId] = (int(totalSupply), parameters, int(assetPV))
+
+    def setSettlementRate(self, currencyId, maturity, assetRate):
+        """
+        Sets a stored settlement rate, assetRate is the (rateOracle, rate, underlyingDecimals)
+        tuple returned by Views.getSettlementRate. Unset settlement rates have a zero rate.
+        """
+        if int(assetRate[1]) != 0:
+            self.settlementRates[(currencyId, int(maturity))] = (
+                assetRate[0],
+                int(assetRate[1]),
+                int(assetRate[2]),
+            )
+
+    def setSettlementMarket(self, currencyId, settlementDate, market):
+        market = tuple(int(v) if i > 0 else v for (i, v) in enumerate(market))
+        self.settlementMarkets[(currencyId, market[1], int(settlementDate))] = market
+
+    def buildSettlementRate(self, currencyId, maturity, blockTime):
+        # AssetRate.buildSettlementRateStateful, the first settlement stores the current rate
+        key = (currencyId, maturity)
+        if key in self.settlementRates:
+            return self.settlementRates[key]
+
+        (rateOracle, rate, underlyingDecimals) = self.getAssetRate(currencyId)
+        if int(rateOracle, 16) != 0:
+            require(0 < blockTime and maturity <= blockTime, "dev: settlement rate timestamp")
+            require(0 < rate, "dev: settlement rate overflow")
+            self.settlementRates[key] = (ZERO_ADDRESS, rate, underlyingDecimals)
+
+        return (ZERO_ADDRESS, rate, underlyingDecimals)
+
+    def getSettlementMarket(self, currencyId, maturity, settlementDate):
+        return self.settlementMarkets.get((currencyId, maturity, settlementDate), EMPTY_MARKET)
+
+    def getCashGroup(self, currencyId):
+        if currencyId not in self.cashGroups:
+            raise Revert("dev: cash group not in snapshot")
+        return self.cashGroups[currencyId]
+
+    def getAssetRate(self, currencyId):
+        if currencyId not in self.assetRates:
+            raise Revert("dev: asset rate not in snapshot")
+        return self.assetRates[currencyId]
+
+    def getETHRate(self, currencyId):
+        if currencyId not in self.ethRates:
+            raise Revert("dev: eth rate not in snapshot")
+        return self.ethRates[currencyId]
+
+    def getNToken(self, currencyId):
+        if currencyId not in self.nTokens:
+            raise Revert("dev: nToken not in snapshot")
+        return self.nTokens[currencyId]
+
+    def _getStoredMarket(self, currencyId, maturity):
+        # Uninitialized markets read as zeros, the same as contract storage
+        return self.markets.get(currencyId, {}).get(maturity, EMPTY_MARKET)
+
+    def loadMarket(self, cashGroup, marketIndex, blockTime):
+        # CashGroup.loadMarket with needsLiquidity set
+        key = (cashGroup[0], marketIndex, blockTime)
+        if key not in self._loadedMarkets:
+            if not 1 <= marketIndex <= cashGroup[1]:
+                raise Revert("Invalid market")
+            maturity = getReferenceTime(blockTime) + getTradedMarket(marketIndex)
+            self._loadedMarkets[key] = loadMarket(
+                self._getStoredMarket(cashGroup[0], maturity),
+                getRateOracleTimeWindow(cashGroup),
+                blockTime,
+            )
+
+        return self._loadedMarkets[key]
+
+    def _getOracleRate(self, cashGroup, maturity, blockTime):
+        return getOracleRate(
+            self._getStoredMarket(cashGroup[0], maturity),
+            getRateOracleTimeWindow(cashGroup),
+            blockTime,
+        )
+
+    def calculateOracleRate(self, cashGroup, maturity, blockTime):
+        key = (cashGroup[0], maturity, blockTime)
+        if key in self._oracleRates:
+            return self._oracleRates[key]
+
+        (marketIndex, idiosyncratic) = getMarketIndex(cashGroup[1], maturity, blockTime)
+        if not idiosyncratic:
+            rate = self._getOracleRate(cashGroup, maturity, blockTime)
+        else:
+            referenceTime = getReferenceTime(blockTime)
+            # The market index is the market past the maturity when idiosyncratic
+            longMaturity = referenceTime + getTradedMarket(marketIndex)
+            longRate = self._getOracleRate(cashGroup, longMaturity, blockTime)
+
+            if marketIndex == 1:
+                # The short market is the annualized asset supply rate
+                shortMaturity = blockTime
+                shortRate = self.supplyRates.get(cashGroup[0], 0)
+            else:
+                shortMaturity = referenceTime + getTradedMarket(marketIndex - 1)
+                shortRate = self._getOracleRate(cashGroup, shortMaturity, blockTime)
+
+            rate = interpolateOracleRate(shortMaturity, longMaturity, shortRate, longRate, maturity)
+
+        self._oracleRates[key] = rate
+        return rate
@@ -0,0 +1,511 @@
+# Mirrors contracts/internal/vaults/VaultConfiguration.sol, VaultState.sol and VaultAccount.sol.
+# Vault configs are the VaultConfig tuples returned by getVaultConfigView, vault states and vault
+# accounts are the VaultState and VaultAccount tuples returned by getVaultState and
+# getVaultAccount (the same layout as get_vault_state and get_vault_account in the vault test
+# fixtures). Strategy tokens are valued with a (convertStrategyToUnderlying, tokenDecimals)
+# valuation tuple, see getSimpleStrategyValuation.
+from scripts.offchain.asset_rate import convertFromUnderlying, convertToUnderlying
+from scripts.offchain.constants import (
+    BASIS_POINT,
+    FIVE_BASIS_POINTS,
+    INTERNAL_TOKEN_PRECISION,
+    PERCENTAGE_DECIMALS,
+    RATE_PRECISION,
+)
+from scripts.offchain.safe_int import (
+    INT256_MAX,
+    Revert,
+    checked,
+    div,
+    divInRatePrecision,
+    mulInRatePrecision,
+    require,
+)
+
+# Vault config flags
+ENABLED = 1 << 0
+ALLOW_ROLL_POSITION = 1 << 1
+ONLY_VAULT_ENTRY = 1 << 2
+ONLY_VAULT_EXIT = 1 << 3
+ONLY_VAULT_ROLL = 1 << 4
+ONLY_VAULT_DELEVERAGE = 1 << 5
+ONLY_VAULT_SETTLE = 1 << 6
+ALLOW_REENTRANCY = 1 << 7
+DISABLE_DELEVERAGE = 1 << 8
+
+# Vault config tuple indexes
+VAULT = 0
+FLAGS = 1
+BORROW_CURRENCY_ID = 2
+MIN_ACCOUNT_BORROW_SIZE = 3
+FEE_RATE = 4
+MIN_COLLATERAL_RATIO = 5
+LIQUIDATION_RATE = 6
+RESERVE_FEE_SHARE = 7
+MAX_BORROW_MARKET_INDEX = 8
+MAX_DELEVERAGE_COLLATERAL_RATIO = 9
+SECONDARY_BORROW_CURRENCIES = 10
+ASSET_RATE = 11
+MAX_REQUIRED_ACCOUNT_COLLATERAL_RATIO = 12
+
+# Vault state tuple indexes
+STATE_MATURITY = 0
+TOTAL_FCASH = 1
+IS_SETTLED = 2
+TOTAL_VAULT_SHARES = 3
+TOTAL_ASSET_CASH = 4
+TOTAL_STRATEGY_TOKENS = 5
+SETTLEMENT_STRATEGY_TOKEN_VALUE = 6
+
+# Vault account tuple indexes
+FCASH = 0
+ACCOUNT_MATURITY = 1
+VAULT_SHARES = 2
+ACCOUNT = 3
+TEMP_CASH_BALANCE = 4
+LAST_ENTRY_BLOCK_HEIGHT = 5
+
+# Valuation tuple indexes
+CONVERT_STRATEGY_TO_UNDERLYING = 0
+TOKEN_DECIMALS = 1
+
+# Settled assets tuple indexes, as returned by getRemainingSettledTokens
+REMAINING_STRATEGY_TOKENS = 0
+REMAINING_ASSET_CASH = 1
+
+# Vault book risk tuple indexes
+COLLATERAL_RATIO = 0
+VAULT_SHARE_VALUE = 1
+CAN_DELEVERAGE = 2
+MAX_LIQUIDATOR_DEPOSIT = 3
+
+
+def getVaultConfig(vault, storedConfig, assetRate):
+    """
+    Mirrors VaultConfiguration.getVaultConfigView for the stored config passed to setVaultConfig
+    (the layout of get_vault_config in the vault test fixtures).
+    """
+    (
+        flags,
+        currencyId,
+        minAccountBorrowSize,
+        minCollateralRatioBPS,
+        feeRate5BPS,
+        liquidationRate,
+        reserveFeeShare,
+        maxBorrowMarketIndex,
+        maxDeleverageCollateralRatioBPS,
+        secondaryBorrowCurrencies,
+        maxRequiredAccountCollateralRatioBPS,
+    ) = storedConfig[0:11]
+
+    return (
+        vault,
+        int(flags),
+        int(currencyId),
+        int(minAccountBorrowSize) * INTERNAL_TOKEN_PRECISION,
+        int(feeRate5BPS) * FIVE_BASIS_POINTS,
+        int(minCollateralRatioBPS) * BASIS_POINT,
+        (int(liquidationRate) * RATE_PRECISION) // PERCENTAGE_DECIMALS,
+        int(reserveFeeShare),
+        int(maxBorrowMarketIndex),
+        int(maxDeleverageCollateralRatioBPS) * BASIS_POINT,
+        tuple(int(c) for c in secondaryBorrowCurrencies),
+        tuple(assetRate),
+        int(maxRequiredAccountCollateralRatioBPS) * BASIS_POINT,
+    )
+
+
+def getFlag(vaultConfig, flagID):
+    return (int(vaultConfig[FLAGS]) & flagID) == flagID
+
+
+def hasSecondaryBorrows(vaultConfig):
+    return any(int(c) != 0 for c in vaultConfig[SECONDARY_BORROW_CURRENCIES])
+
+
+def getSimpleStrategyValuation(exchangeRate, tokenDecimals=10 ** 18):
+    """
+    Returns a valuation tuple that mirrors SimpleStrategyVault.convertStrategyToUnderlying at
+    the given exchange rate, tokenDecimals is the underlying token precision.
+    """
+    exchangeRate = int(exchangeRate)
+
+    def convertStrategyToUnderlying(account, strategyTokens, maturity):
+        return (strategyTokens * exchangeRate * 10 ** 10) // 10 ** 18
+
+    return (convertStrategyToUnderlying, int(tokenDecimals))
+
+
+def _getStrategyTokenValueUnderlyingInternal(valuation, account, strategyTokens, maturity):
+    underlyingValue = int(
+        valuation[CONVERT_STRATEGY_TO_UNDERLYING](account, strategyTokens, maturity)
+    )
+    # TokenHandler.convertToInternal
+    if valuation[TOKEN_DECIMALS] == INTERNAL_TOKEN_PRECISION:
+        return underlyingValue
+    return div(checked(underlyingValue * INTERNAL_TOKEN_PRECISION), valuation[TOKEN_DECIMALS])
+
+
+def getPoolShare(vaultState, vaultShares):
+    """Mirrors VaultStateLib.getPoolShare, returning (assetCash, strategyTokens)"""
+    totalVaultShares = int(vaultState[TOTAL_VAULT_SHARES])
+    if totalVaultShares == 0:
+        return (0, 0)
+
+    return (
+        (vaultShares * int(vaultState[TOTAL_ASSET_CASH])) // totalVaultShares,
+        (vaultShares * int(vaultState[TOTAL_STRATEGY_TOKENS])) // totalVaultShares,
+    )
+
+
+def getCashValueOfShare(vaultState, vaultConfig, valuation, account, vaultShares):
+    if vaultShares == 0:
+        return 0
+
+    (assetCash, strategyTokens) = getPoolShare(vaultState, vaultShares)
+    underlyingInternalStrategyTokenValue = _getStrategyTokenValueUnderlyingInternal(
+        valuation, account, strategyTokens, int(vaultState[STATE_MATURITY])
+    )
+
+    return checked(
+        convertFromUnderlying(vaultConfig[ASSET_RATE], underlyingInternalStrategyTokenValue)
+        + assetCash
+    )
+
+
+def calculateCollateralRatio(
+    vaultConfig, vaultState, valuation, account, vaultShares, fCash, secondaryDebtOutstanding=0
+):
+    """
+    Mirrors VaultConfiguration.calculateCollateralRatio, returning (collateralRatio,
+    vaultShareValue). secondaryDebtOutstanding is the account's secondary fCash debt denominated
+    in the primary borrow currency as a positive integer.
+    """
+    vaultShareValue = getCashValueOfShare(vaultState, vaultConfig, valuation, account, vaultShares)
+    debtOutstanding = convertFromUnderlying(
+        vaultConfig[ASSET_RATE], checked(-fCash + secondaryDebtOutstanding)
+    )
+    netAssetValue = checked(vaultShareValue - debtOutstanding)
+
+    if debtOutstanding == 0:
+        # When there is no debt outstanding then we use a maximal collateral ratio to represent
+        # "infinity"
+        return (INT256_MAX, vaultShareValue)
+
+    return (divInRatePrecision(netAssetValue, debtOutstanding), vaultShareValue)
+
+
+def calculateDeleverageAmount(vaultAccount, vaultConfig, vaultShareValue):
+    """
+    Mirrors VaultAccountLib.calculateDeleverageAmount, returning
+    (maxLiquidatorDepositAssetCash, debtOutstandingAboveMinBorrow).
+    """
+    assetRate = vaultConfig[ASSET_RATE]
+    liquidationRate = int(vaultConfig[LIQUIDATION_RATE])
+    maxCollateralRatioPlusOne = int(vaultConfig[MAX_DELEVERAGE_COLLATERAL_RATIO]) + RATE_PRECISION
+    debtOutstanding = convertFromUnderlying(assetRate, -int(vaultAccount[FCASH]))
+
+    maxLiquidatorDepositAssetCash = divInRatePrecision(
+        mulInRatePrecision(debtOutstanding, maxCollateralRatioPlusOne) - vaultShareValue,
+        maxCollateralRatioPlusOne - liquidationRate,
+    )
+
+    postLiquidationDebtRemaining = checked(debtOutstanding - maxLiquidatorDepositAssetCash)
+    minAccountBorrowSizeAssetCash = convertFromUnderlying(
+        assetRate, int(vaultConfig[MIN_ACCOUNT_BORROW_SIZE])
+    )
+    debtOutstandingAboveMinBorrow = checked(debtOutstanding - minAccountBorrowSizeAssetCash)
+
+    if postLiquidationDebtRemaining < minAccountBorrowSizeAssetCash:
+        # Liquidate such that the account has no fCash debt left
+        maxLiquidatorDepositAssetCash = debtOutstanding
+
+    depositRatio = div(checked(maxLiquidatorDepositAssetCash * liquidationRate), vaultShareValue)
+    if depositRatio >= RATE_PRECISION:
+        maxLiquidatorDepositAssetCash = divInRatePrecision(vaultShareValue, liquidationRate)
+
+    return (maxLiquidatorDepositAssetCash, debtOutstandingAboveMinBorrow)
+
+
+def getVaultBookRisk(
+    vaultConfig, vaultStates, valuation, vaultAccounts, blockTime, secondaryDebts=None
+):
+    """
+    Values every account in a vault at once. vaultStates is a dict of maturity to vault state,
+    vaultAccounts a dict of address to vault account and secondaryDebts an optional dict of
+    address to secondary debt outstanding. Returns a dict of address to (collateralRatio,
+    vaultShareValue, canDeleverage, maxLiquidatorDeposit), where canDeleverage mirrors the
+    checks in VaultAccountAction.deleverageAccount.
+    """
+    secondaryDebts = secondaryDebts or {}
+    deleverageDisabled = getFlag(vaultConfig, DISABLE_DELEVERAGE)
+    minCollateralRatio = int(vaultConfig[MIN_COLLATERAL_RATIO])
+    # Pool shares are linear in vault shares, strategy token values are not necessarily so they
+    # are still valued per account
+    vaultStates = {int(m): tuple(s) for (m, s) in vaultStates.items()}
+
+    results = {}
+    for (address, vaultAccount) in vaultAccounts.items():
+        maturity = int(vaultAccount[ACCOUNT_MATURITY])
+        if maturity == 0 or maturity not in vaultStates:
+            # Accounts without a position have no debt and cannot be deleveraged
+            results[address] = (INT256_MAX, 0, False, 0)
+            continue
+
+        (collateralRatio, vaultShareValue) = calculateCollateralRatio(
+            vaultConfig,
+            vaultStates[maturity],
+            valuation,
+            vaultAccount[ACCOUNT],
+            int(vaultAccount[VAULT_SHARES]),
+            int(vaultAccount[FCASH]),
+            secondaryDebts.get(address, 0),
+        )
+
+        canDeleverage = (
+            not deleverageDisabled and blockTime < maturity and collateralRatio < minCollateralRatio
+        )
+        maxLiquidatorDeposit = 0
+        if canDeleverage:
+            try:
+                (maxLiquidatorDeposit, _) = calculateDeleverageAmount(
+                    vaultAccount, vaultConfig, vaultShareValue
+                )
+            except Revert:
+                # The contract would revert when the vault shares have no value
+                canDeleverage = False
+
+        results[address] = (collateralRatio, vaultShareValue, canDeleverage, maxLiquidatorDeposit)
+
+    return results
+
+
+def setSettledVaultState(vaultState, vaultConfig, valuation, settlementRate, blockTime):
+    """
+    Mirrors VaultStateLib.setSettledVaultState, returning the settled vault state and the
+    (remainingStrategyTokens, remainingAssetCash) settled assets counters.
+    """
+    maturity = int(vaultState[STATE_MATURITY])
+    require(not vaultState[IS_SETTLED], "dev: cannot update vault state after settled")
+    require(maturity <= blockTime, "dev: cannot set settled state before maturity")
+
+    # Use the vault as the account for a globalized value
+    singleTokenValueInternal = _getStrategyTokenValueUnderlyingInternal(
+        valuation, vaultConfig[VAULT], INTERNAL_TOKEN_PRECISION, maturity
+    )
+
+    newState = list(vaultState)
+    newState[IS_SETTLED] = True
+    newState[SETTLEMENT_STRATEGY_TOKEN_VALUE] = singleTokenValueInternal
+
+    remainingAssetCash = checked(
+        int(vaultState[TOTAL_ASSET_CASH])
+        + convertFromUnderlying(settlementRate, int(vaultState[TOTAL_FCASH]))
+    )
+
+    return (tuple(newState), (int(vaultState[TOTAL_STRATEGY_TOKENS]), remainingAssetCash))
+
+
+def _getTotalAccountValueAtSettlement(
+    vaultAccount,
+    vaultState,
+    settlementRate,
+    totalStrategyTokenValueAtSettlement,
+    secondaryBorrowAdjustments,
+):
+    tempCashBalance = int(vaultAccount[TEMP_CASH_BALANCE])
+    totalVaultShareValueAtSettlement = checked(
+        totalStrategyTokenValueAtSettlement
+        + convertToUnderlying(settlementRate, int(vaultState[TOTAL_ASSET_CASH]))
+    )
+
+    totalAccountValue = 0
+    for (vaultShareValueAdjustment, accountValueAdjustment) in secondaryBorrowAdjustments:
+        totalVaultShareValueAtSettlement += vaultShareValueAdjustment
+        totalAccountValue -= accountValueAdjustment
+
+    totalAccountValue = checked(
+        totalAccountValue
+        + div(
+            checked(int(vaultAccount[VAULT_SHARES]) * totalVaultShareValueAtSettlement),
+            int(vaultState[TOTAL_VAULT_SHARES]),
+        )
+        + int(vaultAccount[FCASH])
+    )
+
+    if totalAccountValue < 0:
+        # The account is insolvent at settlement, the shortfall is marked on its cash balance
+        tempCashBalance = checked(
+            tempCashBalance + convertFromUnderlying(settlementRate, totalAccountValue)
+        )
+        totalAccountValue = 0
+
+    return (totalAccountValue, tempCashBalance)
+
+
+def _getAccountClaimsOnSettledMaturity(
+    vaultState,
+    settlementRate,
+    settledAssets,
+    reserveBalance,
+    totalAccountValue,
+    totalStrategyTokenValueAtSettlement,
+):
+    totalStrategyTokens = int(vaultState[TOTAL_STRATEGY_TOKENS])
+    assetCashClaim = 0
+    strategyTokenClaim = 0
+
+    residualAssetCashBalance = checked(
+        int(vaultState[TOTAL_ASSET_CASH])
+        + convertFromUnderlying(settlementRate, int(vaultState[TOTAL_FCASH]))
+    )
+    settledVaultValue = checked(
+        convertToUnderlying(settlementRate, residualAssetCashBalance)
+        + totalStrategyTokenValueAtSettlement
+    )
+
+    if settledVaultValue != 0:
+        strategyTokenClaim = div(
+            checked(totalAccountValue * totalStrategyTokens), settledVaultValue
+        )
+        require(strategyTokenClaim >= 0, "dev: uint256 overflow")
+        assetCashClaim = div(
+            checked(totalAccountValue * residualAssetCashBalance), settledVaultValue
+        )
+
+    (remainingStrategyTokens, remainingAssetCash) = settledAssets
+    if remainingStrategyTokens < strategyTokenClaim:
+        # Insufficient strategy tokens are converted to a cash claim at the settlement value
+        assetCashClaim = checked(
+            assetCashClaim
+            + convertFromUnderlying(
+                settlementRate,
+                div(
+                    checked(
+                        (strategyTokenClaim - remainingStrategyTokens)
+                        * int(vaultState[SETTLEMENT_STRATEGY_TOKEN_VALUE])
+                    ),
+                    INTERNAL_TOKEN_PRECISION,
+                ),
+            )
+        )
+        strategyTokenClaim = remainingStrategyTokens
+        remainingStrategyTokens = 0
+    else:
+        remainingStrategyTokens -= strategyTokenClaim
+
+    require(assetCashClaim >= 0)
+    if remainingAssetCash < assetCashClaim:
+        shortfall = (
+            assetCashClaim - remainingAssetCash if remainingAssetCash > 0 else assetCashClaim
+        )
+
+        # VaultConfiguration.resolveShortfallWithReserve
+        if shortfall <= reserveBalance:
+            assetCashRaised = shortfall
+            reserveBalance -= shortfall
+        else:
+            assetCashRaised = reserveBalance
+            reserveBalance = 0
+
+        if remainingAssetCash > 0:
+            assetCashClaim = checked(remainingAssetCash + assetCashRaised)
+            remainingAssetCash = 0
+        else:
+            assetCashClaim = assetCashRaised
+    else:
+        remainingAssetCash = checked(remainingAssetCash - assetCashClaim)
+
+    return (
+        assetCashClaim,
+        strategyTokenClaim,
+        (remainingStrategyTokens, remainingAssetCash),
+        reserveBalance,
+    )
+
+
+def settleVaultAccount(
+    vaultAccount,
+    vaultState,
+    settlementRate,
+    settledAssets,
+    reserveBalance,
+    secondaryBorrowAdjustments=(),
+):
+    """
+    Mirrors VaultAccountLib.settleVaultAccount for a settled vault state. settledAssets are the
+    (remainingStrategyTokens, remainingAssetCash) counters and reserveBalance is the reserve cash
+    balance of the borrow currency. secondaryBorrowAdjustments is a list of
+    (vaultShareValueAdjustment, accountValueAdjustment) per secondary borrow currency. Returns
+    (newVaultAccount, strategyTokenClaim, newSettledAssets, newReserveBalance).
+    """
+    require(vaultState[IS_SETTLED], "Not Settled")
+
+    totalStrategyTokenValueAtSettlement = div(
+        checked(
+            int(vaultState[TOTAL_STRATEGY_TOKENS])
+            * int(vaultState[SETTLEMENT_STRATEGY_TOKEN_VALUE])
+        ),
+        INTERNAL_TOKEN_PRECISION,
+    )
+
+    (totalAccountValue, tempCashBalance) = _getTotalAccountValueAtSettlement(
+        vaultAccount,
+        vaultState,
+        settlementRate,
+        totalStrategyTokenValueAtSettlement,
+        secondaryBorrowAdjustments,
+    )
+
+    (
+        assetCashClaim,
+        strategyTokenClaim,
+        settledAssets,
+        reserveBalance,
+    ) = _getAccountClaimsOnSettledMaturity(
+        vaultState,
+        settlementRate,
+        tuple(int(v) for v in settledAssets),
+        int(reserveBalance),
+        totalAccountValue,
+        totalStrategyTokenValueAtSettlement,
+    )
+
+    newVaultAccount = list(vaultAccount)
+    newVaultAccount[FCASH] = 0
+    newVaultAccount[ACCOUNT_MATURITY] = 0
+    newVaultAccount[VAULT_SHARES] = 0
+    newVaultAccount[TEMP_CASH_BALANCE] = checked(tempCashBalance + assetCashClaim)
+
+    return (tuple(newVaultAccount), strategyTokenClaim, settledAssets, reserveBalance)
+
+
+def batchSettleVaultAccounts(
+    vaultState,
+    settlementRate,
+    settledAssets,
+    reserveBalance,
+    vaultAccounts,
+    secondaryBorrowAdjustments=None,
+):
+    """
+    Settles vault accounts in a single settled maturity in the order given, vaultAccounts is a
+    dict of address to vault account. Shortfalls are resolved in order, the same way as
+    accounts settling one after another. Returns a dict of address to (newVaultAccount,
+    strategyTokenClaim) along with the final settled assets and reserve balance.
+    """
+    secondaryBorrowAdjustments = secondaryBorrowAdjustments or {}
+    results = {}
+    for (address, vaultAccount) in vaultAccounts.items():
+        (newVaultAccount, strategyTokenClaim, settledAssets, reserveBalance) = settleVaultAccount(
+            vaultAccount,
+            vaultState,
+            settlementRate,
+            settledAssets,
+            reserveBalance,
+            secondaryBorrowAdjustments.get(address, ()),
+        )
+        results[address] = (newVaultAccount, strategyTokenClaim)
+
+    return (results, settledAssets, reserveBalance)
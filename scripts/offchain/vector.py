@@ -0,0 +1,23 @@
+# Helpers for evaluating the off chain models over whole arrays of inputs. Any sequence type
+# (lists, tuples, numpy arrays) is accepted, elements are converted to Python integers since
+# the contract math routinely exceeds 64 bits.
+
+
+def isArray(value):
+    return hasattr(value, "__len__") and not isinstance(value, (str, bytes, bytearray))
+
+
+def broadcast(*columns):
+    # Scalars and length one arrays are repeated to match the longest array
+    lengths = set(len(c) for c in columns if isArray(c) and len(c) != 1)
+    if len(lengths) > 1:
+        raise Exception("Array lengths do not match: {}".format(sorted(lengths)))
+    n = lengths.pop() if lengths else 1
+
+    return [
+        list(c) if isArray(c) and len(c) == n else [c[0] if isArray(c) else c] * n for c in columns
+    ]
+
+
+def toInts(values):
+    return [int(v) for v in values]
@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from glob import glob
+
+# Runs test modules in parallel, each worker runs pytest against its own local node. Run from
+# the project root with: python scripts/run_tests.py -n 16 tests/internal tests/stateful
+SHARD_DIR = "build/test-shards"
+DURATIONS_PATH = "build/test-durations.json"
+DEFAULT_PATHS = [
+    "tests/adapters",
+    "tests/internal",
+    "tests/test_authentication.py",
+    "tests/stateful",
+]
+# Assumed duration for modules that have not been run before
+DEFAULT_DURATION = 60.0
+BASE_PORT = 8646
+# Matches the development network in brownie-config.yaml
+NODE_SETTINGS = ["accounts=20", "mnemonic=owner dignity sense", "default_balance=100000"]
+# Coverage highlight colors, partially covered branches are merged to the better color
+HIGHLIGHT_RANK = {"red": 0, "orange": 1, "yellow": 1, "green": 2}
+
+
+def getTestModules(paths):
+    modules = []
+    for path in paths:
+        if os.path.isfile(path):
+            modules.append(path)
+        else:
+            modules.extend(glob(os.path.join(path, "**", "test_*.py"), recursive=True))
+
+    # Fork tests run against a different network
+    return sorted(set(m for m in modules if "mainnet-fork" not in m))
+
+
+def loadDurations():
+    if not os.path.exists(DURATIONS_PATH):
+        return {}
+    with open(DURATIONS_PATH, "r") as f:
+        return json.load(f)
+
+
+def assignShards(modules, durations, numWorkers):
+    """
+    Assigns modules to workers by longest processing time first, each module goes to the worker
+    with the least total recorded duration
+    """
+    shards = [[] for _ in range(numWorkers)]
+    loads = [0.0] * numWorkers
+    for module in sorted(modules, key=lambda m: (-durations.get(m, DEFAULT_DURATION), m)):
+        worker = loads.index(min(loads))
+        shards[worker].append(module)
+        loads[worker] += durations.get(module, DEFAULT_DURATION)
+
+    return [(shard, load) for (shard, load) in zip(shards, loads) if len(shard) > 0]
+
+
+def isStatefulModule(module):
+    return "stateful" in os.path.normpath(module).split(os.sep)
+
+
+def assignWorkerGroups(modules, durations, numWorkers):
+    """
+    Assigns stateful and other modules to separate workers. Brownie's module isolation resets the
+    chain around every module outside tests/stateful, which would discard the session environment
+    that stateful modules share in the same process. Workers are split between the two groups by
+    their total recorded duration, each group gets at least one.
+    """
+    groups = [[m for m in modules if isStatefulModule(m)]]
+    groups.append([m for m in modules if not isStatefulModule(m)])
+    groups = [g for g in groups if len(g) > 0]
+    if len(groups) < 2:
+        return assignShards(modules, durations, numWorkers)
+
+    loads = [sum(durations.get(m, DEFAULT_DURATION) for m in group) for group in groups]
+    statefulWorkers = round(numWorkers * loads[0] / sum(loads))
+    statefulWorkers = max(1, min(numWorkers - 1, statefulWorkers))
+    return assignShards(groups[0], durations, statefulWorkers) + assignShards(
+        groups[1], durations, max(1, numWorkers - statefulWorkers)
+    )
+
+
+def removeShardNetwork(network):
+    subprocess.run(
+        ["brownie", "networks", "delete", network],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def addShardNetwork(shard, nodeCmd):
+    # Brownie launches and kills a node for each network, so each shard gets its own port. The
+    # networks are added to the global brownie config and must be removed after the run.
+    network = "notional-shard-{}".format(shard)
+    removeShardNetwork(network)
+    subprocess.run(
+        [
+            "brownie",
+            "networks",
+            "add",
+            "Development",
+            network,
+            "cmd={}".format(nodeCmd),
+            "host=http://127.0.0.1",
+            "port={}".format(BASE_PORT + 1 + shard),
+        ]
+        + NODE_SETTINGS,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return network
+
+
+def startShard(shard, modules, network, coverage, pytestArgs):
+    args = [sys.executable, "-m", "pytest", "--network", network]
+    args += ["--junitxml", os.path.join(SHARD_DIR, "shard-{}.xml".format(shard))]
+    if coverage:
+        args.append("--coverage")
+
+    env = dict(os.environ, NOTIONAL_TEST_SHARD=str(shard))
+    log = open(os.path.join(SHARD_DIR, "shard-{}.log".format(shard)), "w")
+    return subprocess.Popen(
+        args + pytestArgs + modules, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def getModuleDurations(modules, shards):
+    """Sums junit test case times by module"""
+    dottedModules = {m[:-3].replace(os.sep, "."): m for m in modules}
+    durations = {}
+    results = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0}
+
+    for shard in shards:
+        path = os.path.join(SHARD_DIR, "shard-{}.xml".format(shard))
+        if not os.path.exists(path):
+            continue
+
+        for suite in ET.parse(path).getroot().iter("testsuite"):
+            for key in results.keys():
+                results[key] += int(suite.get(key, 0))
+
+            for case in suite.iter("testcase"):
+                classname = case.get("classname", "")
+                module = next(
+                    (
+                        m
+                        for (dotted, m) in dottedModules.items()
+                        if classname == dotted or classname.startswith(dotted + ".")
+                    ),
+                    None,
+                )
+                if module is not None:
+                    durations[module] = durations.get(module, 0.0) + float(case.get("time", 0))
+
+    return (durations, results)
+
+
+def mergeJunit(shards):
+    merged = ET.Element("testsuites")
+    for shard in shards:
+        path = os.path.join(SHARD_DIR, "shard-{}.xml".format(shard))
+        if os.path.exists(path):
+            merged.extend(ET.parse(path).getroot().iter("testsuite"))
+
+    ET.ElementTree(merged).write(os.path.join(SHARD_DIR, "results.xml"))
+
+
+def _mergeCoverage(a, b):
+    if isinstance(a, dict) and isinstance(b, dict):
+        return {
+            k: _mergeCoverage(a[k], b[k]) if k in a and k in b else a.get(k, b.get(k))
+            for k in set(a) | set(b)
+        }
+    elif isinstance(a, list) and isinstance(b, list):
+        return sorted(set(a) | set(b))
+    return a
+
+
+def _mergeHighlights(a, b):
+    if isinstance(a, dict) and isinstance(b, dict):
+        return {
+            k: _mergeHighlights(a[k], b[k]) if k in a and k in b else a.get(k, b.get(k))
+            for k in set(a) | set(b)
+        }
+
+    # Highlights are lists of [start, stop, color, message]
+    merged = {}
+    for highlight in a + b:
+        key = tuple(highlight[0:2])
+        if key not in merged or HIGHLIGHT_RANK.get(highlight[2], 0) > HIGHLIGHT_RANK.get(
+            merged[key][2], 0
+        ):
+            merged[key] = highlight
+    return [merged[k] for k in sorted(merged.keys())]
+
+
+def mergeCoverage(shards):
+    """
+    Merges the coverage report of each shard into reports/coverage.json. Covered statements and
+    branches are combined, highlights take the most covered color of each shard.
+    """
+    merged = None
+    for shard in shards:
+        path = os.path.join(SHARD_DIR, "coverage-{}.json".format(shard))
+        if not os.path.exists(path):
+            continue
+
+        with open(path, "r") as f:
+            report = json.load(f)
+
+        if merged is None:
+            merged = report
+        else:
+            merged["coverage"] = _mergeCoverage(merged["coverage"], report["coverage"])
+            merged["highlights"] = _mergeHighlights(merged["highlights"], report["highlights"])
+
+    if merged is not None:
+        os.makedirs("reports", exist_ok=True)
+        with open("reports/coverage.json", "w") as f:
+            json.dump(merged, f, sort_keys=True, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs test modules in parallel local nodes")
+    parser.add_argument("paths", nargs="*", default=DEFAULT_PATHS)
+    parser.add_argument("-n", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--coverage", action="store_true")
+    parser.add_argument("--node-cmd", default="ganache-cli")
+    parser.add_argument("--pytest-args", default="", help="Additional arguments for each worker")
+    args = parser.parse_args()
+
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    for path in glob(os.path.join(SHARD_DIR, "*")):
+        os.remove(path)
+
+    modules = getTestModules(args.paths)
+    durations = loadDurations()
+    assignments = assignWorkerGroups(modules, durations, args.workers)
+
+    networks = []
+    workers = {}
+    try:
+        for (shard, (shardModules, expected)) in enumerate(assignments):
+            networks.append(addShardNetwork(shard, args.node_cmd))
+            workers[shard] = startShard(
+                shard, shardModules, networks[-1], args.coverage, args.pytest_args.split()
+            )
+            print(
+                "Shard {}: {} modules, expected {:.0f}s".format(shard, len(shardModules), expected)
+            )
+
+        start = time.time()
+        exitCodes = {shard: worker.wait() for (shard, worker) in workers.items()}
+        print("Finished in {:.0f}s".format(time.time() - start))
+    finally:
+        # Workers are still running if the run was interrupted or a network failed to be added
+        for worker in workers.values():
+            if worker.poll() is None:
+                worker.terminate()
+                worker.wait()
+        for network in networks:
+            removeShardNetwork(network)
+
+    mergeJunit(workers.keys())
+    (moduleDurations, results) = getModuleDurations(modules, workers.keys())
+    durations.update(moduleDurations)
+    with open(DURATIONS_PATH, "w") as f:
+        json.dump(durations, f, sort_keys=True, indent=2)
+
+    if args.coverage:
+        mergeCoverage(workers.keys())
+
+    print(
+        "{tests} tests, {failures} failures, {errors} errors, {skipped} skipped".format(**results)
+    )
+    for (shard, code) in exitCodes.items():
+        if code != 0:
+            print(
+                "Shard {} exited with {}, see {}".format(
+                    shard, code, os.path.join(SHARD_DIR, "shard-{}.log".format(shard))
+                )
+            )
+
+    return max(exitCodes.values(), default=0)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import re
+
+from brownie.network import web3
+
+# Attributes SLOAD and SSTORE gas in a transaction to named Notional storage areas. Slots are
+# decoded from the struct log trace of the local node: every keccak256 preimage in the trace is
+# recorded so that a mapping slot can be followed back through its parent slots to a root slot in
+# LibStorage or StorageLayoutV1/V2. Print the breakdown for a transaction with:
+#   brownie run scripts/storage_profile.py main <txid>
+LIB_STORAGE_PATH = "contracts/global/LibStorage.sol"
+
+# State variables of StorageLayoutV1 and StorageLayoutV2 by slot, slot zero packs maxCurrencyId,
+# liquidationEnabledState, hasInitialized and owner
+LAYOUT_SLOTS = {
+    0: "owner",
+    1: "pauseRouter",
+    2: "pauseGuardian",
+    3: "rollbackRouterImplementation",
+    4: "nTokenWhitelist",
+    5: "nTokenAllowance",
+    6: "globalTransferOperator",
+    7: "accountAuthorizedTransferOperator",
+    8: "authorizedCallbackContract",
+    9: "tokenAddressToCurrencyId",
+    10: "reentrancyStatus",
+    11: "treasuryManagerContract",
+    12: "reserveBuffer",
+    13: "pendingOwner",
+}
+
+# EIP-1967 implementation slot of the Notional proxy
+CONSTANT_SLOTS = {
+    0x360894A13BA1A3210667C828492DB98DCA3E2076CC3735A920A3CA505D382BBC: "proxyImplementation",
+}
+
+# LibStorage ids reported under a shared area name, every other id is reported by its own name
+STORAGE_AREAS = {
+    "AccountStorage": "accountContext",
+    "Balance": "balances",
+    "PortfolioArray": "portfolioArray",
+    "AssetsBitmap": "ifCashBitmap",
+    "ifCashBitmap": "ifCashBitmap",
+    "Market": "markets",
+    "nTokenContext": "nTokenContext",
+}
+
+# Largest offset from a hashed slot that is still attributed to it, covers struct fields and the
+# fixed length portfolio array
+MAX_SLOT_OFFSET = 64
+CALL_OPS = {"CALL", "STATICCALL", "DELEGATECALL", "CALLCODE", "CREATE", "CREATE2"}
+
+
+def getLibStorageSlots(path=LIB_STORAGE_PATH):
+    """Returns root slot => storage id name, read from the StorageId enum in LibStorage.sol"""
+    with open(path, "r") as f:
+        source = f.read()
+
+    base = int(re.search(r"STORAGE_SLOT_BASE\s*=\s*(\d+)", source).group(1))
+    enum = re.search(r"enum StorageId\s*{(.*?)}", source, re.DOTALL).group(1)
+    enum = re.sub(r"//.*", "", enum)
+    names = [n.strip() for n in enum.split(",") if n.strip() != ""]
+    return {base + i: STORAGE_AREAS.get(name, name) for (i, name) in enumerate(names)}
+
+
+def _toInt(word):
+    return int(word, 16)
+
+
+def _readMemory(memory, offset, size):
+    # Memory is traced as a list of 32 byte words
+    words = memory[offset // 32 : (offset + size + 31) // 32]
+    data = bytes.fromhex("".join(w[2:] if w.startswith("0x") else w for w in words))
+    return data[offset % 32 : offset % 32 + size]
+
+
+class StorageProfiler:
+    """
+    Decodes storage slots accessed by Notional, storage of other contracts is reported under the
+    name given in contractNames or its address
+    """
+
+    def __init__(self, notionalAddress, contractNames=None):
+        self.notional = notionalAddress.lower()
+        self.contractNames = {a.lower(): n for (a, n) in (contractNames or {}).items()}
+        self.rootSlots = dict(LAYOUT_SLOTS)
+        self.rootSlots.update(getLibStorageSlots())
+
+    def getStructLogs(self, txid):
+        response = web3.provider.make_request(
+            "debug_traceTransaction",
+            [
+                txid if isinstance(txid, str) else txid.hex(),
+                {"disableStorage": True, "disableMemory": False, "enableMemory": True},
+            ],
+        )
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response["result"]["structLogs"]
+
+    def _resolveSlot(self, slot, preimages):
+        """Returns the area of a Notional storage slot"""
+        for _ in range(8):
+            if slot in self.rootSlots:
+                return self.rootSlots[slot]
+            if slot in CONSTANT_SLOTS:
+                return CONSTANT_SLOTS[slot]
+
+            parent = None
+            for offset in range(MAX_SLOT_OFFSET):
+                if slot - offset in preimages:
+                    parent = preimages[slot - offset]
+                    break
+            if parent is None:
+                return "unknown"
+            slot = parent
+
+        return "unknown"
+
+    def profile(self, txid):
+        """
+        Returns {area: {"sload" | "sstore": {"cold" | "warm": {"count": int, "gas": int}}}} for
+        the transaction. An access is cold the first time its contract and slot are touched in the
+        transaction.
+        """
+        txn = web3.eth.get_transaction(txid)
+        structLogs = self.getStructLogs(txid)
+        rootDepth = structLogs[0]["depth"] if len(structLogs) > 0 else 1
+        contexts = {rootDepth: (txn["to"] or "").lower()}
+        # Mapping slot => parent slot, from the keccak256 of (key, parent slot)
+        preimages = {}
+        accessed = set()
+        areas = {}
+
+        for (i, step) in enumerate(structLogs):
+            op = step["op"]
+            stack = step.get("stack") or []
+            nextStep = structLogs[i + 1] if i + 1 < len(structLogs) else None
+
+            if op in ("SHA3", "KECCAK256") and nextStep is not None:
+                (offset, size) = (_toInt(stack[-1]), _toInt(stack[-2]))
+                if size == 64 and step.get("memory"):
+                    data = _readMemory(step["memory"], offset, size)
+                    preimages[_toInt(nextStep["stack"][-1])] = int.from_bytes(data[32:], "big")
+                elif size == 32 and step.get("memory"):
+                    # Dynamic arrays and bytes are stored at the hash of their slot
+                    data = _readMemory(step["memory"], offset, size)
+                    preimages[_toInt(nextStep["stack"][-1])] = int.from_bytes(data, "big")
+
+            elif op in CALL_OPS and nextStep is not None and nextStep["depth"] > step["depth"]:
+                # Delegated calls run against the storage of the calling contract
+                if op in ("CALL", "STATICCALL"):
+                    context = "0x{:040x}".format(_toInt(stack[-2]) & (2 ** 160 - 1))
+                elif op in ("DELEGATECALL", "CALLCODE"):
+                    context = contexts[step["depth"]]
+                else:
+                    context = None
+                contexts[nextStep["depth"]] = context
+
+            elif op in ("SLOAD", "SSTORE"):
+                context = contexts.get(step["depth"])
+                slot = _toInt(stack[-1])
+                if context == self.notional:
+                    area = self._resolveSlot(slot, preimages)
+                else:
+                    area = self.contractNames.get(context, context or "unknown")
+
+                temperature = "warm" if (context, slot) in accessed else "cold"
+                accessed.add((context, slot))
+                entry = areas.setdefault(area, {}).setdefault(op.lower(), {})
+                entry = entry.setdefault(temperature, {"count": 0, "gas": 0})
+                entry["count"] += 1
+                entry["gas"] += step["gasCost"]
+
+        return areas
+
+
+def formatProfile(profile):
+    rowFormat = "{:<36}{:>16}{:>16}{:>16}{:>16}"
+    lines = [rowFormat.format("Area", "SLOAD cold", "SLOAD warm", "SSTORE cold", "SSTORE warm")]
+    for area in sorted(profile.keys(), key=lambda a: -_totalGas(profile[a])):
+        values = []
+        for op in ["sload", "sstore"]:
+            for temperature in ["cold", "warm"]:
+                entry = profile[area].get(op, {}).get(temperature, {"count": 0, "gas": 0})
+                values.append("{} ({})".format(entry["gas"], entry["count"]))
+        lines.append(rowFormat.format(area, *values))
+    return "\n".join(lines)
+
+
+def _totalGas(areaProfile):
+    return sum(e["gas"] for op in areaProfile.values() for e in op.values())
+
+
+def getContractNames(env):
+    """Names the token contracts of a TestEnvironment"""
+    names = {}
+    for (symbol, token) in env.token.items():
+        names[token.address] = symbol
+    for (symbol, cToken) in env.cToken.items():
+        names[cToken.address] = "c" + symbol
+    for (currencyId, nToken) in env.nToken.items():
+        names[nToken.address] = "nToken{}".format(currencyId)
+    return names
+
+
+def main(txid, notionalAddress=None):
+    if notionalAddress is None:
+        notionalAddress = web3.eth.get_transaction(txid)["to"]
+
+    print(formatProfile(StorageProfiler(notionalAddress).profile(txid)))
@@ -1,6 +1,35 @@
+import fcntl
+import os
+import shutil
+
 import pytest
 
+pytest_plugins = ["tests.rpc_profiler", "tests.gas_profiler"]
+
+# Set by scripts/run_tests.py when running a test shard
+TEST_SHARD = os.environ.get("NOTIONAL_TEST_SHARD")
+SHARD_DIR = "build/test-shards"
+
 
 @pytest.fixture(scope="module", autouse=True)
 def shared_setup(module_isolation):
     pass
+
+
+@pytest.hookimpl(hookwrapper=True, tryfirst=True)
+def pytest_sessionfinish(session):
+    if TEST_SHARD is None:
+        yield
+        return
+
+    # Brownie writes every coverage report to the same path, shards hold a lock while it is
+    # written so the report can be moved aside for merging
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    with open(os.path.join(SHARD_DIR, "coverage.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+        if os.path.exists("reports/coverage.json"):
+            shutil.move(
+                "reports/coverage.json",
+                os.path.join(SHARD_DIR, "coverage-{}.json".format(TEST_SHARD)),
+            )
@@ -0,0 +1,136 @@
+import os
+import random
+from collections import Counter, namedtuple
+
+from hypothesis import HealthCheck, Phase, given, settings
+from hypothesis import strategies as st
+from scripts.offchain.safe_int import Revert
+
+# Differential fuzzing runs a strategy against a Python model at high volume and only forwards
+# a stratified sample, plus every boundary and failing input, to the mock contracts. Raise the
+# number of model examples with e.g. DIFFERENTIAL_EXAMPLES=100000 brownie test -m differential
+DIFFERENTIAL_EXAMPLES = int(os.environ.get("DIFFERENTIAL_EXAMPLES", 5000))
+SAMPLES_PER_STRATUM = int(os.environ.get("DIFFERENTIAL_SAMPLES_PER_STRATUM", 3))
+
+DifferentialCase = namedtuple("DifferentialCase", ["inputs", "result", "reason"])
+
+
+class DifferentialRun:
+    """
+    Result of running a model over a strategy. Cases are the inputs to check against the
+    contracts, each with the model result (or the Revert it raised) and the reason it was
+    selected: failing, boundary or sample.
+    """
+
+    def __init__(self, cases, strata, examples):
+        self.cases = cases
+        self.strata = strata
+        self.examples = examples
+
+    @property
+    def failing(self):
+        return [c for c in self.cases if c.reason == "failing"]
+
+    def summary(self):
+        reasons = Counter(c.reason for c in self.cases)
+        return "{} model examples in {} strata, {} forwarded ({})".format(
+            self.examples,
+            len(self.strata),
+            len(self.cases),
+            ", ".join("{} {}".format(n, r) for (r, n) in sorted(reasons.items())),
+        )
+
+
+def _inputKey(inputs):
+    return tuple(sorted((k, repr(v)) for (k, v) in inputs.items()))
+
+
+def run_model(
+    model,
+    strategies,
+    stratify,
+    isBoundary=None,
+    check=None,
+    examples=None,
+    samplesPerStratum=None,
+):
+    """
+    Runs model(**inputs) for inputs drawn from the dictionary of strategies.
+
+    stratify(inputs, result) returns a hashable stratum, a sample of each stratum is kept.
+    isBoundary(inputs, result) marks inputs that are always forwarded, as are inputs where
+    check(inputs, result) is false or the model raises anything other than a Revert. Results
+    are the model return value or the Revert instance it raised.
+    """
+    examples = DIFFERENTIAL_EXAMPLES if examples is None else examples
+    samplesPerStratum = SAMPLES_PER_STRATUM if samplesPerStratum is None else samplesPerStratum
+    # Sampling is seeded so that the same cases are forwarded on every run
+    rng = random.Random(0)
+    strata = {}
+    seen = Counter()
+    failing = {}
+    boundary = {}
+    count = [0]
+
+    @settings(
+        max_examples=examples,
+        database=None,
+        deadline=None,
+        derandomize=True,
+        phases=[Phase.explicit, Phase.generate],
+        suppress_health_check=list(HealthCheck),
+    )
+    @given(inputs=st.fixed_dictionaries(strategies))
+    def explore(inputs):
+        count[0] += 1
+        key = _inputKey(inputs)
+        try:
+            result = model(**inputs)
+        except Revert as e:
+            result = e
+        except Exception as e:
+            failing[key] = DifferentialCase(inputs, e, "failing")
+            return
+
+        if check is not None and not check(inputs, result):
+            failing[key] = DifferentialCase(inputs, result, "failing")
+        elif isBoundary is not None and isBoundary(inputs, result):
+            boundary[key] = DifferentialCase(inputs, result, "boundary")
+
+        # Reservoir sample of each stratum
+        stratum = stratify(inputs, result)
+        seen[stratum] += 1
+        samples = strata.setdefault(stratum, [])
+        if len(samples) < samplesPerStratum:
+            samples.append((key, DifferentialCase(inputs, result, "sample")))
+        else:
+            i = rng.randrange(seen[stratum])
+            if i < samplesPerStratum:
+                samples[i] = (key, DifferentialCase(inputs, result, "sample"))
+
+    explore()
+
+    # Every failing and boundary input is forwarded, boundaries should be narrowly defined
+    cases = list(failing.values())
+    cases += [c for (k, c) in boundary.items() if k not in failing]
+
+    forwarded = set(failing.keys()) | set(boundary.keys())
+    for stratum in sorted(strata.keys(), key=repr):
+        cases += [c for (k, c) in strata[stratum] if k not in forwarded]
+
+    return DifferentialRun(cases, dict(seen), count[0])
+
+
+def forward_cases(run, check):
+    """
+    Calls check(inputs, result) against the contracts for every forwarded case, collecting
+    assertion failures so that a single test reports every mismatched input
+    """
+    mismatches = []
+    for case in run.cases:
+        try:
+            check(case.inputs, case.result)
+        except AssertionError as e:
+            mismatches.append("{} input {}: {}".format(case.reason, case.inputs, e))
+
+    assert len(mismatches) == 0, "\n".join([run.summary()] + mismatches)
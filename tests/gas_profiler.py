@@ -0,0 +1,76 @@
+import pytest
+from brownie import history
+from scripts.gas_profile import CallTreeProfile
+
+# Aggregates gas per Solidity function over every transaction sent during the test run. Enabled
+# with --gas-profile=<folded stacks path>, e.g.
+#   brownie test tests/stateful --gas-profile=gas.folded && flamegraph.pl gas.folded > gas.svg
+# Transactions are traced at the end of each test phase, before isolation fixtures revert them.
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("gas profile")
+    group.addoption(
+        "--gas-profile",
+        action="store",
+        default=None,
+        help="Write gas per Solidity call stack to this file in folded stack format",
+    )
+    group.addoption(
+        "--gas-profile-top",
+        action="store",
+        type=int,
+        default=30,
+        help="Number of functions to show in the gas profile summary",
+    )
+
+
+def pytest_configure(config):
+    if config.getoption("--gas-profile"):
+        config.pluginmanager.register(GasProfiler(config), "gas_profiler")
+
+
+class GasProfiler:
+    def __init__(self, config):
+        self.outputPath = config.getoption("--gas-profile")
+        self.top = config.getoption("--gas-profile-top")
+        self.profile = CallTreeProfile()
+        self.failed = 0
+
+    def _collect(self, before):
+        # Transactions are compared by identity, isolation reverts remove them from the history
+        # and later tests can send identical transactions with the same hash. The list of
+        # earlier transactions keeps them alive so that their ids are not reused.
+        known = set(id(txn) for txn in before)
+        for txn in list(history):
+            if id(txn) in known:
+                continue
+
+            try:
+                self.profile.addTransaction(txn)
+            except Exception:
+                # Traces are unavailable for some transactions, e.g. on forked networks
+                self.failed += 1
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_setup(self, item):
+        before = list(history)
+        yield
+        self._collect(before)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        before = list(history)
+        yield
+        self._collect(before)
+
+    def pytest_sessionfinish(self, session):
+        self.profile.writeFolded(self.outputPath)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        terminalreporter.section("gas profile")
+        for line in self.profile.summaryLines(self.top):
+            terminalreporter.write_line(line)
+        if self.failed > 0:
+            terminalreporter.write_line("{} transactions could not be traced".format(self.failed))
+        terminalreporter.write_line("Folded stacks written to {}".format(self.outputPath))
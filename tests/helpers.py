@@ -7,6 +7,7 @@ from brownie.test import strategy
 from eth_abi.packed import encode_abi_packed
 from scripts.config import CurrencyDefaults, nTokenDefaults
 from scripts.deployment import TestEnvironment
+from scripts.offchain.bitmap import getBitmapFromBitNums, getBitNums, toBytes32
 from tests.constants import (
     BALANCE_FLAG_INT,
     CASH_GROUP_PARAMETERS,
@@ -194,29 +195,15 @@ def get_portfolio_array(length, cashGroups, **kwargs):
     return portfolio
 
 
-def get_bitstring_from_bitmap(bitmap):
-    if bitmap.hex() == "":
-        return []
-
-    num_bits = str(len(bitmap) * 8)
-    bitstring = ("{:0>" + num_bits + "b}").format(int(bitmap.hex(), 16))
-
-    return bitstring
-
-
-def get_bitmap_from_bitlist(bitmapList):
-    return "0x{:0{}x}".format(int("".join(bitmapList), 2), 64)
+def get_bitmap_from_bitnums(bitNums):
+    return toBytes32(getBitmapFromBitNums(bitNums))
 
 
 def random_asset_bitmap(numAssets, maxBit=254):
-    # Choose K bits to set
-    bitmapList = ["0"] * 256
-    setBits = random.choices(range(0, maxBit), k=numAssets)
-    for b in setBits:
-        bitmapList[b] = "1"
-    bitmap = get_bitmap_from_bitlist(bitmapList)
-
-    return (bitmap, bitmapList)
+    # Choose K bits to set, returns the bytes32 bitmap and the set bit numbers in ascending order
+    bitmap = getBitmapFromBitNums(random.choices(range(1, maxBit + 1), k=numAssets))
+
+    return (toBytes32(bitmap), getBitNums(bitmap))
 
 
 def currencies_list_to_active_currency_bytes(currenciesList):
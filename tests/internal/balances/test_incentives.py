@@ -1,7 +1,10 @@
+import random
+
 import pytest
 from brownie.convert import to_bytes
 from brownie.convert.datatypes import HexString, Wei
 from brownie.test import given, strategy
+from scripts.offchain.incentives import batchGetClaimableIncentives
 from tests.constants import SECONDS_IN_DAY, SECONDS_IN_YEAR, START_TIME
 from tests.helpers import get_balance_state
 
@@ -160,6 +163,72 @@ class TestIncentives:
         )
         assert incentivesToClaimMinnow3 > incentivesToClaimMinnow2
 
+    @given(
+        nTokensMinted=strategy("uint", min_value=1e8, max_value=1e18),
+        timeSinceMigration=strategy("uint", min_value=0, max_value=SECONDS_IN_YEAR),
+    )
+    def test_incentives_model(self, incentives, nTokensMinted, timeSinceMigration, accounts):
+        incentives.setEmissionRateDirect(accounts[9], 10_000)
+        incentives.setDeprecatedStorageValues(accounts[9], 100_000e8, 1_000_000e8, START_TIME)
+        incentives.migrateNToken(1, START_TIME)
+        migration = incentives.getDeprecatedNTokenSupplyFactors(accounts[9])
+
+        blockTime = START_TIME + timeSinceMigration
+        supplyFactors = incentives.getStoredNTokenSupplyFactors(accounts[9])
+        for (lastClaimTime, lastClaimSupply) in [(START_TIME - 86400, 950_000e8), (0, 0)]:
+            balanceState = get_balance_state(
+                1,
+                storedNTokenBalance=nTokensMinted,
+                lastClaimTime=lastClaimTime,
+                lastClaimSupply=lastClaimSupply,
+            )
+            (incentivesToClaim, _) = incentives.calculateIncentivesToClaim(
+                accounts[9], balanceState, blockTime, nTokensMinted
+            )
+
+            ((claimable,),) = batchGetClaimableIncentives(
+                supplyFactors,
+                10_000,
+                migration,
+                [nTokensMinted],
+                [lastClaimTime],
+                [lastClaimSupply],
+                [blockTime],
+            )
+            assert claimable == incentivesToClaim
+
+    def test_incentives_model_emission_rate_changes(self, incentives, accounts):
+        incentives.changeNTokenSupply(accounts[9], 100_000e8, START_TIME)
+        incentives.setEmissionRate(accounts[9], 50_000, START_TIME)
+        supplyFactors = incentives.getStoredNTokenSupplyFactors(accounts[9])
+        migration = incentives.getDeprecatedNTokenSupplyFactors(accounts[9])
+
+        holders = [random.randint(1e8, 50_000e8) for _ in range(0, 10)]
+        blockTimes = [START_TIME + i * SECONDS_IN_DAY * 30 for i in range(1, 13)]
+        emissionRateChanges = [
+            (START_TIME + SECONDS_IN_DAY * 45, 20_000),
+            (START_TIME + SECONDS_IN_DAY * 200, 80_000),
+        ]
+        results = batchGetClaimableIncentives(
+            supplyFactors, 50_000, migration, holders, 0, 0, blockTimes, emissionRateChanges
+        )
+
+        # Apply the emission rate changes on chain then compare each holder at each block time
+        for (changeTime, emissionRate) in emissionRateChanges:
+            incentives.setEmissionRate(accounts[9], emissionRate, changeTime)
+
+        for (blockTime, claimable) in zip(blockTimes, results):
+            if blockTime < emissionRateChanges[-1][0]:
+                # The on chain accumulation has already moved past this block time
+                continue
+
+            for (nTokenBalance, modelIncentives) in zip(holders, claimable):
+                balanceState = get_balance_state(1, storedNTokenBalance=nTokenBalance)
+                (incentivesToClaim, _) = incentives.calculateIncentivesToClaim(
+                    accounts[9], balanceState, blockTime, nTokenBalance
+                )
+                assert modelIncentives == incentivesToClaim
+
     def test_set_secondary_rewarder(self, incentives, MockSecondaryRewarder, accounts):
         zeroAddress = HexString(to_bytes(0, "bytes20"), "bytes20")
         secondaryRewarder = incentives.getSecondaryRewarder(accounts[9])
@@ -4,6 +4,9 @@ import random
 from brownie import MockAggregator, MockCToken, MockValuationLib, cTokenV2Aggregator
 from brownie.convert.datatypes import HexString, Wei
 from brownie.network.state import Chain
+from scripts.offchain.date_time import getBitNumFromMaturity, getMaturityFromBitNum
+from scripts.offchain.exchange_rate import buildExchangeRate
+from scripts.offchain.snapshot import ValuationSnapshot, encodeNTokenParameters
 from tests.constants import (
     BASIS_POINT,
     RATE_PRECISION,
@@ -109,6 +112,39 @@ class ValuationMock:
 
         self.mock = c
 
+    def get_valuation_snapshot(self):
+        snapshot = ValuationSnapshot()
+        for i in range(1, 5):
+            assetRate = (
+                self.cTokenAdapters[i].address,
+                self.cTokenAdapters[i].getExchangeRateView(),
+                10 ** self.underlyingDecimals[i],
+            )
+            ethRate = buildExchangeRate(
+                i, self.ethAggregators[i].latestAnswer(), 18, False, *self.bufferHaircutDiscount[i]
+            )
+            # nTokens in the mock do not hold any liquidity tokens, so their present value
+            # is equal to their cash balance
+            nTokenParameters = encodeNTokenParameters(
+                0, self.nTokenParameters[i][0], 0, 0, self.nTokenParameters[i][1]
+            )
+
+            snapshot.setCurrency(
+                i,
+                assetRate,
+                ethRate,
+                cashGroupSettings=self.cashGroups[i],
+                markets=self.markets[i],
+                supplyRate=self.cTokenAdapters[i].getAnnualizedSupplyRate(),
+                nToken=(
+                    self.nTokenTotalSupply[i],
+                    nTokenParameters,
+                    self.nTokenCashBalance[i],
+                ),
+            )
+
+        return snapshot
+
     def calculate_to_underlying(self, currency, balance):
         return math.trunc(
             (balance * self.cTokenRates[currency] * Wei(1e8))
@@ -220,7 +256,7 @@ class ValuationMock:
     ):
         assets = []
         markets = self.mock.getActiveMarkets(currency)
-        (maxBitNum, _) = self.mock.getBitNumFromMaturity(blockTime, markets[-1][1])
+        (maxBitNum, _) = getBitNumFromMaturity(blockTime, markets[-1][1])
 
         if shares is None:
             # TODO: allow shares to be positive or negative to offset each other...
@@ -231,7 +267,7 @@ class ValuationMock:
         if maturities is None:
             # Choose n random maturities
             bitNums = random.sample(range(1, maxBitNum + 1), numAssets)
-            maturities = [self.mock.getMaturityFromBitNum(blockTime, b) for b in bitNums]
+            maturities = [getMaturityFromBitNum(blockTime, b) for b in bitNums]
 
         for i in range(numAssets):
             pv = Wei(shares[i] * presentValue)
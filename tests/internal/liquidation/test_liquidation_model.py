@@ -0,0 +1,186 @@
+import pytest
+from brownie.network.state import Chain
+from brownie.test import given, strategy
+from scripts.offchain.free_collateral import getBalances, getLiquidationFactors
+from scripts.offchain.liquidation import (
+    CANDIDATE_ACCOUNT,
+    CANDIDATE_METHOD,
+    CANDIDATE_PROFIT,
+    COLLATERAL_CURRENCY,
+    LOCAL_CURRENCY,
+    calculateCollateralCurrencyLiquidation,
+    calculateLiquidationAmount,
+    calculateLocalCurrencyLiquidation,
+    scanLiquidationCandidates,
+)
+from tests.internal.liquidation.liquidation_helpers import ValuationMock
+
+chain = Chain()
+
+
+@pytest.mark.liquidation
+class TestLocalCurrencyLiquidationModel:
+    @pytest.fixture(scope="module", autouse=True)
+    def liquidation(
+        self,
+        MockLocalLiquidation,
+        SettleAssetsExternal,
+        FreeCollateralExternal,
+        FreeCollateralAtTime,
+        accounts,
+    ):
+        SettleAssetsExternal.deploy({"from": accounts[0]})
+        FreeCollateralExternal.deploy({"from": accounts[0]})
+        FreeCollateralAtTime.deploy({"from": accounts[0]})
+        return ValuationMock(accounts[0], MockLocalLiquidation)
+
+    @pytest.fixture(scope="module")
+    def snapshot(self, liquidation):
+        return liquidation.get_valuation_snapshot()
+
+    @pytest.fixture(autouse=True)
+    def isolation(self, fn_isolation):
+        pass
+
+    @given(
+        liquidateAmountRequired=strategy("int", min_value=0, max_value=100_000_000e8),
+        maxTotalBalance=strategy("int", min_value=0, max_value=100_000_000e8),
+        userSpecifiedMaximum=strategy("int", min_value=0, max_value=100_000_000e8),
+    )
+    def test_liquidation_amount(
+        self, liquidation, liquidateAmountRequired, maxTotalBalance, userSpecifiedMaximum
+    ):
+        assert liquidation.mock.calculateLiquidationAmount(
+            liquidateAmountRequired, maxTotalBalance, userSpecifiedMaximum
+        ) == calculateLiquidationAmount(
+            liquidateAmountRequired, maxTotalBalance, userSpecifiedMaximum
+        )
+
+    @given(
+        nTokenBalance=strategy("uint", min_value=1e8, max_value=100_000_000e8),
+        currency=strategy("uint", min_value=1, max_value=4),
+        ratio=strategy("uint", min_value=1, max_value=150),
+    )
+    def test_ntoken_liquidation(
+        self, liquidation, snapshot, accounts, currency, nTokenBalance, ratio
+    ):
+        haircut = liquidation.calculate_ntoken_to_asset(currency, nTokenBalance, "haircut")
+        liquidator = liquidation.calculate_ntoken_to_asset(currency, nTokenBalance, "liquidator")
+        cashBalance = -(haircut + (liquidator - haircut) * ratio // 100)
+        liquidation.mock.setBalance(accounts[0], currency, cashBalance, nTokenBalance)
+
+        blockTime = chain.time()
+        factors = getLiquidationFactors(
+            snapshot, liquidation.mock.getAccount(accounts[0]), blockTime, currency, 0
+        )
+        (
+            profit,
+            (nTokensPurchased, localAssetCashFromLiquidator),
+        ) = calculateLocalCurrencyLiquidation(factors, nTokenBalance)
+
+        assert (
+            localAssetCashFromLiquidator,
+            nTokensPurchased,
+        ) == liquidation.mock.calculateLocalCurrencyLiquidation.call(
+            accounts[0], currency, 0, {"from": accounts[1]}
+        )
+        assert profit > 0
+
+
+@pytest.mark.liquidation
+class TestCollateralCurrencyLiquidationModel:
+    @pytest.fixture(scope="module", autouse=True)
+    def liquidation(
+        self,
+        MockCollateralLiquidation,
+        SettleAssetsExternal,
+        FreeCollateralExternal,
+        FreeCollateralAtTime,
+        accounts,
+    ):
+        SettleAssetsExternal.deploy({"from": accounts[0]})
+        FreeCollateralExternal.deploy({"from": accounts[0]})
+        FreeCollateralAtTime.deploy({"from": accounts[0]})
+        return ValuationMock(accounts[0], MockCollateralLiquidation)
+
+    @pytest.fixture(scope="module")
+    def snapshot(self, liquidation):
+        return liquidation.get_valuation_snapshot()
+
+    @pytest.fixture(autouse=True)
+    def isolation(self, fn_isolation):
+        pass
+
+    def set_undercollateralized(self, liquidation, account, local, collateral, ratio, nTokens):
+        collateralBalance = 1_000e8
+        liquidation.mock.setBalance(account, collateral, collateralBalance, nTokens)
+        (_, netLocal) = liquidation.mock.getFreeCollateral(account)
+        # Sets a local debt that puts the account below zero free collateral
+        collateralETH = liquidation.calculate_to_eth(
+            collateral, liquidation.calculate_to_underlying(collateral, netLocal[0])
+        )
+        localDebt = liquidation.calculate_from_underlying(
+            local, liquidation.calculate_from_eth(local, collateralETH * ratio // 100)
+        )
+        liquidation.mock.setBalance(account, local, -localDebt, 0)
+
+    @given(
+        local=strategy("uint", min_value=1, max_value=2),
+        collateral=strategy("uint", min_value=3, max_value=4),
+        ratio=strategy("uint", min_value=110, max_value=300),
+        nTokens=strategy("uint", min_value=0, max_value=1_000e8),
+    )
+    def test_collateral_liquidation(
+        self, liquidation, snapshot, accounts, local, collateral, ratio, nTokens
+    ):
+        self.set_undercollateralized(liquidation, accounts[0], local, collateral, ratio, nTokens)
+        account = liquidation.mock.getAccount(accounts[0])
+        (cashBalance, nTokenBalance) = getBalances(account[1])[collateral]
+
+        factors = getLiquidationFactors(snapshot, account, chain.time(), local, collateral)
+        (
+            _,
+            (collateralAssetCash, nTokensPurchased, localAssetCashFromLiquidator),
+        ) = calculateCollateralCurrencyLiquidation(factors, cashBalance, nTokenBalance)
+
+        (
+            expectedLocalAssetCash,
+            expectedCollateralAssetCash,
+            expectedNTokensPurchased,
+        ) = liquidation.mock.calculateCollateralCurrencyLiquidation.call(
+            accounts[0], local, collateral, 0, 0, {"from": accounts[1]}
+        )
+        assert localAssetCashFromLiquidator == expectedLocalAssetCash
+        assert collateralAssetCash == expectedCollateralAssetCash
+        assert nTokensPurchased == expectedNTokensPurchased
+
+    def test_scan_ranks_candidates(self, liquidation, snapshot, accounts):
+        for (i, account) in enumerate(accounts[0:6]):
+            self.set_undercollateralized(liquidation, account, 1, 3, 110 + i * 20, 0)
+        # Has sufficient collateral and is not a candidate
+        liquidation.mock.setBalance(accounts[6], 2, 1_000e8, 0)
+
+        candidates = scanLiquidationCandidates(
+            snapshot,
+            {a.address: liquidation.mock.getAccount(a) for a in accounts[0:7]},
+            chain.time(),
+        )
+
+        profits = [c[CANDIDATE_PROFIT] for c in candidates]
+        assert profits == sorted(profits, reverse=True)
+        assert accounts[6].address not in [c[CANDIDATE_ACCOUNT] for c in candidates]
+
+        collateralCandidates = [c for c in candidates if c[CANDIDATE_METHOD] == COLLATERAL_CURRENCY]
+        assert len(collateralCandidates) == 6
+        for (_, _, address, local, collateral, amounts) in collateralCandidates:
+            (
+                localAssetCash,
+                collateralAssetCash,
+                _,
+            ) = liquidation.mock.calculateCollateralCurrencyLiquidation.call(
+                address, local, collateral, 0, 0, {"from": accounts[9]}
+            )
+            assert (collateralAssetCash, localAssetCash) == (amounts[0], amounts[2])
+
+        # Accounts only hold cash so there is no local currency liquidation
+        assert LOCAL_CURRENCY not in [c[CANDIDATE_METHOD] for c in candidates]
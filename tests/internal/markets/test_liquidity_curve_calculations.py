@@ -1,9 +1,13 @@
 import math
 import random
 
+import brownie
 import pytest
 from brownie.convert.datatypes import Wei
 from brownie.test import given, strategy
+from scripts.offchain.constants import MAX_MARKET_PROPORTION
+from scripts.offchain.market import getExchangeRate
+from scripts.offchain.safe_int import Revert
 from tests.constants import (
     CASH_GROUP_PARAMETERS,
     MARKETS,
@@ -12,8 +16,39 @@ from tests.constants import (
     SECONDS_IN_DAY,
     START_TIME,
 )
+from tests.differential import forward_cases, run_model
 from tests.helpers import get_market_state, impliedRateStrategy, timeToMaturityStrategy
 
+DIFFERENTIAL_TOTAL_FCASH = 10 ** 18
+
+
+def exchange_rate_model(proportion, rateAnchor, rateScalar, fCash):
+    totalCashUnderlying = DIFFERENTIAL_TOTAL_FCASH * (RATE_PRECISION - proportion) // proportion
+    return getExchangeRate(
+        DIFFERENTIAL_TOTAL_FCASH, totalCashUnderlying, rateScalar, rateAnchor, fCash
+    )
+
+
+def traded_proportion(inputs):
+    totalCashUnderlying = (
+        DIFFERENTIAL_TOTAL_FCASH * (RATE_PRECISION - inputs["proportion"]) // inputs["proportion"]
+    )
+    return (DIFFERENTIAL_TOTAL_FCASH - inputs["fCash"]) / (
+        DIFFERENTIAL_TOTAL_FCASH + totalCashUnderlying
+    )
+
+
+def exchange_rate_tolerance(inputs):
+    """
+    Largest difference between the contract exchange rate and the exact rate from rounding. The
+    proportion, its logit and ln(logit) are each truncated to RATE_PRECISION, ln is scaled by
+    RATE_PRECISION / rateScalar and the division truncates once more.
+    """
+    p = traded_proportion(inputs)
+    logit = p / (1 - p) * RATE_PRECISION
+    lnError = 1 / (RATE_PRECISION * p * (1 - p)) + 1 / logit + 1 / RATE_PRECISION
+    return lnError * RATE_PRECISION * RATE_PRECISION / inputs["rateScalar"] + 2
+
 
 @pytest.mark.market
 class TestLiquidityCurve:
@@ -209,3 +244,65 @@ class TestLiquidityCurve:
         )
 
         assert pytest.approx(cashAmount, rel=1e-9, abs=100) == initialCashAmount
+
+    @pytest.mark.differential
+    @pytest.mark.skip_coverage
+    def test_exchange_rate_differential(self, market):
+        def stratify(inputs, result):
+            (exchangeRate, success) = result
+            return (success, inputs["proportion"] * 10 // RATE_PRECISION, inputs["fCash"] > 0)
+
+        def isBoundary(inputs, result):
+            # Inputs next to the max proportion or where the rate falls below one
+            (exchangeRate, success) = result
+            proportion = traded_proportion(inputs) * RATE_PRECISION
+            return abs(proportion - MAX_MARKET_PROPORTION) < 1e5 or (
+                success and exchangeRate - RATE_PRECISION < 1e5
+            )
+
+        def check(inputs, result):
+            (exchangeRate, success) = result
+            if not success:
+                return True
+
+            p = traded_proportion(inputs)
+            expected = (
+                math.log(p / (1 - p)) * RATE_PRECISION / (inputs["rateScalar"] / RATE_PRECISION)
+                + inputs["rateAnchor"]
+            )
+            return abs(expected - exchangeRate) <= exchange_rate_tolerance(inputs)
+
+        run = run_model(
+            exchange_rate_model,
+            {
+                "proportion": strategy("uint256", min_value=1, max_value=RATE_PRECISION - 1),
+                "rateAnchor": strategy("uint256", min_value=1e9, max_value=1.5e9),
+                "rateScalar": strategy("uint256", min_value=10e9, max_value=1000e9),
+                "fCash": strategy("int256", min_value=-1e17, max_value=1e17),
+            },
+            stratify,
+            isBoundary=isBoundary,
+            check=check,
+        )
+
+        def check_market(inputs, result):
+            totalCashUnderlying = (
+                DIFFERENTIAL_TOTAL_FCASH
+                * (RATE_PRECISION - inputs["proportion"])
+                // inputs["proportion"]
+            )
+            args = (
+                DIFFERENTIAL_TOTAL_FCASH,
+                totalCashUnderlying,
+                inputs["rateScalar"],
+                inputs["rateAnchor"],
+                inputs["fCash"],
+            )
+            if isinstance(result, Revert):
+                with brownie.reverts():
+                    market.getExchangeRate(*args)
+            else:
+                assert market.getExchangeRate(*args) == result
+
+        forward_cases(run, check_market)
+        assert len(run.failing) == 0, run.failing
@@ -0,0 +1,218 @@
+import random
+
+import brownie
+import pytest
+from brownie.convert.datatypes import Wei
+from brownie.test import given, strategy
+from scripts.offchain.cash_group import getRateOracleTimeWindow
+from scripts.offchain.market import (
+    batchCalculateTrade,
+    batchGetfCashGivenCashAmount,
+    calculateTrade,
+    getExchangeRate,
+    getImpliedRate,
+    getRateAnchor,
+    logProportion,
+)
+from scripts.offchain.rate_oracle import replayOracleRates
+from tests.constants import (
+    CASH_GROUP_PARAMETERS,
+    MARKETS,
+    RATE_PRECISION,
+    SETTLEMENT_DATE,
+    START_TIME,
+)
+from tests.helpers import get_market_state, impliedRateStrategy, timeToMaturityStrategy
+
+proportionStrategy = strategy(
+    "uint256", min_value=0.01 * RATE_PRECISION, max_value=0.99 * RATE_PRECISION
+)
+
+
+@pytest.mark.market
+class TestMarketModel:
+    @pytest.fixture(scope="module", autouse=True)
+    def market(self, MockMarket, MockCToken, cTokenV2Aggregator, accounts):
+        market = accounts[0].deploy(MockMarket)
+        ctoken = accounts[0].deploy(MockCToken, 8)
+        ctoken.setAnswer(0.02e28)
+        aggregator = cTokenV2Aggregator.deploy(ctoken.address, {"from": accounts[0]})
+
+        market.setAssetRateMapping(1, (aggregator.address, 18))
+        market.setCashGroup(1, CASH_GROUP_PARAMETERS)
+
+        return market
+
+    @pytest.fixture(scope="module")
+    def cashGroup(self, market):
+        return market.buildCashGroupView(1)
+
+    @pytest.fixture(autouse=True)
+    def isolation(self, fn_isolation):
+        pass
+
+    @given(proportion=strategy("int256", min_value=1, max_value=RATE_PRECISION))
+    def test_log_proportion(self, market, proportion):
+        assert logProportion(proportion) == market.logProportion(proportion)
+
+    @given(
+        proportion=proportionStrategy,
+        rateAnchor=strategy("uint256", min_value=1e9, max_value=1.5e9),
+        rateScalar=strategy("uint256", min_value=10e9, max_value=1000e9),
+        fCash=strategy("int256", min_value=-1e17, max_value=1e17),
+    )
+    def test_exchange_rate(self, market, proportion, rateAnchor, rateScalar, fCash):
+        totalfCash = 10 ** 18
+        totalCashUnderlying = totalfCash * (RATE_PRECISION - proportion) // proportion
+
+        assert getExchangeRate(
+            totalfCash, totalCashUnderlying, rateScalar, rateAnchor, fCash
+        ) == market.getExchangeRate(totalfCash, totalCashUnderlying, rateScalar, rateAnchor, fCash)
+
+    @given(
+        proportion=proportionStrategy,
+        impliedRate=impliedRateStrategy,
+        timeToMaturity=timeToMaturityStrategy,
+    )
+    def test_rate_anchor_and_implied_rate(self, market, proportion, impliedRate, timeToMaturity):
+        totalfCash = 10 ** 18
+        totalCashUnderlying = totalfCash * (RATE_PRECISION - proportion) // proportion
+        rateScalar = 100 * RATE_PRECISION
+        timeToMaturity = timeToMaturity * 86400
+
+        (rateAnchor, success) = market.getRateAnchor(
+            totalfCash, impliedRate, totalCashUnderlying, rateScalar, timeToMaturity
+        )
+        assert getRateAnchor(
+            totalfCash, impliedRate, totalCashUnderlying, rateScalar, timeToMaturity
+        ) == (rateAnchor, success)
+
+        if success:
+            assert getImpliedRate(
+                totalfCash, totalCashUnderlying, rateScalar, rateAnchor, timeToMaturity
+            ) == market.getImpliedRate(
+                totalfCash, totalCashUnderlying, rateScalar, rateAnchor, timeToMaturity
+            )
+
+    @given(
+        marketIndex=strategy("uint8", min_value=1, max_value=7),
+        proportion=proportionStrategy,
+        impliedRate=impliedRateStrategy,
+        fCash=strategy("int256", min_value=-5e17, max_value=5e17),
+    )
+    def test_calculate_trade(self, market, cashGroup, marketIndex, proportion, impliedRate, fCash):
+        marketState = get_market_state(
+            MARKETS[marketIndex - 1],
+            proportion=proportion / RATE_PRECISION,
+            lastImpliedRate=impliedRate,
+            assetRate=50,
+        )
+        timeToMaturity = marketState[1] - START_TIME
+
+        (newMarket, assetCash, fee) = market.calculateTrade(
+            marketState, cashGroup, fCash, timeToMaturity, marketIndex
+        )
+        (modelMarket, modelAssetCash, modelFee) = calculateTrade(
+            marketState, cashGroup, fCash, timeToMaturity, marketIndex
+        )
+
+        assert modelAssetCash == assetCash
+        assert modelFee == fee
+        # Previous trade time is set to the block time of the call
+        assert list(modelMarket)[1:7] == list(newMarket)[1:7]
+
+    def test_batch_calculate_trade(self, market, cashGroup):
+        markets = [
+            get_market_state(MARKETS[i], proportion=p, lastImpliedRate=r, assetRate=50)
+            for i in range(0, 3)
+            for (p, r) in [(0.33, 0.03e9), (0.5, 0.06e9), (0.8, 0.12e9)]
+        ]
+        marketIndexes = [1 + (i // 3) for i in range(len(markets))]
+        timeToMaturities = [m[1] - START_TIME for m in markets]
+
+        for fCash in [-1e17, -1e10, 1, 1e10, 1e17, 2e18]:
+            results = batchCalculateTrade(
+                markets, cashGroup, fCash, timeToMaturities, marketIndexes
+            )
+
+            for (m, ttm, i, result) in zip(markets, timeToMaturities, marketIndexes, results):
+                (newMarket, assetCash, fee) = market.calculateTrade(m, cashGroup, fCash, ttm, i)
+                assert result[1] == assetCash
+                assert result[2] == fee
+                assert list(result[0])[1:7] == list(newMarket)[1:7]
+
+    @given(
+        marketIndex=strategy("uint8", min_value=1, max_value=7),
+        proportion=strategy(
+            "uint256", min_value=0.33 * RATE_PRECISION, max_value=0.66 * RATE_PRECISION
+        ),
+        impliedRate=impliedRateStrategy,
+    )
+    def test_batch_fcash_given_cash(self, market, cashGroup, marketIndex, proportion, impliedRate):
+        marketState = get_market_state(
+            MARKETS[marketIndex - 1],
+            proportion=proportion / RATE_PRECISION,
+            lastImpliedRate=impliedRate,
+            assetRate=50,
+        )
+        timeToMaturity = marketState[1] - START_TIME
+        cashAmounts = [Wei(1e8 * c) for c in [-100_000, -1_000, -1, 0, 1, 1_000, 100_000, 1e10]]
+
+        results = batchGetfCashGivenCashAmount(
+            marketState, cashGroup, cashAmounts, marketIndex, timeToMaturity
+        )
+
+        for (cash, (fCash, converged)) in zip(cashAmounts, results):
+            if converged:
+                assert fCash == market.getfCashAmountGivenCashAmount(
+                    marketState, cashGroup, cash, marketIndex, timeToMaturity, 0
+                )
+            else:
+                with brownie.reverts():
+                    market.getfCashAmountGivenCashAmount(
+                        marketState, cashGroup, cash, marketIndex, timeToMaturity, 0
+                    )
+
+    @pytest.mark.no_call_coverage
+    def test_replay_rate_oracle(self, market, cashGroup):
+        timeWindow = getRateOracleTimeWindow(cashGroup)
+        markets = [
+            get_market_state(
+                MARKETS[i],
+                proportion=0.5,
+                lastImpliedRate=0.06e9,
+                oracleRate=0.06e9,
+                previousTradeTime=START_TIME,
+                assetRate=50,
+            )
+            for i in range(0, 3)
+        ]
+        for m in markets:
+            market.setMarketStorage(1, SETTLEMENT_DATE, m)
+
+        events = []
+        blockTime = START_TIME
+        for _ in range(0, 20):
+            blockTime += random.randint(2, 2 * timeWindow)
+            events.append((blockTime, random.randint(1, 3), random.randint(-int(1e16), int(1e16))))
+        # Observe the markets between trades and past the end of the last time window
+        tradeTimes = [t for (t, _, _) in events] + [blockTime + 2 * timeWindow + 2]
+        observationTimes = [(t + u) // 2 for (t, u) in zip(tradeTimes, tradeTimes[1:])]
+        activeMarkets = replayOracleRates(markets, cashGroup, events, observationTimes)
+
+        for (t, marketIndex, fCash) in events:
+            maturity = MARKETS[marketIndex - 1]
+            loaded = market.buildMarket(1, maturity, t, True, timeWindow)
+            (newMarket, assetCash, _) = market.calculateTrade(
+                loaded, cashGroup, fCash, maturity - t, marketIndex
+            )
+            if assetCash != 0:
+                # MockMarket sets the previous trade time to the block time of the call
+                newMarket = list(newMarket)
+                newMarket[7] = t
+                market.setMarketStorage(1, SETTLEMENT_DATE, newMarket)
+
+            (observationTime, modelMarkets) = next(activeMarkets)
+            for (m, modelMarket) in zip(MARKETS, modelMarkets):
+                result = market.buildMarket(1, m, observationTime, True, timeWindow)
+                assert list(modelMarket)[1:] == list(result)[1:]
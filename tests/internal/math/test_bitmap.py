@@ -4,6 +4,7 @@ import brownie
 import pytest
 from brownie.convert import to_bytes
 from brownie.test import given, strategy
+from scripts.offchain import bitmap as model
 
 
 @pytest.mark.math
@@ -61,3 +62,19 @@ class TestBitmap:
         else:
             assert msb == (255 - min(indexes))
             assert bitNum == (min(indexes) + 1)
+
+    @given(bitmap=strategy("bytes32"))
+    def test_bitmap_model(self, mockBitmap, bitmap):
+        index = random.randint(1, 256)
+        value = model.toBitmap(bitmap)
+
+        assert model.isBitSet(value, index) == mockBitmap.isBitSet(bitmap, index)
+        assert model.setBit(value, index, True) == model.toBitmap(
+            mockBitmap.setBit(bitmap, index, True)
+        )
+        assert model.setBit(value, index, False) == model.toBitmap(
+            mockBitmap.setBit(bitmap, index, False)
+        )
+        assert model.totalBitsSet(value) == mockBitmap.totalBitsSet(bitmap)
+        assert model.getNextBitNum(value) == mockBitmap.getNextBitNum(bitmap)
+        assert model.getBitmapFromBitNums(model.getBitNums(value)) == value
@@ -2,6 +2,8 @@ import random
 
 import pytest
 from brownie.test import given, strategy
+from scripts.offchain import date_time as model
+from scripts.offchain.bitmap import getBitmapFromBitNums
 from tests.constants import SECONDS_IN_DAY, START_TIME
 
 
@@ -67,3 +69,33 @@ class TestDateTime:
             (bitNum, _) = dateTime.getBitNumFromMaturity(blockTime, maturity)
             maturityRef = dateTime.getMaturityFromBitNum(blockTime, bitNum)
             assert maturity == maturityRef
+
+    @given(
+        days=strategy("uint40", min_value=0, max_value=7700),
+        blockTime=strategy("uint40", min_value=START_TIME),
+        maxMarketIndex=strategy("uint8", min_value=2, max_value=7),
+    )
+    def test_bit_number_model(self, dateTime, days, blockTime, maxMarketIndex):
+        blockTimeUTC0 = blockTime - blockTime % SECONDS_IN_DAY
+        maturity = blockTimeUTC0 + days * SECONDS_IN_DAY
+
+        assert model.getBitNumFromMaturity(blockTime, maturity) == dateTime.getBitNumFromMaturity(
+            blockTime, maturity
+        )
+        assert model.isValidMaturity(maxMarketIndex, maturity, blockTime) == (
+            dateTime.isValidMaturity(maxMarketIndex, maturity, blockTime)
+        )
+
+        bitNum = random.randint(1, 256)
+        assert model.getMaturityFromBitNum(blockTime, bitNum) == dateTime.getMaturityFromBitNum(
+            blockTime, bitNum
+        )
+
+    @given(blockTime=strategy("uint40", min_value=START_TIME))
+    def test_bitmap_maturities(self, dateTime, blockTime):
+        bitNums = sorted(random.sample(range(1, 256), 20))
+        maturities = [dateTime.getMaturityFromBitNum(blockTime, b) for b in bitNums]
+
+        bitmap = model.getBitmapFromMaturities(blockTime, maturities)
+        assert bitmap == getBitmapFromBitNums(bitNums)
+        assert model.getMaturitiesFromBitmap(blockTime, bitmap) == maturities
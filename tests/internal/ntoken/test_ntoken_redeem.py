@@ -4,6 +4,7 @@ import random
 import pytest
 from brownie.convert.datatypes import Wei
 from brownie.test import given, strategy
+from scripts.offchain.date_time import getBitNumFromMaturity
 from tests.constants import (
     RATE_PRECISION,
     SECONDS_IN_DAY,
@@ -13,7 +14,7 @@ from tests.constants import (
     START_TIME_TREF,
 )
 from tests.helpers import (
-    get_bitmap_from_bitlist,
+    get_bitmap_from_bitnums,
     get_cash_group_with_max_markets,
     get_fcash_token,
     get_liquidity_token,
@@ -91,14 +92,14 @@ def isolation(fn_isolation):
 
 @given(initalizedTimeOffset=strategy("uint32", min_value=0, max_value=89))
 def test_get_ifCash_bits(nTokenRedeemPure, accounts, initalizedTimeOffset):
-    (_, bitmapList) = random_asset_bitmap(15)
+    (_, bitNums) = random_asset_bitmap(15)
     lastInitializedTime = START_TIME_TREF + initalizedTimeOffset * SECONDS_IN_DAY
     for m in marketStates:
-        (bitNum, exact) = nTokenRedeemPure.getBitNumFromMaturity(lastInitializedTime, m[1])
+        (bitNum, exact) = getBitNumFromMaturity(lastInitializedTime, m[1])
         assert exact
-        bitmapList[bitNum - 1] = "1"
+        bitNums.append(bitNum)
 
-    bitmap = get_bitmap_from_bitlist(bitmapList)
+    bitmap = get_bitmap_from_bitnums(bitNums)
 
     # add random ifcash assets at various maturities
     # test that the bits returned are always ifcash
@@ -195,9 +196,7 @@ def test_get_liquidity_token_withdraw_with_residual(
     nTokenRedeem1.setfCash(
         currencyId, tokenAddress, nineMonth, START_TIME_TREF, ifCashNotional  # maturity  # fCash
     )
-    bitmapList = ["0"] * 256
-    bitmapList[119] = "1"  # Set the nine month to 1
-    bitmap = get_bitmap_from_bitlist(bitmapList)
+    bitmap = get_bitmap_from_bitnums([120])  # Set the nine month to 1
 
     nTokenRedeem1.setfCash(
         currencyId,
@@ -3,13 +3,11 @@ import random
 import brownie
 import pytest
 from brownie.test import given, strategy
+from scripts.offchain.bitmap import isBitSet, toBitmap, totalBitsSet
+from scripts.offchain.constants import MAX_BITMAP_ASSETS
+from scripts.offchain.date_time import getBitNumFromMaturity, getMaturityFromBitNum
 from tests.constants import MARKETS, RATE_PRECISION, SETTLEMENT_DATE, START_TIME, START_TIME_TREF
-from tests.helpers import (
-    get_bitstring_from_bitmap,
-    get_cash_group_with_max_markets,
-    get_market_state,
-    random_asset_bitmap,
-)
+from tests.helpers import get_cash_group_with_max_markets, get_market_state, random_asset_bitmap
 
 
 @pytest.mark.portfolio
@@ -58,7 +56,7 @@ class TestBitmapAssets:
 
     @given(bitmap=strategy("bytes32"), currencyId=strategy("uint8"))
     def test_get_and_set_bitmap(self, bitmapAssets, bitmap, currencyId, accounts):
-        if len(list(filter(lambda x: x == "1", get_bitstring_from_bitmap(bitmap)))) > 20:
+        if totalBitsSet(toBitmap(bitmap)) > MAX_BITMAP_ASSETS:
             with brownie.reverts("Over max assets"):
                 bitmapAssets.setAssetsBitmap(accounts[0], currencyId, bitmap)
         else:
@@ -76,7 +74,7 @@ class TestBitmapAssets:
 
     @given(bitNum=strategy("uint", min_value=1, max_value=256))
     def test_set_ifcash_asset(self, bitmapAssets, bitNum, accounts):
-        maturity = bitmapAssets.getMaturityFromBitNum(START_TIME, bitNum)
+        maturity = getMaturityFromBitNum(START_TIME, bitNum)
         notional = random.randint(-1e18, 1e18)
         (bitmap, _) = random_asset_bitmap(15)
         bitmapAssets.setAssetsBitmap(accounts[0], 1, bitmap)
@@ -85,22 +83,20 @@ class TestBitmapAssets:
         (newBitmap, returnVal) = txn.return_value
 
         setValue = bitmapAssets.getifCashAsset(accounts[0], 1, maturity)
-        newBitlist = list(get_bitstring_from_bitmap(newBitmap))
 
         assert setValue == returnVal
         assert setValue == notional
-        assert newBitlist[bitNum - 1] == "1"
+        assert isBitSet(toBitmap(newBitmap), bitNum)
 
         # This should net off the value
         txn = bitmapAssets.addifCashAsset(accounts[0], 1, maturity, START_TIME, -notional)
         (newBitmap, returnVal) = txn.return_value
 
         setValue = bitmapAssets.getifCashAsset(accounts[0], 1, maturity)
-        newBitlist = list(get_bitstring_from_bitmap(newBitmap))
 
         assert setValue == returnVal
         assert setValue == 0
-        assert newBitlist[bitNum - 1] == "0"
+        assert not isBitSet(toBitmap(newBitmap), bitNum)
 
     def test_set_ifcash_asset_set_zero(self, bitmapAssets, accounts):
         maturity = bitmapAssets.getMaturityFromBitNum(START_TIME, 1)
@@ -112,12 +108,11 @@ class TestBitmapAssets:
 
     def test_get_ifcash_array(self, bitmapAssets, accounts):
         currencyId = 1
-        (bitmap, bitmapList) = random_asset_bitmap(10)
+        (bitmap, bitNums) = random_asset_bitmap(10)
 
-        bitIndexes = list(filter(lambda x: x[1] == "1", enumerate(bitmapList)))
         maturities = []
-        for (bitNum, _) in bitIndexes:
-            maturity = bitmapAssets.getMaturityFromBitNum(START_TIME, bitNum + 1)
+        for bitNum in bitNums:
+            maturity = getMaturityFromBitNum(START_TIME, bitNum)
             maturities.append(maturity)
             notional = 1e8
             bitmapAssets.addifCashAsset(accounts[0], currencyId, maturity, START_TIME, notional)
@@ -125,7 +120,7 @@ class TestBitmapAssets:
         bitmapAssets.setAssetsBitmap(accounts[0], currencyId, bitmap)
         portfolio = bitmapAssets.getifCashArray(accounts[0], currencyId, START_TIME)
 
-        assert len(portfolio) == len(bitIndexes)
+        assert len(portfolio) == len(bitNums)
         for (i, asset) in enumerate(portfolio):
             assert asset[0] == 1
             assert asset[1] == maturities[i]
@@ -143,29 +138,28 @@ class TestBitmapAssets:
         # perpetual token
         nextSettleTime = START_TIME_TREF
         # Get the max bit given the time offset
-        (maxBit, _) = bitmapAssets.getBitNumFromMaturity(nextSettleTime, MARKETS[6])
-        (assetsBitmap, assetsBitmapList) = random_asset_bitmap(10, maxBit)
+        (maxBit, _) = getBitNumFromMaturity(nextSettleTime, MARKETS[6])
+        (_, bitNums) = random_asset_bitmap(10, maxBit)
         computedPV = 0
         computedRiskPV = 0
 
         # Set each ifCash slot
-        for i, b in enumerate(assetsBitmapList):
-            if b == "1":
-                notional = random.randint(-1e12, 1e12)
-                maturity = bitmapAssets.getMaturityFromBitNum(nextSettleTime, i + 1)
-
-                bitmapAssets.addifCashAsset(accounts[0], 1, maturity, nextSettleTime, notional)
-
-                if maturity <= START_TIME:
-                    computedPV += notional
-                    computedRiskPV += notional
-                else:
-                    pv = bitmapAssets.getPresentValue(cashGroup, notional, maturity, START_TIME)
-                    riskPv = bitmapAssets.getRiskAdjustedPresentValue(
-                        cashGroup, notional, maturity, START_TIME
-                    )
-                    computedPV += pv
-                    computedRiskPV += riskPv
+        for bitNum in bitNums:
+            notional = random.randint(-1e12, 1e12)
+            maturity = getMaturityFromBitNum(nextSettleTime, bitNum)
+
+            bitmapAssets.addifCashAsset(accounts[0], 1, maturity, nextSettleTime, notional)
+
+            if maturity <= START_TIME:
+                computedPV += notional
+                computedRiskPV += notional
+            else:
+                pv = bitmapAssets.getPresentValue(cashGroup, notional, maturity, START_TIME)
+                riskPv = bitmapAssets.getRiskAdjustedPresentValue(
+                    cashGroup, notional, maturity, START_TIME
+                )
+                computedPV += pv
+                computedRiskPV += riskPv
 
         (pv, _) = bitmapAssets.getifCashNetPresentValue(
             accounts[0], 1, nextSettleTime, START_TIME, cashGroup, False  # non risk adjusted
@@ -0,0 +1,139 @@
+import random
+
+import pytest
+from brownie.network.state import Chain
+from brownie.test import given, strategy
+from hypothesis import settings
+from scripts.offchain.bitmap import getBitmapFromBitNums, toBitmap, toBytes32
+from scripts.offchain.date_time import getMaturityFromBitNum
+from scripts.offchain.settlement import settleBitmappedCashGroup, settlePortfolio
+from scripts.offchain.snapshot import ValuationSnapshot
+from tests.constants import MARKETS, SECONDS_IN_DAY, SECONDS_IN_YEAR, SETTLEMENT_DATE, START_TIME
+from tests.helpers import get_market_state, get_portfolio_array
+from tests.internal.settlement.test_settle_assets import NUM_CURRENCIES, SETTLEMENT_RATE
+
+chain = Chain()
+
+
+@pytest.mark.settlement
+class TestSettlementModel:
+    @pytest.fixture(scope="module", autouse=True)
+    def mockAggregators(self, MockCToken, cTokenV2Aggregator, accounts):
+        aggregators = []
+        for i in range(0, NUM_CURRENCIES):
+            mockToken = MockCToken.deploy(8, {"from": accounts[0]})
+            mock = cTokenV2Aggregator.deploy(mockToken.address, {"from": accounts[0]})
+            mockToken.setAnswer(0.01e18 * (i + 1))
+            aggregators.append(mock)
+
+        return aggregators
+
+    @pytest.fixture(scope="module", autouse=True)
+    def mockSettleAssets(self, MockSettleAssets, mockAggregators, accounts):
+        contract = MockSettleAssets.deploy({"from": accounts[0]})
+
+        contract.setMaxCurrencyId(NUM_CURRENCIES)
+        for i, a in enumerate(mockAggregators):
+            currencyId = i + 1
+            contract.setAssetRateMapping(currencyId, (a.address, 8))
+
+            for m in MARKETS:
+                contract.setMarketState(currencyId, SETTLEMENT_DATE, get_market_state(m))
+
+                # Set settlement rates for markets 0, 1
+                if m == MARKETS[0]:
+                    contract.setSettlementRate(i + 1, m, SETTLEMENT_RATE[0][2], 8)
+                elif m == MARKETS[1]:
+                    contract.setSettlementRate(i + 1, m, SETTLEMENT_RATE[1][2], 8)
+
+        return contract
+
+    @pytest.fixture(autouse=True)
+    def isolation(self, fn_isolation):
+        pass
+
+    def get_settlement_snapshot(self, mockSettleAssets, maturities):
+        snapshot = ValuationSnapshot()
+        for currencyId in range(1, NUM_CURRENCIES + 1):
+            # Unset settlement rates are returned at the current rate
+            for maturity in maturities:
+                snapshot.setSettlementRate(
+                    currencyId, maturity, mockSettleAssets.getSettlementRate(currencyId, maturity)
+                )
+
+            for m in MARKETS:
+                snapshot.setSettlementMarket(
+                    currencyId,
+                    SETTLEMENT_DATE,
+                    mockSettleAssets.getSettlementMarket(currencyId, m, SETTLEMENT_DATE),
+                )
+
+        return snapshot
+
+    @given(numAssets=strategy("uint", min_value=0, max_value=6))
+    @pytest.mark.no_call_coverage
+    def test_settle_portfolio_model(self, mockSettleAssets, accounts, numAssets):
+        blockTime = random.choice(MARKETS[0:3]) + random.randint(0, 6000)
+        assetArray = get_portfolio_array(numAssets, [(i, 4) for i in range(1, NUM_CURRENCIES)])
+        if len(assetArray) > 0:
+            nextSettleTime = min([a[1] if a[2] == 1 else SETTLEMENT_DATE for a in assetArray])
+            if nextSettleTime < blockTime:
+                chain.mine(1, timestamp=max(nextSettleTime - 1000, 0))
+        mockSettleAssets.setAssetArray(accounts[1], assetArray)
+        chain.mine(1, timestamp=blockTime)
+
+        snapshot = self.get_settlement_snapshot(
+            mockSettleAssets, set(a[1] for a in assetArray if a[1] <= blockTime)
+        )
+        (settleAmounts, newPortfolio) = settlePortfolio(snapshot, assetArray, blockTime)
+
+        txn = mockSettleAssets.settlePortfolio(accounts[1], blockTime)
+        assert settleAmounts == [
+            tuple(s) for s in txn.events["SettleAmountsCompleted"][0]["settleAmounts"]
+        ]
+        assert newPortfolio == [list(a[0:4]) for a in mockSettleAssets.getAssetArray(accounts[1])]
+
+        # Settlement markets are updated in the snapshot as they are in storage
+        for ((currencyId, maturity, settlementDate), market) in snapshot.settlementMarkets.items():
+            assert market[2:5] == tuple(
+                mockSettleAssets.getSettlementMarket(currencyId, maturity, settlementDate)[2:5]
+            )
+
+    @given(
+        nextSettleTime=strategy(
+            "uint", min_value=START_TIME, max_value=START_TIME + (40 * SECONDS_IN_YEAR)
+        )
+    )
+    @settings(max_examples=20)
+    @pytest.mark.no_call_coverage
+    def test_settle_bitmap_model(self, mockSettleAssets, accounts, nextSettleTime):
+        currencyId = 1
+        blockTime = nextSettleTime + random.randint(0, SECONDS_IN_YEAR)
+        nextSettleTime = nextSettleTime - nextSettleTime % SECONDS_IN_DAY
+        bitNums = sorted(set(random.choices(range(1, 256), k=10)))
+
+        ifCash = {}
+        for bitNum in bitNums:
+            maturity = getMaturityFromBitNum(nextSettleTime, bitNum)
+            ifCash[maturity] = random.randint(-1e18, 1e18)
+            mockSettleAssets.setifCash(
+                accounts[0], currencyId, maturity, ifCash[maturity], nextSettleTime
+            )
+
+        snapshot = self.get_settlement_snapshot(
+            mockSettleAssets, [m for m in ifCash.keys() if m <= blockTime]
+        )
+        bitmap = getBitmapFromBitNums(bitNums)
+        (totalAssetCash, _, newBitmap, newifCash) = settleBitmappedCashGroup(
+            snapshot, currencyId, bitmap, ifCash, nextSettleTime, blockTime
+        )
+
+        mockSettleAssets._settleBitmappedCashGroup(
+            accounts[0], currencyId, toBytes32(bitmap), nextSettleTime, blockTime
+        )
+        assert totalAssetCash == mockSettleAssets.totalAssetCash()
+        assert newBitmap == toBitmap(mockSettleAssets.newBitmapStorage())
+        for maturity in ifCash.keys():
+            assert newifCash.get(maturity, 0) == mockSettleAssets.getifCashAsset(
+                accounts[0], currencyId, maturity
+            )
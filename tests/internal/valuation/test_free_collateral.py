@@ -2,11 +2,15 @@ import logging
 import random
 from collections import OrderedDict
 
+import brownie
 import pytest
 from brownie.convert import to_bytes
 from brownie.convert.datatypes import HexString
 from brownie.network.state import Chain
 from brownie.test import given, strategy
+from hypothesis import strategies as st
+from scripts.offchain.free_collateral import getFreeCollateralView
+from scripts.offchain.safe_int import Revert
 from tests.constants import (
     HAS_ASSET_DEBT,
     HAS_CASH_DEBT,
@@ -14,12 +18,61 @@ from tests.constants import (
     START_TIME,
     START_TIME_TREF,
 )
-from tests.helpers import get_fcash_token, get_portfolio_array
+from tests.differential import forward_cases, run_model
+from tests.helpers import (
+    currencies_list_to_active_currency_bytes,
+    get_fcash_token,
+    get_portfolio_array,
+)
 from tests.internal.liquidation.liquidation_helpers import ValuationMock
 
 LOGGER = logging.getLogger(__name__)
 chain = Chain()
 
+balancesStrategy = st.dictionaries(
+    st.integers(min_value=1, max_value=4),
+    st.tuples(
+        st.integers(min_value=-100_000 * 10 ** 8, max_value=100_000 * 10 ** 8),
+        st.integers(min_value=0, max_value=100_000 * 10 ** 8),
+    ),
+    max_size=4,
+)
+# (currencyId, marketIndex, notional) for fCash assets in the three market cash groups
+fCashStrategy = st.lists(
+    st.tuples(
+        st.integers(min_value=1, max_value=4),
+        st.integers(min_value=1, max_value=3),
+        st.integers(min_value=-500_000 * 10 ** 8, max_value=500_000 * 10 ** 8).filter(
+            lambda n: n != 0
+        ),
+    ),
+    max_size=6,
+    unique_by=lambda a: a[0:2],
+)
+
+
+def get_model_account(balances, fCash):
+    """
+    Builds the (accountContext, accountBalances, portfolio) tuple that MockValuationLib.getAccount
+    returns after setting the balances and fCash assets on a new account
+    """
+    portfolio = sorted(
+        [get_fcash_token(m, currencyId=c, notional=n) for (c, m, n) in fCash],
+        key=lambda a: (a[0], a[1], a[2]),
+    )
+    portfolioCurrencies = set(a[0] for a in portfolio)
+    activeCurrencies = currencies_list_to_active_currency_bytes(
+        [
+            (c, c in portfolioCurrencies, c in balances)
+            for c in sorted(portfolioCurrencies | set(balances.keys()))
+        ]
+    )
+    accountContext = (0, 0, len(portfolio), 0, activeCurrencies)
+    accountBalances = [(c, cash, nTokens, 0, 0) for (c, (cash, nTokens)) in balances.items()]
+
+    return (accountContext, accountBalances, portfolio)
+
+
 """
 Account Context:
     nextSettleTime:
@@ -408,3 +461,65 @@ class TestFreeCollateral:
             if c == local:
                 continue
             self.validate_liquidation_factors(accounts[0], freeCollateral, local, c)
+
+    @pytest.mark.differential
+    @pytest.mark.skip_coverage
+    def test_free_collateral_differential(self, freeCollateral):
+        snapshot = freeCollateral.get_valuation_snapshot()
+
+        def model(balances, fCash):
+            return getFreeCollateralView(snapshot, get_model_account(balances, fCash), START_TIME)
+
+        def stratify(inputs, result):
+            if isinstance(result, Revert):
+                return ("revert",)
+
+            (fc, _) = result
+            return (
+                len(inputs["balances"]),
+                len(inputs["fCash"]) > 0,
+                any(cash < 0 for (cash, _) in inputs["balances"].values()),
+                fc > 0,
+            )
+
+        def isBoundary(inputs, result):
+            # Accounts that are close to becoming undercollateralized
+            return isinstance(result, Revert) or abs(result[0]) < 1e10
+
+        def check(inputs, result):
+            # Accounts without debt can never have negative free collateral
+            hasDebt = any(cash < 0 for (cash, _) in inputs["balances"].values()) or any(
+                n < 0 for (_, _, n) in inputs["fCash"]
+            )
+            return isinstance(result, Revert) or hasDebt or result[0] >= 0
+
+        run = run_model(
+            model,
+            {"balances": balancesStrategy, "fCash": fCashStrategy},
+            stratify,
+            isBoundary=isBoundary,
+            check=check,
+        )
+
+        # Each case is set on a fresh address so that cases do not share state
+        caseAccounts = iter(range(1, len(run.cases) + 1))
+
+        def check_contract(inputs, result):
+            account = HexString(next(caseAccounts), "bytes20")
+            for (currencyId, (cash, nTokens)) in inputs["balances"].items():
+                freeCollateral.mock.setBalance(account, currencyId, cash, nTokens)
+            if len(inputs["fCash"]) > 0:
+                freeCollateral.mock.setPortfolio(
+                    account,
+                    [get_fcash_token(m, currencyId=c, notional=n) for (c, m, n) in inputs["fCash"]],
+                )
+
+            if isinstance(result, Revert):
+                with brownie.reverts():
+                    freeCollateral.mock.getFreeCollateralView(account, START_TIME)
+            else:
+                (fc, netLocal) = freeCollateral.mock.getFreeCollateralView(account, START_TIME)
+                assert result == (fc, list(netLocal))
+
+        forward_cases(run, check_contract)
+        assert len(run.failing) == 0, run.failing
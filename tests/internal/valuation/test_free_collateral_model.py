@@ -0,0 +1,156 @@
+import random
+
+import brownie
+import pytest
+from brownie.test import given, strategy
+from scripts.offchain.cash_group import toWord
+from scripts.offchain.date_time import getMaturityFromBitNum
+from scripts.offchain.free_collateral import (
+    batchGetFreeCollateralView,
+    getAllLiquidationFactors,
+    getFreeCollateralView,
+    getLiquidationFactors,
+)
+from scripts.offchain.safe_int import Revert
+from tests.constants import START_TIME, START_TIME_TREF
+from tests.helpers import get_portfolio_array
+from tests.internal.liquidation.liquidation_helpers import ValuationMock
+
+
+@pytest.mark.valuation
+class TestFreeCollateralModel:
+    @pytest.fixture(scope="module", autouse=True)
+    def freeCollateral(self, MockFreeCollateral, accounts):
+        return ValuationMock(accounts[0], MockFreeCollateral)
+
+    @pytest.fixture(scope="module")
+    def snapshot(self, freeCollateral):
+        return freeCollateral.get_valuation_snapshot()
+
+    @pytest.fixture(autouse=True)
+    def isolation(self, fn_isolation):
+        pass
+
+    def set_random_balances(self, freeCollateral, account, bitmapCurrency=0):
+        for currency in random.sample(range(1, 5), random.randint(1, 4)):
+            if bitmapCurrency == currency:
+                cashBalance = random.randint(0, 100_000e8)
+            else:
+                cashBalance = random.randint(-100_000e8, 100_000e8)
+
+            nTokens = random.choice([0, random.randint(0, 100_000e8)])
+            freeCollateral.mock.setBalance(account, currency, cashBalance, nTokens)
+
+    def set_random_portfolio(self, freeCollateral, account, numAssets, numCurrencies):
+        cashGroups = [freeCollateral.cashGroups[i] for i in range(1, numCurrencies + 1)]
+        assets = get_portfolio_array(numAssets, cashGroups, sorted=True)
+        freeCollateral.mock.setPortfolio(account, assets)
+
+    def check_free_collateral(self, freeCollateral, snapshot, account, blockTime):
+        (fc, netLocal) = freeCollateral.mock.getFreeCollateralView(account, blockTime)
+        (modelFC, modelNetLocal) = getFreeCollateralView(
+            snapshot, freeCollateral.mock.getAccount(account), blockTime
+        )
+
+        assert modelFC == fc
+        assert modelNetLocal == list(netLocal)
+
+    @given(
+        numAssets=strategy("uint", min_value=0, max_value=6),
+        numCurrencies=strategy("uint", min_value=1, max_value=4),
+    )
+    def test_portfolio_valuation(
+        self, freeCollateral, snapshot, accounts, numAssets, numCurrencies
+    ):
+        self.set_random_balances(freeCollateral, accounts[0])
+        self.set_random_portfolio(freeCollateral, accounts[0], numAssets, numCurrencies)
+
+        self.check_free_collateral(freeCollateral, snapshot, accounts[0], START_TIME)
+
+    @given(
+        numAssets=strategy("uint", min_value=0, max_value=10),
+        currency=strategy("uint", min_value=1, max_value=4),
+    )
+    def test_bitmap_valuation(self, freeCollateral, snapshot, accounts, numAssets, currency):
+        freeCollateral.mock.enableBitmapForAccount(accounts[0], currency, START_TIME_TREF)
+        self.set_random_balances(freeCollateral, accounts[0], bitmapCurrency=currency)
+
+        for i in range(0, numAssets):
+            bitNum = random.randint(1, 130)
+            maturity = getMaturityFromBitNum(START_TIME_TREF, bitNum)
+            notional = random.randint(-500_000e8, 500_000e8)
+            freeCollateral.mock.setifCashAsset(accounts[0], currency, maturity, notional)
+
+        self.check_free_collateral(freeCollateral, snapshot, accounts[0], START_TIME_TREF)
+
+    def test_batch_valuation(self, freeCollateral, snapshot, accounts):
+        for account in accounts[0:8]:
+            if random.random() > 0.5:
+                currency = random.randint(1, 4)
+                freeCollateral.mock.enableBitmapForAccount(account, currency, START_TIME_TREF)
+                self.set_random_balances(freeCollateral, account, bitmapCurrency=currency)
+                maturity = getMaturityFromBitNum(START_TIME_TREF, random.randint(1, 130))
+                freeCollateral.mock.setifCashAsset(
+                    account, currency, maturity, random.randint(-500_000e8, 500_000e8)
+                )
+            else:
+                self.set_random_balances(freeCollateral, account)
+                self.set_random_portfolio(freeCollateral, account, random.randint(0, 6), 4)
+
+        results = batchGetFreeCollateralView(
+            snapshot, [freeCollateral.mock.getAccount(a) for a in accounts[0:8]], START_TIME_TREF
+        )
+
+        for (account, result) in zip(accounts[0:8], results):
+            (fc, netLocal) = freeCollateral.mock.getFreeCollateralView(account, START_TIME_TREF)
+            assert result == (fc, list(netLocal))
+
+    def check_liquidation_factors(self, factors, modelFactors):
+        # Account, netETHValue, local, collateral and nToken values
+        assert list(factors[0:5]) == list(modelFactors[0:5])
+        # nToken parameters are a bytes6 value
+        assert toWord(factors[5]) == modelFactors[5]
+        # ETH rates and the local asset rate
+        assert factors[6] == modelFactors[6]
+        assert factors[7] == modelFactors[7]
+        assert factors[8] == modelFactors[8]
+        # Collateral cash group
+        assert factors[9][0:3] == modelFactors[9][0:3]
+        assert toWord(factors[9][3]) == modelFactors[9][3]
+
+    @given(numAssets=strategy("uint", min_value=0, max_value=6))
+    def test_liquidation_factors(self, freeCollateral, snapshot, accounts, numAssets):
+        self.set_random_balances(freeCollateral, accounts[0])
+        self.set_random_portfolio(freeCollateral, accounts[0], numAssets, 4)
+        account = freeCollateral.mock.getAccount(accounts[0])
+
+        for (local, collateral) in [(1, 0), (1, 2), (2, 1), (3, 4), (4, 0)]:
+            try:
+                modelFactors = getLiquidationFactors(
+                    snapshot, account, START_TIME, local, collateral, accounts[0].address
+                )
+            except Revert:
+                with brownie.reverts():
+                    freeCollateral.mock.getLiquidationFactors(
+                        accounts[0], START_TIME, local, collateral
+                    )
+                continue
+
+            txn = freeCollateral.mock.getLiquidationFactors(
+                accounts[0], START_TIME, local, collateral
+            )
+            self.check_liquidation_factors(txn.events["Liquidation"][0]["factors"], modelFactors)
+
+    def test_all_liquidation_factors(self, freeCollateral, snapshot, accounts):
+        freeCollateral.mock.setBalance(accounts[0], 1, -100_000e8, 0)
+        freeCollateral.mock.setBalance(accounts[0], 2, 1_000e8, 100e8)
+        self.set_random_portfolio(freeCollateral, accounts[0], 4, 3)
+        account = freeCollateral.mock.getAccount(accounts[0])
+
+        allFactors = getAllLiquidationFactors(snapshot, account, START_TIME, accounts[0].address)
+        assert len(allFactors) > 0
+        for ((local, collateral), modelFactors) in allFactors.items():
+            txn = freeCollateral.mock.getLiquidationFactors(
+                accounts[0], START_TIME, local, collateral
+            )
+            self.check_liquidation_factors(txn.events["Liquidation"][0]["factors"], modelFactors)
@@ -0,0 +1,138 @@
+import random
+
+import pytest
+from brownie.test import given, strategy
+from fixtures import *
+from hypothesis import settings
+from scripts.offchain.vaults import (
+    ASSET_RATE,
+    batchSettleVaultAccounts,
+    calculateDeleverageAmount,
+    getCashValueOfShare,
+    getPoolShare,
+    getSimpleStrategyValuation,
+    getVaultBookRisk,
+    getVaultConfig,
+    setSettledVaultState,
+)
+from tests.constants import SECONDS_IN_QUARTER, START_TIME_TREF
+
+
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def get_vault_book(numAccounts, maturity, totalVaultShares):
+    book = {}
+    for i in range(0, numAccounts):
+        fCash = -random.randint(10_000, 100_000) * int(1e8)
+        vaultShares = min(-fCash + random.randint(-5_000, 30_000) * int(1e8), totalVaultShares)
+        book[i] = get_vault_account(
+            fCash=fCash,
+            maturity=maturity,
+            vaultShares=vaultShares,
+            account=accounts[i % 10].address,
+        )
+    return book
+
+
+@given(
+    exchangeRate=strategy("uint", min_value=0.8e18, max_value=1.2e18),
+    totalAssetCash=strategy("uint", max_value=1_000_000e8),
+)
+@settings(max_examples=10)
+def test_vault_book_risk_model(
+    vaultConfigState, vaultConfigAccount, vault, exchangeRate, totalAssetCash
+):
+    storedConfig = get_vault_config(minAccountBorrowSize=10_000)
+    vaultConfigState.setVaultConfig(vault.address, storedConfig)
+    vaultConfigAccount.setVaultConfig(vault.address, storedConfig)
+    vault.setExchangeRate(exchangeRate)
+
+    maturity = START_TIME_TREF + SECONDS_IN_QUARTER
+    state = get_vault_state(
+        maturity=maturity,
+        totalfCash=-2_000_000e8,
+        totalVaultShares=2_000_000e8,
+        totalStrategyTokens=2_000_000e8,
+        totalAssetCash=totalAssetCash,
+    )
+    book = get_vault_book(20, maturity, 2_000_000e8)
+
+    vaultConfig = vaultConfigState.getVaultConfigView(vault.address)
+    assert vaultConfig == getVaultConfig(vault.address, storedConfig, vaultConfig[ASSET_RATE])
+    valuation = getSimpleStrategyValuation(exchangeRate)
+    risk = getVaultBookRisk(vaultConfig, {maturity: state}, valuation, book, START_TIME_TREF)
+
+    for (address, account) in book.items():
+        assert getPoolShare(state, account[2]) == vaultConfigState.getPoolShare(state, account[2])
+        assert getCashValueOfShare(
+            state, vaultConfig, valuation, account[3], account[2]
+        ) == vaultConfigState.getCashValueOfShare(vault.address, account[3], state, account[2])
+
+        (collateralRatio, vaultShareValue) = vaultConfigState.calculateCollateralRatio(
+            vault.address, account, state
+        )
+        assert risk[address][0:2] == (collateralRatio, vaultShareValue)
+        assert risk[address][2] == (collateralRatio < vaultConfig[5])
+
+        (maxDeposit, _) = calculateDeleverageAmount(account, vaultConfig, vaultShareValue)
+        assert maxDeposit == vaultConfigAccount.calculateDeleverageAmount(
+            account, vault.address, vaultShareValue
+        )
+        if risk[address][2]:
+            assert risk[address][3] == maxDeposit
+
+
+@given(residual=strategy("int", min_value=-1_000_000e8, max_value=1_000_000e8))
+@settings(max_examples=10)
+def test_settle_vault_book_model(vaultConfigAccount, vault, residual):
+    vaultConfigAccount.setVaultConfig(vault.address, get_vault_config())
+    maturity = START_TIME_TREF + SECONDS_IN_QUARTER
+    vault.setExchangeRate(1e18)
+    state = get_vault_state(
+        maturity=maturity,
+        totalVaultShares=1_000_000e8,
+        totalStrategyTokens=random.choice([0, 100_000e8]),
+        totalAssetCash=int(50_000_000e8) + residual,
+        totalfCash=-1_000_000e8,
+    )
+    vaultConfigAccount.setVaultState(vault.address, state)
+    vaultConfigAccount.setSettledVaultState(vault.address, maturity, maturity + 100)
+    vaultConfigAccount.setReserveBalance(1, 1_000_000e8)
+
+    vaultConfig = vaultConfigAccount.getVaultConfigView(vault.address)
+    (settledState, settledAssets) = setSettledVaultState(
+        state,
+        vaultConfig,
+        getSimpleStrategyValuation(1e18),
+        vaultConfig[ASSET_RATE],
+        maturity + 100,
+    )
+    assert settledState == vaultConfigAccount.getVaultState(vault.address, maturity)
+    assert settledAssets == vaultConfigAccount.getRemainingSettledTokens(vault.address, maturity)
+
+    book = {}
+    remainingShares = int(1_000_000e8)
+    remainingfCash = int(-1_000_000e8)
+    for i in range(0, 5):
+        vaultShares = random.randint(0, remainingShares) if i < 4 else remainingShares
+        fCash = random.randint(remainingfCash, 0) if i < 4 else remainingfCash
+        remainingShares -= vaultShares
+        remainingfCash -= fCash
+        book[accounts[i].address] = get_vault_account(
+            maturity=maturity, fCash=fCash, vaultShares=vaultShares, account=accounts[i].address
+        )
+
+    (results, settledAssets, reserveBalance) = batchSettleVaultAccounts(
+        settledState, vaultConfig[ASSET_RATE], settledAssets, 1_000_000e8, book
+    )
+
+    for (address, account) in book.items():
+        txn = vaultConfigAccount.settleVaultAccount(vault.address, account, maturity + 100)
+        (accountAfter, strategyTokens) = txn.return_value
+        assert results[address] == (accountAfter, strategyTokens)
+
+    assert settledAssets == vaultConfigAccount.getRemainingSettledTokens(vault.address, maturity)
+    assert reserveBalance == vaultConfigAccount.getReserveBalance(1)
@@ -0,0 +1,169 @@
+import json
+import time
+from collections import Counter
+
+import pytest
+from brownie.network import web3
+
+# Records RPC calls, wall time, transactions and gas for each test phase and fixture. Enabled
+# with --rpc-profile=<report path>, e.g. brownie test tests/stateful --rpc-profile=profile.json
+# RPC calls are attributed to the innermost fixture or test phase, wall time of the setup phase
+# includes the fixtures it sets up.
+SEND_METHODS = ("eth_sendTransaction", "eth_sendRawTransaction")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("rpc profile")
+    group.addoption(
+        "--rpc-profile",
+        action="store",
+        default=None,
+        help="Write RPC calls, wall time and gas per test and fixture to this JSON file",
+    )
+    group.addoption(
+        "--rpc-profile-top",
+        action="store",
+        type=int,
+        default=20,
+        help="Number of tests and fixtures to show in the RPC profile summary",
+    )
+
+
+def pytest_configure(config):
+    if config.getoption("--rpc-profile"):
+        config.pluginmanager.register(RpcProfiler(config), "rpc_profiler")
+
+
+def _newStats():
+    return {"wallTime": 0.0, "rpcTime": 0.0, "calls": Counter(), "transactions": 0, "gasUsed": 0}
+
+
+class RpcProfiler:
+    def __init__(self, config):
+        self.reportPath = config.getoption("--rpc-profile")
+        self.top = config.getoption("--rpc-profile-top")
+        self.provider = None
+        # Stack of (stats, receipts already counted) that RPC calls are currently attributed to
+        self.active = []
+        self.tests = {}
+        self.fixtures = {}
+
+    def _wrapProvider(self):
+        # Brownie replaces the provider when it connects so this is checked on every phase. The
+        # provider is checked without a request so that no RPC call is counted for the check.
+        if web3.provider is None or web3.provider is self.provider:
+            return
+
+        self.provider = web3.provider
+        makeRequest = self.provider.make_request
+
+        def profiledRequest(method, params):
+            start = time.perf_counter()
+            response = makeRequest(method, params)
+            elapsed = time.perf_counter() - start
+            if len(self.active) > 0:
+                self._record(*self.active[-1], method, response, elapsed)
+            return response
+
+        self.provider.make_request = profiledRequest
+
+    def _record(self, stats, seenReceipts, method, response, elapsed):
+        stats["calls"][method] += 1
+        stats["rpcTime"] += elapsed
+        result = response.get("result") if isinstance(response, dict) else None
+
+        if method in SEND_METHODS and result is not None:
+            stats["transactions"] += 1
+        elif method == "eth_getTransactionReceipt" and isinstance(result, dict):
+            # Brownie fetches each receipt several times so gas is only counted once per test
+            # phase or fixture run. Transactions reverted by isolation are sent again with the
+            # same hash in later tests and are counted there too.
+            txHash = result.get("transactionHash")
+            if txHash is not None and txHash not in seenReceipts:
+                seenReceipts.add(txHash)
+                stats["gasUsed"] += int(result.get("gasUsed", "0x0"), 16)
+
+    def _measure(self, stats):
+        self._wrapProvider()
+        self.active.append((stats, set()))
+        return time.perf_counter()
+
+    def _finish(self, stats, start):
+        stats["wallTime"] += time.perf_counter() - start
+        self.active.pop()
+
+    def _testStats(self, item, phase):
+        phases = self.tests.setdefault(item.nodeid, {})
+        return phases.setdefault(phase, _newStats())
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        name = "{} ({})".format(fixturedef.argname, fixturedef.scope)
+        stats = self.fixtures.setdefault(name, _newStats())
+        start = self._measure(stats)
+        yield
+        self._finish(stats, start)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_setup(self, item):
+        stats = self._testStats(item, "setup")
+        start = self._measure(stats)
+        yield
+        self._finish(stats, start)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        stats = self._testStats(item, "call")
+        start = self._measure(stats)
+        yield
+        self._finish(stats, start)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_teardown(self, item):
+        stats = self._testStats(item, "teardown")
+        start = self._measure(stats)
+        yield
+        self._finish(stats, start)
+
+    def _totals(self, phases):
+        totals = _newStats()
+        for stats in phases.values():
+            for (key, value) in stats.items():
+                totals[key] += value
+        return totals
+
+    def pytest_sessionfinish(self, session):
+        report = {
+            "tests": {
+                nodeid: dict(phases, total=self._totals(phases))
+                for (nodeid, phases) in self.tests.items()
+            },
+            "fixtures": self.fixtures,
+        }
+        with open(self.reportPath, "w") as f:
+            json.dump(report, f, sort_keys=True, indent=2)
+
+    def _summaryLines(self, title, entries):
+        lines = ["{} by wall time:".format(title)]
+        ranked = sorted(entries.items(), key=lambda e: e[1]["wallTime"], reverse=True)
+        for (name, stats) in ranked[0 : self.top]:
+            lines.append(
+                "{:8.2f}s {:8.2f}s rpc {:6d} calls {:5d} txns {:12d} gas  {}".format(
+                    stats["wallTime"],
+                    stats["rpcTime"],
+                    sum(stats["calls"].values()),
+                    stats["transactions"],
+                    stats["gasUsed"],
+                    name,
+                )
+            )
+        return lines
+
+    def pytest_terminal_summary(self, terminalreporter):
+        terminalreporter.section("rpc profile")
+        tests = {nodeid: self._totals(phases) for (nodeid, phases) in self.tests.items()}
+        for line in self._summaryLines("Tests", tests) + self._summaryLines(
+            "Fixtures", self.fixtures
+        ):
+            terminalreporter.write_line(line)
+        terminalreporter.write_line("Full report written to {}".format(self.reportPath))
@@ -0,0 +1,93 @@
+from copy import copy
+
+import pytest
+from brownie.network.rpc import Rpc
+from brownie.network.state import Chain
+from tests.helpers import initialize_environment
+from tests.stateful.scenarios import build_scenario
+
+chain = Chain()
+rpc = Rpc()
+
+
+class SnapshotLayers:
+    """
+    Stack of chain snapshots, each layer reverts to the chain state when it was pushed. Brownie's
+    chain.snapshot only holds a single snapshot so layers are taken directly from the node.
+    """
+
+    def __init__(self):
+        self.layers = []
+
+    def push(self):
+        self.layers.append(rpc.snapshot())
+        return len(self.layers)
+
+    def pop(self, depth):
+        assert len(self.layers) == depth, "dev: snapshot layers popped out of order"
+        # Reverting invalidates the snapshot and any later ones, chain._revert takes a new
+        # snapshot and clears the brownie transaction history after the reverted block
+        chain._revert(self.layers.pop())
+
+
+@pytest.fixture(scope="session")
+def snapshot_layers():
+    return SnapshotLayers()
+
+
+@pytest.fixture(scope="session")
+def session_environment(accounts, snapshot_layers):
+    # Every stateful module starts from the same environment, it is only deployed once
+    chain.reset()
+    env = initialize_environment(accounts)
+    snapshot_layers.push()
+    return env
+
+
+@pytest.fixture(scope="module")
+def module_isolation(session_environment, snapshot_layers):
+    """Reverts to the session environment after each module"""
+    depth = snapshot_layers.push()
+    yield
+    snapshot_layers.pop(depth)
+
+
+@pytest.fixture(scope="module")
+def scenario(request, module_environment, accounts, snapshot_layers):
+    """
+    Builds the named scenario a test is parametrized with, see tests/stateful/scenarios.py.
+    Yields the scenario parameters or None for tests without a scenario.
+    """
+    param = getattr(request, "param", None)
+    if param is None:
+        yield None
+        return
+
+    # The layer is pushed before the build so that each scenario starts from the module state
+    (name, params) = param
+    depth = snapshot_layers.push()
+    build_scenario(name, module_environment, accounts, params)
+    yield params
+    snapshot_layers.pop(depth)
+
+
+@pytest.fixture
+def fn_isolation(module_isolation, scenario, snapshot_layers):
+    """Reverts to the module environment, or its scenario, after each test"""
+    depth = snapshot_layers.push()
+    yield
+    snapshot_layers.pop(depth)
+
+
+@pytest.fixture(scope="module")
+def module_environment(session_environment, module_isolation):
+    """
+    Copy of the session environment for a module, modules may enable more currencies so the
+    contract mappings are copied as well
+    """
+    env = copy(session_environment)
+    for (name, value) in vars(session_environment).items():
+        if isinstance(value, dict):
+            setattr(env, name, copy(value))
+
+    return env
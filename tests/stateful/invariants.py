@@ -3,8 +3,14 @@ from collections import defaultdict
 import pytest
 from brownie.convert.datatypes import Wei
 from brownie.network.state import Chain
+from scripts.offchain.asset_handler import getSettlementDate
+from scripts.offchain.ntoken import batchGetNTokenAssetPV
+from scripts.offchain.settlement import batchSettleAccounts, settlePortfolio
+from scripts.offchain.snapshot import ValuationSnapshot
 from tests.constants import HAS_ASSET_DEBT, HAS_BOTH_DEBT, HAS_CASH_DEBT, SECONDS_IN_QUARTER
 from tests.helpers import active_currencies_to_list, get_settlement_date
+from tests.stateful.ledger import get_shadow_ledger
+from tests.stateful.multicall import get_batched_environment, prefetch_note_and_vault_balances
 
 chain = Chain()
 QUARTER = 86400 * 90
@@ -28,58 +34,69 @@ def check_system_invariants(env, accounts, vaults=[], vaultfCashOverrides=[]):
         except Exception as e:
             print(e)
 
+    # Account reads only cover accounts changed since the last check, other reads for the pass
+    # are batched into a few eth_calls
+    get_shadow_ledger(env, accounts)
+    env = get_batched_environment(env, accounts, vaults)
     check_cash_balance(env, accounts, vaults)
     check_ntoken(env, accounts)
+    check_ntoken_present_value(env)
     check_portfolio_invariants(env, accounts, vaults, vaultfCashOverrides)
     check_account_context(env, accounts)
     check_token_incentive_balance(env, accounts)
     check_vault_invariants(env, accounts, vaults)
 
 
-def computed_settled_asset_cash(env, asset, currencyId, symbol):
-    blockTime = chain.time()
-    settledCash = 0
-    settlementDate = get_settlement_date(asset, blockTime)
-    if settlementDate > blockTime:
-        return 0
-
-    assetRate = env.notional.getSettlementRate(currencyId, asset[1])
-    decimals = assetRate[2]
-    conversionRate = Wei(1e18) * Wei(decimals) / Wei(assetRate[1] * 1e8)
-    if asset[2] == 1:
-        settledCash += asset[3] * conversionRate
-    else:
-        market = list(
-            filter(
-                lambda x: x[1] == asset[1],
-                env.notional.getActiveMarketsAtBlockTime(currencyId, settlementDate - 1),
-            )
-        )[0]
-        settledCash += market[3] * asset[3] / market[4]
-
-        if asset[1] < blockTime:
-            settledCash += (market[2] * asset[3] / market[4]) * conversionRate
-
-    return settledCash
+def get_settlement_snapshot(env, snapshot, portfolios, blockTime):
+    # Loads each settlement rate and settlement market referenced by the portfolios once
+    settlementRates = set()
+    settlementDates = set()
+    for portfolio in portfolios:
+        for asset in portfolio:
+            settlementDate = getSettlementDate(asset)
+            if settlementDate > blockTime:
+                continue
+
+            if asset[1] <= blockTime:
+                settlementRates.add((asset[0], asset[1]))
+            if asset[2] > 1:
+                settlementDates.add((asset[0], settlementDate))
+
+    for (currencyId, maturity) in settlementRates:
+        snapshot.setSettlementRate(
+            currencyId, maturity, env.notional.getSettlementRate(currencyId, maturity)
+        )
 
+    for (currencyId, settlementDate) in settlementDates:
+        for market in env.notional.getActiveMarketsAtBlockTime(currencyId, settlementDate - 1):
+            snapshot.setSettlementMarket(currencyId, settlementDate, market)
 
-def compute_settled_fcash(currencyId, symbol, env, accounts):
-    settledCash = 0
+    return snapshot
 
-    for account in accounts:
-        portfolio = env.notional.getAccountPortfolio(account.address)
-        for asset in portfolio:
-            if asset[0] == currencyId:
-                settledCash += computed_settled_asset_cash(env, asset, currencyId, symbol)
 
-    # Check nToken portfolios
-    (portfolio, ifCashAssets) = env.notional.getNTokenPortfolio(env.nToken[currencyId].address)
+def compute_settled_asset_cash(env, accounts):
+    # Returns the asset cash each currency would receive if every account and nToken settled
+    blockTime = chain.time()
+    snapshot = get_valuation_snapshot(env)
+    ledger = get_shadow_ledger(env, accounts)
+    accountsToSettle = {a.address: ledger.getAccount(a.address) for a in accounts}
+    nTokenPortfolios = {}
+    for (currencyId, nToken) in env.nToken.items():
+        (portfolio, ifCashAssets) = env.notional.getNTokenPortfolio(nToken.address)
+        nTokenPortfolios[currencyId] = list(portfolio) + list(ifCashAssets)
 
-    for asset in portfolio:
-        settledCash += computed_settled_asset_cash(env, asset, currencyId, symbol)
+    get_settlement_snapshot(
+        env,
+        snapshot,
+        [a[2] for a in accountsToSettle.values()] + list(nTokenPortfolios.values()),
+        blockTime,
+    )
 
-    for asset in ifCashAssets:
-        settledCash += computed_settled_asset_cash(env, asset, currencyId, symbol)
+    (_, settledCash) = batchSettleAccounts(snapshot, accountsToSettle, blockTime)
+    for portfolio in nTokenPortfolios.values():
+        (settleAmounts, _) = settlePortfolio(snapshot, portfolio, blockTime)
+        for (currencyId, netCashChange) in settleAmounts:
+            settledCash[currencyId] = settledCash.get(currencyId, 0) + netCashChange
 
     return settledCash
 
@@ -87,6 +104,8 @@ def compute_settled_fcash(currencyId, symbol, env, accounts):
 def check_cash_balance(env, accounts, vaults):
     # For every currency, check that the contract balance matches the account
     # balances and capital deposited trackers
+    settledCash = compute_settled_asset_cash(env, accounts)
+    ledger = get_shadow_ledger(env, accounts)
     for (symbol, currencyId) in env.currencyId.items():
         tokenBalance = None
         if symbol == "ETH":
@@ -104,16 +123,9 @@ def check_cash_balance(env, accounts, vaults):
         else:
             contractBalance = tokenBalance * 1e8 / 1e18
 
-        accountBalances = 0
+        accountBalances = ledger.cashBalances[currencyId]
         vaultBalances = 0
-        nTokenTotalBalances = 0
-
-        for account in accounts:
-            (cashBalance, nTokenBalance, _) = env.notional.getAccountBalance(
-                currencyId, account.address
-            )
-            accountBalances += cashBalance
-            nTokenTotalBalances += nTokenBalance
+        nTokenTotalBalances = ledger.nTokenBalances[currencyId]
 
         for vault in vaults:
             config = env.notional.getVaultConfig(vault)
@@ -153,7 +165,7 @@ def check_cash_balance(env, accounts, vaults):
             accountBalances += m[3]
 
         accountBalances += env.notional.getReserveBalance(currencyId)
-        accountBalances += compute_settled_fcash(currencyId, symbol, env, accounts)
+        accountBalances += settledCash.get(currencyId, 0)
 
         # NOTE: this can happen from liquidation when withdrawing liquidity tokens or
         # in rounding errors during initialize markets. Strategy vaults also leave some dust
@@ -168,13 +180,10 @@ def check_cash_balance(env, accounts, vaults):
 def check_ntoken(env, accounts):
     # For every nToken, check that it has no other balances and its
     # total outstanding supply matches its supply
+    ledger = get_shadow_ledger(env, accounts)
     for (currencyId, nToken) in env.nToken.items():
         totalSupply = nToken.totalSupply()
-        totalTokensHeld = 0
-
-        for account in accounts:
-            (_, tokens, _) = env.notional.getAccountBalance(currencyId, account.address)
-            totalTokensHeld += tokens
+        totalTokensHeld = ledger.nTokenBalances[currencyId]
 
         # Ensure that total supply equals tokens held
         assert totalTokensHeld == totalSupply
@@ -199,6 +208,54 @@ def check_ntoken(env, accounts):
         assert env.notional.getFreeCollateral(nToken.address)[0] >= 0
 
 
+def get_valuation_snapshot(env):
+    snapshot = ValuationSnapshot()
+    aggregators = {a.address: a for a in env.cTokenAggregator.values()}
+
+    for currencyId in env.nToken.keys():
+        (cashGroupSettings, assetRate) = env.notional.getCashGroupAndAssetRate(currencyId)
+        (_, _, ethRate, _) = env.notional.getCurrencyAndRates(currencyId)
+        # Markets are returned with the oracle rate at the current block time, setting the last
+        # implied rate to the oracle rate means the snapshot loads them as they are
+        markets = [
+            tuple(m[0:5]) + (m[6], m[6], m[7]) for m in env.notional.getActiveMarkets(currencyId)
+        ]
+        supplyRate = (
+            aggregators[assetRate[0]].getAnnualizedSupplyRate()
+            if assetRate[0] in aggregators
+            else 0
+        )
+
+        snapshot.setCurrency(
+            currencyId,
+            assetRate,
+            ethRate,
+            cashGroupSettings=cashGroupSettings,
+            markets=markets,
+            supplyRate=supplyRate,
+        )
+
+    return snapshot
+
+
+def check_ntoken_present_value(env):
+    # The off chain nToken valuation must match the value reported by the nToken
+    snapshot = get_valuation_snapshot(env)
+    for (currencyId, nToken) in env.nToken.items():
+        nTokenAccount = env.notional.getNTokenAccount(nToken.address).dict()
+        (liquidityTokens, ifCashAssets) = env.notional.getNTokenPortfolio(nToken.address)
+        portfolio = (
+            nTokenAccount["cashBalance"],
+            nTokenAccount["lastInitializedTime"],
+            liquidityTokens,
+            ifCashAssets,
+        )
+
+        (pv,) = batchGetNTokenAssetPV(snapshot, currencyId, portfolio, [chain.time()])
+        # Allows for the view call being made a few seconds after chain.time()
+        assert pytest.approx(pv, rel=1e-7) == nToken.getPresentValueAssetDenominated()
+
+
 def check_portfolio_invariants(env, accounts, vaults, vaultfCashOverrides=[]):
     fCash = defaultdict(dict)
     liquidityToken = defaultdict(dict)
@@ -210,21 +267,18 @@ def check_portfolio_invariants(env, accounts, vaults, vaultfCashOverrides=[]):
 
     for account in accounts:
         env.notional.settleAccount(account.address)
-        portfolio = env.notional.getAccountPortfolio(account.address)
-        for asset in portfolio:
-            if asset[2] == 1:
-                if (asset[0], asset[1]) in fCash:
-                    # Is fCash asset type, fCash[currencyId][maturity]
-                    fCash[(asset[0], asset[1])] += asset[3]
-                else:
-                    fCash[(asset[0], asset[1])] = asset[3]
-            else:
-                if (asset[0], asset[1], asset[2]) in liquidityToken:
-                    # Is liquidity token, liquidityToken[currencyId][maturity][assetType]
-                    # Each liquidity token is indexed by its type and settlement date
-                    liquidityToken[(asset[0], asset[1], asset[2])] += asset[3]
-                else:
-                    liquidityToken[(asset[0], asset[1], asset[2])] = asset[3]
+
+    # Only accounts changed by settlement are read again, the ledger holds the net fCash and
+    # liquidity tokens of all account portfolios
+    ledger = get_shadow_ledger(env, accounts)
+    prefetch_note_and_vault_balances(env, accounts, vaults)
+    for (key, notional) in ledger.fCash.items():
+        if notional != 0:
+            fCash[key] = fCash.get(key, 0) + notional
+
+    for (key, notional) in ledger.liquidityTokens.items():
+        if notional != 0:
+            liquidityToken[key] = notional
 
     # Check nToken portfolios
     for (currencyId, nToken) in env.nToken.items():
@@ -289,23 +343,22 @@ def check_portfolio_invariants(env, accounts, vaults, vaultfCashOverrides=[]):
 
 
 def check_account_context(env, accounts):
+    ledger = get_shadow_ledger(env, accounts)
     for account in accounts:
-        context = env.notional.getAccountContext(account.address)
+        context = ledger.getAccount(account.address)[0]
         activeCurrencies = list(active_currencies_to_list(context[-1]))
 
         hasCashDebt = False
         for (_, currencyId) in env.currencyId.items():
             # Checks that active currencies is set properly
-            (cashBalance, nTokenBalance, _) = env.notional.getAccountBalance(
-                currencyId, account.address
-            )
+            (cashBalance, nTokenBalance, _) = ledger.getAccountBalance(currencyId, account.address)
             if (cashBalance != 0 or nTokenBalance != 0) and context[3] != currencyId:
                 assert (currencyId, True) in [(a[0], a[2]) for a in activeCurrencies]
 
             if cashBalance < 0:
                 hasCashDebt = True
 
-        portfolio = env.notional.getAccountPortfolio(account.address)
+        portfolio = ledger.getAccountPortfolio(account.address)
         nextSettleTime = 0
         if len(portfolio) > 0:
             nextSettleTime = get_settlement_date(portfolio[0], chain.time())
@@ -0,0 +1,159 @@
+from collections import defaultdict
+
+from brownie.network import web3
+from hexbytes import HexBytes
+from tests.stateful.multicall import MulticallCache
+
+# Number of recent chain states kept so that reverted tests resume from a matching state
+MAX_CHECKPOINTS = 64
+
+
+def _getAccountAddresses(receipt):
+    """Returns every address in the indexed topics and data words of the receipt logs"""
+    addresses = set()
+    for log in receipt["logs"]:
+        data = bytes(HexBytes(log["data"]))
+        words = [bytes(HexBytes(t)) for t in log["topics"][1:]]
+        words += [data[i : i + 32] for i in range(0, len(data) - 31, 32)]
+        for word in words:
+            if word[0:12] == bytes(12):
+                addresses.add(web3.toChecksumAddress(word[12:]))
+
+    return addresses
+
+
+class ShadowLedger:
+    """
+    Tracks account balances and portfolios across invariant checks. Each sync only reads the
+    accounts referenced by Notional events (as indexed or data arguments) or sending transactions
+    since the last matching chain state, and updates the system totals incrementally.
+    """
+
+    def __init__(self, env, accounts):
+        self.env = env
+        self.accounts = [a.address for a in accounts]
+        self.checkpoints = []
+        self._reset()
+
+    def _reset(self):
+        self.currencies = tuple(sorted(self.env.currencyId.values()))
+        # account => (getAccount, getAccountPortfolio, {currencyId: getAccountBalance})
+        self.records = {}
+        self.cashBalances = defaultdict(int)
+        self.nTokenBalances = defaultdict(int)
+        self.fCash = defaultdict(int)
+        self.liquidityTokens = defaultdict(int)
+
+    def _copyState(self):
+        return (
+            dict(self.records),
+            defaultdict(int, self.cashBalances),
+            defaultdict(int, self.nTokenBalances),
+            defaultdict(int, self.fCash),
+            defaultdict(int, self.liquidityTokens),
+        )
+
+    def _setState(self, state):
+        # State is copied so that checkpoints are never modified
+        self.records = dict(state[0])
+        self.cashBalances = defaultdict(int, state[1])
+        self.nTokenBalances = defaultdict(int, state[2])
+        self.fCash = defaultdict(int, state[3])
+        self.liquidityTokens = defaultdict(int, state[4])
+
+    def _findCheckpoint(self, head):
+        # Checkpoints are only valid if their block is still in the chain after any reverts
+        for (blockNumber, blockHash, state) in reversed(self.checkpoints):
+            if blockNumber <= head and web3.eth.get_block(blockNumber)["hash"] == blockHash:
+                return (blockNumber, state)
+        return None
+
+    def _getTouchedAccounts(self, fromBlock, toBlock):
+        touched = set()
+        for blockNumber in range(fromBlock, toBlock + 1):
+            block = web3.eth.get_block(blockNumber, full_transactions=True)
+            for txn in block["transactions"]:
+                touched.add(txn["from"])
+                touched |= _getAccountAddresses(web3.eth.get_transaction_receipt(txn["hash"]))
+
+        return touched & set(self.accounts)
+
+    def _applyRecord(self, record, sign):
+        (_, portfolio, balances) = record
+        for (currencyId, (cashBalance, nTokenBalance, _)) in balances.items():
+            self.cashBalances[currencyId] += sign * cashBalance
+            self.nTokenBalances[currencyId] += sign * nTokenBalance
+
+        for asset in portfolio:
+            if asset[2] == 1:
+                self.fCash[(asset[0], asset[1])] += sign * asset[3]
+            else:
+                self.liquidityTokens[(asset[0], asset[1], asset[2])] += sign * asset[3]
+
+    def _readAccounts(self, accounts):
+        notional = self.env.notional
+        cache = MulticallCache()
+        calls = []
+        for account in accounts:
+            calls.append((notional.getAccount, [account]))
+            calls.append((notional.getAccountPortfolio, [account]))
+            for currencyId in self.currencies:
+                calls.append((notional.getAccountBalance, [currencyId, account]))
+        cache.prefetch(calls)
+
+        for account in accounts:
+            if account in self.records:
+                self._applyRecord(self.records[account], -1)
+
+            self.records[account] = (
+                cache.call(notional.getAccount, account),
+                cache.call(notional.getAccountPortfolio, account),
+                {c: cache.call(notional.getAccountBalance, c, account) for c in self.currencies},
+            )
+            self._applyRecord(self.records[account], 1)
+
+    def sync(self):
+        """Brings the ledger up to the latest block, returning the accounts that were read"""
+        head = web3.eth.block_number
+        checkpoint = None
+        if self.currencies == tuple(sorted(self.env.currencyId.values())):
+            checkpoint = self._findCheckpoint(head)
+
+        if checkpoint is None:
+            # Newly enabled currencies or a revert past every checkpoint require a full read
+            self._reset()
+            changed = self.accounts
+        else:
+            (blockNumber, state) = checkpoint
+            self._setState(state)
+            touched = self._getTouchedAccounts(blockNumber + 1, head)
+            changed = [a for a in self.accounts if a in touched]
+
+        self._readAccounts(changed)
+        headHash = web3.eth.get_block(head)["hash"]
+        self.checkpoints = [c for c in self.checkpoints if c[1] != headHash]
+        self.checkpoints = self.checkpoints[-(MAX_CHECKPOINTS - 1) :] + [
+            (head, headHash, self._copyState())
+        ]
+        return changed
+
+    def getAccount(self, account):
+        return self.records[account][0]
+
+    def getAccountPortfolio(self, account):
+        return self.records[account][1]
+
+    def getAccountBalance(self, currencyId, account):
+        return self.records[account][2][currencyId]
+
+
+def get_shadow_ledger(env, accounts):
+    """Returns the ledger for the environment and accounts, synced to the latest block"""
+    addresses = [a.address for a in accounts]
+    ledger = getattr(env, "shadowLedger", None)
+    if ledger is None or ledger.accounts != addresses:
+        ledger = ShadowLedger(env, accounts)
+        env.shadowLedger = ledger
+
+    ledger.sync()
+    return ledger
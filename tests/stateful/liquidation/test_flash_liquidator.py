@@ -6,7 +6,7 @@ from brownie.convert.datatypes import Wei
 from brownie.network.state import Chain
 from scripts.config import CurrencyDefaults, nTokenDefaults
 from tests.constants import SECONDS_IN_QUARTER
-from tests.helpers import get_balance_action, get_balance_trade_action, initialize_environment
+from tests.helpers import get_balance_action, get_balance_trade_action
 
 chain = Chain()
 LocalCurrency_NoTransferFee = 0
@@ -84,8 +84,8 @@ def isolation(fn_isolation):
 
 
 @pytest.fixture(scope="module", autouse=True)
-def env(accounts):
-    environment = initialize_environment(accounts)
+def env(accounts, module_environment):
+    environment = module_environment
     environment.enableCurrency("USDT", CurrencyDefaults)
     cashGroup = list(environment.notional.getCashGroup(2))
     # Enable the one year market
@@ -4,7 +4,7 @@ from brownie import accounts
 from brownie.network.state import Chain
 from scripts.config import CurrencyDefaults, nTokenDefaults
 from tests.constants import RATE_PRECISION, SECONDS_IN_QUARTER
-from tests.helpers import get_balance_trade_action, initialize_environment
+from tests.helpers import get_balance_trade_action
 from tests.stateful.invariants import check_system_invariants
 
 chain = Chain()
@@ -21,8 +21,8 @@ def transferDAI(environment, accounts):
 
 
 @pytest.fixture(scope="module", autouse=True)
-def env(accounts):
-    environment = initialize_environment(accounts)
+def env(accounts, module_environment):
+    environment = module_environment
     cashGroup = list(environment.notional.getCashGroup(2))
     # Enable the one year market
     cashGroup[0] = 3
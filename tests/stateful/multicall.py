@@ -0,0 +1,145 @@
+from copy import copy
+
+from brownie import MockMulticall
+from brownie.network import web3
+from brownie.network.contract import ContractCall, ContractTx
+from eth_abi import decode_abi
+
+# Number of view calls in each eth_call, bounded by the node's eth_call gas limit
+BATCH_SIZE = 50
+
+
+class MulticallCache:
+    """
+    Caches view call results by target and calldata. Prefetched calls are batched through the
+    MockMulticall creation code, any other call is made directly the first time it is read.
+    """
+
+    def __init__(self):
+        self.results = {}
+
+    def _key(self, method, args):
+        return (method._address, method.encode_input(*args))
+
+    def prefetch(self, calls):
+        pending = {}
+        for (method, args) in calls:
+            key = self._key(method, args)
+            if key not in self.results:
+                pending[key] = method
+
+        pending = list(pending.items())
+        for i in range(0, len(pending), BATCH_SIZE):
+            batch = pending[i : i + BATCH_SIZE]
+            data = MockMulticall.deploy.encode_input([key for (key, _) in batch])
+            (results,) = decode_abi(["(bool,bytes)[]"], web3.eth.call({"data": data}))
+
+            for ((key, method), (success, returnData)) in zip(batch, results):
+                # Failed calls are made again directly so that they raise as they would
+                if success:
+                    self.results[key] = method.decode_output("0x" + returnData.hex())
+
+    def call(self, method, *args):
+        key = self._key(method, args)
+        if key not in self.results:
+            self.results[key] = method(*args)
+        return self.results[key]
+
+    def clear(self):
+        self.results = {}
+
+
+class BatchedContract:
+    """Reads view methods through the cache, transactions clear it"""
+
+    def __init__(self, contract, cache):
+        self._contract = contract
+        self._cache = cache
+
+    def __getattr__(self, name):
+        attr = getattr(self._contract, name)
+        if isinstance(attr, ContractCall):
+            return lambda *args: self._cache.call(attr, *args)
+        elif isinstance(attr, ContractTx):
+
+            def transact(*args):
+                self._cache.clear()
+                txn = attr(*args)
+                self._cache.clear()
+                return txn
+
+            return transact
+
+        return attr
+
+
+def get_batched_environment(env, accounts, vaults):
+    """
+    Returns a copy of the environment that reads every contract through a shared multicall
+    cache, with the reads made by an invariant pass prefetched
+    """
+    cache = MulticallCache()
+    batched = copy(env)
+    batched.multicall = cache
+    batched.notional = BatchedContract(env.notional, cache)
+    batched.noteERC20 = BatchedContract(env.noteERC20, cache)
+    for name in ["token", "cToken", "nToken", "cTokenAggregator"]:
+        contracts = getattr(env, name)
+        setattr(batched, name, {k: BatchedContract(c, cache) for (k, c) in contracts.items()})
+
+    prefetch_system_reads(batched, vaults)
+    prefetch_note_and_vault_balances(batched, accounts, vaults)
+    return batched
+
+
+def prefetch_system_reads(env, vaults):
+    cache = getattr(env, "multicall", None)
+    if cache is None:
+        return
+
+    notional = env.notional._contract
+    calls = []
+    for (symbol, currencyId) in env.currencyId.items():
+        calls.append((notional.getActiveMarkets, [currencyId]))
+        calls.append((notional.getReserveBalance, [currencyId]))
+        if symbol in env.token:
+            calls.append((env.token[symbol]._contract.balanceOf, [notional.address]))
+        if symbol in env.cToken:
+            calls.append((env.cToken[symbol]._contract.balanceOf, [notional.address]))
+
+    for (currencyId, nToken) in env.nToken.items():
+        nToken = nToken._contract
+        calls.append((notional.getCashGroupAndAssetRate, [currencyId]))
+        calls.append((notional.getCurrencyAndRates, [currencyId]))
+        calls.append((notional.getNTokenAccount, [nToken.address]))
+        calls.append((notional.getNTokenPortfolio, [nToken.address]))
+        calls.append((notional.getFreeCollateral, [nToken.address]))
+        calls.append((nToken.totalSupply, []))
+        calls.append((nToken.getPresentValueAssetDenominated, []))
+        for testCurrencyId in env.currencyId.values():
+            calls.append((notional.getAccountBalance, [testCurrencyId, nToken.address]))
+
+    for aggregator in env.cTokenAggregator.values():
+        calls.append((aggregator._contract.getAnnualizedSupplyRate, []))
+
+    for vault in vaults:
+        calls.append((notional.getVaultConfig, [vault]))
+
+    calls.append((env.noteERC20._contract.balanceOf, [notional.address]))
+    cache.prefetch(calls)
+
+
+def prefetch_note_and_vault_balances(env, accounts, vaults):
+    cache = getattr(env, "multicall", None)
+    if cache is None:
+        return
+
+    # Only NOTE balances and vault accounts, other account state is read by the shadow ledger
+    notional = env.notional._contract
+    calls = []
+    for account in accounts:
+        calls.append((env.noteERC20._contract.balanceOf, [account]))
+        for vault in vaults:
+            calls.append((notional.getVaultAccount, [account, vault]))
+
+    cache.prefetch(calls)
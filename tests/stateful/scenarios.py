@@ -0,0 +1,58 @@
+from itertools import product
+
+import pytest
+from tests.helpers import setup_residual_environment
+
+# Named scenarios built on top of a module environment. A test selects a scenario with
+#   @pytest.mark.parametrize("scenario", scenario_params("name", ...), indirect=True)
+# Tests are grouped by scenario, each one is built once per module and every test reverts to
+# the node snapshot taken after it was built.
+SCENARIOS = {}
+
+
+def register_scenario(name):
+    """Registers a builder called as builder(environment, accounts, **params)"""
+
+    def register(builder):
+        SCENARIOS[name] = builder
+        return builder
+
+    return register
+
+
+def build_scenario(name, environment, accounts, params):
+    if name not in SCENARIOS:
+        raise KeyError("Unknown scenario {}".format(name))
+    SCENARIOS[name](environment, accounts, **params)
+
+
+def scenario_params(name, **values):
+    """Returns a parameter for each combination of the given parameter values"""
+    names = sorted(values.keys())
+    params = []
+    for combination in product(*[values[n] for n in names]):
+        scenarioParams = dict(zip(names, combination))
+        scenarioId = "-".join("{}={}".format(n, scenarioParams[n]) for n in names)
+        params.append(pytest.param((name, scenarioParams), id=scenarioId))
+
+    return params
+
+
+@register_scenario("residual_environment")
+def residual_environment(environment, accounts, residualType, marketResiduals, canSellResiduals):
+    setup_residual_environment(
+        environment, accounts, residualType, marketResiduals, canSellResiduals
+    )
+
+
+RESIDUAL_SCENARIOS = scenario_params(
+    "residual_environment",
+    residualType=[0, 1, 2],
+    marketResiduals=[False, True],
+    canSellResiduals=[False, True],
+)
+
+
+def get_residual_params(params):
+    """Returns (residualType, marketResiduals, canSellResiduals) of a residual scenario"""
+    return (params["residualType"], params["marketResiduals"], params["canSellResiduals"])
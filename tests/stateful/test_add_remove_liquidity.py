@@ -6,7 +6,6 @@ from tests.helpers import (
     active_currencies_to_list,
     get_balance_trade_action,
     get_tref,
-    initialize_environment,
 )
 from tests.stateful.invariants import check_system_invariants
 
@@ -14,8 +13,8 @@ chain = Chain()
 
 
 @pytest.fixture(scope="module", autouse=True)
-def environment(accounts):
-    return initialize_environment(accounts)
+def environment(module_environment):
+    return module_environment
 
 
 @pytest.fixture(autouse=True)
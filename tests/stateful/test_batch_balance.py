@@ -1,15 +1,15 @@
 import brownie
 import pytest
 from brownie.network.state import Chain
-from tests.helpers import active_currencies_to_list, get_balance_action, initialize_environment
+from tests.helpers import active_currencies_to_list, get_balance_action
 from tests.stateful.invariants import check_system_invariants
 
 chain = Chain()
 
 
 @pytest.fixture(scope="module", autouse=True)
-def environment(accounts):
-    return initialize_environment(accounts)
+def environment(module_environment):
+    return module_environment
 
 
 @pytest.fixture(autouse=True)
@@ -10,7 +10,6 @@ from tests.helpers import (
     get_balance_trade_action,
     get_lend_action,
     get_tref,
-    initialize_environment,
 )
 from tests.stateful.invariants import check_system_invariants
 
@@ -18,8 +17,8 @@ chain = Chain()
 
 
 @pytest.fixture(scope="module", autouse=True)
-def environment(accounts):
-    return initialize_environment(accounts)
+def environment(module_environment):
+    return module_environment
 
 
 @pytest.fixture(autouse=True)
@@ -3,15 +3,15 @@ import pytest
 from brownie.convert.datatypes import HexString, Wei
 from brownie.network.state import Chain
 from brownie.test import given, strategy
-from tests.helpers import get_balance_action, get_trade_action, initialize_environment
+from tests.helpers import get_balance_action, get_trade_action
 from tests.stateful.invariants import check_system_invariants
 
 chain = Chain()
 
 
 @pytest.fixture(scope="module", autouse=True)
-def environment(accounts):
-    env = initialize_environment(accounts)
+def environment(accounts, module_environment):
+    env = module_environment
     env.comptroller.enterMarkets(
         [env.cToken["DAI"].address, env.cToken["USDC"].address, env.cToken["ETH"].address],
         {"from": accounts[1]},
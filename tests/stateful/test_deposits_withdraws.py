@@ -8,7 +8,6 @@ from tests.helpers import (
     active_currencies_to_list,
     get_balance_action,
     get_balance_trade_action,
-    initialize_environment,
 )
 from tests.stateful.invariants import check_system_invariants
 
@@ -16,8 +15,8 @@ chain = Chain()
 
 
 @pytest.fixture(scope="module", autouse=True)
-def environment(accounts):
-    return initialize_environment(accounts)
+def environment(module_environment):
+    return module_environment
 
 
 @pytest.fixture(autouse=True)
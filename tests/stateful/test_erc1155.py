@@ -9,7 +9,6 @@ from tests.helpers import (
     get_balance_action,
     get_balance_trade_action,
     get_lend_action,
-    initialize_environment,
 )
 from tests.stateful.invariants import check_system_invariants
 
@@ -17,8 +16,8 @@ chain = Chain()
 
 
 @pytest.fixture(scope="module", autouse=True)
-def environment(accounts):
-    env = initialize_environment(accounts)
+def environment(accounts, module_environment):
+    env = module_environment
     env.notional.enableBitmapCurrency(2, {"from": accounts[2]})
 
     return env
@@ -11,8 +11,6 @@ from tests.helpers import (
     get_balance_action,
     get_balance_trade_action,
     get_tref,
-    initialize_environment,
-    setup_residual_environment,
 )
 from tests.stateful.invariants import check_system_invariants
 
@@ -506,58 +504,3 @@ def test_delayed_second_initialize_markets(environment, accounts):
     chain.mine(1, timestamp=(blockTime + SECONDS_IN_QUARTER + SECONDS_IN_DAY * 65))
     environment.notional.initializeMarkets(currencyId, False)
     ntoken_asserts(environment, currencyId, False, accounts)
-
-
-def test_delayed_second_initialize_markets_negative_residual(environment, accounts):
-    currencyId = 2
-    environment = initialize_environment(accounts)
-    setup_residual_environment(
-        environment, accounts, residualType=1, canSellResiduals=True, marketResiduals=False
-    )
-    environment.token["DAI"].transfer(accounts[1], 1_000_000e18, {"from": accounts[0]})
-
-    # Trade some more to leave yet another residual in the 6 month and 1 year market
-    action = get_balance_trade_action(
-        2,
-        "DepositUnderlying",
-        [
-            {"tradeActionType": "Lend", "marketIndex": 2, "notional": 100_000e8, "minSlippage": 0},
-            {"tradeActionType": "Lend", "marketIndex": 3, "notional": 100_000e8, "minSlippage": 0},
-        ],
-        depositActionAmount=200_000e18,
-        withdrawEntireCashBalance=True,
-    )
-    environment.notional.batchBalanceAndTradeAction(accounts[1], [action], {"from": accounts[1]})
-
-    # There is an idiosyncratic residual in the environment above. We will now try to fast forward
-    # and re-initialize the markets with the residual left.
-    blockTime = chain.time()
-    chain.mine(1, timestamp=blockTime + SECONDS_IN_QUARTER)
-    environment.notional.initializeMarkets(currencyId, False)
-
-    ntoken_asserts(environment, currencyId, False, accounts)
-
-
-def test_delayed_second_initialize_markets_positive_residual(accounts):
-    currencyId = 2
-    environment = initialize_environment(accounts)
-    setup_residual_environment(
-        environment, accounts, residualType=1, canSellResiduals=True, marketResiduals=False
-    )
-
-    # Trade some more to leave yet another residual in the 1 year market
-    action = get_balance_trade_action(
-        2,
-        "DepositUnderlying",
-        [{"tradeActionType": "Borrow", "marketIndex": 3, "notional": 10000e8, "maxSlippage": 0}],
-        depositActionAmount=11000e18,
-    )
-    environment.notional.batchBalanceAndTradeAction(accounts[1], [action], {"from": accounts[1]})
-
-    # There is an idiosyncratic residual in the environment above. We will now try to fast forward
-    # and re-initialize the markets with the residual left.
-    blockTime = chain.time()
-    chain.mine(1, timestamp=blockTime + SECONDS_IN_QUARTER)
-    environment.notional.initializeMarkets(currencyId, False)
-
-    ntoken_asserts(environment, currencyId, False, accounts)
@@ -0,0 +1,49 @@
+import pytest
+from brownie.network import web3
+from tests.stateful.multicall import get_batched_environment
+
+
+@pytest.fixture(scope="module", autouse=True)
+def environment(module_environment):
+    return module_environment
+
+
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def test_batched_reads_match_direct_calls(environment, accounts):
+    blockNumber = web3.eth.block_number
+    batched = get_batched_environment(environment, accounts, [])
+    # Prefetching does not send any transactions
+    assert web3.eth.block_number == blockNumber
+    assert len(batched.multicall.results) > 0
+
+    for account in accounts:
+        assert batched.notional.getAccountContext(account) == (
+            environment.notional.getAccountContext(account)
+        )
+        assert batched.notional.getAccountPortfolio(account) == (
+            environment.notional.getAccountPortfolio(account)
+        )
+        assert batched.noteERC20.balanceOf(account) == environment.noteERC20.balanceOf(account)
+        for currencyId in environment.currencyId.values():
+            assert batched.notional.getAccountBalance(currencyId, account) == (
+                environment.notional.getAccountBalance(currencyId, account)
+            )
+
+    for (currencyId, nToken) in environment.nToken.items():
+        assert batched.notional.getNTokenPortfolio(nToken) == (
+            environment.notional.getNTokenPortfolio(nToken)
+        )
+        assert batched.nToken[currencyId].totalSupply() == nToken.totalSupply()
+        assert batched.notional.getActiveMarkets(currencyId) == (
+            environment.notional.getActiveMarkets(currencyId)
+        )
+
+
+def test_transactions_clear_batched_reads(environment, accounts):
+    batched = get_batched_environment(environment, accounts, [])
+    batched.notional.settleAccount(accounts[0], {"from": accounts[0]})
+    assert len(batched.multicall.results) == 0
@@ -8,7 +8,6 @@ from tests.helpers import (
     active_currencies_to_list,
     get_balance_action,
     get_balance_trade_action,
-    initialize_environment,
 )
 from tests.stateful.invariants import check_system_invariants
 from tests.stateful.test_initialize_markets import ntoken_asserts
@@ -19,8 +18,8 @@ INITIAL_CASH_AMOUNT = Wei(100000e18)
 
 
 @pytest.fixture(scope="module", autouse=True)
-def environment(accounts):
-    env = initialize_environment(accounts)
+def environment(accounts, module_environment):
+    env = module_environment
     env.enableCurrency("NOMINT", CurrencyDefaults)
     env.token["NOMINT"].approve(env.notional.address, 2 ** 255, {"from": accounts[1]})
     env.token["NOMINT"].transfer(accounts[1], INITIAL_CASH_AMOUNT * 2, {"from": accounts[0]})
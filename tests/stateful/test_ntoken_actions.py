@@ -7,7 +7,6 @@ from tests.constants import RATE_PRECISION, SECONDS_IN_DAY, SECONDS_IN_QUARTER,
 from tests.helpers import (
     get_balance_action,
     get_balance_trade_action,
-    initialize_environment,
     setup_residual_environment,
 )
 from tests.stateful.invariants import check_system_invariants
@@ -16,8 +15,8 @@ chain = Chain()
 
 
 @pytest.fixture(scope="module", autouse=True)
-def environment(accounts):
-    return initialize_environment(accounts)
+def environment(module_environment):
+    return module_environment
 
 
 @pytest.fixture(autouse=True)
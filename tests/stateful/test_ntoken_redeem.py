@@ -2,23 +2,21 @@ import brownie
 import pytest
 from brownie.exceptions import RPCRequestError
 from brownie.network.state import Chain
-from brownie.test import given, strategy
 from scripts.config import CurrencyDefaults
 from tests.constants import SECONDS_IN_QUARTER
 from tests.helpers import (
     get_balance_action,
     get_balance_trade_action,
-    initialize_environment,
-    setup_residual_environment,
 )
 from tests.stateful.invariants import check_system_invariants
+from tests.stateful.scenarios import RESIDUAL_SCENARIOS, get_residual_params
 
 chain = Chain()
 
 
 @pytest.fixture(scope="module", autouse=True)
-def environment(accounts):
-    return initialize_environment(accounts)
+def environment(module_environment):
+    return module_environment
 
 
 @pytest.fixture(autouse=True)
@@ -249,19 +247,11 @@ def test_redeem_tokens_and_save_assets_bitmap(environment, accounts):
     check_system_invariants(environment, accounts)
 
 
-@given(
-    residualType=strategy("uint8", min_value=0, max_value=2),
-    marketResiduals=strategy("bool"),
-    canSellResiduals=strategy("bool"),
-)
-def test_redeem_ntoken_batch_balance_action(
-    environment, accounts, residualType, marketResiduals, canSellResiduals
-):
+@pytest.mark.parametrize("scenario", RESIDUAL_SCENARIOS, indirect=True)
+def test_redeem_ntoken_batch_balance_action(environment, accounts, scenario):
+    (residualType, marketResiduals, canSellResiduals) = get_residual_params(scenario)
     currencyId = 2
     redeemAmount = 1_000_000e8
-    setup_residual_environment(
-        environment, accounts, residualType, marketResiduals, canSellResiduals
-    )
     nTokenAddress = environment.notional.nTokenAddress(currencyId)
     (_, ifCashAssets) = environment.notional.getNTokenPortfolio(nTokenAddress)
 
@@ -306,19 +296,11 @@ def test_redeem_ntoken_batch_balance_action(
     check_system_invariants(environment, accounts)
 
 
-@given(
-    residualType=strategy("uint8", min_value=0, max_value=2),
-    marketResiduals=strategy("bool"),
-    canSellResiduals=strategy("bool"),
-)
-def test_redeem_ntoken_sell_fcash_no_residuals(
-    environment, accounts, residualType, marketResiduals, canSellResiduals
-):
+@pytest.mark.parametrize("scenario", RESIDUAL_SCENARIOS, indirect=True)
+def test_redeem_ntoken_sell_fcash_no_residuals(environment, accounts, scenario):
+    (residualType, marketResiduals, canSellResiduals) = get_residual_params(scenario)
     currencyId = 2
     redeemAmount = 1_000_000e8
-    setup_residual_environment(
-        environment, accounts, residualType, marketResiduals, canSellResiduals
-    )
     nTokenAddress = environment.notional.nTokenAddress(currencyId)
     (_, ifCashAssets) = environment.notional.getNTokenPortfolio(nTokenAddress)
 
@@ -362,18 +344,10 @@ def test_redeem_ntoken_sell_fcash_no_residuals(
     check_system_invariants(environment, accounts)
 
 
-@given(
-    residualType=strategy("uint8", min_value=0, max_value=2),
-    marketResiduals=strategy("bool"),
-    canSellResiduals=strategy("bool"),
-)
-def test_redeem_ntoken_keep_assets_no_residuals(
-    environment, accounts, residualType, marketResiduals, canSellResiduals
-):
+@pytest.mark.parametrize("scenario", RESIDUAL_SCENARIOS, indirect=True)
+def test_redeem_ntoken_keep_assets_no_residuals(environment, accounts, scenario):
+    (residualType, marketResiduals, _) = get_residual_params(scenario)
     currencyId = 2
-    setup_residual_environment(
-        environment, accounts, residualType, marketResiduals, canSellResiduals
-    )
     nTokenAddress = environment.notional.nTokenAddress(currencyId)
     (_, ifCashAssets) = environment.notional.getNTokenPortfolio(nTokenAddress)
 
@@ -412,18 +386,10 @@ def test_redeem_ntoken_keep_assets_no_residuals(
     check_system_invariants(environment, accounts)
 
 
-@given(
-    residualType=strategy("uint8", min_value=0, max_value=2),
-    marketResiduals=strategy("bool"),
-    canSellResiduals=strategy("bool"),
-)
-def test_redeem_ntoken_keep_assets_accept_residuals(
-    environment, accounts, residualType, marketResiduals, canSellResiduals
-):
+@pytest.mark.parametrize("scenario", RESIDUAL_SCENARIOS, indirect=True)
+def test_redeem_ntoken_keep_assets_accept_residuals(environment, accounts, scenario):
+    (residualType, marketResiduals, _) = get_residual_params(scenario)
     currencyId = 2
-    setup_residual_environment(
-        environment, accounts, residualType, marketResiduals, canSellResiduals
-    )
     nTokenAddress = environment.notional.nTokenAddress(currencyId)
     (_, ifCashAssets) = environment.notional.getNTokenPortfolio(nTokenAddress)
 
@@ -480,18 +446,10 @@ def test_redeem_ntoken_keep_assets_accept_residuals(
     check_system_invariants(environment, accounts)
 
 
-@given(
-    residualType=strategy("uint8", min_value=0, max_value=2),
-    marketResiduals=strategy("bool"),
-    canSellResiduals=strategy("bool"),
-)
-def test_redeem_ntoken_sell_assets_accept_residuals(
-    environment, accounts, residualType, marketResiduals, canSellResiduals
-):
+@pytest.mark.parametrize("scenario", RESIDUAL_SCENARIOS, indirect=True)
+def test_redeem_ntoken_sell_assets_accept_residuals(environment, accounts, scenario):
+    (residualType, marketResiduals, canSellResiduals) = get_residual_params(scenario)
     currencyId = 2
-    setup_residual_environment(
-        environment, accounts, residualType, marketResiduals, canSellResiduals
-    )
     nTokenAddress = environment.notional.nTokenAddress(currencyId)
     (_, ifCashAssets) = environment.notional.getNTokenPortfolio(nTokenAddress)
 
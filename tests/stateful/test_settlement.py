@@ -5,7 +5,6 @@ from tests.helpers import (
     get_balance_action,
     get_balance_trade_action,
     get_tref,
-    initialize_environment,
 )
 from tests.stateful.invariants import check_system_invariants
 
@@ -13,8 +12,8 @@ chain = Chain()
 
 
 @pytest.fixture(scope="module", autouse=True)
-def environment(accounts):
-    return initialize_environment(accounts)
+def environment(module_environment):
+    return module_environment
 
 
 @pytest.fixture(autouse=True)
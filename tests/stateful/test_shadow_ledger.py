@@ -0,0 +1,60 @@
+import pytest
+from brownie.network.state import Chain
+from tests.helpers import get_balance_action
+from tests.stateful.invariants import check_system_invariants
+from tests.stateful.ledger import ShadowLedger
+
+chain = Chain()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def environment(module_environment):
+    return module_environment
+
+
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def test_ledger_only_reads_changed_accounts(environment, accounts):
+    ledger = ShadowLedger(environment, accounts)
+    assert ledger.sync() == [a.address for a in accounts]
+    assert ledger.sync() == []
+
+    environment.notional.batchBalanceAction(
+        accounts[1],
+        [get_balance_action(2, "DepositAsset", depositActionAmount=100e8)],
+        {"from": accounts[1]},
+    )
+    assert ledger.sync() == [accounts[1].address]
+
+    for currencyId in environment.currencyId.values():
+        assert ledger.cashBalances[currencyId] == sum(
+            environment.notional.getAccountBalance(currencyId, a)[0] for a in accounts
+        )
+        assert ledger.nTokenBalances[currencyId] == sum(
+            environment.notional.getAccountBalance(currencyId, a)[1] for a in accounts
+        )
+
+    check_system_invariants(environment, accounts)
+
+
+def test_ledger_resumes_after_revert(environment, accounts):
+    ledger = ShadowLedger(environment, accounts)
+    ledger.sync()
+    balanceBefore = ledger.getAccountBalance(2, accounts[1].address)
+
+    chain.snapshot()
+    environment.notional.batchBalanceAction(
+        accounts[1],
+        [get_balance_action(2, "DepositAsset", depositActionAmount=100e8)],
+        {"from": accounts[1]},
+    )
+    assert ledger.sync() == [accounts[1].address]
+    assert ledger.getAccountBalance(2, accounts[1].address)[0] == balanceBefore[0] + 100e8
+
+    # The state before the deposit is restored from its checkpoint without any reads
+    chain.revert()
+    assert ledger.sync() == []
+    assert ledger.getAccountBalance(2, accounts[1].address) == balanceBefore
@@ -1,11 +1,10 @@
 import pytest
-from tests.helpers import initialize_environment
 from tests.internal.vaults.fixtures import get_vault_config, set_flags
 
 
 @pytest.fixture(scope="module", autouse=True)
-def environment(accounts):
-    env = initialize_environment(accounts)
+def environment(accounts, module_environment):
+    env = module_environment
     env.token["DAI"].transfer(accounts[1], 100_000_000e18, {"from": accounts[0]})
     env.token["USDC"].transfer(accounts[1], 100_000_000e6, {"from": accounts[0]})
     env.token["DAI"].approve(env.notional.address, 2 ** 256 - 1, {"from": accounts[1]})
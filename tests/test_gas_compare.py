@@ -0,0 +1,112 @@
+import json
+import sys
+
+import pytest
+from scripts import gas_compare
+from scripts.gas_compare import compareResults, getThreshold, isFailure, loadThresholds
+
+THRESHOLDS = [("settleAssets.*", 0.01, 500), ("settleAssets.bitmap.*", 0, 0), ("*", 0.01, 200)]
+
+
+def gas(cold, warm=None):
+    return {"cold": cold, "warm": cold if warm is None else warm}
+
+
+def test_threshold_first_matching_pattern_applies():
+    assert getThreshold("settleAssets.array.1.1", THRESHOLDS) == (0.01, 500)
+    # The broader pattern is listed first so the bitmap pattern is never reached
+    assert getThreshold("settleAssets.bitmap.1.1", THRESHOLDS) == (0.01, 500)
+    assert getThreshold("deposit.direct.DepositAsset.DAI", THRESHOLDS) == (0.01, 200)
+
+
+def test_threshold_without_matching_pattern():
+    assert getThreshold("deposit.direct.DepositAsset.DAI", THRESHOLDS[0:2]) == (0, 0)
+
+
+def test_threshold_overrides_are_checked_first(tmp_path):
+    path = tmp_path / "thresholds.json"
+    path.write_text(json.dumps({"settleAssets.bitmap.*": {"relative": 0, "absolute": 0}}))
+    thresholds = loadThresholds(str(path))
+
+    assert getThreshold("settleAssets.bitmap.1.1", thresholds) == (0, 0)
+    assert getThreshold("settleAssets.array.1.1", thresholds) == gas_compare.THRESHOLDS[1][1:]
+    assert loadThresholds(None) == gas_compare.THRESHOLDS
+
+
+@pytest.mark.parametrize(
+    "after,isRegression",
+    [
+        # Within the absolute threshold, above the relative threshold
+        (100_150, False),
+        # Above the absolute threshold, within the relative threshold
+        (100_900, False),
+        # Exactly at the relative threshold
+        (101_000, False),
+        # Above both thresholds
+        (101_001, True),
+    ],
+)
+def test_change_must_exceed_both_thresholds(after, isRegression):
+    (regressions, improvements, _, _, _) = compareResults(
+        {"key": gas(100_000)}, {"key": gas(after)}, [("*", 0.01, 200)]
+    )
+
+    assert improvements == []
+    if isRegression:
+        assert regressions == [("key.cold", 100_000, after), ("key.warm", 100_000, after)]
+    else:
+        assert regressions == []
+
+
+def test_improvements_and_warm_measurements():
+    (regressions, improvements, _, _, _) = compareResults(
+        {"key": gas(100_000, 50_000)}, {"key": gas(90_000, 50_000)}, [("*", 0.01, 200)]
+    )
+
+    assert regressions == []
+    assert improvements == [("key.cold", 100_000, 90_000)]
+
+
+def test_added_and_removed_benchmarks():
+    comparison = compareResults(
+        {"kept": gas(1000), "removed": gas(1000)},
+        {"kept": gas(1000), "added": gas(1000)},
+        THRESHOLDS,
+    )
+    (regressions, improvements, added, removed, failed) = comparison
+
+    assert (regressions, improvements, failed) == ([], [], [])
+    assert added == ["added"]
+    assert removed == ["removed"]
+    assert isFailure(comparison)
+
+
+def test_added_benchmarks_pass():
+    comparison = compareResults({"kept": gas(1000)}, {"kept": gas(1000), "added": gas(1)}, [])
+    assert not isFailure(comparison)
+
+
+def test_failed_benchmarks():
+    comparison = compareResults(
+        {"failing": gas(1000), "fixed": {"error": "revert"}},
+        {"failing": {"error": "revert"}, "fixed": gas(1000)},
+        THRESHOLDS,
+    )
+    (regressions, improvements, added, removed, failed) = comparison
+
+    assert (regressions, improvements, added, removed) == ([], [], [], [])
+    assert failed == ["failing"]
+    assert isFailure(comparison)
+
+
+def test_missing_baseline(tmp_path, monkeypatch):
+    results = tmp_path / "gas_stats.json"
+    results.write_text(json.dumps({"key": gas(1000)}))
+    monkeypatch.setattr(gas_compare, "BASELINE_DIR", str(tmp_path / "baselines"))
+    monkeypatch.setattr(gas_compare, "findBaseline", lambda: None)
+
+    monkeypatch.setattr(sys, "argv", ["gas_compare.py", "compare", "-r", str(results)])
+    assert gas_compare.main() == 1
+
+    monkeypatch.setattr(sys, "argv", sys.argv + ["--allow-missing-baseline"])
+    assert gas_compare.main() == 0